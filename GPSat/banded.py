@@ -0,0 +1,458 @@
+"""
+Banded matrix linear algebra for sparse GPR with compactly supported (B-spline) inducing features,
+as used by "actually sparse" variational GPs, see:
+https://github.com/HJakeCunningham/ASVGP
+
+With B-spline features of degree p in each dimension, Kuu and Kuf Kfu (and so P = Kuu + Kuf Kfu / sigma^2)
+are banded, so the bound and predictions can be computed with a banded Cholesky decomposition in O(M b^2),
+rather than O(M^3), where b is the bandwidth: p in 1-D, so the cost is linear in the number of features.
+
+Symmetric banded matrices are stored by their lower bands, as in LAPACK / ``scipy.linalg.cholesky_banded``,
+i.e. ``ab[k, j] = A[j + k, j]`` for ``k = 0, ..., bandwidth``.
+"""
+import numpy as np
+import scipy.linalg
+import tensorflow as tf
+import gpflow
+from gpflow import default_float
+from functools import reduce
+
+from GPSat.decorators import numba_lazy
+
+
+# ----- banded matrices -----
+
+def dense_to_banded(A, bandwidth):
+    """Lower banded storage, of shape (bandwidth + 1, M), of the symmetric (M, M) matrix A."""
+    M = len(A)
+    ab = np.zeros((bandwidth + 1, M), dtype=A.dtype)
+    for k in range(bandwidth + 1):
+        ab[k, :M - k] = np.diagonal(A, -k)
+    return ab
+
+
+def banded_to_dense(ab):
+    """Symmetric (M, M) matrix from its lower banded storage ab."""
+    M = ab.shape[1]
+    A = np.zeros((M, M), dtype=ab.dtype)
+    for k in range(ab.shape[0]):
+        A += np.diag(ab[k, :M - k], -k)
+        if k > 0:
+            A += np.diag(ab[k, :M - k], k)
+    return A
+
+
+@numba_lazy("njit")
+def selected_inverse(cb):
+    """
+    Band of A^{-1}, in lower banded storage, from the lower banded Cholesky factor cb of A
+    (see ``scipy.linalg.cholesky_banded``), using the Takahashi recursion: O(M b^2) for bandwidth b.
+    """
+    bw1, M = cb.shape
+    zb = np.zeros((bw1, M))
+    for j in range(M - 1, -1, -1):
+        n = min(bw1 - 1, M - 1 - j)
+        ljj = cb[0, j]
+        # Z[j + 1 + p, j] = -sum_q Z[j + 1 + p, j + 1 + q] L[j + 1 + q, j] / L[j, j]
+        # - only uses the (already computed) band of Z to the right of column j
+        for p in range(n):
+            s = 0.0
+            for q in range(n):
+                if p >= q:
+                    s += zb[p - q, j + 1 + q] * cb[1 + q, j]
+                else:
+                    s += zb[q - p, j + 1 + p] * cb[1 + q, j]
+            zb[1 + p, j] = -s / ljj
+        s = 0.0
+        for q in range(n):
+            s += zb[1 + q, j] * cb[1 + q, j]
+        zb[0, j] = 1.0 / ljj ** 2 - s / ljj
+    return zb
+
+
+@numba_lazy("njit")
+def _selected_inverse_grad(cb, zb, zb_bar):
+    # reverse mode of selected_inverse: gradient w.r.t. cb from the gradient w.r.t. its output zb
+    bw1, M = cb.shape
+    zb_bar = zb_bar.copy()
+    cb_bar = np.zeros((bw1, M))
+    for j in range(M):
+        n = min(bw1 - 1, M - 1 - j)
+        ljj = cb[0, j]
+        # the diagonal Z[j, j] was computed last (from Z[j + 1 + q, j]), so goes first
+        g = zb_bar[0, j]
+        s = 0.0
+        for q in range(n):
+            s += zb[1 + q, j] * cb[1 + q, j]
+            zb_bar[1 + q, j] -= g * cb[1 + q, j] / ljj
+            cb_bar[1 + q, j] -= g * zb[1 + q, j] / ljj
+        cb_bar[0, j] += g * (-2.0 / ljj ** 3 + s / ljj ** 2)
+        for p in range(n):
+            g = zb_bar[1 + p, j]
+            cb_bar[0, j] -= g * zb[1 + p, j] / ljj
+            for q in range(n):
+                if p >= q:
+                    k, c = p - q, j + 1 + q
+                else:
+                    k, c = q - p, j + 1 + p
+                cb_bar[1 + q, j] -= g * zb[k, c] / ljj
+                zb_bar[k, c] -= g * cb[1 + q, j] / ljj
+    return cb_bar
+
+
+@numba_lazy("njit")
+def _cholesky_banded_grad(cb, cb_bar):
+    # reverse mode of (lower) banded Cholesky: gradient w.r.t. the band of A from the gradient w.r.t. cb
+    bw1, M = cb.shape
+    bw = bw1 - 1
+    cb_bar = cb_bar.copy()
+    ab_bar = np.zeros((bw1, M))
+    for j in range(M - 1, -1, -1):
+        ljj = cb[0, j]
+        # L[i, j] = (A[i, j] - sum_k L[i, k] L[j, k]) / L[j, j], for i > j
+        for i in range(j + 1, min(j + bw, M - 1) + 1):
+            g = cb_bar[i - j, j] / ljj
+            ab_bar[i - j, j] += g
+            cb_bar[0, j] -= g * cb[i - j, j]
+            for k in range(max(i - bw, 0), j):
+                cb_bar[i - k, k] -= g * cb[j - k, k]
+                cb_bar[j - k, k] -= g * cb[i - k, k]
+        # L[j, j] = sqrt(A[j, j] - sum_k L[j, k]^2)
+        g = cb_bar[0, j] / (2 * ljj)
+        ab_bar[0, j] += g
+        for k in range(max(j - bw, 0), j):
+            cb_bar[j - k, k] -= 2 * g * cb[j - k, k]
+    return ab_bar
+
+
+def _band_weights(ab):
+    # off-diagonal bands appear twice in the symmetric matrix, e.g. in gradients and traces
+    w = np.full((ab.shape[0], 1), 2.)
+    w[0] = 1.
+    return w
+
+
+def _banded_logdet_quad_grad(cb, x, dlogdet, dquad):
+    # gradient of logdet(A) + b^T A^{-1} b w.r.t. the band of A: dlogdet * A^{-1} - dquad * x x^T, x = A^{-1} b
+    # - only the band is needed, as the band is all that is stored (and differentiated)
+    zb = selected_inverse(cb)
+    M = cb.shape[1]
+    xxb = np.zeros_like(cb)
+    for k in range(cb.shape[0]):
+        xxb[k, :M - k] = np.sum(x[k:] * x[:M - k], axis=1)
+    return (_band_weights(cb) * (dlogdet * zb - dquad * xxb)).astype(cb.dtype)
+
+
+@tf.custom_gradient
+def banded_logdet_quad(ab, b):
+    """
+    Log determinant of the symmetric positive definite banded matrix A, with lower banded storage ``ab``,
+    and the quadratic form ``sum(b * A^{-1} b)``, for ``b`` of shape (M, K).
+
+    Computed with a banded Cholesky decomposition, with gradients (w.r.t. the band of A) using only the
+    band of A^{-1}, see :func:`selected_inverse`.
+    """
+    cb = tf.numpy_function(lambda a: scipy.linalg.cholesky_banded(a, lower=True), [ab], ab.dtype)
+    cb.set_shape(ab.shape)
+    x = tf.numpy_function(lambda c, y: scipy.linalg.cho_solve_banded((c, True), y), [cb, b], ab.dtype)
+    x.set_shape(b.shape)
+    logdet = 2. * tf.reduce_sum(tf.math.log(cb[0]))
+    quad = tf.reduce_sum(b * x)
+
+    def grad(dlogdet, dquad):
+        dab = tf.numpy_function(_banded_logdet_quad_grad, [cb, x, dlogdet, dquad], ab.dtype)
+        dab.set_shape(ab.shape)
+        return dab, 2. * dquad * x
+
+    return (logdet, quad), grad
+
+
+@tf.custom_gradient
+def banded_selected_inverse(ab):
+    """
+    Band of A^{-1}, in lower banded storage, for the symmetric positive definite banded matrix A, with lower
+    banded storage ``ab``. Both the value and the gradient require O(M b^2) computation for bandwidth b.
+    """
+    cb = tf.numpy_function(lambda a: scipy.linalg.cholesky_banded(a, lower=True), [ab], ab.dtype)
+    cb.set_shape(ab.shape)
+    zb = tf.numpy_function(selected_inverse, [cb], ab.dtype)
+    zb.set_shape(ab.shape)
+
+    def grad(zb_bar):
+        ab_bar = tf.numpy_function(lambda c, z, z_bar: _cholesky_banded_grad(c, _selected_inverse_grad(c, z, z_bar)),
+                                   [cb, zb, zb_bar], ab.dtype)
+        ab_bar.set_shape(ab.shape)
+        return ab_bar
+
+    return zb, grad
+
+
+# ----- B-spline features -----
+
+def _cardinal_bspline(u, degree, deriv=0):
+    # cardinal B-spline of degree 1 or 2, supported on [0, degree + 1], or its derivative
+    if degree == 1:
+        pieces = [[u, 2. - u], [np.ones_like(u), -np.ones_like(u)]]
+    elif degree == 2:
+        pieces = [[u ** 2 / 2, (-2 * u ** 2 + 6 * u - 3) / 2, (3 - u) ** 2 / 2],
+                  [u, 3 - 2 * u, u - 3],
+                  [np.ones_like(u), -2 * np.ones_like(u), np.ones_like(u)]]
+    else:
+        raise NotImplementedError(f"B-splines of degree: {degree} not implemented")
+    piece = np.clip(np.floor(u), 0, degree).astype(int)
+    out = np.choose(piece, pieces[deriv])
+    return np.where((u >= 0) & (u <= degree + 1), out, 0.)
+
+
+def bspline_features(x, a, b, m, degree, deriv=0):
+    """
+    Evaluate the ``m`` B-splines of ``degree``, with uniformly spaced knots, spanning [a, b] at locations ``x``.
+    Each location has (at most) ``degree + 1`` non-zero B-splines.
+
+    Returns
+    -------
+    tuple of np.ndarray
+        Values (or derivatives), of shape (N, degree + 1), and the index of the corresponding B-splines.
+    """
+    assert m > degree, f"number of B-splines: {m} must be greater than the degree: {degree}"
+    x = np.asarray(x, dtype=float).reshape(-1)
+    h = (b - a) / (m - degree)
+    s = (x - a) / h
+    # B-spline j is supported on [a + (j - degree) h, a + (j + 1) h]
+    first = np.clip(np.floor(s), 0, m - degree - 1).astype(int)
+    idx = first[:, None] + np.arange(degree + 1)[None, :]
+    u = s[:, None] - idx + degree
+    return _cardinal_bspline(u, degree, deriv) / h ** deriv, idx
+
+
+def _add_symmetric_band(ab, rows, cols, vals):
+    # add the symmetric part of the (sparse) matrix with entries vals at (rows, cols) to the lower banded ab
+    diff = rows - cols
+    np.add.at(ab, (np.abs(diff), np.minimum(rows, cols)), np.where(diff == 0, 1., 0.5) * vals)
+
+
+def bspline_gram(a, b, m, degree, derivs=(0, 0)):
+    """
+    Symmetric part of the matrix of integrals over [a, b] of the products of the B-splines' derivatives,
+    of order ``derivs[0]`` (rows) and ``derivs[1]`` (columns), in lower banded storage of shape (degree + 1, m).
+    """
+    h = (b - a) / (m - degree)
+    # Gauss-Legendre quadrature on each interval between knots, exact for the piecewise polynomials
+    xi, wi = np.polynomial.legendre.leggauss(degree + 1)
+    x = (a + h * (np.arange(m - degree)[:, None] + (xi[None, :] + 1) / 2)).reshape(-1)
+    v0, idx = bspline_features(x, a, b, m, degree, derivs[0])
+    v1, _ = bspline_features(x, a, b, m, degree, derivs[1])
+    w = np.tile(wi * h / 2, m - degree)
+    G = np.zeros((degree + 1, m))
+    rows, cols = np.broadcast_arrays(idx[:, :, None], idx[:, None, :])
+    _add_symmetric_band(G, rows, cols, w[:, None, None] * v0[:, :, None] * v1[:, None, :])
+    return G
+
+
+def _outer_boundary(a, b, m, degree, derivs):
+    # symmetric part of B^{(d0)}(x) B^{(d1)}(x)^T, products of the B-splines' derivatives, at x = a and x = b,
+    # in lower banded storage
+    (v0, idx), (v1, _) = [bspline_features(np.array([a, b]), a, b, m, degree, deriv=d) for d in derivs]
+    out = []
+    for i in range(2):
+        S = np.zeros((degree + 1, m))
+        rows, cols = np.broadcast_arrays(idx[i][:, None], idx[i][None, :])
+        _add_symmetric_band(S, rows, cols, v0[i][:, None] * v1[i][None, :])
+        out.append(S)
+    return out
+
+
+# ------- gpr -------
+
+class GPR_banded(gpflow.models.GPModel, gpflow.models.InternalDataTrainingLossMixin):
+    def __init__(self, data, kernels, a, b, ms):
+        """
+        GPR with (collapsed) B-spline inducing features and a separable Matern kernel, using banded linear algebra.
+
+        The features in each dimension are ``ms[i]`` B-splines on [a[i], b[i]], of degree 1 for Matern12 and
+        degree 2 for Matern32, so Kuu is the Kronecker product of banded matrices, given by the RKHS inner
+        products of the B-splines, and Kuf is sparse.
+
+        Requires O(M b^2) computation for the bound and predictions, where b is the bandwidth of P,
+        e.g. for 2-D b is (approximately) the degree times the number of features in the second dimension.
+        All the per dimension matrices (Kuu and its inverse) are likewise stored and computed as banded matrices.
+        """
+        for kernel in kernels:
+            assert isinstance(kernel, (gpflow.kernels.Matern12, gpflow.kernels.Matern32)), \
+                f"kernel: {kernel.__class__.__name__} not implemented, must be one of: Matern12, Matern32"
+
+        likelihood = gpflow.likelihoods.Gaussian()
+        mean_function = gpflow.mean_functions.Zero()
+        super().__init__(kernels[0], likelihood, mean_function, num_latent_gps=1)
+
+        self.data = data
+        self.X, self.Y = data
+        self.kernels = kernels
+        self.a, self.b, self.ms = list(a), list(b), list(ms)
+        self.degrees = [1 if isinstance(k, gpflow.kernels.Matern12) else 2 for k in kernels]
+        self.M = int(np.prod(self.ms))
+
+        assert np.all(self.X >= np.asarray(self.a)) and np.all(self.X <= np.asarray(self.b)), \
+            "observations must be within the domain [a, b]"
+
+        # bandwidth of the Kronecker product of the banded matrices (of bandwidth degree) for each dimension
+        strides = [int(np.prod(self.ms[i + 1:])) for i in range(len(self.ms))]
+        self.bandwidth = min(sum(p * s for p, s in zip(self.degrees, strides)), self.M - 1)
+
+        # per dimension: the (hyperparameter independent) terms of Kuu, see _Kuu
+        self._Kuu_terms = []
+        for a_, b_, m, p in zip(self.a, self.b, self.ms, self.degrees):
+            if p == 1:
+                Sa, Sb = _outer_boundary(a_, b_, m, p, (0, 0))
+                terms = {"G00": bspline_gram(a_, b_, m, p, (0, 0)),
+                         "G11": bspline_gram(a_, b_, m, p, (1, 1)),
+                         "S00": Sa + Sb}
+            else:
+                # symmetric part of int B B'', so G02 is int B B''^T + B'' B^T, likewise for S01
+                G02 = bspline_gram(a_, b_, m, p, (0, 2))
+                S00, S01, S11 = [_outer_boundary(a_, b_, m, p, d) for d in [(0, 0), (0, 1), (1, 1)]]
+                terms = {"G00": bspline_gram(a_, b_, m, p, (0, 0)),
+                         "G02": 2 * G02,
+                         "G22": bspline_gram(a_, b_, m, p, (2, 2)),
+                         "S00": S00[0] + S00[1],
+                         "S01": 2 * (S01[1] - S01[0]),
+                         "S11": S11[0] + S11[1]}
+            self._Kuu_terms.append(terms)
+
+        # indices, into each dimension's (flattened) lower banded matrix, of the entries of the Kronecker product
+        # in each band, which are zero if the entry is outside any dimension's band
+        rows = np.arange(self.M)[None, :] + np.arange(self.bandwidth + 1)[:, None]
+        valid = rows < self.M
+        rows = np.minimum(rows, self.M - 1)
+        cols = np.broadcast_to(np.arange(self.M)[None, :], rows.shape)
+        r_d, c_d = np.unravel_index(rows, self.ms), np.unravel_index(cols, self.ms)
+        self._band_index = []
+        for r, c, m, p in zip(r_d, c_d, self.ms, self.degrees):
+            k = np.abs(r - c)
+            valid &= k <= p
+            self._band_index.append((np.minimum(k, p) * m + np.minimum(r, c)).astype(np.int32))
+        self._band_valid = valid.astype(float)
+
+        # pre compute static quantities: Kuf Kfu (banded) and Kuf Y
+        idx, vals = self._features(self.X)
+        KufKfu = np.zeros((self.bandwidth + 1, self.M))
+        diff = idx[:, :, None] - idx[:, None, :]
+        lower = diff >= 0
+        np.add.at(KufKfu,
+                  (diff[lower], np.broadcast_to(idx[:, None, :], diff.shape)[lower]),
+                  (vals[:, :, None] * vals[:, None, :])[lower])
+        self.KufKfu = KufKfu
+        self.KufY = np.zeros((self.M, self.Y.shape[1]))
+        np.add.at(self.KufY, idx, vals[:, :, None] * self.Y[:, None, :])
+        self.tr_YTY = np.sum(np.square(self.Y))
+
+        # posterior quantities for prediction, and the hyperparameters they were computed for
+        self._posterior_cache = None
+
+    def _features(self, X):
+        # non-zero features of each location in X, and their indices: the products of those in each dimension
+        idx, vals = np.zeros((len(X), 1), dtype=int), np.ones((len(X), 1))
+        for i, (a, b, m, p) in enumerate(zip(self.a, self.b, self.ms, self.degrees)):
+            v, j = bspline_features(X[:, i], a, b, m, p)
+            idx = (idx[:, :, None] * m + j[:, None, :]).reshape(len(X), -1)
+            vals = (vals[:, :, None] * v[:, None, :]).reshape(len(X), -1)
+        return idx, vals
+
+    def _Kuu(self):
+        # Kuu for each dimension: the RKHS inner products of the B-splines for the (1-D) Matern kernel on [a, b],
+        # i.e. the norm on the real line of the (minimum norm) extension of functions on [a, b]:
+        # - Matern12: 1 / (2 l s2) (int_a^b l^2 f^2 + f'^2 dx + l (f(a)^2 + f(b)^2))
+        # - Matern32: 1 / (4 l^3 s2) (int_a^b (l^2 f - f'')^2 dx + 2 l ((l f(a) - f'(a))^2 + (l f(b) + f'(b))^2))
+        # with l = lambda (1 / lengthscale, sqrt(3) / lengthscale respectively), s2 the kernel variance
+        # - in lower banded storage, of bandwidth the degree of the B-splines
+        Kuu = []
+        for kernel, T in zip(self.kernels, self._Kuu_terms):
+            var = kernel.variance
+            if isinstance(kernel, gpflow.kernels.Matern12):
+                lamb = 1. / kernel.lengthscales
+                K = (lamb ** 2 * T["G00"] + T["G11"] + lamb * T["S00"]) / (2 * lamb * var)
+            else:
+                lamb = np.sqrt(3.) / kernel.lengthscales
+                K = (lamb ** 4 * T["G00"] - lamb ** 2 * T["G02"] + T["G22"]
+                     + 2 * lamb * (lamb ** 2 * T["S00"] + lamb * T["S01"] + T["S11"])) / (4 * lamb ** 3 * var)
+            Kuu.append(K)
+        return Kuu
+
+    def _kron_band(self, K):
+        # band of the Kronecker product of the (m_i, m_i) banded matrices K, given in lower banded storage
+        # - for the band of Kuu^{-1} (from the bands of the inverses) this is only correct where Kuf Kfu is non-zero
+        return reduce(tf.multiply, [tf.gather(tf.reshape(K_d, [-1]), idx) for K_d, idx in zip(K, self._band_index)]) \
+            * self._band_valid
+
+    def maximum_log_likelihood_objective(self):
+        return self.elbo()
+
+    def elbo(self):
+        Kuu = self._Kuu()
+        sigma2 = self.likelihood.variance
+        P = self._kron_band(Kuu) + self.KufKfu / sigma2
+        log_det_P, quad = banded_logdet_quad(P, tf.convert_to_tensor(self.KufY) / sigma2)
+
+        Kuu_logdet = reduce(tf.add, [float(self.M) / m * banded_logdet_quad(K, tf.zeros((m, 1), K.dtype))[0]
+                                     for K, m in zip(Kuu, self.ms)])
+        # trace of Kuu^{-1} Kuf Kfu only requires the band of Kuu^{-1} = kron of the inverses
+        Kuu_inv = self._kron_band([banded_selected_inverse(K) for K in Kuu])
+        tr_Qff = tf.reduce_sum(_band_weights(self.KufKfu) * Kuu_inv * self.KufKfu)
+        Kdiag_sum = reduce(tf.multiply, [k.variance for k in self.kernels]) * len(self.X)
+
+        ND = tf.cast(tf.size(self.Y), default_float())
+        D = tf.cast(tf.shape(self.Y)[1], default_float())
+
+        elbo = -0.5 * ND * tf.math.log(2 * np.pi * sigma2)
+        elbo -= 0.5 * D * log_det_P
+        elbo += 0.5 * D * Kuu_logdet
+        elbo -= 0.5 * self.tr_YTY / sigma2
+        elbo += 0.5 * quad
+        elbo -= 0.5 * D * Kdiag_sum / sigma2
+        elbo += 0.5 * D * tr_Qff / sigma2
+        return elbo
+
+    def _posterior(self):
+        # posterior quantities (in numpy) for prediction, reused while the hyperparameters are unchanged
+        key = tuple(p.numpy().tobytes() for p in self.parameters)
+        if (self._posterior_cache is None) or (self._posterior_cache[0] != key):
+            Kuu = [K.numpy() for K in self._Kuu()]
+            sigma2 = self.likelihood.variance.numpy()
+            P = self._kron_band(Kuu).numpy() + self.KufKfu / sigma2
+            cb = scipy.linalg.cholesky_banded(P, lower=True)
+            post = {
+                "Kuu_inv": [selected_inverse(scipy.linalg.cholesky_banded(K, lower=True)) for K in Kuu],
+                "alpha": scipy.linalg.cho_solve_banded((cb, True), self.KufY / sigma2),
+                # band of P^{-1}, all that is needed for the predictive variance
+                "P_inv": selected_inverse(cb)
+            }
+            self._posterior_cache = (key, post)
+        return self._posterior_cache[1]
+
+    def predict_f(self, Xnew, full_cov=False, full_output_cov=False):
+        assert not full_output_cov
+        if full_cov:
+            raise NotImplementedError
+        # NOTE: the features are zero outside of [a, b], so predictions there revert to the prior
+        Xnew = np.asarray(Xnew)
+        post = self._posterior()
+
+        idx, vals = self._features(Xnew)
+        mean = np.sum(vals[:, :, None] * post["alpha"][idx], axis=1)
+
+        # var = k** - phi^T Kuu^{-1} phi + phi^T P^{-1} phi
+        # - with Kuu^{-1} the Kronecker product of each dimension's inverse, the first is a product over dimensions
+        qff = np.ones(len(Xnew))
+        for i, (a, b, m, p) in enumerate(zip(self.a, self.b, self.ms, self.degrees)):
+            v, j = bspline_features(Xnew[:, i], a, b, m, p)
+            jj = j[:, :, None], j[:, None, :]
+            Kuu_inv = post["Kuu_inv"][i][np.abs(jj[0] - jj[1]), np.minimum(*jj)]
+            qff *= np.einsum("ni,nij,nj->n", v, Kuu_inv, v)
+        var = np.prod([k.variance.numpy() for k in self.kernels]) - qff
+        # - the second only requires the band of P^{-1}
+        diff = idx[:, :, None] - idx[:, None, :]
+        P_inv = post["P_inv"][np.abs(diff), np.minimum(idx[:, :, None], idx[:, None, :])]
+        var += np.einsum("ni,nij,nj->n", vals, P_inv, vals)
+
+        var = np.tile(var[:, None], [1, self.Y.shape[1]])
+        return tf.convert_to_tensor(mean), tf.convert_to_tensor(var)
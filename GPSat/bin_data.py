@@ -17,7 +17,6 @@ from dataclasses import dataclass
 from typing import List, Dict, Tuple, Union, Type
 
 import matplotlib.pyplot as plt
-import cartopy.crs as ccrs
 
 from IPython.display import display
 from GPSat import get_data_path
@@ -769,6 +768,8 @@ def plot_wrapper(plt_df, val_col,
                  plt_where=None,
                  projection=None,
                  extent=None):
+    import cartopy.crs as ccrs
+
     # projection
     if projection is None:
         projection = ccrs.NorthPolarStereo()
@@ -64,6 +64,18 @@ class DataConfig:
         in the last expression. Passing this will select data that is within ±4 of the t-coordinate of the current expert location.
         That is, if ``t=5`` in the current expert location, this will select data for ``t=1,...,9`` in ``df``.
 
+        A radius selection (``'col'`` a list of columns) can adapt to each expert location, to select a target
+        number of observations, by adding ``'target_num_obs'`` (a ``[min, max]`` pair) and, optionally, bounds
+        on the radius ``'min_val'`` and ``'max_val'``, e.g.
+
+        .. code-block:: python
+
+            local_select = [{"col": ["x", "y"], "comp": "<", "val": 300_000,
+                             "target_num_obs": [500, 2000], "min_val": 100_000, "max_val": 600_000}]
+
+        The radius used for each expert is stored in the ``"local_radius"`` column of the ``run_details`` table.
+        See :func:`DataLoader.local_data_select <GPSat.dataloader.DataLoader.local_data_select>`.
+
         We note that if ``local_select`` is unspecified, it defaults to using the entire data for training.
 
     global_select: list of dict, optional
@@ -130,6 +142,22 @@ class DataConfig:
         If ``None``, it will automatically infer the engine from the file name of ``'data_source'``.
     read_kwargs: dict, optional
         Keyword arguments for reading in data from source.
+    thinning: dict, optional
+        If specified, the local data of each expert (selected by ``local_select``) is thinned to at most
+        ``thinning["max_obs"]`` observations before the model is constructed, bounding the per expert cost.
+        Keyword arguments for :func:`DataLoader.thin_data <GPSat.dataloader.DataLoader.thin_data>`, e.g.
+
+        .. code-block:: python
+
+            thinning = {"max_obs": 2000, "method": "stratified", "bin_size": {"x": 5000, "y": 5000, "t": 1}}
+
+        ``"method"`` is either ``"stratified"`` (sample evenly across spatial/temporal bins) or ``"super_obs"``
+        (average observations within bins). The number of observations before thinning is recorded in the
+        ``"num_obs_local"`` column of the ``run_details`` table, ``"num_obs"`` is the number used by the model,
+        along with the thinning method, ``max_obs`` and ``bin_size`` and the mean number of observations per
+        super-observation (``"num_averaged_mean"``, 1 for ``"stratified"``).
+        **NOTE:** the models' likelihood variance is not scaled by the number of observations averaged, so with
+        ``"super_obs"`` it is that of a super-observation, see the Warnings in ``thin_data``.
     """
     data_source: Union[str, pd.DataFrame, dict, None] = None
     table:  Union[str, None] = None
@@ -142,6 +170,7 @@ class DataConfig:
     col_funcs:  Union[List[str], dict, None] = None
     engine:  Union[str, None] = None
     read_kwargs: Union[dict, None] = None
+    thinning: Union[dict, None] = None
 
     file_suffix_engine_map = {
         "csv": "read_csv",
@@ -310,7 +339,9 @@ class ModelConfig:
                      'GPflowSVGPModel',
                      'sklearnGPRModel',
                      'GPflowVFFModel',
-                     'GPflowASVGPModel']
+                     'GPflowASVGPModel',
+                     'GPflowVecchiaModel',
+                     'GPflowKalmanModel']
     
     oi_model: Union[MODELS, dict, None] = None
     init_params: Union[dict, None] = None
@@ -406,6 +437,17 @@ class ExpertLocsConfig:
         Boolean to set verbosity. ``True`` for verbose, ``False`` otherwise.
     sort_by: str | list of str | None, default None.
         Column name to sort rows by. This is passed to ``pd.DataFrame.sort_values``.
+    quadtree: dict, optional
+        If specified, the data loaded from ``source`` is taken to be the observations and the expert locations
+        are generated from it, refining the expert spacing where there are many (or variable) observations.
+        The dict holds the keyword arguments passed to ``GPSat.dataloader.DataLoader.quadtree_expert_locations``,
+        e.g.
+
+        .. code-block:: python
+
+            quadtree = {"min_cell_size": 50_000, "max_cell_size": 400_000, "max_obs": 2000,
+                        "coords_col": ["x", "y"]}
+
     """
     source: Union[str, pd.DataFrame, dict, None] = None
     where: Union[dict, List[dict], None] = None
@@ -417,6 +459,7 @@ class ExpertLocsConfig:
     source_kwargs: Union[dict, None] = None
     verbose: bool = False
     sort_by: Union[str, List[str], None] = None
+    quadtree: Union[dict, None] = None
     # TODO: Remove the following inputs (kept as legacy)
     df: Union[pd.DataFrame, None] = None
     file: Union[str, None] = None
@@ -476,6 +519,30 @@ class PredictionLocsConfig:
     load_kwargs: dict, optional
         Used if ``method = "from_source"`` to specify keyword arguments to be passed to
         ``GPSat.dataloader.DataLoader.load`` in order to load prediction location data from source.
+    precompute_mapping: bool, default False
+        Used with ``method = "from_dataframe"`` or ``"from_source"`` and ``max_dist``.
+        If ``True``, the prediction locations within ``max_dist`` of every expert location are found once,
+        using a KD-tree, and stored as a sparse mapping, making selection per expert a lookup.
+    mapping_cache_dir: str or None, default None
+        Directory to cache the precomputed mapping in. The cache file is keyed by a hash of the
+        expert locations, prediction locations and ``max_dist``. If ``None`` the mapping is not cached to disk.
+    grid_index: bool, default True
+        Used with ``max_dist``. If ``True``, a uniform grid (bucket) index is built over the prediction locations
+        the first time they are used, and only locations in buckets intersecting an expert's
+        ``max_dist`` radius are checked, rather than all prediction locations.
+    grid_index_cell_size: int or float or None, default None
+        Size of the grid index buckets. If ``None``, ``max_dist`` is used.
+    shared_grid_file: str or None, default None
+        Path to a ``.npy`` file used to share the prediction locations between processes.
+        The first process to load the prediction locations writes them to this file, every process
+        then memory-maps it read-only, rather than each holding its own copy.
+        If the file already exists, and was written from the same source (``load_kwargs`` or ``df_file``,
+        otherwise the same ``df``), it is used instead of loading the prediction locations,
+        otherwise it is overwritten. The grid index (see ``grid_index``) is shared in the same way.
+    scale_max_dist: bool, default False
+        Used with ``max_dist`` and an adaptive training radius (a ``local_select`` entry with ``target_num_obs``,
+        see ``DataConfig``). If ``True``, ``max_dist`` is scaled, for each expert, by the ratio of its (adapted)
+        training radius to the ``local_select`` radius ``val``. ``precompute_mapping`` is then not used.
     """
     METHODS = Literal["expert_loc", "from_dataframe", "from_source"]
 
@@ -487,6 +554,12 @@ class PredictionLocsConfig:
     df_file: Union[str, None] = None
     max_dist: Union[int, float, None] = None
     load_kwargs: Union[dict, None] = None
+    precompute_mapping: bool = False
+    mapping_cache_dir: Union[str, None] = None
+    grid_index: bool = True
+    grid_index_cell_size: Union[int, float, None] = None
+    shared_grid_file: Union[str, None] = None
+    scale_max_dist: bool = False
     # For use in prediction_locations._shift_arrays (remove this functionality for simplicity?)
     X_out: Union[str, None] = None # To check.
 
@@ -536,6 +609,10 @@ class RunConfig:
         Minimum number observations required to run optimisation or make predictions.
     table_suffix: str, default ""
         Suffix to be applied to all table names when writing to file.
+    thread_policy: dict, optional
+        Keyword arguments for ``GPSat.runtime.set_thread_policy``, to limit the number of threads used by
+        TensorFlow, BLAS and numba, e.g. ``{"num_threads": 4}``.
+        If not specified, environment variables (e.g. ``GPSAT_NUM_THREADS``) are used, if set.
     """
     store_path: str
     store_every: int = 10
@@ -545,6 +622,7 @@ class RunConfig:
     predict: bool = True
     min_obs: int = 3
     table_suffix: str = ""
+    thread_policy: Union[dict, None] = None
 
 
 @dataclass_json
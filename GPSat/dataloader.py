@@ -12,10 +12,8 @@ import types
 import pandas as pd
 import numpy as np
 import xarray as xr
-import scipy.stats as scst
 
 from deprecated import deprecated
-from scipy.spatial import KDTree
 
 from functools import reduce
 from GPSat.utils import config_func, get_git_information, sparse_true_array, pandas_to_dict
@@ -2273,6 +2271,7 @@ class DataLoader:
         x_in, y_in, vals = df[x_col].values, df[y_col].values, df[val_col].values
 
         # apply binning
+        import scipy.stats as scst
         binned = scst.binned_statistic_2d(x_in, y_in, vals,
                                           statistic=bin_statistic,
                                           bins=[x_edge,
@@ -2344,6 +2343,7 @@ class DataLoader:
                 for c in col:
                     assert c in df
                 # creating a kdt tree can take (say) 90ms for 3.7k rows
+                from scipy.spatial import KDTree
                 kdt = KDTree(df.loc[:, col].values)
                 out += [kdt]
 
@@ -2351,7 +2351,7 @@ class DataLoader:
 
     @classmethod
     @timer
-    def local_data_select(cls, df, reference_location, local_select, kdtree=None, verbose=True):
+    def local_data_select(cls, df, reference_location, local_select, kdtree=None, verbose=True, return_vals=False):
         """
         Selects data from a DataFrame based on a given criteria and reference (expert) location.
 
@@ -2370,16 +2370,26 @@ class DataLoader:
             contain keys 'col', 'comp', and 'val'. 'col' is the column in 'df' to apply the comparison on, 'comp'
             is the comparison operator as a string (can be '>=', '>', '==', '<', '<='), and 'val' is the value to
             compare with.
+
+            For multi dimensional selections (radius) the radius can be adapted, for each reference location, to
+            select a target number of observations by including the keys: 'target_num_obs', a (min, max) pair, and
+            (optionally) 'min_val' and 'max_val', bounds on the radius. If fewer than min (more than max)
+            observations, that satisfy the other criteria, are within 'val' the radius is increased (decreased)
+            to the distance of the min-th (just less than the (max+1)-th) nearest, within the bounds.
         kdtree : KDTree or list of KDTree, optional
             Precomputed KDTree or list of KDTrees for optimization. Each KDTree in the list corresponds to an
             entry in local_select. If not provided, a new KDTree will be created.
         verbose : bool, default=True
             If True, print details for each selection criteria.
+        return_vals : bool, default=False
+            If True, also return the 'val' used for each entry of local_select, i.e. the (adapted) radius for
+            those with 'target_num_obs'.
 
         Returns
         -------
         pd.DataFrame
             A DataFrame containing only the data that meets all of the selection criteria.
+            If ``return_vals`` is True, a tuple of this and the list of values used.
 
         Raises
         ------
@@ -2402,8 +2412,16 @@ class DataLoader:
         # convert reference location to dict (if not already)
         reference_location = pandas_to_dict(reference_location)
 
+        # adaptive (radius) selections are applied last, so the target number of observations is of those
+        # satisfying all other criteria
+        vals = [ls['val'] for ls in local_select]
+        adaptive = ["target_num_obs" in ls for ls in local_select]
+        order = [i for i in range(len(local_select)) if not adaptive[i]] + \
+                [i for i in range(len(local_select)) if adaptive[i]]
+
         # increment over each of the selection criteria
-        for idx, ls in enumerate(local_select):
+        for idx in order:
+            ls = local_select[idx]
             col = ls['col']
             comp = ls['comp']
             if verbose:
@@ -2411,6 +2429,7 @@ class DataLoader:
 
             # single (str) entry for column
             if isinstance(col, str):
+                assert not adaptive[idx], f"target_num_obs only handled for multi dimensional col, got: {col}"
                 # TODO: here just use data_select method?
                 assert col in df, f"col: {col} is not in data - {df.columns}"
                 assert col in reference_location, f"col: {col} is not in reference_location - {reference_location.keys()}"
@@ -2425,6 +2444,14 @@ class DataLoader:
                 for c in col:
                     assert c in df, f"column: {c} is not in df.columns: {df.columns}"
                     assert c in reference_location, f"col: {col} is not in reference_location - {reference_location.keys()}"
+                from scipy.spatial import KDTree
+                ref = [reference_location[c] for c in col]
+
+                if adaptive[idx]:
+                    vals[idx] = cls._adaptive_radius(df.loc[select, col].values, ref, ls)
+                    if verbose:
+                        print(f"adapted radius: {vals[idx]}")
+
                 # creating a kdt tree can take (say) 90ms for 3.7k rows
                 # - using pre-calculated kd-tree can reduce run time (if being called often)
                 if kdtree is not None:
@@ -2436,16 +2463,129 @@ class DataLoader:
                 else:
                     kdt = KDTree(df.loc[:, col].values)
 
-                in_ids = kdt.query_ball_point(x=[reference_location[c] for c in col],
-                                              r=ls['val'])
+                in_ids = kdt.query_ball_point(x=ref, r=vals[idx])
                 # create a bool array of False, then populate locations with True
                 _ = np.zeros(len(df), dtype=bool)
                 _[in_ids] = True
                 select &= _
 
         # data to be used by a local model
+        if return_vals:
+            return df.loc[select, :], vals
         return df.loc[select, :]
 
+    @staticmethod
+    def _adaptive_radius(locs, ref, ls):
+        # radius, about ref, for local select entry ls (with 'target_num_obs'), containing at least min and at most
+        # max (if possible) of locs, within the bounds ('min_val', 'max_val'), or ls['val'] if it already does
+        # - locations within the radius are those with distance <= radius, as selected by query_ball_point
+        min_obs, max_obs = ls['target_num_obs']
+        assert min_obs <= max_obs, f"target_num_obs: {ls['target_num_obs']} must be (min, max)"
+        r = ls['val']
+        if len(locs) > 0:
+            d = np.sqrt(np.sum((locs - np.asarray(ref)) ** 2, axis=1))
+            within = np.sum(d <= r)
+            if within < min_obs:
+                # include the min_obs nearest
+                k = min(min_obs, len(locs))
+                r = np.partition(d, k - 1)[k - 1]
+            elif within > max_obs:
+                # exclude all but the max_obs nearest
+                r = np.nextafter(np.partition(d, max_obs)[max_obs], -np.inf)
+        return float(np.clip(r, ls.get('min_val', 0.), ls.get('max_val', np.inf)))
+
+    @staticmethod
+    def thin_data(df, max_obs, coords_col, obs_col=None, method="stratified", bin_size=None, seed=0):
+        """
+        Thin the data in a DataFrame to at most ``max_obs`` rows, to bound the cost of a local model.
+
+        The (coordinate) space is divided into bins and either:
+
+        - ``"stratified"``: observations are sampled (at random) from each bin in turn, so bins with few
+          observations keep them all, while dense bins (e.g. at track crossovers) are sampled down.
+        - ``"super_obs"``: observations in each bin are averaged into a single super-observation, with the bins
+          coarsened (bin size doubled) until there are at most ``max_obs``. The number of observations averaged
+          is given in the ``"num_averaged"`` column; its noise variance is the observation noise variance
+          divided by this number (see **Warnings**).
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            The data to thin, e.g. as selected by ``local_data_select``.
+        max_obs : int
+            Maximum number of rows (observations) to return.
+        coords_col : list of str
+            Coordinate columns used to bin the data.
+        obs_col : str or list of str, optional
+            Observation column(s), to be averaged for ``"super_obs"``, in which case it must be specified.
+        method : str, default "stratified"
+            Either ``"stratified"`` or ``"super_obs"``.
+        bin_size : float, list or dict, optional
+            Bin size in each coordinate (a dict should be keyed by ``coords_col``). If not specified the range of
+            each coordinate is divided into ``ceil(max_obs ** (1 / len(coords_col)))`` bins.
+        seed : int, default 0
+            Seed for the random sampling of ``"stratified"``.
+
+        Returns
+        -------
+        pd.DataFrame
+            ``df`` if it has at most ``max_obs`` rows, otherwise the thinned data: a subset of the rows
+            of ``df`` for ``"stratified"`` or, for ``"super_obs"``, the (mean) coordinates and observations
+            and the number of observations averaged, for each bin.
+
+        Warnings
+        --------
+        The local expert models have a single (homoscedastic) likelihood variance, they do not use the
+        ``"num_averaged"`` column. So, with ``"super_obs"``, the likelihood variance fitted (or set) is that of
+        a super-observation, roughly the observation noise variance divided by the typical number averaged,
+        rather than that of an individual observation - and ``y_var`` predictions are for a super-observation.
+        Bins with more observations are also given the same weight as those with fewer. To recover the
+        observation noise variance, multiply by the number averaged (e.g. ``"num_averaged_mean"`` in
+        ``run_details`` when used by ``LocalExpertOI``), or use ``"stratified"`` thinning.
+        """
+        assert method in ["stratified", "super_obs"], \
+            f"method: '{method}' not valid, must be one of: ['stratified', 'super_obs']"
+        assert max_obs >= 1, f"max_obs must be >= 1, got: {max_obs}"
+        if len(df) <= max_obs:
+            return df
+
+        coords_col = [coords_col] if isinstance(coords_col, str) else list(coords_col)
+        coords = df[coords_col].to_numpy(dtype=float)
+        lower = coords.min(axis=0)
+
+        if bin_size is None:
+            num_bins = np.ceil(max_obs ** (1 / len(coords_col)))
+            bin_size = (coords.max(axis=0) - lower) / num_bins
+        elif isinstance(bin_size, dict):
+            bin_size = [bin_size[c] for c in coords_col]
+        bin_size = np.broadcast_to(np.asarray(bin_size, dtype=float), [len(coords_col)]).copy()
+        # a coordinate with a single value has one bin
+        bin_size[bin_size <= 0] = 1.
+
+        def bin_ids(size):
+            # integer id of the bin each row belongs to
+            _, ids = np.unique(np.floor((coords - lower) / size).astype(np.int64), axis=0, return_inverse=True)
+            return ids.reshape(-1)
+
+        if method == "stratified":
+            # random order, then rank within each bin: take rank 0 from every bin, then rank 1, etc
+            rng = np.random.default_rng(seed)
+            order = rng.permutation(len(df))
+            ids = bin_ids(bin_size)[order]
+            rank = pd.Series(ids).groupby(ids).cumcount().to_numpy()
+            keep = order[np.argsort(rank, kind="stable")[:max_obs]]
+            return df.iloc[np.sort(keep)]
+
+        assert obs_col is not None, "obs_col must be specified for method: 'super_obs'"
+        obs_col = [obs_col] if isinstance(obs_col, str) else list(obs_col)
+        ids = bin_ids(bin_size)
+        while ids.max() + 1 > max_obs:
+            bin_size = bin_size * 2
+            ids = bin_ids(bin_size)
+        out = df[coords_col + obs_col].groupby(ids).mean()
+        out["num_averaged"] = np.bincount(ids)
+        return out.reset_index(drop=True)
+
     @staticmethod
     @timer
     def make_multiindex_df(idx_dict, **kwargs):
@@ -2712,6 +2852,142 @@ class DataLoader:
 
         return locs
 
+    @staticmethod
+    def quadtree_expert_locations(df,
+                                  min_cell_size,
+                                  coords_col=None,
+                                  obs_col=None,
+                                  max_experts=None,
+                                  max_cell_size=None,
+                                  max_obs=0,
+                                  min_obs=1,
+                                  bounds=None,
+                                  return_cell_info=False):
+        """
+        Generate local expert locations adapted to the observations, by quadtree refinement: experts are at the
+        centres of (square) cells, which are split into four, refining the expert spacing where there are many
+        observations or, if ``obs_col`` is given, where they are variable.
+
+        Starting from a single cell covering the observations (or ``bounds``), cells larger than ``max_cell_size``
+        are split. Then, in order of priority, the number of observations in a cell (times their standard
+        deviation, if ``obs_col`` is given), cells with more than ``max_obs`` observations are split, unless this
+        would make them smaller than ``min_cell_size`` or the number of experts greater than ``max_experts``.
+
+        Cells with fewer than ``min_obs`` observations do not have an expert, so none are placed over regions
+        without observations.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            Observations, with (at least) the ``coords_col`` columns.
+        min_cell_size : float
+            Minimum cell size, i.e. the smallest spacing between experts.
+        coords_col : list of str, optional
+            Coordinate columns, default ``["x", "y"]``. Cells are split in each of these dimensions, so
+            there are ``2 ** len(coords_col)`` children per cell.
+        obs_col : str, optional
+            Observation column. If given, the refinement priority is weighted by the standard deviation of the
+            observations in a cell.
+        max_experts : int, optional
+            Maximum number of expert locations. If not specified refinement continues until ``min_cell_size``
+            or ``max_obs`` are reached.
+        max_cell_size : float, optional
+            Maximum cell size, i.e. the largest spacing between experts, where there are observations.
+        max_obs : int, default 0
+            Only cells with more than this many observations are split.
+        min_obs : int, default 1
+            Minimum number of observations in a cell for it to have an expert.
+        bounds : list of (min, max), optional
+            Domain for each coordinate. If not specified the extent of the observations is used.
+            The root cell is a square (cube), with side the largest extent.
+        return_cell_info : bool, default False
+            If True, include the ``"cell_size"`` and number of observations (``"num_obs"``) of each expert's cell.
+
+        Returns
+        -------
+        pd.DataFrame
+            Expert locations, with columns ``coords_col``, sorted by these.
+        """
+        import heapq
+        import itertools
+
+        coords_col = ["x", "y"] if coords_col is None else list(coords_col)
+        X = df[coords_col].to_numpy(dtype=float)
+        obs = None if obs_col is None else df[obs_col].to_numpy(dtype=float)
+        D = len(coords_col)
+
+        if bounds is None:
+            bounds = np.stack([X.min(axis=0), X.max(axis=0)], axis=1)
+        bounds = np.asarray(bounds, dtype=float)
+        root_size = max(np.max(bounds[:, 1] - bounds[:, 0]), min_cell_size)
+        assert min_cell_size > 0, f"min_cell_size must be positive, got: {min_cell_size}"
+        assert (max_experts is None) or (max_experts >= 1), f"max_experts must be >= 1, got: {max_experts}"
+
+        # a cell is (lower corner, size, indices of the observations within it)
+        inside = np.all((X >= bounds[:, 0]) & (X <= bounds[:, 1]), axis=1)
+        root = (bounds[:, 0], root_size, np.nonzero(inside)[0])
+
+        # offsets of the children (in units of the half size)
+        offsets = np.array(list(np.ndindex(*[2] * D)), dtype=float)
+
+        def split(cell):
+            lower, size, idx = cell
+            half = size / 2
+            # child of each observation, observations on the upper boundary go to the upper child
+            child = np.minimum(np.floor((X[idx] - lower) / half), 1).astype(int) @ (2 ** np.arange(D)[::-1])
+            return [(lower + o * half, half, idx[child == k]) for k, o in enumerate(offsets)]
+
+        def priority(cell):
+            idx = cell[2]
+            p = float(len(idx))
+            if (obs is not None) and (len(idx) > 1):
+                p *= np.std(obs[idx])
+            return p
+
+        def num_experts(cells):
+            return sum(len(c[2]) >= min_obs for c in cells)
+
+        # split cells larger than the maximum size
+        leaves = [root]
+        if max_cell_size is not None:
+            while any((c[1] > max_cell_size) and (c[1] / 2 >= min_cell_size) for c in leaves):
+                leaves = [child for c in leaves
+                          for child in (split(c) if (c[1] > max_cell_size) and (c[1] / 2 >= min_cell_size) else [c])]
+            assert (max_experts is None) or (num_experts(leaves) <= max_experts), \
+                f"max_experts: {max_experts} is fewer than the number of cells of max_cell_size with observations"
+
+        # refine, highest priority first - the heap (of negative priority) holds the cells that may be split
+        # - ties are broken by a unique counter, first pushed first, so cells themselves are never compared
+        final, heap = [], []
+        tie = itertools.count()
+        count = num_experts(leaves)
+
+        def push(cell):
+            if (len(cell[2]) > max_obs) and (len(cell[2]) >= min_obs) and (cell[1] / 2 >= min_cell_size):
+                heapq.heappush(heap, (-priority(cell), next(tie), cell))
+            else:
+                final.append(cell)
+
+        for c in leaves:
+            push(c)
+        while len(heap):
+            _, _, cell = heapq.heappop(heap)
+            children = split(cell)
+            new_count = count - 1 + num_experts(children)
+            if (max_experts is not None) and (new_count > max_experts):
+                final.append(cell)
+                continue
+            count = new_count
+            for c in children:
+                push(c)
+
+        cells = [c for c in final if len(c[2]) >= min_obs]
+        out = pd.DataFrame(np.array([c[0] + c[1] / 2 for c in cells]).reshape(-1, D), columns=coords_col)
+        if return_cell_info:
+            out["cell_size"] = [c[1] for c in cells]
+            out["num_obs"] = [len(c[2]) for c in cells]
+        return out.sort_values(coords_col).reset_index(drop=True)
+
     @staticmethod
     def get_masks_for_expert_loc(ref_data, el_masks=None, obs_col=None):
         """
@@ -42,6 +42,42 @@ def timer(func):
     return caller
 
 
+def numba_lazy(decorator, *dec_args, **dec_kwargs):
+    """
+    Decorator to compile a function with ``numba`` the first time it is called, rather than when it is defined.
+
+    Using e.g. ``numba.guvectorize`` with explicit signatures compiles the function when the module is imported,
+    which (along with importing ``numba`` itself) slows down importing modules that only occasionally use them.
+
+    Parameters
+    ----------
+    decorator: str
+        Name of the ``numba`` decorator to apply, e.g. ``"jit"``, ``"njit"`` or ``"guvectorize"``.
+    *dec_args, **dec_kwargs
+        Arguments passed to the ``numba`` decorator. Signatures should be given as strings,
+        e.g. ``"void(float64[:], float64[:])"``, so ``numba`` does not need to be imported to specify them.
+
+    Examples
+    --------
+    >>> @numba_lazy("guvectorize", ["void(float64[:], float64[:])"], "()->()", nopython=True)
+    ... def _double(x, out):
+    ...     out[0] = 2 * x[0]
+
+    """
+    def wrapper(func):
+        compiled = None
+
+        @wraps(func)
+        def caller(*args, **kwargs):
+            nonlocal compiled
+            if compiled is None:
+                import numba
+                compiled = getattr(numba, decorator)(*dec_args, **dec_kwargs)(func)
+            return compiled(*args, **kwargs)
+        return caller
+    return wrapper
+
+
 if __name__ == '__main__':
 
     pass
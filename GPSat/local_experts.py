@@ -17,20 +17,11 @@ from abc import ABC, abstractmethod
 from typing import List, Dict, Tuple, Union, Type
 from dataclasses import dataclass
 
-try:
-    import cartopy.crs as ccrs
-except ModuleNotFoundError as e:
-    print(f"error importing ccrs from cartopy: {e}\ninstall with: conda install -c conda-forge cartopy=0.20.2")
-    ccrs = None
-
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_pdf import PdfPages
-from GPSat.plot_utils import plot_pcolormesh, plot_hist
-
 from GPSat.decorators import timer
 from GPSat.dataloader import DataLoader
 from GPSat.models import get_model
 from GPSat.prediction_locations import PredictionLocations
+from GPSat.runtime import set_thread_policy, ensure_thread_policy
 from GPSat.utils import json_serializable, check_prev_oi_config, get_previous_oi_config, config_func, \
     dict_of_array_to_dict_of_dataframe, pandas_to_dict, cprint, nested_dict_literal_eval, pretty_print_class
 from GPSat.config_dataclasses import (DataConfig, 
@@ -56,6 +47,7 @@ class LocalExpertData:
     data_source: Union[str, None] = None
     engine: Union[str, None] = None
     read_kwargs: Union[dict, None] = None
+    thinning: Union[dict, None] = None
 
     file_suffix_engine_map = {
         "csv": "read_csv",
@@ -189,6 +181,9 @@ class LocalExpertOI:
         # config will be used to store the parameters used to set: locations, data, model
         self.config = {}
 
+        # limit threads used by TensorFlow, BLAS, numba - if specified by environment variables
+        ensure_thread_policy()
+
         # ------
         # Local Expert Locations
         # ------
@@ -360,6 +355,7 @@ class LocalExpertOI:
                              reset_index=False,
                              source_kwargs=None,
                              verbose=False,
+                             quadtree=None,
                              **kwargs):
 
         # TODO: remove some of the inputs here, just use kwargs, which will be passed to DataLoader.load
@@ -419,6 +415,15 @@ class LocalExpertOI:
                 print(f"sorting values by: {sort_by}")
             locs.sort_values(sort_by, inplace=True)
 
+        # adapt the expert locations to the data: source is taken to be the observations, which are
+        # refined with a quadtree, see DataLoader.quadtree_expert_locations
+        if quadtree is not None:
+            if verbose:
+                print(f"generating expert locations from {len(locs)} observations with a quadtree")
+            locs = DataLoader.quadtree_expert_locations(locs, **quadtree)
+            if sort_by:
+                locs.sort_values(sort_by, inplace=True)
+
         self.expert_locs = locs
 
 
@@ -534,7 +539,8 @@ class LocalExpertOI:
                     # HARDCODED: min_itemsize for specific columns, to allow for adding of strings of longer
                     #  - length than previous ones.
                     # TODO: review the size used here, will it have a high storage cost?
-                    min_itemsize = {c: 64 for c in df_tmp.columns if c in ["model", "device"]}
+                    min_itemsize = {c: 64 for c in df_tmp.columns
+                                    if c in ["model", "device", "thinning_method", "thinning_bin_size"]}
                     with pd.HDFStore(store_path, mode='a') as store:
                         # tmp = store.get(f"{k}{table_suffix}")
                         # TODO: here, why not using data_columns=True? - will this cause issue searching later
@@ -757,6 +763,279 @@ class LocalExpertOI:
         # identify if saving to same parameter table(s) if: file_match, suffix_match and there are no additional kwargs
         return file_match & suffix_match & (len(additional_kwargs) == 0)
 
+    def _select_local_data(self, rl, df, prev_where):
+        # select the local data for expert location rl, (re)loading the global data from source if need be
+        # - returns the local data, along with the global data and where condition used to load it (for re-use)
+        #   the details of the selection, for 'run_details': the radius used by an adaptive selection
+        #   and the ratio of the adapted radius to the nominal one (None if not adaptive), which the caller
+        #   can pass on to the prediction locations, see PredictionLocations.scale_max_dist
+        df, prev_where = self._update_global_data(df=df,
+                                                  global_select=self.data.global_select,
+                                                  local_select=self.data.local_select,
+                                                  ref_loc=rl,
+                                                  prev_where=prev_where)
+        df_local, vals = DataLoader.local_data_select(df,
+                                                      reference_location=rl,
+                                                      local_select=self.data.local_select,
+                                                      verbose=False,
+                                                      return_vals=True)
+        radius = [(v, ls['val']) for ls, v in zip(self.data.local_select, vals) if "target_num_obs" in ls]
+        assert len(radius) <= 1, "only one local_select entry can have target_num_obs"
+        if len(radius) == 0:
+            return df_local, df, prev_where, {}, None
+
+        return df_local, df, prev_where, {"local_radius": radius[0][0]}, radius[0][0] / radius[0][1]
+
+    def _thin_local_data(self, df_local):
+        # thin the local data to bound the cost of the expert model, if thinning is specified
+        # - returns the (thinned) local data and the details of the thinning applied, for 'run_details'
+        if self.data.thinning is None:
+            return df_local, {}
+        num_obs_local = len(df_local)
+        df_local = DataLoader.thin_data(df_local,
+                                        coords_col=self.data.coords_col,
+                                        obs_col=self.data.obs_col,
+                                        **self.data.thinning)
+        # mean number of observations per (super) observation, see Warnings in DataLoader.thin_data
+        num_averaged_mean = df_local["num_averaged"].mean() if "num_averaged" in df_local else 1.0
+        return df_local, {"num_obs_local": num_obs_local,
+                          "thinning_method": self.data.thinning.get("method", "stratified"),
+                          "thinning_max_obs": self.data.thinning["max_obs"],
+                          "thinning_bin_size": str(self.data.thinning.get("bin_size", None))[:64],
+                          "num_averaged_mean": float(num_averaged_mean) if len(df_local) else np.nan}
+
+    def _expert_model_settings(self, num_obs):
+        # the model (class), init params, constraints, optimise and predict kwargs to use for an expert
+        # - the replacement model is used if the number of observations is lower than replacement_threshold
+        if hasattr(self, "replacement_threshold") and (num_obs < self.replacement_threshold):
+            print("Setting model to replacement GPR...")
+            return (self.replacement_model, self.replacement_init_params, self.replacement_constraints,
+                    self.replacement_optim_kwargs, self.replacement_pred_kwargs)
+        return self.model, self.model_init_params, self.constraints, self.optim_kwargs, self.pred_kwargs
+
+    def _init_expert_model(self, rl, df_local, _model, init_params):
+        # initialise a model with the local data of expert location rl
+        # TODO: needed to review the unpacking of model_params, when won't it work?
+        return _model(data=df_local,
+                      obs_col=self.data.obs_col,
+                      coords_col=self.data.coords_col,
+                      # ideally prefer not to have a specific model's key word argument explicitly given like this
+                      # should be handled in init_params.
+                      expert_loc=rl[self.data.coords_col].to_numpy().squeeze(),  # Needed for VFF / ASVGP
+                      **init_params)
+
+    def _apply_constraints(self, model, constraints):
+        # TODO: generalise this to apply any constraints - use apply_param_transform (may require more checks)
+        #  - may need information from config, i.e. obj = model.kernel, specify the bijector, other parameters
+        if constraints is None:
+            return
+        if not isinstance(constraints, dict):
+            warnings.warn(f"constraints: {constraints} are not currently handled!")
+            return
+        # Apply coordinate scaling to lengthscale hyperparameters if applicable
+        # - on a copy, so the constraints (config) are not modified
+        constraints = {k: dict(v) for k, v in constraints.items()}
+        if (self.model_init_params.get('coords_scale', None) is not None) and ("lengthscales" in constraints):
+            constraints["lengthscales"]["scale"] = True
+        model.set_parameter_constraints(constraints, move_within_tol=True, tol=1e-2)
+
+    def _store_expert_results(self, model, ref_loc, num_obs, prediction_coords, opt_success, t0, _model,
+                              pred_kwargs, save_params, optimise, predict, config_id,
+                              store_path, store_every, table_suffix, store_dict, prev_params,
+                              pred=None, run_time=None, data_details=None):
+        # make predictions (if not provided) with an (optimised) model for a single expert location,
+        # add the results (predictions, parameters and run details) to store_dict - writing to store_path if needed
+
+        # get the final / current objective function value
+        final_objective = model.get_objective_function_value()
+        # get the hyper parameters - for storing
+        # quick bug fix: params_to_store can be None, however *None does not work
+        pts = [] if self.params_to_store is None else self.params_to_store
+        hypes = model.get_parameters(*pts)
+
+        # print (truncated) parameters
+        cprint("parameters:", c="OKCYAN")
+        for k, v in hypes.items():
+            if isinstance(v, np.ndarray):
+                print(f"{k}: {repr(v[:5])} {'(truncated) ' if len(v) > 5 else ''}")
+            else:
+                print(f"{k}: {v}")
+
+        # if not saving parameters set hypes to empty dict
+        if not save_params:
+            hypes = {}
+
+        # --
+        # make prediction
+        # --
+
+        if predict & (len(prediction_coords) > 0):
+
+            if pred is None:
+                pred = model.predict(coords=prediction_coords, **pred_kwargs)
+
+            # add prediction coordinate location
+            for ci, c in enumerate(self.data.coords_col):
+                # TODO: review if want to force coordinates to be float
+                pred[f'pred_loc_{c}'] = prediction_coords[:, ci]
+        else:
+            if len(prediction_coords) == 0:
+                print("*** no predictions are being made because prediction_coords has len 0")
+            elif predict is False:
+                print("*** no predictions made")
+            pred = {}
+
+        # ----
+        # store results in tables (keys) in hdf file
+        # ----
+
+        if run_time is None:
+            run_time = time.time() - t0
+
+        # get the device name from the model
+        device_name = model.cpu_name if model.gpu_name is None else model.gpu_name
+        # any additional (model specific) run details - stored in their own table, so every row of
+        # 'run_details' has the same columns (including experts that were skipped)
+        model_run_details = model.get_run_details()
+
+        # delete model to try to handle Out of Memory issue?
+        del model
+        gc.collect()
+
+        # run details / info - for reference
+        run_details = {
+            "num_obs": num_obs,
+            **(data_details or {}),
+            "run_time": run_time,
+            "objective_value": final_objective,
+            "parameters_optimised": optimise,
+            "optimise_success": opt_success,
+            "model": pretty_print_class(_model)[:64],  # _model.__class__.__name__,
+            "device": device_name[:64],
+            "config_id": config_id
+        }
+
+        # TODO: refactor this - only needed if loading/initialising with previous parameters
+        # if optimisation was successful then store previous parameters
+        if run_details['optimise_success']:
+            # if any([np.any(np.isnan(v)) for v in hypes.values()]):
+            #     print("found nan in hyper parameters - after optimise_success = True, not updating previous params")
+            # else:
+            for k, v in hypes.items():
+                if np.any(np.isnan(v)):
+                    print(f"{k} had nans, not updating")
+                else:
+                    rho = 0.95
+                    try:
+                        prev_params[k] = rho * prev_params[k] + (1 - rho) * hypes[k]
+                    except ValueError as e:
+                        # if not loading previous parameters can just ignore any isus
+                        if self.model_load_params is not None:
+                            if self.model_load_params.get("previous", False):
+                                # ValueError could arise if parameters shape changes, namely for inducing points
+                                cprint(f"in updating prev_params for: {k}", c="WARNING")
+                                cprint(e, c="WARNING")
+
+        # ---
+        # convert dict of arrays to tables for saving
+        # ---
+
+        # TODO: determine if multi index should only have coord_cols - or include extras
+        # TODO: could just take rl = rl[self.data.coords_col] at the top of for loop, if other coordinates aren't used
+        #  - in which case probably would want to write 'other coordinates' e.g. date, lon, lat to a separate table
+        pred = self.dict_of_array_to_table(pred,
+                                           ref_loc=ref_loc[self.data.coords_col],
+                                           concat=True,
+                                           table='preds')
+
+        run_details = self.dict_of_array_to_table(run_details,
+                                                  ref_loc=ref_loc[self.data.coords_col],
+                                                  concat=True,
+                                                  table="run_details")
+        if len(model_run_details):
+            model_run_details = self.dict_of_array_to_table(model_run_details,
+                                                            ref_loc=ref_loc[self.data.coords_col],
+                                                            concat=True,
+                                                            table="model_run_details")
+        hypes = self.dict_of_array_to_table(hypes,
+                                            ref_loc=ref_loc[self.data.coords_col],
+                                            concat=False)
+
+        save_dict = {
+            **run_details,
+            **model_run_details,
+            **pred,
+            **hypes,
+            # include a coordinates table - which can have additional coordinate information
+            # "coordinates": prediction_coords.set_index(self.data.coords_col)
+        }
+
+        # ---
+        # 'store' results
+        # ---
+
+        # change index to multi index (using ref_loc)
+        # - add to table in store_dict or append to table in store_path if above store_every
+        store_dict = self._append_to_store_dict_or_write_to_table(save_dict=save_dict,
+                                                                  store_dict=store_dict,
+                                                                  store_path=store_path,
+                                                                  store_every=store_every,
+                                                                  table_suffix=table_suffix)
+
+        return store_dict
+
+    def _run_expert_batch(self, pending, optimise, predict, store_dict, prev_params, **store_kwargs):
+        # optimise and make predictions for a batch of experts together, with a model that supports it
+        # (has batch_experts = True), e.g. GPyTorchBatchGPRModel. pending is a list of dict, one per expert,
+        # created in run. the results for each expert are stored as in the single expert case
+
+        n = len(pending)
+        cprint(f"running batch of {n} experts", c="OKCYAN")
+        t0 = time.time()
+
+        _model = pending[0]["_model"]
+        models = [p["model"] for p in pending]
+
+        if optimise:
+            opt_success = _model.optimise_parameters_batch(models, **pending[0]["optim_kwargs"])
+        else:
+            cprint("*** not optimising parameters", c="WARNING")
+            opt_success = [False] * n
+
+        pred_kwargs = pending[0]["pred_kwargs"]
+        if predict:
+            preds = _model.predict_batch(models, [p["prediction_coords"] for p in pending], **pred_kwargs)
+        else:
+            preds = [None] * n
+
+        # share the batch run time equally between experts
+        batch_time = (time.time() - t0) / n
+
+        for p, success, pred in zip(pending, opt_success, preds):
+            store_dict = self._store_expert_results(model=p["model"],
+                                                    ref_loc=p["ref_loc"],
+                                                    num_obs=p["num_obs"],
+                                                    prediction_coords=p["prediction_coords"],
+                                                    opt_success=success,
+                                                    t0=t0,
+                                                    _model=p["_model"],
+                                                    pred_kwargs=pred_kwargs,
+                                                    save_params=p["save_params"],
+                                                    optimise=optimise,
+                                                    predict=predict,
+                                                    store_dict=store_dict,
+                                                    prev_params=prev_params,
+                                                    pred=pred,
+                                                    run_time=p["prep_time"] + batch_time,
+                                                    data_details=p["data_details"],
+                                                    **store_kwargs)
+        pending.clear()
+        gc.collect()
+
+        cprint(f"batch run time : {time.time() - t0:.2f} seconds", c="OKGREEN")
+
+        return store_dict
+
     # @timer
     def run(self,
             store_path=None,
@@ -766,7 +1045,8 @@ class LocalExpertOI:
             optimise=True,
             predict=True,
             min_obs=3,
-            table_suffix=""):
+            table_suffix="",
+            thread_policy=None):
         """
         Run a full sweep to perform local optimal interpolation at every expert location.
         The results will be stored in an HDF5 file containing (1) the predictions at each location,
@@ -795,6 +1075,13 @@ class LocalExpertOI:
             Minimum number observations required to run optimisation or make predictions.
         table_suffix: str, optional
             Suffix to be appended to all table names when writing to file.
+        thread_policy: dict, optional
+            Keyword arguments for :func:`GPSat.runtime.set_thread_policy`, to limit the number of threads used by
+            TensorFlow, BLAS and numba in this process, e.g. ``{"num_threads": 4}``.
+            If not specified the policy from environment variables (e.g. ``GPSAT_NUM_THREADS``) is used, if any.
+            The effective settings, which depend on the machine, are stored in the ``thread_settings`` table
+            (one row per call to ``run``), rather than in ``oi_config``, so restarting on a machine with a
+            different number of cores uses the same ``config_id``.
 
         Returns
         -------
@@ -821,6 +1108,16 @@ class LocalExpertOI:
 
         _t0 = time.perf_counter()
 
+        # ---
+        # thread policy
+        # ---
+
+        # limit threads used by TensorFlow, BLAS, numba - the effective settings are stored after the config
+        if thread_policy is not None:
+            thread_settings = set_thread_policy(**thread_policy)
+        else:
+            thread_settings = ensure_thread_policy()
+
         # ---
         # checks on attributes and inputs
         # ---
@@ -883,6 +1180,15 @@ class LocalExpertOI:
                                  oi_config=self.config,
                                  skip_valid_checks_on=skip_valid_checks_on)
 
+        # record the (machine specific) thread settings used for this run
+        with pd.HDFStore(store_path, mode="a") as store:
+            store.append(f"thread_settings{table_suffix}",
+                         pd.DataFrame({"config_id": config_id,
+                                       "datetime": time.strftime("%Y-%m-%d %H:%M:%S"),
+                                       **thread_settings}, index=[0]),
+                         index=False,
+                         min_itemsize={"datetime": 19})
+
         # -------
         # store (new) locations, remove those already found
         # -------
@@ -911,6 +1217,12 @@ class LocalExpertOI:
                                                           # row_select={"col": "config_id", "comp": "==", "val": config_id}
                                                           )
 
+        # provide all expert locations to prediction locations
+        # - so the expert to prediction location mapping can be computed once, rather than per expert
+        # - using all (rather than remaining) locations, so a cached mapping can be reused on restart
+        if self.pred_loc.precompute_mapping:
+            self.pred_loc.set_mapping_expert_locs(self.expert_locs)
+
         # TODO: want to store prediction locations in a table? unique values only
         #  - chould be useful to have different types of predictions together, with a column inidicating type
         #  - e.g. pred_type: xval, pan_arctic, whatever.
@@ -925,6 +1237,15 @@ class LocalExpertOI:
         store_dict = {}
         prev_params = {}
         count = 0
+        # experts waiting to be run together, for batch models (see _run_expert_batch)
+        pending = []
+        # arguments for storing the results of each expert
+        store_kwargs = {"optimise": optimise,
+                        "predict": predict,
+                        "config_id": config_id,
+                        "store_path": store_path,
+                        "store_every": store_every,
+                        "table_suffix": table_suffix}
         df, prev_where = None, None
         # for idx, rl in xprt_locs.iterrows():
         for idx in range(len(xprt_locs)):
@@ -954,6 +1275,13 @@ class LocalExpertOI:
             # prediction locations are static (once loaded)
             # - it's quick to check if expert location is close, then skip if not
 
+            # prediction locations can depend on the (adaptive) training radius, in which case select the local
+            # data first - otherwise after, so experts without prediction locations are skipped quickly
+            if self.pred_loc.scale_max_dist:
+                df_local, df, prev_where, select_details, radius_scale = \
+                    self._select_local_data(rl, df=df, prev_where=prev_where)
+                self.pred_loc.radius_scale = radius_scale
+
             # update the expert location for the PredictionLocation attribute
             self.pred_loc.expert_loc = rl
             # generate the expert locations
@@ -968,35 +1296,37 @@ class LocalExpertOI:
             # (update) global data - from data_source (if need be)
             # ----------------------------
 
-            df, prev_where = self._update_global_data(df=df,
-                                                      global_select=self.data.global_select,
-                                                      local_select=self.data.local_select,
-                                                      ref_loc=rl,
-                                                      prev_where=prev_where)
-
             # ----------------------------
             # select local data - relative to expert's location - from global data
             # ----------------------------
 
-            df_local = DataLoader.local_data_select(df,
-                                                    reference_location=rl,
-                                                    local_select=self.data.local_select,
-                                                    verbose=False)
+            if not self.pred_loc.scale_max_dist:
+                df_local, df, prev_where, select_details, radius_scale = \
+                    self._select_local_data(rl, df=df, prev_where=prev_where)
+                self.pred_loc.radius_scale = radius_scale
             cprint(f"number obs: {len(df_local)}", c="OKCYAN")
 
+            # (optionally) thin the local data, to at most a maximum number of observations
+            df_local, thin_details = self._thin_local_data(df_local)
+            if len(thin_details):
+                cprint(f"number obs after thinning: {len(df_local)}", c="OKCYAN")
+            # details of the local data selection, for 'run_details'
+            data_details = {**select_details, **thin_details}
+
             # if there are too few observations store to 'run_details' (so can skip later) and continue
             if len(df_local) < min_obs:
                 # for too few run obs record their entry, meaning they will skipped over if process is restarted
                 # TODO: determine if this is the desired functionality
                 run_details = {
                     "num_obs": len(df_local),
+                    **data_details,
                     "run_time": np.nan,
                     "objective_value": np.nan,
                     "parameters_optimised": optimise,
                     "optimise_success": False,
                     "model": pretty_print_class(self.model)[:64],  # _model.__class__.__name__,
                     "device": "",
-                    "config_id": config_id,
+                    "config_id": config_id
                 }
                 save_dict = self.dict_of_array_to_table(run_details,
                                                         ref_loc=rl[self.data.coords_col],
@@ -1017,36 +1347,8 @@ class LocalExpertOI:
             # -----
 
             # initialise model
-            # TODO: needed to review the unpacking of model_params, when won't it work?
-            if hasattr(self, "replacement_threshold"):
-                # Use replacement GPR model if the number of data points is lower than [replacement_threshold]
-                if len(df_local) < self.replacement_threshold:
-                    print("Setting model to replacement GPR...")
-                    _model = self.replacement_model
-                    _init_params = self.replacement_init_params
-                    _constraints = self.replacement_constraints
-                    _optim_kwargs = self.replacement_optim_kwargs
-                    _pred_kwargs = self.replacement_pred_kwargs
-                else:
-                    _model = self.model
-                    _init_params = self.model_init_params
-                    _constraints = self.constraints
-                    _optim_kwargs = self.optim_kwargs
-                    _pred_kwargs = self.pred_kwargs
-            else:
-                _model = self.model
-                _init_params = self.model_init_params
-                _constraints = self.constraints
-                _optim_kwargs = self.optim_kwargs
-                _pred_kwargs = self.pred_kwargs
-
-            model = _model(data=df_local,
-                           obs_col=self.data.obs_col,
-                           coords_col=self.data.coords_col,
-                           # ideally prefer not to have a specific model's key word argument explicitly given like this
-                           # should be handled in _init_params.
-                           expert_loc=rl[self.data.coords_col].to_numpy().squeeze(),  # Needed for VFF / ASVGP
-                           **_init_params)
+            _model, _init_params, _constraints, _optim_kwargs, _pred_kwargs = self._expert_model_settings(len(df_local))
+            model = self._init_expert_model(rl, df_local, _model=_model, init_params=_init_params)
 
             # *****************
             # here should simply use: set_parameters -  refactor this section
@@ -1104,20 +1406,30 @@ class LocalExpertOI:
             # apply constraints
             # --
 
-            # TODO: generalise this to apply any constraints - use apply_param_transform (may require more checks)
-            #  - may need information from config, i.e. obj = model.kernel, specify the bijector, other parameters
-
-            if _constraints is not None:
-                if isinstance(_constraints, dict):
-                    # Apply coordinate scaling to lengthscale hyperparameters if applicable
-                    if self.model_init_params.get('coords_scale', None) is not None:
-                        _constraints["lengthscales"]["scale"] = True
-                    model.set_parameter_constraints(_constraints, move_within_tol=True, tol=1e-2)
-                else:
-                    warnings.warn(f"constraints: {_constraints} are not currently handled!")
+            self._apply_constraints(model, _constraints)
 
             # **********************************
 
+            # batch models: collect experts, to be optimised and make predictions together
+            if getattr(_model, "batch_experts", False):
+                pending.append({"model": model,
+                                "ref_loc": rl,
+                                "num_obs": len(df_local),
+                                "data_details": data_details,
+                                "prediction_coords": prediction_coords,
+                                "save_params": save_params,
+                                "prep_time": time.time() - t0,
+                                "_model": _model,
+                                "optim_kwargs": _optim_kwargs,
+                                "pred_kwargs": _pred_kwargs})
+                if len(pending) >= model.expert_batch_size:
+                    store_dict = self._run_expert_batch(pending,
+                                                        **store_kwargs,
+                                                        store_dict=store_dict,
+                                                        prev_params=prev_params)
+                    pending = []
+                continue
+
             # --
             # optimise parameters
             # --
@@ -1131,134 +1443,36 @@ class LocalExpertOI:
                 # if not optimising set opt_success to False
                 opt_success = False
 
-            # get the final / current objective function value
-            final_objective = model.get_objective_function_value()
-            # get the hyper parameters - for storing
-            # quick bug fix: params_to_store can be None, however *None does not work
-            pts = [] if self.params_to_store is None else self.params_to_store
-            hypes = model.get_parameters(*pts)
-
-            # print (truncated) parameters
-            cprint("parameters:", c="OKCYAN")
-            for k, v in hypes.items():
-                if isinstance(v, np.ndarray):
-                    print(f"{k}: {repr(v[:5])} {'(truncated) ' if len(v) > 5 else ''}")
-                else:
-                    print(f"{k}: {v}")
-
-            # if not saving parameters set hypes to empty dict
-            if not save_params:
-                hypes = {}
-
             # --
-            # make prediction
+            # make prediction, store results
             # --
 
-            if predict & (len(prediction_coords) > 0):
-
-                pred = model.predict(coords=prediction_coords,  **_pred_kwargs)
-
-                # add prediction coordinate location
-                for ci, c in enumerate(self.data.coords_col):
-                    # TODO: review if want to force coordinates to be float
-                    pred[f'pred_loc_{c}'] = prediction_coords[:, ci]
-            else:
-                if len(prediction_coords) == 0:
-                    print("*** no predictions are being made because prediction_coords has len 0")
-                elif predict is False:
-                    print("*** no predictions made")
-                pred = {}
-
-            # ----
-            # store results in tables (keys) in hdf file
-            # ----
-
-            t1 = time.time()
-            run_time = t1 - t0
-
-            # get the device name from the model
-            device_name = model.cpu_name if model.gpu_name is None else model.gpu_name
-
-            # delete model to try to handle Out of Memory issue?
+            store_dict = self._store_expert_results(model=model,
+                                                    ref_loc=rl,
+                                                    num_obs=len(df_local),
+                                                    prediction_coords=prediction_coords,
+                                                    opt_success=opt_success,
+                                                    t0=t0,
+                                                    _model=_model,
+                                                    pred_kwargs=_pred_kwargs,
+                                                    save_params=save_params,
+                                                    data_details=data_details,
+                                                    **store_kwargs,
+                                                    store_dict=store_dict,
+                                                    prev_params=prev_params)
             del model
             gc.collect()
 
-            # run details / info - for reference
-            run_details = {
-                "num_obs": len(df_local),
-                "run_time": run_time,
-                "objective_value": final_objective,
-                "parameters_optimised": optimise,
-                "optimise_success": opt_success,
-                "model": pretty_print_class(_model)[:64],  # _model.__class__.__name__,
-                "device": device_name[:64],
-                "config_id": config_id,
-            }
-
-            # TODO: refactor this - only needed if loading/initialising with previous parameters
-            # if optimisation was successful then store previous parameters
-            if run_details['optimise_success']:
-                # if any([np.any(np.isnan(v)) for v in hypes.values()]):
-                #     print("found nan in hyper parameters - after optimise_success = True, not updating previous params")
-                # else:
-                for k, v in hypes.items():
-                    if np.any(np.isnan(v)):
-                        print(f"{k} had nans, not updating")
-                    else:
-                        rho = 0.95
-                        try:
-                            prev_params[k] = rho * prev_params[k] + (1 - rho) * hypes[k]
-                        except ValueError as e:
-                            # if not loading previous parameters can just ignore any isus
-                            if self.model_load_params is not None:
-                                if self.model_load_params.get("previous", False):
-                                    # ValueError could arise if parameters shape changes, namely for inducing points
-                                    cprint(f"in updating prev_params for: {k}", c="WARNING")
-                                    cprint(e, c="WARNING")
-
-            # ---
-            # convert dict of arrays to tables for saving
-            # ---
-
-            # TODO: determine if multi index should only have coord_cols - or include extras
-            # TODO: could just take rl = rl[self.data.coords_col] at the top of for loop, if other coordinates aren't used
-            #  - in which case probably would want to write 'other coordinates' e.g. date, lon, lat to a separate table
-            pred = self.dict_of_array_to_table(pred,
-                                               ref_loc=rl[self.data.coords_col],
-                                               concat=True,
-                                               table='preds')
-
-            run_details = self.dict_of_array_to_table(run_details,
-                                                      ref_loc=rl[self.data.coords_col],
-                                                      concat=True,
-                                                      table="run_details")
-            hypes = self.dict_of_array_to_table(hypes,
-                                                ref_loc=rl[self.data.coords_col],
-                                                concat=False)
-
-            save_dict = {
-                **run_details,
-                **pred,
-                **hypes,
-                # include a coordinates table - which can have additional coordinate information
-                # "coordinates": prediction_coords.set_index(self.data.coords_col)
-            }
-
-            # ---
-            # 'store' results
-            # ---
-
-            # change index to multi index (using ref_loc)
-            # - add to table in store_dict or append to table in store_path if above store_every
-            store_dict = self._append_to_store_dict_or_write_to_table(save_dict=save_dict,
-                                                                      store_dict=store_dict,
-                                                                      store_path=store_path,
-                                                                      store_every=store_every,
-                                                                      table_suffix=table_suffix)
-
             t2 = time.time()
             cprint(f"total run time : {t2 - t0:.2f} seconds", c="OKGREEN")
 
+        # run any remaining experts for batch models
+        if len(pending):
+            store_dict = self._run_expert_batch(pending,
+                                                **store_kwargs,
+                                                store_dict=store_dict,
+                                                prev_params=prev_params)
+
         # ---
         # store any remaining data
         # ---
@@ -1277,7 +1491,84 @@ class LocalExpertOI:
 
         # explicitly return None
         return None
-        
+
+    def compare_precision(self,
+                          precision="mixed",
+                          num_experts=5,
+                          optimise=True,
+                          min_obs=3,
+                          seed=None):
+        """
+        Compare the results of a model run in reduced ``precision`` against float64, for a random sample of
+        expert locations. The model must accept a ``precision`` keyword argument,
+        e.g. :class:`GPflowGPRModel <GPSat.models.gpflow_models.GPflowGPRModel>`.
+
+        For each sampled expert location the model is initialised, constrained, (optionally) optimised and
+        used to predict, as in :meth:`run`, once with ``precision="float64"`` and once with ``precision``.
+        Nothing is written to file.
+
+        Parameters
+        ----------
+        precision: str, default "mixed"
+            Precision to compare against "float64", e.g. "mixed" or "float32".
+        num_experts: int, default 5
+            Number of expert locations to sample (without replacement).
+        optimise: bool, default True
+            If ``True``, parameters are optimised for each model before comparing.
+        min_obs: int, default 3
+            Minimum number of observations required, expert locations with fewer are skipped.
+        seed: int, optional
+            Seed for sampling the expert locations.
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per expert location, containing the coordinates, number of observations and
+            maximum absolute deviation (from float64) of the objective function value, each parameter
+            and each prediction output, in columns prefixed with ``max_abs_diff_``.
+
+        """
+        rng = np.random.default_rng(seed)
+        idx = rng.choice(len(self.expert_locs), size=min(num_experts, len(self.expert_locs)), replace=False)
+
+        rows = []
+        df, prev_where = None, None
+        for i in np.sort(idx):
+            rl = self.expert_locs.iloc[[i], :]
+
+            # local data first, prediction locations can depend on the (adaptive) training radius
+            df_local, df, prev_where, _, radius_scale = self._select_local_data(rl, df=df, prev_where=prev_where)
+            df_local, _ = self._thin_local_data(df_local)
+
+            self.pred_loc.radius_scale = radius_scale
+            self.pred_loc.expert_loc = rl
+            prediction_coords = self.pred_loc()
+            if len(df_local) < min_obs:
+                continue
+
+            _model, _init_params, _constraints, _optim_kwargs, _pred_kwargs = self._expert_model_settings(len(df_local))
+            res = {}
+            for prec in ["float64", precision]:
+                model = self._init_expert_model(rl, df_local, _model=_model,
+                                                init_params={**_init_params, "precision": prec})
+                self._apply_constraints(model, _constraints)
+
+                if optimise:
+                    model.optimise_parameters(**_optim_kwargs)
+
+                res[prec] = {"objective_value": model.get_objective_function_value(),
+                             **model.get_parameters()}
+                if len(prediction_coords) > 0:
+                    res[prec].update(model.predict(coords=prediction_coords, **_pred_kwargs))
+
+            row = {c: rl[c].values[0] for c in self.data.coords_col}
+            row["num_obs"] = len(df_local)
+            for k, v in res["float64"].items():
+                diff = np.asarray(res[precision][k], dtype=float) - np.asarray(v, dtype=float)
+                row[f"max_abs_diff_{k}"] = np.max(np.abs(diff))
+            rows.append(row)
+
+        return pd.DataFrame(rows)
 
     def plot_locations_and_obs(self,
                                image_file,
@@ -1299,6 +1590,12 @@ class LocalExpertOI:
                                projection=None,
                                extent=None):
 
+        # plotting packages are only imported when needed
+        import cartopy.crs as ccrs
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_pdf import PdfPages
+        from GPSat.plot_utils import plot_pcolormesh
+
         # TODO: review this method
         # repeating steps used in run to increment over expert locations
         # - plot observations whenever global data changes
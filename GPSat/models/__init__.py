@@ -14,12 +14,18 @@ def get_model(name):
         from GPSat.models.sklearn_models import sklearnGPRModel as model
     elif name == "GPflowVFFModel":
         from GPSat.models.vff_model import GPflowVFFModel as model
+    elif name == "GPflowVecchiaModel":
+        from GPSat.models.vecchia_model import GPflowVecchiaModel as model
+    elif name == "GPflowKalmanModel":
+        from GPSat.models.kalman_model import GPflowKalmanModel as model
     elif name == "GPflowASVGPModel":
         from GPSat.models.asvgp_model import GPflowASVGPModel as model
     elif name == "PurePythonGPR":
         from GPSat.models.pure_python_gpr import PurePythonGPR as model
     elif name == "GPyTorchGPRModel":
         from GPSat.models.gpytorch_models import GPyTorchGPRModel as model
+    elif name == "GPyTorchBatchGPRModel":
+        from GPSat.models.gpytorch_models import GPyTorchBatchGPRModel as model
     else:
         raise NotImplementedError(f"model with name: '{name}' is not implemented")
 
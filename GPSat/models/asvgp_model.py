@@ -5,10 +5,7 @@ import numpy as np
 from GPSat.decorators import timer
 from GPSat.models import BaseGPRModel
 from GPSat.models.gpflow_models import GPflowGPRModel
-
-# Clone from https://github.com/HJakeCunningham/ASVGP
-from ASVGP.asvgp.gpr import GPR_kron
-from ASVGP.asvgp.basis import B1Spline, B2Spline, B3Spline
+from GPSat.banded import GPR_banded
 
 from copy import copy
 from typing import Union, List
@@ -33,6 +30,7 @@ class GPflowASVGPModel(GPflowGPRModel):
                  mean_func_kwargs=None,
                  domain_size: Union[float, List[float]]=None,
                  expert_loc=None,
+                 banded=False,
                  **kwargs):
         # TODO: handle kernel (hyper) parameters
         # TODO: Currently does not handle variable ms + does not incorporate mean function
@@ -45,8 +43,14 @@ class GPflowASVGPModel(GPflowGPRModel):
                                    is specified per dimension. If list, the i-th entry corresponds to the 
                                    number of Fourier feature in dimension i.
             domain_size: ... (non-scaled coordinates)
+            banded: If True, use GPSat's banded storage and solvers (banded Cholesky, and selected inverse
+                    for the variance terms) for the objective and predictions, see GPSat.banded.GPR_banded.
+                    The cost is then linear in the number of features in (the first) dimension.
+                    Only Matern12 and Matern32 kernels are supported. Does not require ASVGP.
         """
 
+        self._check_unsupported_options(kwargs, pad_to_bucket=False, precision="float64")
+
         # --
         # set data
         # --
@@ -142,17 +146,26 @@ class GPflowASVGPModel(GPflowGPRModel):
         elif isinstance(num_inducing_features, list):
             m_list = [num for num in num_inducing_features]
 
-        bases = [self._get_basis(a, b, m, k) for (a, b, m, k) in zip(a_list, b_list, m_list, kernels)]
-
         # ---
         # model
         # ---
-        self.model = GPR_kron(data=(self.coords, self.obs),
-                              kernels=kernels,
-                              bases=bases)
+        if banded:
+            self.model = GPR_banded(data=(self.coords, self.obs),
+                                    kernels=kernels,
+                                    a=a_list, b=b_list, ms=m_list)
+        else:
+            # Clone from https://github.com/HJakeCunningham/ASVGP
+            from ASVGP.asvgp.gpr import GPR_kron
+
+            bases = [self._get_basis(a, b, m, k) for (a, b, m, k) in zip(a_list, b_list, m_list, kernels)]
+            self.model = GPR_kron(data=(self.coords, self.obs),
+                                  kernels=kernels,
+                                  bases=bases)
 
     def _get_basis(self, a, b, m, kernel):
         """Returns spline basis appropriate for the Matern kernel order"""
+        from ASVGP.asvgp.basis import B1Spline, B2Spline, B3Spline
+
         if isinstance(kernel, gpflow.kernels.Matern12):
             return B1Spline(a, b, m)
         elif isinstance(kernel, gpflow.kernels.Matern32):
@@ -1,15 +1,12 @@
 import inspect
 import re
-import os
-import platform
-import subprocess
 import pandas as pd
 import numpy as np
-from tensorflow.python.client import device_lib
 from abc import ABC, abstractmethod
 from typing import List, Dict, Union, Literal, Optional
 from GPSat.decorators import timer
 from GPSat.utils import cprint
+from GPSat.runtime import ensure_thread_policy, environment
 
 
 # ------- Base class ---------
@@ -69,6 +66,8 @@ class BaseGPRModel(ABC):
         Sets values of parameters.
     set_parameter_constraints(constraints_dict, **kwargs)
         Sets constraints on parameters.
+    get_run_details()
+        Returns additional, model specific, details to be stored in the ``model_run_details`` table.
 
     Notes
     -----
@@ -92,6 +91,8 @@ class BaseGPRModel(ABC):
                  # kernel=None,
                  # prior_mean=None,
                  verbose: bool = True,
+                 predict_batch_size: Optional[int] = None,
+                 full_cov_memory_limit: Optional[float] = None,
                  **kwargs):
         """
         Parameters
@@ -123,6 +124,14 @@ class BaseGPRModel(ABC):
             with mean zero if one wishes. Setting ``obs_mean = 'local'`` allows us to use the mean value of the array ``self.obs``.
         verbose: bool, default True
             Set verbosity of model initialisation.
+        predict_batch_size: int, optional
+            If specified, and supported by the inheriting class, prediction coordinates are passed through
+            ``predict`` in batches of (at most) this size and the (marginal) outputs concatenated,
+            bounding the memory used by the cross-covariance. Not applied if ``full_cov=True``.
+        full_cov_memory_limit: float, optional
+            Memory budget, in MB, for predicting with ``full_cov=True``. If the (estimated) memory required for
+            the full covariance matrices exceeds this ``predict`` will raise an error, rather than allocating them.
+            If not specified, no limit is applied.
 
         """
 
@@ -244,6 +253,15 @@ class BaseGPRModel(ABC):
         self.obs -= self.obs_mean
         self.obs /= self.obs_scale
 
+        # ---
+        # prediction batching / memory budget
+        # ---
+
+        assert (predict_batch_size is None) or (predict_batch_size > 0), \
+            f"predict_batch_size: {predict_batch_size} must be positive (or None)"
+        self.predict_batch_size = predict_batch_size
+        self.full_cov_memory_limit = full_cov_memory_limit
+
         # ---
         # prior mean and kernel functions
         # ---
@@ -256,6 +274,9 @@ class BaseGPRModel(ABC):
         # device information
         # ---
 
+        # apply thread policy from environment variables (GPSAT_NUM_THREADS, etc), if not already done
+        ensure_thread_policy()
+
         self.gpu_name, self.cpu_name = self._get_device_names()
 
         if verbose > 1:
@@ -277,51 +298,47 @@ class BaseGPRModel(ABC):
             _ = getattr(self, f"get_{pn}")
 
     def _get_device_names(self):
-
-        gpu_name = None
-        cpu_name = self._get_processor_name()
-
-        try:
-            dev = device_lib.list_local_devices()
-            for d in dev:
-                # check if device is GPU
-                # - NOTE: will break after first GPU
-                if (d.device_type == "GPU") & (gpu_name is None):
-                    cprint("found GPU", "BOLD")
-                    try:
-                        name_loc = re.search("name:(.*?),", d.physical_device_desc).span(0)
-                        gpu_name = d.physical_device_desc[(name_loc[0] + 6):(name_loc[1] - 1)]
-                    except Exception as e:
-                        print("there was some issue getting GPU name")
-                        print(e)
-                    break
-        except Exception as e:
-            print(e)
-        return gpu_name, cpu_name
+        # devices are detected once per process, see GPSat.runtime.environment
+        env = environment()
+        return env.gpu_name, env.cpu_name
 
     @staticmethod
     def _get_processor_name():
-        # ref: https://stackoverflow.com/questions/4842448/getting-processor-information-in-python
-        if platform.system() == "Windows":
-            return platform.processor()
-        elif platform.system() == "Darwin":
-            os.environ['PATH'] = os.environ['PATH'] + os.pathsep + '/usr/sbin'
-            command = "sysctl -n machdep.cpu.brand_string"
-            try:
-                out = subprocess.check_output(command).strip()
-            except FileNotFoundError as e:
-                out = "Unable to get cpu info for system: Darwin"
-            return out
-        elif platform.system() == "Linux":
-            command = "cat /proc/cpuinfo"
-            all_info = subprocess.check_output(command, shell=True).decode().strip()
-            for line in all_info.split("\n"):
-                if "model name" in line:
-                    return re.sub(".*model name.*:", "", line, 1).lstrip()
-        else:
-            print(f"getting processor name for system: {platform.system()} not implemented")
-            return f"Unable to get cpu info for system: {platform.system()}"
-
+        return environment().cpu_name
+
+    def _predict_dtype(self) -> np.dtype:
+        # floating point type predictions are calculated in - used to estimate the memory they require
+        return np.dtype(float)
+
+    def _use_predict_batches(self, num_pred: int, full_cov: bool = False) -> bool:
+        # check if predictions at num_pred locations should be made in batches (see predict_batch_size)
+        # - if full_cov=True check the memory required is within budget (see full_cov_memory_limit)
+        if full_cov:
+            if self.full_cov_memory_limit is not None:
+                # f*_cov and y_cov, plus (approximately) the same again for intermediate calculations
+                req_mb = 4 * num_pred ** 2 * self._predict_dtype().itemsize / 1024 ** 2
+                assert req_mb <= self.full_cov_memory_limit, \
+                    f"predicting with full_cov=True for {num_pred} locations requires ~{req_mb:.1f}MB, " \
+                    f"which exceeds full_cov_memory_limit: {self.full_cov_memory_limit}MB. " \
+                    f"Use full_cov=False (with predict_batch_size) or fewer prediction locations"
+            return False
+        return (self.predict_batch_size is not None) and (num_pred > self.predict_batch_size)
+
+    def _predict_in_batches(self, coords, **predict_kwargs) -> Dict[str, np.ndarray]:
+        # make (marginal) predictions in batches of predict_batch_size, concatenating the outputs
+        # - coords should be array-like (not a DataFrame), predict_kwargs are passed to predict
+        bs = self.predict_batch_size
+        outs = [self.predict(coords[i:(i + bs)], full_cov=False, **predict_kwargs)
+                for i in range(0, len(coords), bs)]
+
+        out = {}
+        for k, v in outs[0].items():
+            # values which are not per prediction location (e.g. a scalar f_bar) are taken from the first batch
+            if np.ndim(v) == 0:
+                out[k] = v
+            else:
+                out[k] = np.concatenate([o[k] for o in outs])
+        return out
 
     @abstractmethod
     def predict(self, coords: np.ndarray) -> Dict[str, np.ndarray]:
@@ -438,6 +455,13 @@ class BaseGPRModel(ABC):
             assert k in self.param_names, f"cannot get parameters for: {k}, it's not in param_names: {self.param_names}"
             getattr(self, f"set_{k}_constraints")(**v, **kwargs)
 
+    def get_run_details(self) -> dict:
+        """
+        Get additional, model specific, details of a run - to be stored in the ``model_run_details`` table.
+        By default returns an empty dict, inheriting classes can override this method.
+        """
+        return {}
+
     @abstractmethod
     def get_objective_function_value(self) -> np.ndarray:
         """
@@ -6,22 +6,239 @@ import gpflow
 import numpy as np
 import itertools
 from copy import copy
+from collections import OrderedDict
+from dataclasses import replace
 
 import tensorflow as tf
 import tensorflow_probability as tfp
-from tensorflow.python.client import device_lib
 
 from gpflow.base import Parameter
 from gpflow.config import default_float
-from gpflow.utilities import set_trainable, triangular
+from gpflow.utilities import set_trainable, triangular, parameter_dict
 from gpflow.models.util import inducingpoint_wrapper
+from gpflow.conditionals.util import base_conditional
+from gpflow.logdensities import multivariate_normal
 
 from typing import List, Dict, Union, Optional
 
 from GPSat.decorators import timer
 from GPSat.models import BaseGPRModel
+from GPSat.models.inducing_points import get_inducing_points, cache_inducing_points
 from GPSat.utils import cprint
 
+# ------- padded (bucketed) data helpers ---------
+
+# default bucket sizes for padded models - each is ~25% larger than the previous
+_DEFAULT_BUCKET_SIZES = tuple(int(64 * 1.25 ** k) for k in range(25))
+
+# padded GPflow models, and their compiled functions, are cached and re-used between model instances
+# - keyed by the bucket size and model specification, least recently used are removed beyond the max size
+_PADDED_MODEL_CACHE = OrderedDict()
+_PADDED_MODEL_CACHE_MAX_SIZE = 16
+
+
+def clear_padded_model_cache(max_size: Union[int, None] = None):
+    """
+    Remove all cached padded models (see ``pad_to_bucket`` in :class:`GPflowGPRModel`),
+    and optionally set the maximum number of padded models cached.
+
+    Parameters
+    ----------
+    max_size: int, optional
+        Maximum number of padded models (one per bucket size and model specification) to cache,
+        the least recently used are removed first. If ``None`` the current value (default 16) is kept.
+
+    Returns
+    -------
+    None
+    """
+    global _PADDED_MODEL_CACHE_MAX_SIZE
+    if max_size is not None:
+        assert max_size >= 1, f"max_size must be >= 1, got: {max_size}"
+        _PADDED_MODEL_CACHE_MAX_SIZE = int(max_size)
+    _PADDED_MODEL_CACHE.clear()
+
+
+def _set_param_by_path(model, path, param):
+    # set a parameter given its path from parameter_dict, e.g. ".kernel.lengthscales"
+    *parents, name = path.lstrip(".").split(".")
+    obj = model
+    for a in parents:
+        obj = getattr(obj, a)
+    setattr(obj, name, param)
+
+
+class MaskedGPR(gpflow.models.GPR):
+    """
+    GPflow GPR with a fixed number of (padded) observations. Observations where ``mask`` is zero are padding:
+    their rows / columns of the covariance are replaced with an identity block, so they make no contribution
+    to the log marginal likelihood or to predictions.
+
+    Keeping the data shape fixed allows compiled functions (e.g. the training loss) to be re-used
+    for different data, without TensorFlow retracing.
+    """
+    def __init__(self, data, mask, kernel, mean_function=None, noise_variance=None, likelihood=None):
+        super().__init__(data=data,
+                         kernel=kernel,
+                         mean_function=mean_function,
+                         noise_variance=noise_variance,
+                         likelihood=likelihood)
+        # 1 for observations, 0 for padding
+        self.mask = mask
+
+    def _masked_cov(self):
+        X, _ = self.data
+        m = tf.cast(self.mask, default_float())
+        K = self.kernel(X) * (m[:, None] * m[None, :])
+        s = m * self.likelihood.variance_at(X)[:, 0] + (1. - m)
+        return tf.linalg.set_diag(K, tf.linalg.diag_part(K) + s), m
+
+    def log_marginal_likelihood(self) -> tf.Tensor:
+        X, Y = self.data
+        K, m = self._masked_cov()
+        L = tf.linalg.cholesky(K)
+        err = (Y - self.mean_function(X)) * m[:, None]
+        log_prob = multivariate_normal(err, tf.zeros_like(err), L)
+        # remove the (constant) contribution of the padded observations
+        num_pad = tf.reduce_sum(1. - m) * tf.cast(tf.shape(Y)[1], default_float())
+        return tf.reduce_sum(log_prob) + 0.5 * num_pad * np.log(2 * np.pi)
+
+    def predict_f(self, Xnew, full_cov: bool = False, full_output_cov: bool = False):
+        X, Y = self.data
+        K, m = self._masked_cov()
+        err = (Y - self.mean_function(X)) * m[:, None]
+        kmn = self.kernel(X, Xnew) * m[:, None]
+        knn = self.kernel(Xnew, full_cov=full_cov)
+        f_mean_zero, f_var = base_conditional(kmn, K, knn, err, full_cov=full_cov, white=False)
+        return f_mean_zero + self.mean_function(Xnew), f_var
+
+
+class MixedPrecisionGPR(gpflow.models.GPR):
+    """
+    GPflow GPR where the kernel matrices are built in the (reduced) precision of the model's parameters and data,
+    e.g. float32, while the Cholesky factorisation (and log-determinant) is computed in ``chol_dtype``,
+    with jitter added to the diagonal of the training covariance.
+
+    The model should be created within a ``gpflow.config.as_context`` with the reduced precision as the default float.
+    """
+    def __init__(self, data, kernel, mean_function=None, noise_variance=None, likelihood=None,
+                 chol_dtype=np.float64, jitter=None):
+        super().__init__(data=data,
+                         kernel=kernel,
+                         mean_function=mean_function,
+                         noise_variance=noise_variance,
+                         likelihood=likelihood)
+        self.chol_dtype = chol_dtype
+        # jitter, relative to the average prior variance
+        # - default is 10 (100) machine epsilon of float32 if the Cholesky is in float64 (float32)
+        if jitter is None:
+            jitter = (10 if chol_dtype == np.float64 else 100) * np.finfo(np.float32).eps
+        self.jitter = jitter
+
+    def _chol_cov(self):
+        # training covariance (with noise and jitter) in chol_dtype, along with the residuals
+        X, Y = self.data
+        K = tf.cast(self.kernel(X), self.chol_dtype)
+        kdiag = tf.linalg.diag_part(K)
+        s = tf.cast(self.likelihood.variance_at(X)[:, 0], self.chol_dtype)
+        K = tf.linalg.set_diag(K, kdiag + s + self.jitter * tf.reduce_mean(kdiag))
+        err = tf.cast(Y - self.mean_function(X), self.chol_dtype)
+        return K, err
+
+    def log_marginal_likelihood(self) -> tf.Tensor:
+        K, err = self._chol_cov()
+        L = tf.linalg.cholesky(K)
+        log_prob = multivariate_normal(err, tf.zeros_like(err), L)
+        # return in the precision of the parameters
+        return tf.cast(tf.reduce_sum(log_prob), self.data[0].dtype)
+
+    def predict_f(self, Xnew, full_cov: bool = False, full_output_cov: bool = False):
+        L, alpha = gpr_factorise(self)
+        f_pred, _ = gpr_fused_predict(self, L, alpha, Xnew, full_cov=full_cov)
+        return f_pred
+
+
+# ------- fused GPR prediction ---------
+
+def gpr_factorise(model: gpflow.models.GPR):
+    """
+    Factorise the training covariance of a GPflow GPR (or :class:`MaskedGPR`) model.
+
+    Parameters
+    ----------
+    model: gpflow.models.GPR
+
+    Returns
+    -------
+    tuple of tf.Tensor
+        ``L``, the lower Cholesky factor of ``K(X, X) + noise``, and ``alpha = (K(X, X) + noise)^-1 (Y - m(X))``.
+
+    """
+    X, Y = model.data
+    err = Y - model.mean_function(X)
+    if isinstance(model, MaskedGPR):
+        K, m = model._masked_cov()
+        err = err * m[:, None]
+    elif isinstance(model, MixedPrecisionGPR):
+        K, err = model._chol_cov()
+    else:
+        K = model.kernel(X)
+        K = tf.linalg.set_diag(K, tf.linalg.diag_part(K) + model.likelihood.variance_at(X)[:, 0])
+    L = tf.linalg.cholesky(K)
+    alpha = tf.linalg.cholesky_solve(L, err)
+    return L, alpha
+
+
+def gpr_fused_predict(model: gpflow.models.GPR, L, alpha, Xnew, full_cov=False):
+    """
+    Predict with a GPflow GPR (or :class:`MaskedGPR`) model using an existing factorisation
+    (see :func:`gpr_factorise`), so ``K(X, X)`` is not re-built or re-factorised.
+
+    Parameters
+    ----------
+    model: gpflow.models.GPR
+    L: tf.Tensor
+        Lower Cholesky factor of the training covariance.
+    alpha: tf.Tensor
+        Training covariance inverse multiplied by the (mean removed) observations.
+    Xnew: tf.Tensor | np.ndarray
+        Prediction locations, shape ``[M, D]``.
+    full_cov: bool, default False
+        If ``True`` the latent variance is returned as a full covariance, of shape ``[P, M, M]``.
+
+    Returns
+    -------
+    tuple
+        ``(f_mean, f_var)`` and ``(f_mean, y_var)``, in the same form as returned by
+        GPflow's ``predict_f`` and ``predict_y`` (with ``full_cov=False`` for the latter).
+
+    """
+    X, _ = model.data
+    # kernels are evaluated in the precision of the data, the remaining calculations in that of the factorisation
+    # - these only differ for MixedPrecisionGPR
+    Xnew = tf.cast(Xnew, X.dtype)
+    dtype = L.dtype
+
+    Kmn = tf.cast(model.kernel(X, Xnew), dtype)
+    if isinstance(model, MaskedGPR):
+        Kmn = Kmn * tf.cast(model.mask, default_float())[:, None]
+
+    num_latent = tf.shape(alpha)[1]
+    f_mean = tf.linalg.matmul(Kmn, alpha, transpose_a=True) + tf.cast(model.mean_function(Xnew), dtype)
+
+    A = tf.linalg.triangular_solve(L, Kmn, lower=True)
+    if full_cov:
+        f_cov = tf.cast(model.kernel(Xnew), dtype) - tf.linalg.matmul(A, A, transpose_a=True)
+        f_var = tf.linalg.diag_part(f_cov)[:, None]
+        f_cov = tf.tile(f_cov[None, ...], [num_latent, 1, 1])
+    else:
+        f_var = (tf.cast(model.kernel(Xnew, full_cov=False), dtype) - tf.reduce_sum(tf.square(A), 0))[:, None]
+    f_var = tf.tile(f_var, [1, num_latent])
+    y_var = f_var + tf.cast(model.likelihood.variance_at(Xnew), dtype)
+
+    return (f_mean, f_cov if full_cov else f_var), (f_mean, y_var)
+
+
 # ------- GPflow models ---------
 class GPflowGPRModel(BaseGPRModel):
     """
@@ -29,6 +246,11 @@ class GPflowGPRModel(BaseGPRModel):
 
     See :class:`~GPSat.models.base_model.BaseGPRModel` for a complete list of attributes and methods.
     """
+    # cache entry used if training data is padded to a bucket size (see pad_to_bucket)
+    _bucket_entry = None
+    # cached factorisation of the training covariance, used by predict (see _get_factorisation)
+    _factorisation = None
+
     @timer
     def __init__(self,
                  data=None,
@@ -47,6 +269,12 @@ class GPflowGPRModel(BaseGPRModel):
                  mean_func_kwargs=None,
                  noise_variance=None,
                  likelihood: gpflow.likelihoods.Gaussian=None,
+                 pad_to_bucket=False,
+                 bucket_sizes=None,
+                 predict_batch_size=None,
+                 full_cov_memory_limit=None,
+                 precision="float64",
+                 jitter=None,
                  **kwargs):
         """
         Parameters
@@ -85,6 +313,40 @@ class GPflowGPRModel(BaseGPRModel):
             GPflow model for Gaussian likelihood used to model data uncertainty.
             Can use custom GPflow Gaussian likelihood class here.
             Unnecessary if using a vanilla Gaussian likelihood and ``noise_variance`` is specified.
+        pad_to_bucket: bool, default False
+            If ``True``, the training data is padded to the smallest of ``bucket_sizes`` that can contain it,
+            with padded observations masked so they make no contribution (see :class:`MaskedGPR`).
+            Models with the same bucket size and specification then share the same underlying GPflow model
+            and compiled training loss / predict functions, which avoids TensorFlow retracing for every expert.
+            Requires ``kernel`` (and ``mean_function``, if used) to be specified as a ``str`` and ``likelihood`` to be ``None``.
+            As the underlying GPflow model is shared, only one model instance per bucket should be in use at a time.
+            The number of traces made during this model's use is available via ``get_run_details()``.
+            Only supported by the exact GPR model (this class), the sub-classed models (e.g.
+            :class:`GPflowSGPRModel`, :class:`GPflowSVGPModel`) raise an ``AssertionError`` if it is set.
+        bucket_sizes: list of int, optional
+            Sizes to pad the training data to, if ``pad_to_bucket=True``. If not specified, uses sizes from 64
+            increasing by ~25% to ~13,500. If the number of observations exceeds the largest size the data is not padded.
+        predict_batch_size
+            See :func:`BaseGPRModel.__init__() <GPSat.models.base_model.BaseGPRModel.__init__>`
+        full_cov_memory_limit
+            See :func:`BaseGPRModel.__init__() <GPSat.models.base_model.BaseGPRModel.__init__>`
+        precision: str, default "float64"
+            Floating point precision used for computation, one of:
+            "float64" - all calculations in float64 (GPflow's default float);
+            "mixed" - parameters, data, kernel matrices, cross-covariances in float32,
+            with the Cholesky factorisation (and log determinant) and subsequent solves in float64;
+            "float32" - all calculations in float32.
+            If not "float64" uses :class:`MixedPrecisionGPR`, which adds ``jitter`` to the training covariance.
+            Requires ``kernel`` (and ``mean_function``, if used) to be specified as a ``str``,
+            ``likelihood`` to be ``None`` and is not compatible with ``pad_to_bucket=True``.
+            See :meth:`LocalExpertOI.compare_precision() <GPSat.local_experts.LocalExpertOI.compare_precision>`
+            for checking the deviation from float64 results.
+            Only supported by the exact GPR model (this class), the sub-classed models (e.g.
+            :class:`GPflowSGPRModel`, :class:`GPflowSVGPModel`) raise an ``AssertionError`` if it is not "float64".
+        jitter: float, optional
+            Only used if ``precision`` is not "float64". Jitter added to the diagonal of the training covariance,
+            relative to the average prior variance. Default is ``10 * np.finfo(np.float32).eps``
+            for "mixed" and ``100 * np.finfo(np.float32).eps`` for "float32".
 
         """
         # TODO: handle kernel (hyper) parameters
@@ -102,7 +364,9 @@ class GPflowGPRModel(BaseGPRModel):
                          coords_scale=coords_scale,
                          obs_scale=obs_scale,
                          obs_mean=obs_mean,
-                         verbose=verbose)
+                         verbose=verbose,
+                         predict_batch_size=predict_batch_size,
+                         full_cov_memory_limit=full_cov_memory_limit)
 
         # --
         # set kernel
@@ -111,6 +375,7 @@ class GPflowGPRModel(BaseGPRModel):
         #
 
         assert kernel is not None, "kernel was not provided"
+        kernel_spec = kernel
 
         # if kernel is str: get function
         if isinstance(kernel, str):
@@ -140,6 +405,9 @@ class GPflowGPRModel(BaseGPRModel):
         # prior mean function
         # --
 
+        # specification of mean function - used for padded model cache key
+        mean_func_spec = (mean_function, repr(mean_func_kwargs))
+
         if isinstance(mean_function, str):
             if mean_func_kwargs is None:
                 mean_func_kwargs = {}
@@ -149,6 +417,40 @@ class GPflowGPRModel(BaseGPRModel):
         # model
         # ---
 
+        assert precision in ["float64", "mixed", "float32"], \
+            f"precision: {precision} not valid, should be one of: 'float64', 'mixed', 'float32'"
+        if precision != "float64":
+            self._check_model_spec(kernel_spec, mean_func_spec, likelihood, option=f"precision='{precision}'")
+            assert not pad_to_bucket, f"precision='{precision}' is not compatible with pad_to_bucket=True"
+
+            # (re-)create the kernel and mean function with float32 parameters
+            with gpflow.config.as_context(replace(gpflow.config.config(), float=np.float32)):
+                kernel = getattr(gpflow.kernels, kernel_spec)(**kernel_kwargs)
+                if mean_func_spec[0] is not None:
+                    mean_function = getattr(gpflow.mean_functions, mean_func_spec[0])(**(mean_func_kwargs or {}))
+                self.model = MixedPrecisionGPR(data=(self.coords.astype(np.float32), self.obs.astype(np.float32)),
+                                               kernel=kernel,
+                                               mean_function=mean_function,
+                                               noise_variance=noise_variance,
+                                               chol_dtype=np.float64 if precision == "mixed" else np.float32,
+                                               jitter=jitter)
+            return
+
+        if pad_to_bucket:
+            self._check_model_spec(kernel_spec, mean_func_spec, likelihood, option="pad_to_bucket=True")
+
+            bucket_sizes = _DEFAULT_BUCKET_SIZES if bucket_sizes is None else sorted(bucket_sizes)
+            bucket = [b for b in bucket_sizes if b >= len(self.coords)]
+            if len(bucket) == 0:
+                warnings.warn(f"\nnumber of observations: {len(self.coords)} is greater than the largest "
+                              f"bucket size: {bucket_sizes[-1]}, data will not be padded")
+            else:
+                cache_key = (bucket[0], self.coords.shape[1], self.obs.shape[1],
+                             kernel_spec, repr(kernel_kwargs), mean_func_spec, noise_variance)
+                self._set_bucket_entry(cache_key, kernel=kernel, mean_function=mean_function,
+                                       noise_variance=noise_variance)
+                return
+
         # TODO: allow for model type (e.g. "GPR" to be specified as input?)
         self.model = gpflow.models.GPR(data=(self.coords, self.obs),
                                        kernel=kernel,
@@ -156,6 +458,170 @@ class GPflowGPRModel(BaseGPRModel):
                                        noise_variance=noise_variance,
                                        likelihood=likelihood)
 
+    @staticmethod
+    def _check_model_spec(kernel_spec, mean_func_spec, likelihood, option):
+        # options which (re-)create the model from its specification require it to be given by name
+        assert isinstance(kernel_spec, str), f"{option} requires kernel to be provided as a str"
+        assert (mean_func_spec[0] is None) or isinstance(mean_func_spec[0], str), \
+            f"{option} requires mean_function to be provided as a str (or None)"
+        assert likelihood is None, f"{option} requires likelihood to be None, use noise_variance instead"
+
+    def _check_unsupported_options(self, options, **defaults):
+        # options only implemented for the exact GPR model (e.g. pad_to_bucket) would otherwise be silently
+        # ignored by sub-classes, which accept them in **kwargs - check they are left at their defaults
+        for k, default in defaults.items():
+            val = options.get(k, default)
+            assert val == default, f"{k}={val!r} is not supported by {type(self).__name__}"
+
+    def _set_bucket_entry(self, cache_key, kernel, mean_function, noise_variance):
+        # get (or create) the padded model for cache_key, reset its parameters and set the (padded) data
+
+        if cache_key not in _PADDED_MODEL_CACHE:
+            bucket = cache_key[0]
+            X = tf.Variable(np.zeros((bucket, self.coords.shape[1])), dtype=default_float(), trainable=False)
+            Y = tf.Variable(np.zeros((bucket, self.obs.shape[1])), dtype=default_float(), trainable=False)
+            mask = tf.Variable(np.zeros(bucket), dtype=default_float(), trainable=False)
+            model = MaskedGPR(data=(X, Y),
+                              mask=mask,
+                              kernel=kernel,
+                              mean_function=mean_function,
+                              noise_variance=noise_variance)
+
+            params = {k: v for k, v in parameter_dict(model).items() if isinstance(v, Parameter)}
+            entry = {
+                "bucket": bucket,
+                "model": model,
+                "num_traces": 0,
+                # initial parameter values and trainable status - used to reset when re-using model
+                "init_params": {k: (v.numpy(), v.trainable) for k, v in params.items()},
+                # parameters with their default transforms, and with Sigmoid transforms (once constraints are set)
+                # - swapped in and out, rather than re-created, so compiled functions can be re-used
+                "default_params": params,
+                "sigmoid_params": {},
+                # compiled functions for each combination of parameters
+                "functions": {}
+            }
+            _PADDED_MODEL_CACHE[cache_key] = entry
+            while len(_PADDED_MODEL_CACHE) > _PADDED_MODEL_CACHE_MAX_SIZE:
+                _PADDED_MODEL_CACHE.popitem(last=False)
+
+        _PADDED_MODEL_CACHE.move_to_end(cache_key)
+        entry = _PADDED_MODEL_CACHE[cache_key]
+        self._bucket_entry = entry
+        self._num_traces_at_init = entry["num_traces"]
+        self.model = entry["model"]
+
+        # restore the default transforms - any constraints set for a previous model do not apply to this one
+        current = parameter_dict(self.model)
+        for k, p in entry["default_params"].items():
+            if current.get(k) is not p:
+                _set_param_by_path(self.model, k, p)
+
+        # reset parameters to their initial values
+        for k, p in entry["default_params"].items():
+            val, trainable = entry["init_params"][k]
+            p.assign(np.reshape(val, p.shape))
+            set_trainable(p, trainable)
+
+        self._compile_bucket_functions(entry)
+        self._set_padded_data()
+
+    def _set_padded_data(self):
+        # assign (padded) coords and obs to the data variables of the padded model
+        bucket = self._bucket_entry["bucket"]
+        n = len(self.coords)
+        assert n <= bucket, f"number of observations: {n} exceeds bucket size: {bucket}"
+
+        X = np.zeros((bucket, self.coords.shape[1]))
+        Y = np.zeros((bucket, self.obs.shape[1]))
+        mask = np.zeros(bucket)
+        X[:n], Y[:n], mask[:n] = self.coords, self.obs, 1.
+
+        self.model.data[0].assign(X)
+        self.model.data[1].assign(Y)
+        self.model.mask.assign(mask)
+        # data variables are updated in place, so any cached factorisation is invalid
+        self._factorisation = None
+
+    @staticmethod
+    def _compile_bucket_functions(entry):
+        # create (or re-use) the compiled functions for a padded model, with its current parameters
+        # - NOTE: the python function bodies only run when tracing, so are used to count traces
+        model = entry["model"]
+        D = model.data[0].shape[1]
+
+        # compiled functions reference the parameters, so are specific to the (current) parameter objects
+        key = tuple((k, id(v)) for k, v in sorted(parameter_dict(model).items()))
+        if key in entry["functions"]:
+            entry.update(entry["functions"][key])
+            return
+
+        def training_loss():
+            entry["num_traces"] += 1
+            return model.training_loss()
+
+        def factorise():
+            entry["num_traces"] += 1
+            return gpr_factorise(model)
+
+        def predict(L, alpha, Xnew):
+            entry["num_traces"] += 1
+            return gpr_fused_predict(model, L, alpha, Xnew, full_cov=False)
+
+        def predict_full_cov(L, alpha, Xnew):
+            entry["num_traces"] += 1
+            return gpr_fused_predict(model, L, alpha, Xnew, full_cov=True)
+
+        bucket, P = model.data[1].shape
+        spec = [tf.TensorSpec(shape=[bucket, bucket], dtype=default_float()),
+                tf.TensorSpec(shape=[bucket, P], dtype=default_float()),
+                tf.TensorSpec(shape=[None, D], dtype=default_float())]
+        functions = {
+            "training_loss": tf.function(training_loss),
+            "factorise": tf.function(factorise),
+            "predict": tf.function(predict, input_signature=spec),
+            "predict_full_cov": tf.function(predict_full_cov, input_signature=spec)
+        }
+        entry["functions"][key] = functions
+        entry.update(functions)
+
+    def _get_factorisation(self):
+        # return the Cholesky factor and alpha of the training covariance (see gpr_factorise)
+        # - cached until the data or any of the model's variables (parameters, constraint bounds) change
+        variables = [v for m in [self.model.kernel, self.model.likelihood, self.model.mean_function]
+                     for v in m.variables]
+        key = tuple(v.numpy().tobytes() for v in variables)
+
+        cache = self._factorisation
+        if (cache is None) or (cache["data"] is not self.model.data) or (cache["key"] != key):
+            if self._bucket_entry is not None:
+                L, alpha = self._bucket_entry["factorise"]()
+            else:
+                L, alpha = gpr_factorise(self.model)
+            cache = {"data": self.model.data, "key": key, "L": L, "alpha": alpha}
+            self._factorisation = cache
+
+        return cache["L"], cache["alpha"]
+
+    def get_run_details(self) -> dict:
+        """
+        If training data is padded (``pad_to_bucket=True``), returns the bucket size ("padded_size") and the number
+        of TensorFlow traces made ("num_traces") since this model was initialised. Otherwise returns an empty dict.
+        """
+        if self._bucket_entry is None:
+            return {}
+        return {
+            "padded_size": self._bucket_entry["bucket"],
+            "num_traces": self._bucket_entry["num_traces"] - self._num_traces_at_init
+        }
+
+    def _predict_dtype(self) -> np.dtype:
+        # the dtype of the model's training data (e.g. float32 for precision="float32"), if it has any
+        data = getattr(self.model, "data", None)
+        if data is None:
+            return np.dtype(gpflow.config.default_float())
+        return np.dtype(tf.as_dtype(data[0].dtype).as_numpy_dtype)
+
     def update_obs_data(self,
                         data=None,
                         coords_col=None,
@@ -171,9 +637,16 @@ class GPflowGPRModel(BaseGPRModel):
                          coords=coords,
                          obs=obs,
                          coords_scale=coords_scale,
-                         obs_scale=obs_scale)
+                         obs_scale=obs_scale,
+                         predict_batch_size=self.predict_batch_size,
+                         full_cov_memory_limit=self.full_cov_memory_limit)
 
-        self.model.data = (self.coords, self.obs)
+        if self._bucket_entry is not None:
+            self._set_padded_data()
+        else:
+            # keep the precision of the existing data
+            dtype = self.model.data[0].dtype
+            self.model.data = (tf.constant(self.coords, dtype=dtype), tf.constant(self.obs, dtype=dtype))
 
 
     @property
@@ -223,11 +696,25 @@ class GPflowGPRModel(BaseGPRModel):
         assert isinstance(coords, np.ndarray), f"coords should be an ndarray (one can be converted from)"
         coords = coords.astype(self.coords.dtype)
 
+        # for many prediction locations: predict in batches, to limit memory use
+        if self._use_predict_batches(len(coords), full_cov=full_cov):
+            return self._predict_in_batches(coords, apply_scale=apply_scale)
+
         if apply_scale:
             coords = coords / self.coords_scale
 
-        y_pred = self.model.predict_y(Xnew=coords, full_cov=False, full_output_cov=False)
-        f_pred = self.model.predict_f(Xnew=coords, full_cov=full_cov)
+        if type(self.model) in (gpflow.models.GPR, MaskedGPR, MixedPrecisionGPR):
+            # factorise the training covariance once (cached between calls), get f and y predictions from it
+            L, alpha = self._get_factorisation()
+            if self._bucket_entry is not None:
+                # use the compiled functions of the (shared) padded model
+                predict_fn = self._bucket_entry["predict_full_cov" if full_cov else "predict"]
+                f_pred, y_pred = predict_fn(L, alpha, coords)
+            else:
+                f_pred, y_pred = gpr_fused_predict(self.model, L, alpha, coords, full_cov=full_cov)
+        else:
+            y_pred = self.model.predict_y(Xnew=coords, full_cov=False, full_output_cov=False)
+            f_pred = self.model.predict_f(Xnew=coords, full_cov=full_cov)
 
         # TODO: obs_scale should be applied to predictions
         # z = (x-u)/sig; x = z * sig + u
@@ -314,8 +801,15 @@ class GPflowGPRModel(BaseGPRModel):
 
         self._fix_hyperparameters(fixed_params)
 
+        training_loss = self.model.training_loss
+        if self._bucket_entry is not None:
+            # use the already compiled training loss of the padded model
+            # - compiling within minimize would trace again for every model
+            training_loss = self._bucket_entry["training_loss"]
+            opt_kwargs["compile"] = False
+
         opt = gpflow.optimizers.Scipy()
-        opt_logs = opt.minimize(self.model.training_loss,
+        opt_logs = opt.minimize(training_loss,
                                 self.model.trainable_variables,
                                 options=dict(maxiter=max_iter),
                                 **opt_kwargs)
@@ -478,6 +972,12 @@ class GPflowGPRModel(BaseGPRModel):
             # similarly for the lower bound
             param_vals[param_vals < (low + tol)] = low[param_vals < (low + tol)] + tol
 
+        # padded models are re-used, update the bounds of existing constraints rather than creating new parameters
+        # - so compiled functions (which reference the parameters) remain valid
+        if self._bucket_entry is not None:
+            self._set_sigmoid_bounds(obj=obj, param_name=param_name, low=low, high=high, value=param_vals)
+            return
+
         # if the length scale values have changed then assign the new values
         if (np.atleast_1d(original_param.numpy()) != param_vals).any():
             try:
@@ -490,8 +990,8 @@ class GPflowGPRModel(BaseGPRModel):
         self._apply_param_transform(obj=obj,
                                     bijector="Sigmoid",
                                     param_name=param_name,
-                                    low=tf.constant(low),
-                                    high=tf.constant(high))
+                                    low=tf.constant(low, dtype=original_param.dtype),
+                                    high=tf.constant(high, dtype=original_param.dtype))
 
     @timer
     def set_lengthscales_constraints(self, low, high, move_within_tol=True, tol=1e-8, scale=False, scale_magnitude=None):
@@ -589,6 +1089,45 @@ class GPflowGPRModel(BaseGPRModel):
                                     scale=scale,
                                     scale_magnitude=scale_magnitude)
 
+    def _set_sigmoid_bounds(self, obj, param_name, low, high, value):
+        # set Sigmoid constraints on a parameter, using variables for the bounds so they can be updated in place
+        p = getattr(obj, param_name)
+        value = np.atleast_1d(value)
+
+        def _matches(q):
+            return isinstance(q.transform, tfp.bijectors.Sigmoid) and isinstance(q.transform.low, tf.Variable) \
+                and (q.transform.low.shape == low.shape) and (q.shape == value.shape)
+
+        if _matches(p):
+            p.transform.low.assign(low)
+            p.transform.high.assign(high)
+            p.assign(value)
+            return
+
+        entry = self._bucket_entry
+        path = [k for k, v in parameter_dict(self.model).items() if v is p][0]
+        new_p = entry["sigmoid_params"].get(path)
+        if (new_p is None) or (not _matches(new_p)):
+            bij = tfp.bijectors.Sigmoid(low=tf.Variable(low, dtype=default_float(), trainable=False),
+                                        high=tf.Variable(high, dtype=default_float(), trainable=False))
+            new_p = gpflow.Parameter(value,
+                                     trainable=p.trainable,
+                                     prior=p.prior,
+                                     name=p.name.split(":")[0],
+                                     transform=bij)
+            entry["sigmoid_params"][path] = new_p
+        else:
+            # re-use the constrained parameter from a previous model
+            new_p.transform.low.assign(low)
+            new_p.transform.high.assign(high)
+            new_p.assign(value)
+            set_trainable(new_p, p.trainable)
+            # set_trainable applies to all variables of the parameter, the Sigmoid bounds must remain fixed
+            set_trainable(new_p.transform, False)
+        setattr(obj, param_name, new_p)
+        # the compiled functions reference the previous parameter, so need to be re-created (or re-used)
+        self._compile_bucket_functions(entry)
+
     def _apply_param_transform(self, obj, bijector, param_name, **bijector_kwargs):
 
         # check obj is correct
@@ -616,14 +1155,16 @@ class GPflowGPRModel(BaseGPRModel):
                                  trainable=p.trainable,
                                  prior=p.prior,
                                  name=p.name.split(":")[0],
-                                 transform=bij)
+                                 transform=bij,
+                                 dtype=p.dtype)
 
         # create a new parameter with different transform
         new_p = gpflow.Parameter(p,
                                  trainable=p.trainable,
                                  prior=p.prior,
                                  name=p.name.split(":")[0],
-                                 transform=bij)
+                                 transform=bij,
+                                 dtype=p.dtype)
         # set parameter
         setattr(obj, param_name, new_p)
 
@@ -679,9 +1220,11 @@ class GPflowSGPRModel(GPflowGPRModel):
     - This is sub-classed from :class:`~GPSat.models.gpflow_models.GPflowGPRModel` and uses the same
       :func:`~GPSat.models.gpflow_models.GPflowGPRModel.predict()` method.
     - Has O(NM^2) computational complexity and O(NM) memory scaling.
-    - Several techniques for inducing point selection exists (e.g. see `this GPflow tutorial <https://gpflow.github.io/GPflow/develop/notebooks/getting_started/large_data.html>`_),
-      however we have only implemented the *random selection* method, where inducing points are initialised as M random sub-samples of
-      the training data.
+    - Several techniques for inducing point selection exists (e.g. see `this GPflow tutorial <https://gpflow.github.io/GPflow/develop/notebooks/getting_started/large_data.html>`_).
+      Inducing points can be initialised as M random sub-samples of the training data (default), k-means++ centroids,
+      by greedily maximising the conditional variance, or on a regular grid, see ``inducing_point_method``.
+      With ``reuse_inducing_points=True`` the (possibly optimised) inducing locations, relative to the expert location,
+      are reused by subsequent experts.
     
     References
     ----------
@@ -702,11 +1245,18 @@ class GPflowSGPRModel(GPflowGPRModel):
                  *,
                  kernel="Matern32",
                  num_inducing_points=500,
+                 inducing_point_method="random",
+                 inducing_point_seed=0,
+                 inducing_point_kwargs=None,
+                 reuse_inducing_points=False,
+                 expert_loc=None,
                  kernel_kwargs=None,
                  mean_function=None,
                  mean_func_kwargs=None,
                  noise_variance=None,  # Variance of Gaussian likelihood
                  likelihood: gpflow.likelihoods.Gaussian=None,
+                 predict_batch_size=None,
+                 full_cov_memory_limit=None,
                  **kwargs
                  ):
         """
@@ -744,10 +1294,33 @@ class GPflowSGPRModel(GPflowGPRModel):
             See :func:`GPflowGPRModel.__init__() <GPSat.models.gpflow_models.GPflowGPRModel.__init__>`
         num_inducing_points: int, default 500
             The number of inducing points.
+        inducing_point_method: str, default "random"
+            Method used to select the initial inducing point locations, one of: ``"random"`` (random subset
+            of the observation locations), ``"kmeans++"``, ``"greedy_variance"`` (greedily maximise the
+            conditional variance under the initial kernel) or ``"grid"`` (regular grid in scaled coordinates).
+            See :func:`~GPSat.models.inducing_points.select_inducing_points`.
+        inducing_point_seed: int, default 0
+            Seed used by ``"random"`` and ``"kmeans++"`` inducing point selection.
+        inducing_point_kwargs: dict, optional
+            Additional keyword arguments for the inducing point selection method, e.g. ``{"kmeans_iter": 10}``.
+        reuse_inducing_points: bool, default False
+            If ``True``, inducing point locations are stored relative to the expert location and reused by
+            subsequent neighbouring models, i.e. those whose observations surround the stored expert location,
+            with the same ``inducing_point_method``, ``num_inducing_points`` and coordinate scaling.
+            If inducing points are optimised (``train_inducing_points=True``), the optimised locations are reused.
+            See :func:`~GPSat.models.inducing_points.get_inducing_points`.
+        expert_loc: np.ndarray, optional
+            Location of the local expert (in the original, unscaled coordinates), which reused inducing points
+            are relative to. If not specified the mean of the observation locations is used.
+        predict_batch_size
+            See :func:`BaseGPRModel.__init__() <GPSat.models.base_model.BaseGPRModel.__init__>`
+        full_cov_memory_limit
+            See :func:`BaseGPRModel.__init__() <GPSat.models.base_model.BaseGPRModel.__init__>`
 
         """
         # TODO: handle kernel (hyper) parameters
-        # TODO: include options for inducing points (random or grid)
+
+        self._check_unsupported_options(kwargs, pad_to_bucket=False, precision="float64")
 
         # --
         # set data
@@ -762,7 +1335,9 @@ class GPflowSGPRModel(GPflowGPRModel):
                               coords_scale=coords_scale,
                               obs_scale=obs_scale,
                               obs_mean=obs_mean,
-                              verbose=verbose)
+                              verbose=verbose,
+                              predict_batch_size=predict_batch_size,
+                              full_cov_memory_limit=full_cov_memory_limit)
 
         # --
         # set kernel
@@ -814,9 +1389,13 @@ class GPflowSGPRModel(GPflowGPRModel):
                   "setting inducing points to data points...")
             self.inducing_points = self.coords
         else:
-            X = copy(self.coords)
-            np.random.shuffle(X)
-            self.inducing_points = X[:num_inducing_points]
+            self.inducing_points = self._select_inducing_points(num_inducing_points,
+                                                                method=inducing_point_method,
+                                                                seed=inducing_point_seed,
+                                                                kernel=kernel,
+                                                                reuse=reuse_inducing_points,
+                                                                expert_loc=expert_loc,
+                                                                **(inducing_point_kwargs or {}))
 
         # ---
         # model
@@ -829,6 +1408,42 @@ class GPflowSGPRModel(GPflowGPRModel):
                                         inducing_variable=self.inducing_points,
                                         likelihood=likelihood)
 
+    def _select_inducing_points(self, num_inducing_points, method="random", seed=0, kernel=None,
+                                reuse=False, expert_loc=None, **method_kwargs):
+        # select inducing points from (scaled) coords, see GPSat.models.inducing_points.get_inducing_points
+        # - expert_loc is in the original coordinates, reused inducing points are stored relative to it (scaled)
+        if expert_loc is not None:
+            ref_loc = np.asarray(expert_loc, dtype=float).reshape(-1) / self.coords_scale.reshape(-1)
+        else:
+            ref_loc = self.coords.mean(axis=0)
+
+        kernel_func = None
+        if kernel is not None:
+            kernel_func = lambda a, b: kernel.K(a, b).numpy()
+
+        # inducing points are stored in scaled coordinates, so only reuse those with the same scaling
+        reuse_key = tuple(np.asarray(self.coords_scale, dtype=float).ravel())
+
+        # store settings to update the reused inducing points after optimisation
+        self._inducing_point_reuse = (method, num_inducing_points, ref_loc, reuse_key) if reuse else None
+
+        return get_inducing_points(self.coords, num_inducing_points,
+                                   method=method,
+                                   seed=seed,
+                                   kernel=kernel_func,
+                                   reference_location=ref_loc,
+                                   reuse=reuse,
+                                   reuse_key=reuse_key,
+                                   **method_kwargs)
+
+    def _cache_optimised_inducing_points(self):
+        # after optimising inducing point locations, store them to be reused by subsequent models
+        if getattr(self, "_inducing_point_reuse", None) is not None:
+            method, num_inducing_points, ref_loc, reuse_key = self._inducing_point_reuse
+            Z = self.get_inducing_points()
+            if (len(Z) == num_inducing_points) and np.all(np.isfinite(Z)):
+                cache_inducing_points(Z, method, num_inducing_points, ref_loc, reuse_key=reuse_key)
+
     @property
     def param_names(self) -> list:
         """
@@ -898,6 +1513,9 @@ class GPflowSGPRModel(GPflowGPRModel):
         
         opt_success = super().optimise_parameters(max_iter, **opt_kwargs)
 
+        if train_inducing_points:
+            self._cache_optimised_inducing_points()
+
         return opt_success
 
  
@@ -942,12 +1560,15 @@ class GPflowSVGPModel(GPflowGPRModel):
                  kernel="Matern32",
                  num_inducing_points=None,
                  minibatch_size=None,
+                 shuffle_buffer_size=None,
                  kernel_kwargs=None,
                  mean_function=None,
                  mean_func_kwargs=None,
                  noise_variance=None,
                  likelihood=None,
                  likelihood_kwargs=None,
+                 predict_batch_size=None,
+                 full_cov_memory_limit=None,
                  **kwargs):
         """
         Parameters
@@ -992,11 +1613,20 @@ class GPflowSVGPModel(GPflowGPRModel):
             The size of minibatch used for stochastic estimation of the loss function. Using smaller 
             batch sizes will result in increased per-iteration efficiency, however optimisation becomes more noisy.
             If not specified, it will not apply minibatching.
+        shuffle_buffer_size: int, optional
+            Size of the buffer used to shuffle the (cached) training data when minibatching.
+            Default is the number of observations, i.e. a full shuffle each epoch. A smaller buffer reduces memory
+            use for large datasets, at the cost of minibatches being less random.
+        predict_batch_size
+            See :func:`BaseGPRModel.__init__() <GPSat.models.base_model.BaseGPRModel.__init__>`
+        full_cov_memory_limit
+            See :func:`BaseGPRModel.__init__() <GPSat.models.base_model.BaseGPRModel.__init__>`
 
         """
 
         # TODO: handle kernel (hyper) parameters
-        # TODO: include options for inducing points (random or grid)
+
+        self._check_unsupported_options(kwargs, pad_to_bucket=False, precision="float64")
 
         # --
         # set data
@@ -1011,7 +1641,9 @@ class GPflowSVGPModel(GPflowGPRModel):
                               coords_scale=coords_scale,
                               obs_scale=obs_scale,
                               obs_mean=obs_mean,
-                              verbose=verbose)
+                              verbose=verbose,
+                              predict_batch_size=predict_batch_size,
+                              full_cov_memory_limit=full_cov_memory_limit)
 
         # --
         # set kernel
@@ -1070,13 +1702,21 @@ class GPflowSVGPModel(GPflowGPRModel):
         # ---
         X = self.coords
         Y = self.obs
-        self.train_dataset = tf.data.Dataset.from_tensor_slices((X, Y)).repeat().shuffle(X.shape[0])
 
         if minibatch_size is None:
             self.minibatch_size = self.coords.shape[0] # Set to full-batch gradient descent if minibatch size is not specified
         else:
             self.minibatch_size = minibatch_size
 
+        # cache the (converted) data, so it's not re-read from the numpy arrays each epoch
+        if shuffle_buffer_size is None:
+            shuffle_buffer_size = X.shape[0]
+        self.train_dataset = tf.data.Dataset.from_tensor_slices((X, Y)).cache()\
+            .shuffle(shuffle_buffer_size, reshuffle_each_iteration=True).repeat()
+
+        # number of optimisation steps taken (by the last call to optimise_parameters)
+        self._num_opt_steps = 0
+
         # ---
         # model
         # ---
@@ -1106,6 +1746,15 @@ class GPflowSVGPModel(GPflowGPRModel):
         evals = [elbo(minibatch).numpy() for minibatch in itertools.islice(train_iter, np.min([100, num_batches]))]
         return np.mean(evals)
 
+    def _train_batches(self) -> tf.data.Dataset:
+        # (infinite) dataset of training batches, prefetched so the next batch is prepared while training
+        if self.minibatch_size >= self.coords.shape[0]:
+            # full batch: no need to shuffle, use a single (constant) batch
+            ds = tf.data.Dataset.from_tensors((self.coords, self.obs)).repeat()
+        else:
+            ds = self.train_dataset.batch(self.minibatch_size, drop_remainder=True)
+        return ds.prefetch(tf.data.AUTOTUNE)
+
     def _fix_variational_parameters(self, fixed_params):
         if "inducing_points" in fixed_params:
             set_trainable(self.model.inducing_variable.Z, False)
@@ -1125,6 +1774,7 @@ class GPflowSVGPModel(GPflowGPRModel):
                             persistence=100,
                             check_every=10,
                             early_stop=True,
+                            elbo_ema_decay=0.9,
                             verbose=False):
         """
         Method to optimise the model parameters (kernel hyperparmeters + variational parameters).
@@ -1156,7 +1806,11 @@ class GPflowSVGPModel(GPflowGPRModel):
         persistence: int, default 100
             See **Notes** below.
         check_every: int, default 10
-            See **Notes** below.
+            Number of optimisation steps run in a single compiled (``tf.function``) call, after which the stopping
+            criterion is checked. See **Notes** below.
+        elbo_ema_decay: float, default 0.9
+            Decay of the exponential moving average of the ELBO used for the stopping criterion.
+            Larger values give a smoother, but slower to respond, estimate. See **Notes** below.
         verbose: bool, default False
             Set verbosity of model optimisation. If ``True``, displays the loss every ``check_every`` steps.
         
@@ -1170,8 +1824,10 @@ class GPflowSVGPModel(GPflowGPRModel):
         Since we use stochastic optimisation, traditional convergence criterion to stop early does not apply here.
         We instead devise a stopping criterion as follows:
 
-        - Check the ELBO every ``check_every`` iterations.
-        - If the ELBO does not improve after ``persistence`` iterations, stop optimisation.
+        - Run ``check_every`` iterations, recording the ELBO of each minibatch as it's evaluated for the
+          gradient step (so no additional ELBO evaluations are required).
+        - Update an exponential moving average (with decay ``elbo_ema_decay``) of the ELBO with the average of these.
+        - If the moving average of the ELBO does not improve after ``persistence`` iterations, stop optimisation.
 
         This stopping criterion will be enabled if ``early_stop`` is set to ``True``.
 
@@ -1196,54 +1852,77 @@ class GPflowSVGPModel(GPflowGPRModel):
         adam_vars = self.model.trainable_variables
         adam_opt = tf.optimizers.Adam(learning_rate)
 
-        train_iter = iter(self.train_dataset.batch(self.minibatch_size))
-        loss_fn = self.model.training_loss_closure(train_iter, compile=True)
+        # full batch: use the data directly, otherwise get (prefetched) minibatches from dataset
+        full_batch = self.minibatch_size >= self.coords.shape[0]
+        if full_batch:
+            data = (tf.constant(self.coords), tf.constant(self.obs))
+        else:
+            train_iter = iter(self._train_batches())
 
         @tf.function
-        def optimisation_step():
+        def optimisation_steps(num_steps):
             """
+            Run num_steps optimisation steps, each on a new minibatch, returning the average ELBO of the minibatches.
+            The steps run in a (compiled) loop, avoiding the overhead of a python call per step.
+
             Apply natural gradients to update the inducing mean + covariance (q_mu, q_sqrt)
             and the adam optimizer to update the model hyperparameters / inducing point locations.
             This allows for better + faster convergence.
             TODO: Double check. Just using adam seems more stable and quicker
             """
-            if natural_gradients:
-                natgrad_opt.minimize(loss_fn, variational_vars)
-            adam_opt.minimize(loss_fn, adam_vars)
-
-        # initialise the maximum elbo
+            elbo_sum = tf.constant(0, dtype=default_float())
+            for _ in tf.range(num_steps):
+                batch = data if full_batch else train_iter.get_next()
+                if natural_gradients:
+                    natgrad_opt.minimize(lambda: self.model.training_loss(batch), variational_vars)
+                with tf.GradientTape(watch_accessed_variables=False) as tape:
+                    tape.watch(adam_vars)
+                    loss = self.model.training_loss(batch)
+                grads = tape.gradient(loss, adam_vars)
+                adam_opt.apply_gradients(zip(grads, adam_vars))
+                elbo_sum += -loss
+            return elbo_sum / tf.cast(num_steps, elbo_sum.dtype)
+
+        # initialise the maximum (moving average of) elbo
         max_elbo = -np.inf
+        elbo_ema = None
         stopped_early = False
         max_count = 0
-        for step in range(max_iter):
-            optimisation_step()
-            if step % check_every == 0:
-                # loss_fn() will give the training_loss (negative elbo) for current batch
-                elbo = -loss_fn().numpy()
-                if np.isnan(elbo):
-                    print("Optimisation failed...")
+        step = 0
+        while step < max_iter:
+            num_steps = min(check_every, max_iter - step)
+            elbo = optimisation_steps(tf.constant(num_steps)).numpy()
+            step += num_steps
+            if np.isnan(elbo):
+                print("Optimisation failed...")
+                stopped_early = True
+                opt_success = False
+                break
+            elbo_ema = elbo if elbo_ema is None else elbo_ema_decay * elbo_ema + (1 - elbo_ema_decay) * elbo
+            if verbose:
+                print(f"step: {step},  elbo: {elbo:.2f}, elbo (moving average): {elbo_ema:.2f}")
+            # check if new elbo estimate is larger than previous
+            if (elbo_ema > max_elbo) and early_stop:
+                max_elbo = elbo_ema
+                max_count = 0
+            else:
+                max_count += num_steps
+                # stop optimisation if elbo hasn't increased for [persistence] steps
+                if (max_count >= persistence) and early_stop:
+                    print("objective did not improve stopping")
                     stopped_early = True
-                    opt_success = False
+                    opt_success = True
                     break
-                if verbose:
-                    print(f"step: {step},  elbo: {elbo:.2f}")
-                # check if new elbo estimate is larger than previous
-                if (elbo > max_elbo) and early_stop:
-                    max_elbo = elbo
-                    max_count = 0
-                else:
-                    max_count += check_every
-                    # stop optimisation if elbo hasn't increased for [persistence] steps
-                    if (max_count >= persistence) and early_stop:
-                        print("objective did not improve stopping")
-                        stopped_early = True
-                        opt_success = True
-                        break
 
         opt_success = opt_success if stopped_early else np.nan
+        self._num_opt_steps = step
 
         return opt_success
 
+    def get_run_details(self) -> dict:
+        """Returns the number of optimisation steps taken ("num_opt_steps"), 0 if not optimised."""
+        return {"num_opt_steps": self._num_opt_steps}
+
     @property
     def param_names(self) -> list:
         """
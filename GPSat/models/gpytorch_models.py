@@ -1,9 +1,12 @@
+import copy
 import inspect
+import math
 import numpy as np
 import pandas as pd
 import torch
 import gpytorch
 from gpytorch.kernels import ScaleKernel, GridInterpolationKernel
+from typing import List, Dict
 from GPSat.decorators import timer
 from GPSat.models import BaseGPRModel
 
@@ -27,6 +30,58 @@ class ExactGPR(gpytorch.models.ExactGP):
         return gpytorch.distributions.MultivariateNormal(mean_x, covar_x)
 
 
+class BatchExactGPR(torch.nn.Module):
+    """
+    Independent exact GPs for a batch of B datasets (e.g. local experts), each padded to a common size N.
+
+    Kernel, likelihood and mean modules should have ``batch_shape=[B]``, so each GP has its own hyperparameters.
+    Padded entries (``mask == 0``) are excluded by replacing their rows / columns in the covariance matrix
+    with those of the identity matrix, and setting their residuals to zero.
+    """
+    def __init__(self, train_x, train_y, mask, kernel, likelihood, mean=None):
+        super().__init__()
+        self.train_x = train_x
+        self.train_y = train_y
+        self.mask = mask
+        self.num_data = mask.sum(-1)
+        self.covar_module = kernel
+        self.likelihood = likelihood
+        self.mean_module = mean
+
+    def _mean(self):
+        if self.mean_module is None:
+            return torch.zeros(self.train_x.shape[0], dtype=self.train_x.dtype)
+        return self.mean_module.constant.reshape(-1)
+
+    def _chol_and_alpha(self):
+        # cholesky of (masked) K + noise I, and alpha = (K + noise I)^{-1} (y - m), each with a leading batch dim
+        mask = self.mask
+        K = self.covar_module(self.train_x).to_dense()
+        diag = self.likelihood.noise.reshape(-1, 1) * mask + (1 - mask)
+        K = K * mask[:, :, None] * mask[:, None, :] + torch.diag_embed(diag)
+        L = torch.linalg.cholesky(K)
+        r = (self.train_y - self._mean()[:, None]) * mask
+        alpha = torch.cholesky_solve(r[..., None], L)[..., 0]
+        return L, alpha, r
+
+    def neg_mll(self):
+        """Negative log marginal likelihood of each GP, divided by its number of observations, shape (B,)."""
+        L, alpha, r = self._chol_and_alpha()
+        mll = -0.5 * (r * alpha).sum(-1) \
+              - torch.log(torch.diagonal(L, dim1=-2, dim2=-1)).sum(-1) \
+              - 0.5 * self.num_data * math.log(2 * math.pi)
+        return -mll / self.num_data
+
+    def predict(self, x, x_mask):
+        """Marginal posterior mean and variance of f at (padded) locations x, each of shape (B, P)."""
+        L, alpha, _ = self._chol_and_alpha()
+        Kxs = self.covar_module(self.train_x, x).to_dense() * self.mask[:, :, None]
+        f_mean = self._mean()[:, None] + (Kxs * alpha[..., None]).sum(1)
+        v = torch.linalg.solve_triangular(L, Kxs, upper=False)
+        f_var = self.covar_module(x, diag=True) - (v ** 2).sum(1)
+        return f_mean * x_mask, f_var * x_mask
+
+
 # ---------- GPyTorch local expert models ----------
 
 class GPyTorchGPRModel(BaseGPRModel):
@@ -47,6 +102,8 @@ class GPyTorchGPRModel(BaseGPRModel):
                  mean_func_kwargs: dict=None,
                  noise_variance: float=None, # Variance of Gaussian likelihood. Unnecessary if likelihood is specified
                  likelihood: gpytorch.likelihoods.GaussianLikelihood=None,
+                 predict_batch_size: int=None,
+                 full_cov_memory_limit: float=None,
                  **kwargs):
         
         # --
@@ -60,7 +117,9 @@ class GPyTorchGPRModel(BaseGPRModel):
                          obs=obs,
                          coords_scale=coords_scale,
                          obs_scale=obs_scale,
-                         obs_mean=obs_mean)
+                         obs_mean=obs_mean,
+                         predict_batch_size=predict_batch_size,
+                         full_cov_memory_limit=full_cov_memory_limit)
 
         self.coords = torch.tensor(self.coords, requires_grad=False, dtype=torch.float32)
         self.obs = torch.tensor(self.obs, requires_grad=False, dtype=torch.float32).squeeze()
@@ -151,8 +210,12 @@ class GPyTorchGPRModel(BaseGPRModel):
         assert isinstance(coords, torch.Tensor), f"coords should be a torch tensor"
         coords = coords.type(self.coords.dtype)
 
+        # for many prediction locations: predict in batches, to limit memory use
+        if self._use_predict_batches(len(coords), full_cov=full_cov):
+            return self._predict_in_batches(coords, apply_scale=apply_scale)
+
         if apply_scale:
-            coords = coords / self.coords_scale
+            coords = coords / torch.as_tensor(self.coords_scale, dtype=coords.dtype)
 
         # Compute f* and y*
         with torch.no_grad(), gpytorch.settings.fast_pred_var():
@@ -214,6 +277,9 @@ class GPyTorchGPRModel(BaseGPRModel):
                     return loss
                 optimizer.step(closure)
 
+        # success if the objective (and so the parameters) is finite
+        return bool(np.isfinite(self.get_objective_function_value()))
+
     def get_objective_function_value(self):
         self.model.eval()
         mll = gpytorch.mlls.ExactMarginalLogLikelihood(self.likelihood, self.model)
@@ -222,6 +288,10 @@ class GPyTorchGPRModel(BaseGPRModel):
             loss = mll(output, self.obs.to(device))
         return loss.item()
 
+    def _predict_dtype(self) -> np.dtype:
+        # e.g. torch.float32 -> np.float32
+        return np.dtype(str(self.coords.dtype).replace("torch.", ""))
+
     # -----
     # Getters/setters for model hyperparameters
     # -----
@@ -235,15 +305,16 @@ class GPyTorchGPRModel(BaseGPRModel):
         """
         return self.model.covar_module.base_kernel.nu
 
-    def get_lengthscales(self):
-        return self.model.covar_module.base_kernel.lengthscale
+    # parameters are returned as numpy (float), so they can be stored
+    def get_lengthscales(self) -> np.ndarray:
+        return self.model.covar_module.base_kernel.lengthscale.detach().cpu().numpy().astype(float).reshape(-1)
 
-    def get_kernel_variance(self):
-        return self.model.covar_module.outputscale
+    def get_kernel_variance(self) -> float:
+        return float(self.model.covar_module.outputscale.detach().cpu())
+
+    def get_likelihood_variance(self) -> float:
+        return float(self.likelihood.noise.detach().cpu().reshape(-1)[0])
 
-    def get_likelihood_variance(self):
-        return self.likelihood.noise
-    
     def set_smoothness(self, smoothness):
         self.model.covar_module.base_kernel.nu = smoothness
 
@@ -296,27 +367,41 @@ class GPyTorchGPRModel(BaseGPRModel):
 
         return low, high
 
-    @timer
+    def _set_interval_constraint(self, param_name, module, raw_name, low, high,
+                                 move_within_tol=True, tol=1e-8, scale=False):
+        # register an Interval constraint, keeping the current parameter value (moved within bounds)
+        value = np.atleast_1d(np.asarray(self.get_parameters(param_name)[param_name], dtype=float))
+        low = np.broadcast_to(np.atleast_1d(np.asarray(low, dtype=float)), value.shape).copy()
+        high = np.broadcast_to(np.atleast_1d(np.asarray(high, dtype=float)), value.shape).copy()
+        assert np.all(low <= high), "all values in high constraint must be greater than low"
+
+        # scale the bound by the coordinate scale value
+        if scale:
+            low = low / self.coords_scale[0, :]
+            high = high / self.coords_scale[0, :]
+
+        if move_within_tol:
+            value = np.clip(value, low + tol, high - tol)
+
+        if param_name == "lengthscales":
+            bounds = (torch.tensor(low, dtype=torch.float32), torch.tensor(high, dtype=torch.float32))
+        else:
+            bounds = (float(low[0]), float(high[0]))
+            value = value[0]
+        module.register_constraint(raw_name, gpytorch.constraints.Interval(*bounds))
+        getattr(self, f"set_{param_name}")(value)
+
     def set_lengthscales_constraints(self, low, high, move_within_tol=True, tol=1e-8, scale=False):
-        (low, high) = self._preprocess_constraint('lengthscales', low, high, move_within_tol, tol, scale)
-        self.model.covar_module.base_kernel.register_constraint("raw_lengthscale",
-                                                                gpytorch.constraints.Interval(low, high)
-                                                                )
+        self._set_interval_constraint("lengthscales", self.model.covar_module.base_kernel, "raw_lengthscale",
+                                      low, high, move_within_tol=move_within_tol, tol=tol, scale=scale)
 
-    @timer
     def set_kernel_variance_constraints(self, low, high, move_within_tol=True, tol=1e-8, scale=False):
-        (low, high) = self._preprocess_constraint('kernel_variance', low, high, move_within_tol, tol, scale)
-        self.model.covar_module.register_constraint("raw_outputscale",
-                                                    gpytorch.constraints.Interval(low, high)
-                                                    )
+        self._set_interval_constraint("kernel_variance", self.model.covar_module, "raw_outputscale",
+                                      low, high, move_within_tol=move_within_tol, tol=tol, scale=scale)
 
-    @timer
     def set_likelihood_variance_constraints(self, low, high, move_within_tol=True, tol=1e-8, scale=False):
-        (low, high) = self._preprocess_constraint('likelihood_variance', low, high, move_within_tol, tol, scale)
-        self.model.likelihood.register_constraint("raw_noise",
-                                                  gpytorch.constraints.Interval(low, high)
-                                                  )
-
+        self._set_interval_constraint("likelihood_variance", self.likelihood.noise_covar, "raw_noise",
+                                      low, high, move_within_tol=move_within_tol, tol=tol, scale=scale)
 
 class GPyTorchKISSGPModel(GPyTorchGPRModel):
     @timer
@@ -386,6 +471,298 @@ class GPyTorchKISSGPModel(GPyTorchGPRModel):
                                                                 )
 
 
+class GPyTorchBatchGPRModel(GPyTorchGPRModel):
+    """
+    Exact GPR model using GPyTorch, where the hyperparameters of many (small) local experts are optimised,
+    and predictions made, together as a single batched model, rather than one expert at a time.
+
+    Each instance holds the data and parameters for a single local expert, and behaves as
+    :class:`~GPSat.models.gpytorch_models.GPyTorchGPRModel`. When used with
+    :func:`LocalExpertOI.run() <GPSat.local_experts.LocalExpertOI.run>`, experts are collected into batches
+    of (up to) ``expert_batch_size``, then optimised with :meth:`optimise_parameters_batch`
+    and predictions made with :meth:`predict_batch`.
+
+    Notes
+    -----
+    - Within a batch, the data of each expert is padded to the largest number of observations,
+      so the cost of a batch is O(B N_max^3), with B the number of experts in the batch.
+    - Each expert has its own hyperparameters, and stops being updated once its objective has converged.
+    - Only ``ConstantMean`` or ``ZeroMean`` mean functions and Gaussian likelihoods are supported in batch mode.
+
+    """
+
+    # LocalExpertOI will collect experts and use optimise_parameters_batch / predict_batch
+    batch_experts = True
+
+    @timer
+    def __init__(self,
+                 data=None,
+                 coords_col=None,
+                 obs_col=None,
+                 coords=None,
+                 obs=None,
+                 coords_scale=None,
+                 obs_scale=None,
+                 obs_mean=None,
+                 *,
+                 expert_batch_size: int = 32,
+                 **kwargs):
+        """
+        Parameters
+        ----------
+        expert_batch_size: int, default 32
+            Maximum number of local experts optimised (and predicted) together as a batch,
+            when run with :func:`LocalExpertOI.run() <GPSat.local_experts.LocalExpertOI.run>`.
+        kwargs: dict, optional
+            See :class:`~GPSat.models.gpytorch_models.GPyTorchGPRModel`.
+
+        """
+        super().__init__(data=data,
+                         coords_col=coords_col,
+                         obs_col=obs_col,
+                         coords=coords,
+                         obs=obs,
+                         coords_scale=coords_scale,
+                         obs_scale=obs_scale,
+                         obs_mean=obs_mean,
+                         **kwargs)
+        assert expert_batch_size >= 1, f"expert_batch_size must be >= 1, got: {expert_batch_size}"
+        self.expert_batch_size = expert_batch_size
+        # number of experts in the batch this model was last optimised with, and the steps it took
+        self.batch_size = 1
+        self.num_opt_steps = 0
+
+    # -----
+    # batched optimisation / prediction
+    # -----
+
+    @staticmethod
+    def _batch_module(models, dtype=torch.float64) -> BatchExactGPR:
+        # build a batched model from the current data and parameters of each model
+        B = len(models)
+        D = models[0].coords.shape[1]
+        N = max(len(m.coords) for m in models)
+
+        train_x = torch.zeros(B, N, D, dtype=dtype)
+        train_y = torch.zeros(B, N, dtype=dtype)
+        mask = torch.zeros(B, N, dtype=dtype)
+        for b, m in enumerate(models):
+            n = len(m.coords)
+            train_x[b, :n] = m.coords.to(dtype)
+            train_y[b, :n] = m.obs.reshape(-1).to(dtype)
+            mask[b, :n] = 1
+
+        # kernel: same type (and constraints) as the first model, with a batch dimension
+        base = models[0].model.covar_module.base_kernel
+        kernel_kwargs = {"nu": base.nu} if hasattr(base, "nu") else {}
+        for m in models[1:]:
+            assert type(m.model.covar_module.base_kernel) == type(base), "all models in a batch must use the same kernel"
+            if "nu" in kernel_kwargs:
+                assert m.model.covar_module.base_kernel.nu == base.nu, "all models in a batch must have same smoothness"
+        base_kernel = type(base)(ard_num_dims=D, batch_shape=torch.Size([B]), **kernel_kwargs)
+        base_kernel.register_constraint("raw_lengthscale", copy.deepcopy(base.raw_lengthscale_constraint))
+        kernel = ScaleKernel(base_kernel, batch_shape=torch.Size([B]))
+        kernel.register_constraint("raw_outputscale",
+                                   copy.deepcopy(models[0].model.covar_module.raw_outputscale_constraint))
+
+        # likelihood
+        for m in models:
+            assert isinstance(m.likelihood, gpytorch.likelihoods.GaussianLikelihood), \
+                "only GaussianLikelihood is supported in batch mode"
+        likelihood = gpytorch.likelihoods.GaussianLikelihood(
+            batch_shape=torch.Size([B]),
+            noise_constraint=copy.deepcopy(models[0].likelihood.noise_covar.raw_noise_constraint))
+
+        # mean
+        mean_module = models[0].model.mean_module
+        if isinstance(mean_module, gpytorch.means.ConstantMean):
+            mean = gpytorch.means.ConstantMean(batch_shape=torch.Size([B]))
+        elif isinstance(mean_module, gpytorch.means.ZeroMean):
+            mean = None
+        else:
+            raise NotImplementedError(f"mean function: {type(mean_module)} not supported in batch mode")
+
+        batch = BatchExactGPR(train_x, train_y, mask, kernel, likelihood, mean).to(dtype)
+
+        # initialise with the parameters of each model
+        with torch.no_grad():
+            kernel.base_kernel.lengthscale = torch.stack(
+                [m.model.covar_module.base_kernel.lengthscale.reshape(1, D) for m in models]).to(dtype)
+            kernel.outputscale = torch.stack([m.model.covar_module.outputscale.reshape(()) for m in models]).to(dtype)
+            likelihood.noise = torch.stack([m.likelihood.noise.reshape(1) for m in models]).to(dtype)
+            if mean is not None:
+                mean.constant = torch.stack([m.model.mean_module.constant.reshape(()) for m in models]).to(dtype)
+        return batch
+
+    @staticmethod
+    def _update_from_batch(models, batch: BatchExactGPR):
+        # write the (optimised) batch parameters back to each model
+        with torch.no_grad():
+            lengthscales = batch.covar_module.base_kernel.lengthscale
+            outputscale = batch.covar_module.outputscale
+            noise = batch.likelihood.noise.reshape(-1)
+            for b, m in enumerate(models):
+                dtype = m.coords.dtype
+                m.model.covar_module.base_kernel.lengthscale = lengthscales[b].to(dtype)
+                m.model.covar_module.outputscale = outputscale[b].to(dtype)
+                m.likelihood.noise = noise[b].reshape(1).to(dtype)
+                if batch.mean_module is not None:
+                    m.model.mean_module.constant = batch.mean_module.constant.reshape(-1)[b].to(dtype)
+
+    @classmethod
+    @timer
+    def optimise_parameters_batch(cls, models, optimiser="adam", iterations=30, learning_rate=0.1,
+                                  tol=1e-5, patience=5) -> List[bool]:
+        """
+        Optimise the hyperparameters of several models (local experts) together as a single batched model.
+
+        The objective is the sum over experts of each expert's negative log marginal likelihood
+        (divided by its number of observations, as in :meth:`optimise_parameters`), so the experts are independent.
+
+        Parameters
+        ----------
+        models: list of GPyTorchBatchGPRModel
+            Models to optimise, all using the same kernel type, mean function and constraints.
+        optimiser: str, default "adam"
+            Only ``"adam"`` is supported in batch mode.
+        iterations: int, default 30
+            Maximum number of optimisation steps.
+        learning_rate: float, default 0.1
+            Learning rate for Adam.
+        tol: float or None, default 1e-5
+            An expert is considered converged, and its parameters no longer updated, once the (relative) change
+            in its objective is below ``tol`` for ``patience`` consecutive steps, while the other experts continue.
+            Optimisation stops once all experts have converged. If ``None`` all experts take ``iterations`` steps.
+        patience: int, default 5
+            See ``tol``.
+
+        Returns
+        -------
+        list of bool
+            For each model, whether optimisation was successful: the objective is finite
+            (as for :meth:`optimise_parameters`, reaching ``iterations`` before converging is not a failure).
+            The number of steps each expert took is available from :meth:`get_run_details`.
+
+        """
+        assert optimiser == "adam", f"only optimiser='adam' is supported in batch mode, got: {optimiser}"
+        B = len(models)
+        batch = cls._batch_module(models)
+        params = [p for p in batch.parameters() if p.requires_grad]
+        optimizer = torch.optim.Adam(params, lr=learning_rate)
+
+        # experts still being optimised
+        active = torch.ones(B, dtype=torch.bool)
+        stall = torch.zeros(B, dtype=torch.int64)
+        num_steps = torch.zeros(B, dtype=torch.int64)
+        prev_loss = None
+        for i in range(iterations):
+            optimizer.zero_grad()
+            loss = batch.neg_mll()
+            loss.sum().backward()
+            frozen = [p.detach().clone() for p in params]
+            optimizer.step()
+            # keep the parameters of converged experts fixed (each parameter has a leading batch dimension)
+            with torch.no_grad():
+                for p, f in zip(params, frozen):
+                    p[~active] = f[~active]
+            num_steps += active
+
+            if tol is not None:
+                loss = loss.detach()
+                if prev_loss is not None:
+                    small = (prev_loss - loss).abs() <= tol * loss.abs().clamp(min=1)
+                    stall = torch.where(small, stall + 1, torch.zeros_like(stall))
+                    active &= stall < patience
+                prev_loss = loss
+                if not active.any():
+                    break
+
+        with torch.no_grad():
+            final_loss = batch.neg_mll()
+        success = torch.isfinite(final_loss)
+
+        cls._update_from_batch(models, batch)
+        for m, n in zip(models, num_steps.tolist()):
+            m.batch_size = B
+            m.num_opt_steps = n
+        return [bool(s) for s in success]
+
+    def _prediction_coords(self, coords, apply_scale=True) -> np.ndarray:
+        # prediction coordinates as (scaled) 2-d numpy array
+        if isinstance(coords, (pd.Series, pd.DataFrame)):
+            if self.coords_col is not None:
+                coords = coords[self.coords_col].values
+            else:
+                coords = coords.values
+        if isinstance(coords, torch.Tensor):
+            coords = coords.cpu().numpy()
+        coords = np.asarray(coords, dtype=float)
+        if coords.ndim == 1:
+            coords = coords[None, :]
+        if apply_scale:
+            coords = coords / self.coords_scale
+        return coords
+
+    @classmethod
+    @timer
+    def predict_batch(cls, models, coords, full_cov=False, apply_scale=True) -> List[Dict[str, np.ndarray]]:
+        """
+        Make (marginal) predictions for several models together as a single batched model.
+
+        Parameters
+        ----------
+        models: list of GPyTorchBatchGPRModel
+            Models to make predictions with.
+        coords: list
+            Prediction locations for each model, see :meth:`predict`.
+        full_cov: bool, default False
+            If ``True``, predictions are made one model at a time, with :meth:`predict`.
+        apply_scale: bool, default True
+            See :meth:`predict`.
+
+        Returns
+        -------
+        list of dict
+            For each model, the predictions as returned by :meth:`predict` (with ``full_cov=False``).
+
+        """
+        assert len(models) == len(coords), "models and coords must have the same length"
+        if full_cov:
+            return [m.predict(c, full_cov=True, apply_scale=apply_scale) for m, c in zip(models, coords)]
+
+        B = len(models)
+        x = [m._prediction_coords(c, apply_scale=apply_scale) for m, c in zip(models, coords)]
+        P = max(len(xi) for xi in x)
+        D = x[0].shape[1]
+        xs = np.zeros((B, P, D))
+        x_mask = np.zeros((B, P))
+        for b, xi in enumerate(x):
+            xs[b, :len(xi)] = xi
+            x_mask[b, :len(xi)] = 1
+
+        batch = cls._batch_module(models)
+        with torch.no_grad():
+            f_mean, f_var = batch.predict(torch.tensor(xs), torch.tensor(x_mask))
+            noise = batch.likelihood.noise.reshape(-1, 1)
+        f_mean, f_var, noise = f_mean.numpy(), f_var.numpy(), noise.numpy()
+
+        out = []
+        for b, (m, xi) in enumerate(zip(models, x)):
+            n = len(xi)
+            out.append({
+                "f*": f_mean[b, :n],
+                "f*_var": f_var[b, :n],
+                "y_var": f_var[b, :n] + noise[b],
+                "f_bar": m.obs_mean.item()
+            })
+        return out
+
+    def get_run_details(self) -> dict:
+        """Number of experts in the batch this model was optimised with ("batch_size"),
+        and the number of optimisation steps it took ("num_opt_steps")."""
+        return {"batch_size": self.batch_size, "num_opt_steps": self.num_opt_steps}
+
+
 if __name__ == "__main__":
     # Testing local experts
     import numpy as np
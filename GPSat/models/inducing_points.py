@@ -0,0 +1,299 @@
+# methods for selecting inducing point locations for sparse GP models (e.g. SGPR, SVGP)
+# - only require numpy / scipy, so can be used independent of the model backend
+
+import numpy as np
+
+from typing import Callable, Union
+
+
+# inducing point locations, relative to a reference location (e.g. the expert location),
+# which can be reused by neighbouring (local expert) models - see get_inducing_points
+# - values are tuples of (reference location, inducing points relative to it)
+_INDUCING_POINT_CACHE = {}
+
+INDUCING_POINT_METHODS = ["random", "kmeans++", "greedy_variance", "grid"]
+
+
+def _se_kernel(X1, X2):
+    # squared exponential kernel with unit lengthscales and variance, used if a kernel is not provided
+    d2 = np.sum(X1 ** 2, axis=1)[:, None] + np.sum(X2 ** 2, axis=1)[None, :] - 2 * X1 @ X2.T
+    return np.exp(-0.5 * np.maximum(d2, 0))
+
+
+def random_inducing_points(X: np.ndarray, num_inducing_points: int, rng: np.random.Generator) -> np.ndarray:
+    """Select inducing points as a random subset (without replacement) of the rows of ``X``."""
+    idx = rng.choice(len(X), size=num_inducing_points, replace=False)
+    return X[np.sort(idx)]
+
+
+def kmeans_inducing_points(X: np.ndarray, num_inducing_points: int, rng: np.random.Generator,
+                           kmeans_iter: int = 10) -> np.ndarray:
+    """
+    Select inducing points as the centroids of k-means clustering of ``X``, initialised with k-means++.
+
+    Parameters
+    ----------
+    X: np.ndarray
+        Locations (e.g. coordinates of observations) of shape (N, D).
+    num_inducing_points: int
+        Number of clusters (inducing points), M.
+    rng: np.random.Generator
+        Random number generator used for the k-means++ initialisation.
+    kmeans_iter: int, default 10
+        Number of (Lloyd) iterations of k-means to run after the k-means++ initialisation.
+
+    Returns
+    -------
+    np.ndarray
+        Inducing point locations of shape (M, D).
+
+    """
+    from scipy.cluster.vq import kmeans2
+    # drop duplicate locations, to avoid (near) empty clusters
+    Xu = np.unique(X, axis=0)
+    if len(Xu) <= num_inducing_points:
+        return Xu
+    centroids, _ = kmeans2(Xu, num_inducing_points, iter=kmeans_iter, minit="++", seed=rng)
+    return centroids
+
+
+def greedy_variance_inducing_points(X: np.ndarray, num_inducing_points: int,
+                                    kernel: Union[Callable, None] = None,
+                                    threshold: float = 1e-6) -> np.ndarray:
+    """
+    Select inducing points as a subset of the rows of ``X`` by greedily maximising the conditional variance,
+    i.e. a pivoted (partial) Cholesky decomposition of the kernel matrix, see [BRW'20].
+
+    Requires O(NM^2) computation and O(NM) memory, with N=len(X), M=num_inducing_points.
+
+    Parameters
+    ----------
+    X: np.ndarray
+        Locations (e.g. coordinates of observations) of shape (N, D).
+    num_inducing_points: int
+        Maximum number of inducing points, M.
+    kernel: callable, optional
+        Kernel function taking two arrays of shape (N1, D), (N2, D) and returning an array of shape (N1, N2).
+        If not provided a squared exponential kernel with unit lengthscales and variance is used,
+        which assumes ``X`` has been scaled appropriately.
+    threshold: float, default 1e-6
+        Stop selecting points once the largest conditional variance is below this value
+        (relative to the largest prior variance), in which case fewer than M points will be returned.
+
+    Returns
+    -------
+    np.ndarray
+        Inducing point locations of shape (M, D) (or fewer, see ``threshold``).
+
+    References
+    ----------
+    \\[BRW'20\\] Burt, D. R., Rasmussen, C. E., & van der Wilk, M. "Convergence of sparse variational inference in
+    Gaussian processes regression." Journal of Machine Learning Research 21 (2020).
+
+    """
+    if kernel is None:
+        kernel = _se_kernel
+
+    N = len(X)
+    # conditional (on selected points) variance of each location
+    # - only diagonal needed, evaluate in chunks to avoid forming N x N matrix
+    di = np.concatenate([np.diag(kernel(X[i:(i + 1000)], X[i:(i + 1000)])) for i in range(0, N, 1000)])
+    di = di.astype(float)
+    max_var = di.max()
+    ci = np.zeros((num_inducing_points, N))
+    idx = []
+    j = int(np.argmax(di))
+    for m in range(num_inducing_points):
+        if di[j] <= threshold * max_var:
+            break
+        idx.append(j)
+        kj = np.asarray(kernel(X[j:(j + 1)], X)).reshape(-1)
+        e = (kj - ci[:m, j] @ ci[:m]) / np.sqrt(di[j])
+        ci[m] = e
+        di = di - e ** 2
+        di[idx] = -np.inf
+        j = int(np.argmax(di))
+
+    return X[np.sort(idx)]
+
+
+def grid_inducing_points(X: np.ndarray, num_inducing_points: int) -> np.ndarray:
+    """
+    Select inducing points on a regular grid spanning the bounding box of ``X``.
+
+    The number of grid points along each dimension is proportional to the extent of ``X`` in that dimension,
+    so ``X`` should be scaled such that distances are comparable (e.g. by lengthscales).
+    If the grid has more than M points, those furthest from any location in ``X`` are dropped.
+
+    Parameters
+    ----------
+    X: np.ndarray
+        Locations (e.g. coordinates of observations) of shape (N, D).
+    num_inducing_points: int
+        Number of inducing points, M.
+
+    Returns
+    -------
+    np.ndarray
+        Inducing point locations of shape (M, D).
+
+    """
+    from scipy.spatial import cKDTree
+
+    lo, hi = X.min(axis=0), X.max(axis=0)
+    extent = hi - lo
+    has_extent = extent > 0
+    D = has_extent.sum()
+
+    # number of points along each dimension, with the product approximately num_inducing_points
+    n = np.ones(len(extent), dtype=int)
+    if D > 0:
+        step = (np.prod(extent[has_extent]) / num_inducing_points) ** (1 / D)
+        n[has_extent] = np.maximum(np.round(extent[has_extent] / step), 1).astype(int)
+        # increase the number of points along the longest dimensions until there are enough
+        while np.prod(n) < num_inducing_points:
+            n[np.argmax(np.where(has_extent, extent / n, -np.inf))] += 1
+
+    # grid points at the centre of each cell
+    axes = [lo[i] + (np.arange(n[i]) + 0.5) * extent[i] / n[i] for i in range(len(n))]
+    Z = np.stack([g.ravel() for g in np.meshgrid(*axes, indexing="ij")], axis=1)
+
+    if len(Z) > num_inducing_points:
+        d, _ = cKDTree(X).query(Z)
+        Z = Z[np.sort(np.argsort(d, kind="stable")[:num_inducing_points])]
+    return Z
+
+
+def select_inducing_points(X: np.ndarray,
+                           num_inducing_points: int,
+                           method: str = "random",
+                           seed: Union[int, None] = 0,
+                           kernel: Union[Callable, None] = None,
+                           **method_kwargs) -> np.ndarray:
+    """
+    Select inducing point locations for (data) locations ``X``.
+
+    Parameters
+    ----------
+    X: np.ndarray
+        Locations (e.g. coordinates of observations) of shape (N, D).
+    num_inducing_points: int
+        Number of inducing points, M. If greater than or equal to N then ``X`` is returned.
+    method: str, default "random"
+        One of:
+
+        - ``"random"``: a random subset of ``X``.
+        - ``"kmeans++"``: centroids of k-means clustering, initialised with k-means++.
+        - ``"greedy_variance"``: subset of ``X`` selected by greedily maximising conditional variance under ``kernel``.
+        - ``"grid"``: a regular grid covering ``X``.
+
+    seed: int, optional
+        Seed for the random number generator used by ``"random"`` and ``"kmeans++"``.
+    kernel: callable, optional
+        Kernel function used by ``"greedy_variance"``, see :func:`greedy_variance_inducing_points`.
+    method_kwargs: dict, optional
+        Additional keyword arguments for the selected method, e.g. ``kmeans_iter`` for ``"kmeans++"``.
+
+    Returns
+    -------
+    np.ndarray
+        Inducing point locations of shape (M, D) (fewer for ``"greedy_variance"`` if the conditional variance
+        becomes negligible).
+
+    """
+    assert method in INDUCING_POINT_METHODS, \
+        f"inducing point method: '{method}' not valid, must be one of: {INDUCING_POINT_METHODS}"
+
+    if len(X) <= num_inducing_points:
+        return X
+
+    rng = np.random.default_rng(seed)
+    if method == "random":
+        return random_inducing_points(X, num_inducing_points, rng)
+    elif method == "kmeans++":
+        return kmeans_inducing_points(X, num_inducing_points, rng, **method_kwargs)
+    elif method == "greedy_variance":
+        return greedy_variance_inducing_points(X, num_inducing_points, kernel=kernel, **method_kwargs)
+    else:
+        return grid_inducing_points(X, num_inducing_points)
+
+
+def get_inducing_points(X: np.ndarray,
+                        num_inducing_points: int,
+                        method: str = "random",
+                        seed: Union[int, None] = 0,
+                        kernel: Union[Callable, None] = None,
+                        reference_location: Union[np.ndarray, None] = None,
+                        reuse: bool = False,
+                        reuse_key=None,
+                        **method_kwargs) -> np.ndarray:
+    """
+    Get inducing point locations for (data) locations ``X``, either selected with :func:`select_inducing_points`
+    or, if ``reuse=True``, reusing those previously selected for another (e.g. neighbouring expert) model.
+
+    Reused inducing points are stored relative to ``reference_location`` (e.g. the expert location),
+    and shifted to the current ``reference_location``. Only inducing points selected (or updated with
+    :func:`cache_inducing_points`) with the same ``method``, ``num_inducing_points``, dimension and ``reuse_key``
+    are reused, and only if they were stored for a neighbouring location, i.e. one within the bounding box of ``X``.
+
+    Parameters
+    ----------
+    X: np.ndarray
+        Locations of shape (N, D).
+    num_inducing_points: int
+        Number of inducing points, M.
+    method: str, default "random"
+        See :func:`select_inducing_points`.
+    seed: int, optional
+        See :func:`select_inducing_points`.
+    kernel: callable, optional
+        See :func:`select_inducing_points`.
+    reference_location: np.ndarray, optional
+        Location, of shape (D,), the inducing points are stored relative to. Default is the mean of ``X``.
+    reuse: bool, default False
+        If ``True``, reuse inducing points previously selected with the same settings, if available,
+        otherwise select and store them to be reused.
+    reuse_key: hashable, optional
+        Additional key identifying which inducing points can be reused, e.g. the scaling applied to ``X``,
+        so those selected for unrelated data are not reused.
+    method_kwargs: dict, optional
+        See :func:`select_inducing_points`.
+
+    Returns
+    -------
+    np.ndarray
+        Inducing point locations of shape (M, D).
+
+    """
+    if reference_location is None:
+        reference_location = X.mean(axis=0)
+    reference_location = np.asarray(reference_location, dtype=float).reshape(-1)
+
+    cached = _INDUCING_POINT_CACHE.get((method, num_inducing_points, X.shape[1], reuse_key)) if reuse else None
+    if (cached is not None) and (len(X) > num_inducing_points):
+        cached_loc, Z = cached
+        # only reuse those stored for a neighbouring location
+        if np.all((cached_loc >= X.min(axis=0)) & (cached_loc <= X.max(axis=0))):
+            return Z + reference_location
+
+    Z = select_inducing_points(X, num_inducing_points, method=method, seed=seed, kernel=kernel, **method_kwargs)
+    # only store if a full set of inducing points was selected
+    if reuse and (len(Z) == num_inducing_points):
+        cache_inducing_points(Z, method, num_inducing_points, reference_location, reuse_key=reuse_key)
+    return Z
+
+
+def cache_inducing_points(Z: np.ndarray, method: str, num_inducing_points: int, reference_location: np.ndarray,
+                          reuse_key=None):
+    """
+    Store inducing point locations ``Z`` (e.g. after optimisation), relative to ``reference_location``,
+    to be reused by :func:`get_inducing_points` with ``reuse=True`` (and the same ``reuse_key``).
+    """
+    reference_location = np.asarray(reference_location, dtype=float).reshape(-1)
+    _INDUCING_POINT_CACHE[(method, num_inducing_points, Z.shape[1], reuse_key)] = \
+        (reference_location, np.array(Z, dtype=float) - reference_location)
+
+
+def clear_inducing_point_cache():
+    """Remove all stored inducing point locations, see :func:`get_inducing_points`."""
+    _INDUCING_POINT_CACHE.clear()
@@ -0,0 +1,587 @@
+# State space (Kalman filter / smoother) spatio-temporal GPR, for experts with long time windows
+import gpflow
+import numpy as np
+import tensorflow as tf
+
+from gpflow.config import default_float, default_jitter
+from gpflow.utilities.ops import square_distance
+from gpflow.models.training_mixins import InternalDataTrainingLossMixin
+
+from GPSat.decorators import timer
+from GPSat.models import BaseGPRModel
+from GPSat.models.gpflow_models import GPflowGPRModel
+from GPSat.models.inducing_points import select_inducing_points
+
+# correlation functions of (scaled) distance r
+_CORRELATIONS = {
+    "Matern12": lambda r: tf.exp(-r),
+    "Matern32": lambda r: (1. + np.sqrt(3.) * r) * tf.exp(-np.sqrt(3.) * r),
+    "Matern52": lambda r: (1. + np.sqrt(5.) * r + 5. / 3. * tf.square(r)) * tf.exp(-np.sqrt(5.) * r),
+    "SquaredExponential": lambda r: tf.exp(-0.5 * tf.square(r)),
+}
+
+# kernels with an (exact) state space form
+STATE_SPACE_KERNELS = ["Matern12", "Matern32", "Matern52"]
+
+
+def matern_state_space(kernel, lengthscale):
+    """
+    State space form of a (unit variance) Matern kernel in one dimension, i.e. the feedback matrix F and the
+    stationary state covariance P_inf of the stochastic differential equation dx/dt = F x + L w, with f = x[0].
+
+    Parameters
+    ----------
+    kernel: str
+        One of "Matern12", "Matern32" or "Matern52", with state dimension 1, 2 and 3 respectively.
+    lengthscale: tf.Tensor
+        Scalar lengthscale.
+
+    Returns
+    -------
+    tuple of tf.Tensor
+        F and P_inf, each of shape (d, d).
+    """
+    assert kernel in STATE_SPACE_KERNELS, \
+        f"kernel: {kernel} does not have a state space form, must be one of {STATE_SPACE_KERNELS}"
+    one, zero = tf.ones_like(lengthscale), tf.zeros_like(lengthscale)
+    if kernel == "Matern12":
+        lam = 1. / lengthscale
+        F = [[-lam]]
+        P_inf = [[one]]
+    elif kernel == "Matern32":
+        lam = np.sqrt(3.) / lengthscale
+        F = [[zero, one],
+             [-lam ** 2, -2. * lam]]
+        P_inf = [[one, zero],
+                 [zero, lam ** 2]]
+    else:
+        lam = np.sqrt(5.) / lengthscale
+        F = [[zero, one, zero],
+             [zero, zero, one],
+             [-lam ** 3, -3. * lam ** 2, -3. * lam]]
+        P_inf = [[one, zero, -lam ** 2 / 3.],
+                 [zero, lam ** 2 / 3., zero],
+                 [-lam ** 2 / 3., zero, lam ** 4]]
+    return tf.stack([tf.stack(row) for row in F]), tf.stack([tf.stack(row) for row in P_inf])
+
+
+class SeparableSpaceTime(gpflow.kernels.Stationary):
+    def __init__(self, variance=1.0, lengthscales=1.0, space_kernel="Matern32", time_kernel="Matern32",
+                 time_dim=-1, **kwargs):
+        """
+        Separable spatio-temporal kernel:
+
+            k((x, t), (x', t')) = variance * c_s(|x - x'|) * c_t(|t - t'|)
+
+        where c_s and c_t are (unit variance) correlation functions of the scaled distance in space and in time,
+        with lengthscales for each dimension, including time.
+
+        Parameters
+        ----------
+        space_kernel: str, default "Matern32"
+            Spatial correlation, one of "Matern12", "Matern32", "Matern52" or "SquaredExponential".
+        time_kernel: str, default "Matern32"
+            Temporal correlation, one of "Matern12", "Matern32" or "Matern52" (kernels with a state space form).
+        time_dim: int, default -1
+            Index of the time dimension of the inputs.
+        """
+        assert space_kernel in _CORRELATIONS, \
+            f"space_kernel: {space_kernel} not implemented, must be one of {list(_CORRELATIONS)}"
+        assert time_kernel in STATE_SPACE_KERNELS, \
+            f"time_kernel: {time_kernel} not implemented, must be one of {STATE_SPACE_KERNELS}"
+        assert np.size(lengthscales) > 1, "lengthscales must be given for each dimension (space and time)"
+        super().__init__(variance=variance, lengthscales=lengthscales, **kwargs)
+        self.space_kernel = space_kernel
+        self.time_kernel = time_kernel
+        self.time_dim = time_dim
+
+    def split(self, X):
+        """Split (unscaled) inputs X into the spatial inputs and the time input."""
+        return tf.gather(X, self._space_dims(X.shape[-1]), axis=-1), X[..., self.time_dim % X.shape[-1]]
+
+    def _space_dims(self, D):
+        return [d for d in range(D) if d != self.time_dim % D]
+
+    def space_lengthscales(self):
+        return tf.gather(self.lengthscales, self._space_dims(self.lengthscales.shape[0]))
+
+    def time_lengthscale(self):
+        return self.lengthscales[self.time_dim % self.lengthscales.shape[0]]
+
+    def K_space(self, Xs, Xs2=None):
+        """Spatial correlation between spatial inputs Xs and Xs2, i.e. without the variance."""
+        ls = self.space_lengthscales()
+        r2 = square_distance(Xs / ls, None if Xs2 is None else Xs2 / ls)
+        return _CORRELATIONS[self.space_kernel](tf.sqrt(tf.maximum(r2, 1e-36)))
+
+    def K_time(self, t, t2=None):
+        """Temporal correlation between times t and t2."""
+        t2 = t if t2 is None else t2
+        r = tf.abs(t[:, None] - t2[None, :]) / self.time_lengthscale()
+        return _CORRELATIONS[self.time_kernel](r)
+
+    def K(self, X, X2=None):
+        Xs, t = self.split(X)
+        Xs2, t2 = (None, None) if X2 is None else self.split(X2)
+        return self.variance * self.K_space(Xs, Xs2) * self.K_time(t, t2)
+
+    def state_space(self):
+        """Temporal state space form (F, P_inf), see matern_state_space."""
+        return matern_state_space(self.time_kernel, self.time_lengthscale())
+
+
+class KalmanGPR(gpflow.models.GPModel, InternalDataTrainingLossMixin):
+    def __init__(self, data, kernel: SeparableSpaceTime, inducing_points, mean_function=None,
+                 noise_variance=None, likelihood=None):
+        """
+        Spatio-temporal GPR with a separable kernel, as Kalman filtering and smoothing over time.
+
+        The latent function at each time, at the spatial inducing points Z, together with its time
+        derivatives, is the state of a linear Gaussian state space model (exact for a Matern kernel in time).
+        Observations depend on the state through f(x, t) ~ k_s(x, Z) K_ZZ^-1 f(Z, t), giving the collapsed
+        (SGPR) variational bound, with inducing variables f(Z, t) at all times:
+
+            ELBO = log N(y | 0, Q_ff + noise_variance I) - tr(K_ff - Q_ff) / (2 noise_variance)
+
+        which is computed by a Kalman filter. This requires O(N M^2 + T (M d)^3) computation for N observations
+        at T distinct times, M inducing points and temporal state dimension d. If Z contains all of the
+        observation (spatial) locations the bound is the exact log marginal likelihood.
+
+        Parameters
+        ----------
+        kernel: SeparableSpaceTime
+            Separable spatio-temporal kernel.
+        inducing_points: np.ndarray
+            Spatial inducing point locations Z, of shape (M, D-1), i.e. excluding the time dimension.
+        """
+        assert isinstance(kernel, SeparableSpaceTime), \
+            f"kernel: {kernel.__class__.__name__} not implemented, must be SeparableSpaceTime"
+        assert data[1].shape[-1] == 1, f"only single output supported, got: {data[1].shape[-1]}"
+
+        if likelihood is None:
+            if noise_variance is None:
+                noise_variance = 1.0
+            likelihood = gpflow.likelihoods.Gaussian(noise_variance)
+        super().__init__(kernel, likelihood, mean_function, num_latent_gps=1)
+
+        self.inducing_points = tf.constant(np.asarray(inducing_points, dtype=default_float()))
+        self.set_data(data)
+
+    def set_data(self, data):
+        """Set the observations, grouping them by (distinct) time."""
+        X, Y = [np.asarray(d, dtype=default_float()) for d in data]
+        t = np.asarray(self.kernel.split(X)[1])
+
+        times, time_index = np.unique(t, return_inverse=True)
+        time_index = time_index.reshape(-1)
+        counts = np.bincount(time_index, minlength=len(times))
+
+        # observations grouped by time, padded to the largest group: indices of shape (T, n_max), with mask
+        order = np.argsort(time_index, kind="stable")
+        start = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        pos = np.arange(len(t)) - np.repeat(start, counts)
+        group_index = np.zeros((len(times), counts.max()), dtype=int)
+        group_mask = np.zeros((len(times), counts.max()), dtype=default_float())
+        group_index[time_index[order], pos] = order
+        group_mask[time_index[order], pos] = 1.
+
+        self.data = (tf.constant(X), tf.constant(Y))
+        self.times = times
+        self._group_index = tf.constant(group_index)
+        self._group_mask = tf.constant(group_mask)
+        self._prediction_cache = None
+
+    @property
+    def num_time_steps(self):
+        return len(self.times)
+
+    def _projection(self, X):
+        # A = k_s(X, Z) K_ZZ^-1 and the residual spatial variance, 1 - diag(Q_ss), of shape (N, M) and (N,)
+        Z = self.inducing_points
+        Lz = tf.linalg.cholesky(self.kernel.K_space(Z) + default_jitter() * tf.eye(tf.shape(Z)[0],
+                                                                                    dtype=default_float()))
+        tmp = tf.linalg.triangular_solve(Lz, self.kernel.K_space(Z, self.kernel.split(X)[0]))
+        A = tf.transpose(tf.linalg.triangular_solve(Lz, tmp, adjoint=True))
+        return A, 1. - tf.reduce_sum(tf.square(tmp), axis=0)
+
+    def _transitions(self, times):
+        # transition matrices and process noise between consecutive times, each of shape (T, d, d)
+        # - the first step is from the stationary distribution
+        F, P_inf = self.kernel.state_space()
+        dt = tf.constant(np.diff(times), dtype=default_float())
+        As = tf.linalg.expm(dt[:, None, None] * F[None])
+        Qs = P_inf[None] - As @ P_inf[None] @ tf.linalg.matrix_transpose(As)
+        As = tf.concat([tf.zeros_like(F)[None], As], axis=0)
+        Qs = tf.concat([P_inf[None], Qs], axis=0)
+        return As, Qs
+
+    def _observation_stats(self):
+        # per time sufficient statistics of the observations: A^T A, A^T r, r^T r and count,
+        # for residuals r = y - mean_function(x), as well as the trace term of the bound
+        X, Y = self.data
+        A, resid_var = self._projection(X)
+        r = (Y - self.mean_function(X))[:, 0]
+
+        mask = self._group_mask
+        A_g = tf.gather(A, self._group_index) * mask[..., None]
+        r_g = tf.gather(r, self._group_index) * mask
+        AtA = tf.einsum("tnm,tnk->tmk", A_g, A_g)
+        Aty = tf.einsum("tnm,tn->tm", A_g, r_g)
+        yty = tf.reduce_sum(tf.square(r_g), axis=1)
+        n = tf.reduce_sum(mask, axis=1)
+        trace = self.kernel.variance * tf.reduce_sum(resid_var)
+        return (AtA, Aty, yty, n), trace
+
+    def _kalman_filter(self, times, stats, return_states=False):
+        # Kalman filter over times, with observations summarised by their sufficient statistics (see
+        # _observation_stats). The state, of shape (M, d), has covariance (M, d, M, d); at the first time it is
+        # K_ZZ (x) P_inf, with the (Kronecker structured) transitions I (x) A and process noise K_ZZ (x) Q.
+        # Updates only involve the function values, f(Z, t) = state[:, 0], and are (M, M) computations.
+        Z = self.inducing_points
+        M = tf.shape(Z)[0]
+        eye = tf.eye(M, dtype=default_float())
+        Kzz = self.kernel.variance * (self.kernel.K_space(Z) + default_jitter() * eye)
+        s2 = self.likelihood.variance
+        As, Qs = self._transitions(times)
+        d = tf.shape(As)[1]
+
+        def step(carry, elems):
+            m, P, _ = carry[:3]
+            A, Q, AtA, Aty, yty, n = elems
+
+            # predict
+            m_pred = tf.matmul(m, A, transpose_b=True)
+            P_pred = tf.einsum("ij,ajbk,lk->aibl", A, P, A) + Kzz[:, None, :, None] * Q[None, :, None, :]
+
+            # update, using Woodbury's identity for S = A_t P_ff A_t^T + s2 I, the covariance of y_t
+            mu = m_pred[:, 0]
+            L = tf.linalg.cholesky(P_pred[:, 0, :, 0] + default_jitter() * eye)
+            C = tf.linalg.cholesky(eye + tf.matmul(L, AtA @ L, transpose_a=True) / s2)
+            Atr = Aty - tf.linalg.matvec(AtA, mu)
+            rtr = yty - 2. * tf.reduce_sum(mu * Aty) + tf.reduce_sum(mu * tf.linalg.matvec(AtA, mu))
+            V = tf.linalg.triangular_solve(C, tf.matmul(L, AtA, transpose_a=True)) / s2
+            w = tf.linalg.triangular_solve(C, tf.linalg.matvec(L, Atr, transpose_a=True)[:, None])[:, 0] / s2
+
+            log_det = n * tf.math.log(s2) + 2. * tf.reduce_sum(tf.math.log(tf.linalg.diag_part(C)))
+            quad = rtr / s2 - tf.reduce_sum(tf.square(w))
+            log_lik = -0.5 * (n * np.log(2 * np.pi) + log_det + quad)
+
+            # A_t^T S^-1 A_t and A_t^T S^-1 r
+            W = AtA / s2 - tf.matmul(V, V, transpose_a=True)
+            g = Atr / s2 - tf.linalg.matvec(V, w, transpose_a=True)
+            P_f = P_pred[:, :, :, 0]
+            m_new = m_pred + tf.einsum("aib,b->ai", P_f, g)
+            P_new = P_pred - tf.einsum("aic,ce,bje->aibj", P_f, W, P_f)
+            P_new = 0.5 * (P_new + tf.transpose(P_new, [2, 3, 0, 1]))
+
+            if return_states:
+                return m_new, P_new, log_lik, m_pred, P_pred
+            return m_new, P_new, log_lik
+
+        init = (tf.zeros([M, d], dtype=default_float()),
+                tf.zeros([M, d, M, d], dtype=default_float()),
+                tf.zeros([], dtype=default_float()))
+        if return_states:
+            init = init + (init[0], init[1])
+        return tf.scan(step, (As, Qs) + tuple(stats), initializer=init), As
+
+    def maximum_log_likelihood_objective(self):
+        return self.elbo()
+
+    def elbo(self):
+        """Collapsed variational lower bound of the log marginal likelihood, computed by Kalman filtering."""
+        stats, trace = self._observation_stats()
+        out, _ = self._kalman_filter(self.times, stats)
+        return tf.reduce_sum(out[2]) - 0.5 * trace / self.likelihood.variance
+
+    def _smoothed_function(self, times):
+        # smoothed (posterior) mean and covariance of f(Z, t), of shape (T, M) and (T, M, M), at (sorted) times,
+        # which must include all observation times
+        (AtA, Aty, yty, n), _ = self._observation_stats()
+        index = np.searchsorted(times, self.times)[:, None]
+        T = len(times)
+        stats = [tf.scatter_nd(index, s, [T] + s.shape[1:].as_list()) for s in (AtA, Aty, yty, n)]
+        (m_f, P_f, _, m_p, P_p), As = self._kalman_filter(times, stats, return_states=True)
+
+        # Rauch-Tung-Striebel smoother, with the state flattened to length D = M d
+        M, d = m_f.shape[1], m_f.shape[2]
+        D = M * d
+        m_f, m_p = tf.reshape(m_f, [T, D]), tf.reshape(m_p, [T, D])
+        P_f, P_p = tf.reshape(P_f, [T, D, D]), tf.reshape(P_p, [T, D, D])
+        eye = tf.eye(D, dtype=default_float())
+
+        def step(carry, elems):
+            m_s, P_s = carry
+            mf, Pf, mp, Pp, A = elems
+            Phi = tf.linalg.LinearOperatorKronecker([tf.linalg.LinearOperatorIdentity(M, dtype=default_float()),
+                                                     tf.linalg.LinearOperatorFullMatrix(A)]).to_dense()
+            # G = P_f Phi^T P_pred^-1
+            G = tf.transpose(tf.linalg.cholesky_solve(tf.linalg.cholesky(Pp + default_jitter() * eye), Phi @ Pf))
+            m_s = mf + tf.linalg.matvec(G, m_s - mp)
+            P_s = Pf + G @ (P_s - Pp) @ tf.transpose(G)
+            return m_s, P_s
+
+        if T > 1:
+            m_s, P_s = tf.scan(step, (m_f[:-1], P_f[:-1], m_p[1:], P_p[1:], As[1:]),
+                               initializer=(m_f[-1], P_f[-1]), reverse=True)
+            m_s, P_s = tf.concat([m_s, m_f[-1:]], axis=0), tf.concat([P_s, P_f[-1:]], axis=0)
+        else:
+            m_s, P_s = m_f, P_f
+
+        # function values are every d-th element of the state
+        m_s = tf.reshape(m_s, [T, M, d])[:, :, 0]
+        P_s = tf.reshape(P_s, [T, M, d, M, d])[:, :, 0, :, 0]
+        return m_s, P_s
+
+    def predict_f(self, Xnew, full_cov=False, full_output_cov=False):
+        """Prediction at each location, from the smoothed function values at the inducing points at its time."""
+        assert not full_output_cov
+        if full_cov:
+            raise NotImplementedError("full_cov=True not implemented for KalmanGPR")
+        Xnew = np.asarray(Xnew, dtype=default_float())
+
+        # predictions at the same locations, with the same parameters, are reused, e.g. by predict_y
+        key = (Xnew.tobytes(), tuple(p.numpy().tobytes() for p in self.parameters))
+        if (self._prediction_cache is not None) and (self._prediction_cache[0] == key):
+            return self._prediction_cache[1]
+
+        t_new = np.asarray(self.kernel.split(Xnew)[1])
+        times, time_index = np.unique(np.concatenate([self.times, t_new]), return_inverse=True)
+        time_index = time_index.reshape(-1)[len(self.times):]
+        m_s, P_s = self._smoothed_function(times)
+
+        A, resid_var = self._projection(Xnew)
+        mean = self.mean_function(Xnew)[:, 0] + tf.reduce_sum(A * tf.gather(m_s, time_index), axis=1)
+        # variance of A f(Z, t), computed for each (distinct) time, plus the residual variance (K_ss - Q_ss)
+        var = np.empty(len(Xnew))
+        for i in np.unique(time_index):
+            select = time_index == i
+            A_i = tf.boolean_mask(A, select)
+            var[select] = tf.reduce_sum((A_i @ P_s[i]) * A_i, axis=1).numpy()
+        var = var + self.kernel.variance * resid_var
+
+        out = mean[:, None], var[:, None]
+        self._prediction_cache = (key, out)
+        return out
+
+
+class GPflowKalmanModel(GPflowGPRModel):
+    """
+    Model for spatio-temporal observations with long time windows, e.g. experts with ``coords_col=['x','y','t']``
+    using many days of observations. GP regression with a separable kernel (a Matern in time) is done by Kalman
+    filtering and smoothing over time, so computation is linear, rather than cubic, in the number of time steps.
+
+    Each time slice is represented by a spatial inducing basis (as in SGPR), at the observations' spatial locations
+    if there are at most ``num_inducing_points`` of them, in which case the model is exact.
+
+    Has the same hyperparameters as :class:`~GPSat.models.gpflow_models.GPflowGPRModel` ("lengthscales", one for
+    each coordinate including time, "kernel_variance" and "likelihood_variance"), so can be used in its place.
+
+    See :class:`~GPSat.models.base_model.BaseGPRModel` for a complete list of attributes and methods.
+
+    Notes
+    -----
+    - Has O(N M^2 + T (M d)^3) computational complexity and O(T (M d)^2) memory scaling, for T distinct observation
+      times, M spatial inducing points and temporal state dimension d (1, 2 or 3 for Matern12, 32 or 52).
+    - Each distinct time is a filter step, so times should be discretised (e.g. to days) for T << N.
+    - The kernel is separable: variance * c_s(x, x') * c_t(t, t'), unlike the GPflowGPRModel kernel of the scaled
+      distance in all dimensions.
+    - ``full_cov`` predictions are not supported.
+
+    References
+    ----------
+    \\[HS'10\\] Hartikainen, Jouni, and Simo Särkkä. "Kalman filtering and smoothing solutions to temporal
+    Gaussian process regression models." IEEE International Workshop on Machine Learning for Signal Processing, 2010.
+
+    \\[T'09\\] Titsias, Michalis. "Variational learning of inducing variables in sparse Gaussian processes."
+    Artificial intelligence and statistics. PMLR, 2009.
+
+    """
+    @timer
+    def __init__(self,
+                 data=None,
+                 coords_col=None,
+                 obs_col=None,
+                 coords=None,
+                 obs=None,
+                 coords_scale=None,
+                 obs_scale=None,
+                 obs_mean=None,
+                 verbose=True,
+                 *,
+                 kernel="Matern32",
+                 time_kernel=None,
+                 time_col=None,
+                 kernel_kwargs=None,
+                 num_inducing_points=500,
+                 inducing_point_method="random",
+                 inducing_point_seed=0,
+                 mean_function=None,
+                 mean_func_kwargs=None,
+                 noise_variance=None,
+                 likelihood: gpflow.likelihoods.Gaussian=None,
+                 predict_batch_size=None,
+                 full_cov_memory_limit=None,
+                 **kwargs):
+        """
+        Parameters
+        ----------
+        data
+            See :func:`BaseGPRModel.__init__() <GPSat.models.base_model.BaseGPRModel.__init__>`
+        coords_col
+            See :func:`BaseGPRModel.__init__() <GPSat.models.base_model.BaseGPRModel.__init__>`
+        obs_col
+            See :func:`BaseGPRModel.__init__() <GPSat.models.base_model.BaseGPRModel.__init__>`
+        coords
+            See :func:`BaseGPRModel.__init__() <GPSat.models.base_model.BaseGPRModel.__init__>`
+        obs
+            See :func:`BaseGPRModel.__init__() <GPSat.models.base_model.BaseGPRModel.__init__>`
+        coords_scale
+            See :func:`BaseGPRModel.__init__() <GPSat.models.base_model.BaseGPRModel.__init__>`
+        obs_scale
+            See :func:`BaseGPRModel.__init__() <GPSat.models.base_model.BaseGPRModel.__init__>`
+        obs_mean
+            See :func:`BaseGPRModel.__init__() <GPSat.models.base_model.BaseGPRModel.__init__>`
+        verbose
+            See :func:`BaseGPRModel.__init__() <GPSat.models.base_model.BaseGPRModel.__init__>`
+        kernel: str, default "Matern32"
+            Spatial correlation: "Matern12", "Matern32", "Matern52" or "SquaredExponential".
+            Also used in time if ``time_kernel`` is not specified.
+        time_kernel: str, optional
+            Temporal correlation: "Matern12", "Matern32" or "Matern52".
+        time_col: str or int, optional
+            Name (in ``coords_col``) or index of the time coordinate. Default is the last coordinate.
+        kernel_kwargs: dict, optional
+            Keyword arguments for :class:`SeparableSpaceTime`, e.g. ``lengthscales`` and ``variance``.
+        num_inducing_points: int, default 500
+            Maximum number of spatial inducing points. If there are at most this many distinct spatial
+            observation locations they are used as inducing points.
+        inducing_point_method: str, default "random"
+            Method used to select the spatial inducing points from the distinct spatial locations,
+            see :func:`~GPSat.models.inducing_points.select_inducing_points`.
+        inducing_point_seed: int, default 0
+            Seed used by ``"random"`` and ``"kmeans++"`` inducing point selection.
+        mean_function
+            See :func:`GPflowGPRModel.__init__() <GPSat.models.gpflow_models.GPflowGPRModel.__init__>`
+        mean_func_kwargs
+            See :func:`GPflowGPRModel.__init__() <GPSat.models.gpflow_models.GPflowGPRModel.__init__>`
+        noise_variance
+            See :func:`GPflowGPRModel.__init__() <GPSat.models.gpflow_models.GPflowGPRModel.__init__>`
+        likelihood
+            See :func:`GPflowGPRModel.__init__() <GPSat.models.gpflow_models.GPflowGPRModel.__init__>`
+        predict_batch_size
+            See :func:`BaseGPRModel.__init__() <GPSat.models.base_model.BaseGPRModel.__init__>`
+        full_cov_memory_limit
+            See :func:`BaseGPRModel.__init__() <GPSat.models.base_model.BaseGPRModel.__init__>`
+
+        """
+        self._check_unsupported_options(kwargs, pad_to_bucket=False, precision="float64")
+
+        # --
+        # set data
+        # --
+
+        BaseGPRModel.__init__(self,
+                              data=data,
+                              coords_col=coords_col,
+                              obs_col=obs_col,
+                              coords=coords,
+                              obs=obs,
+                              coords_scale=coords_scale,
+                              obs_scale=obs_scale,
+                              obs_mean=obs_mean,
+                              verbose=verbose,
+                              predict_batch_size=predict_batch_size,
+                              full_cov_memory_limit=full_cov_memory_limit)
+
+        # --
+        # set kernel
+        # --
+
+        D = self.coords.shape[1]
+        assert D > 1, "coords must include (at least) one spatial dimension and time"
+        if time_col is None:
+            time_dim = D - 1
+        elif isinstance(time_col, str):
+            assert self.coords_col is not None and time_col in self.coords_col, \
+                f"time_col: '{time_col}' not in coords_col: {self.coords_col}"
+            time_dim = list(self.coords_col).index(time_col)
+        else:
+            time_dim = time_col % D
+
+        if kernel_kwargs is None:
+            kernel_kwargs = {}
+        kernel_kwargs = {"lengthscales": np.ones(D), **kernel_kwargs}
+        if verbose:
+            print(f"setting lengthscales to: {kernel_kwargs['lengthscales']}")
+        kernel = SeparableSpaceTime(space_kernel=kernel,
+                                    time_kernel=kernel if time_kernel is None else time_kernel,
+                                    time_dim=time_dim,
+                                    **kernel_kwargs)
+
+        # --
+        # prior mean function
+        # --
+
+        if isinstance(mean_function, str):
+            if mean_func_kwargs is None:
+                mean_func_kwargs = {}
+            mean_function = getattr(gpflow.mean_functions, mean_function)(**mean_func_kwargs)
+
+        # --
+        # spatial inducing points: the distinct spatial locations, or a selection of them
+        # --
+
+        space_coords = np.unique(np.delete(self.coords, time_dim, axis=1), axis=0)
+        self.inducing_points = select_inducing_points(space_coords, num_inducing_points,
+                                                      method=inducing_point_method,
+                                                      seed=inducing_point_seed)
+
+        # ---
+        # model
+        # ---
+
+        self.model = KalmanGPR(data=(self.coords, self.obs),
+                               kernel=kernel,
+                               inducing_points=self.inducing_points,
+                               mean_function=mean_function,
+                               noise_variance=noise_variance,
+                               likelihood=likelihood)
+
+    def update_obs_data(self,
+                        data=None,
+                        coords_col=None,
+                        obs_col=None,
+                        coords=None,
+                        obs=None,
+                        coords_scale=None,
+                        obs_scale=None):
+
+        BaseGPRModel.__init__(self,
+                              data=data,
+                              coords_col=coords_col,
+                              obs_col=obs_col,
+                              coords=coords,
+                              obs=obs,
+                              coords_scale=coords_scale,
+                              obs_scale=obs_scale,
+                              predict_batch_size=self.predict_batch_size,
+                              full_cov_memory_limit=self.full_cov_memory_limit)
+
+        # the grouping of observations by time depends on the observations
+        self.model.set_data((self.coords, self.obs))
+
+    def get_objective_function_value(self):
+        """Get the negative ELBO (the negative log marginal likelihood, if the inducing points are all the
+        distinct spatial observation locations)."""
+        return -self.model.elbo().numpy()
+
+    def get_inducing_points(self) -> np.ndarray:
+        """Get the spatial inducing point locations."""
+        return self.model.inducing_points.numpy()
+
+    def get_run_details(self) -> dict:
+        """Returns the number of filter time steps ("num_time_steps") and spatial inducing points
+        ("num_inducing_points")."""
+        return {"num_time_steps": self.model.num_time_steps,
+                "num_inducing_points": len(self.inducing_points)}
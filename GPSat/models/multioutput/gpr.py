@@ -1,13 +1,14 @@
 import gpflow
 from gpflow.models import GPR, GPModel, SVGP
 from gpflow.models.util import data_input_to_tensor, InducingVariablesLike
-from gpflow.kernels import LinearCoregionalization
+from gpflow.kernels import LinearCoregionalization, SharedIndependent
 from gpflow.logdensities import multivariate_normal
 from gpflow.mean_functions import MeanFunction, Zero
 from check_shapes import inherit_check_shapes
 import tensorflow as tf
 from likelihoods import LinearModelLikelihood, NonlinearModelLikelihood, ForwardModelLikelihood
 from utils import add_likelihood_noise_cov, multioutput_conditional
+from utils import separable_log_marginal_likelihood, separable_multioutput_conditional
 from typing import Union, Optional
 
 
@@ -19,7 +20,12 @@ class MultioutputGPR(GPR):
                  num_latent_gps,
                  mean_function = None,
                  noise_variance = None,
-                 likelihood: LinearModelLikelihood = None):
+                 likelihood: LinearModelLikelihood = None,
+                 structured: bool = True):
+        """
+        - structured: if True, and the kernel is separable (see separable_kernel), compute the
+            likelihood and predictions in eigen form, without forming the (NP, NP) covariance
+        """
         assert isinstance(likelihood, LinearModelLikelihood)
         assert (noise_variance is None) or (
             likelihood is None
@@ -37,10 +43,35 @@ class MultioutputGPR(GPR):
         if mean_function is None:
             self.mean_function = Zero(output_dim=Y_data.shape[-1])
 
+        self.structured = structured
+
+    def separable_kernel(self):
+        """
+        If the latent kernel is separable, i.e. k(x, x') B for a shared (single output) kernel k and
+        (L, L) coregionalisation matrix B, return k and B, otherwise None
+        """
+        if not self.structured:
+            return None
+        if isinstance(self.kernel, SharedIndependent):
+            return self.kernel.kernel, tf.eye(self.kernel.output_dim, dtype=gpflow.default_float())
+        if isinstance(self.kernel, LinearCoregionalization) \
+                and all(k is self.kernel.kernels[0] for k in self.kernel.kernels):
+            W = self.kernel.W
+            return self.kernel.kernels[0], W @ tf.transpose(W)
+        return None
+
     @inherit_check_shapes
     def log_marginal_likelihood(self) -> tf.Tensor:
         X, Y = self.data
         H = self.likelihood.H
+        separable = self.separable_kernel()
+        if separable is not None:
+            k, B = separable
+            return separable_log_marginal_likelihood(k(X),
+                                                     Y - self.mean_function(X),
+                                                     H @ B @ tf.transpose(H),
+                                                     self.likelihood.variance)
+
         K = self.kernel(X, full_cov=True, full_output_cov=True) # Shape (N, L, N, L)
         K = tf.transpose(K, [0,2,1,3]) # Shape (N, N, L, L)
         HKHt = H @ K @ tf.transpose(H) # Shape (N, N, P, P)
@@ -63,6 +94,21 @@ class MultioutputGPR(GPR):
         X, Y = self.data
         err = Y - self.mean_function(X) # TODO: Handle multivariate mean properly. Shape (M, P)
 
+        separable = self.separable_kernel()
+        if separable is not None:
+            k, B = separable
+            f_mean_zero, f_var = separable_multioutput_conditional(
+                k(X, Xnew), k(X), k(Xnew, full_cov=full_cov), err, B=B, H=self.likelihood.H,
+                R=self.likelihood.variance, full_cov=full_cov
+            )  # [N, L], [N, L, N, L] or [N, L, L]
+
+            f_mean = f_mean_zero + self.mean_function(Xnew)
+
+            if not full_output_cov:
+                f_var = tf.linalg.diag_part(f_var)
+
+            return f_mean, f_var
+
         kmm = self.kernel(X, full_cov=True, full_output_cov=True) # Shape (M, L, M, L)
         knn = self.kernel(Xnew, full_cov=full_cov, full_output_cov=True) # Shape (N, L, N, L)
         kmn = self.kernel(X, Xnew, full_cov=True, full_output_cov=True) # Shape (M, L, N, L)
@@ -5,12 +5,12 @@ import numpy as np
 import pandas as pd
 from numpy.linalg import multi_dot as mdot
 import scipy
-from scipy.spatial.distance import squareform, pdist, cdist
+from scipy.spatial.distance import cdist
 
 from GPSat.decorators import timer
 from GPSat.models import BaseGPRModel
 
-from GPSat.utils import sigmoid, inverse_sigmoid, softplus, inverse_softplus
+from GPSat.utils import sigmoid, inverse_sigmoid, softplus, inverse_softplus, sigmoid_grad, softplus_grad
 
 class PurePythonGPR(BaseGPRModel):
     """Pure Python GPR class - used to hold model details from pure python implementation"""
@@ -128,13 +128,14 @@ class PurePythonGPR(BaseGPRModel):
     def get_transform_funcs(self,  func, **kwargs):
         # assert name in self.param_names, f"name: {name} not in param_names: {self.param_names}"
 
+        # grad_func: derivative of func, for the gradient of the objective w.r.t. the (unconstrained) variables
         if func == "softplus":
-            return {"func": softplus, "inv_func": inverse_softplus, "kwargs": kwargs}
+            return {"func": softplus, "inv_func": inverse_softplus, "grad_func": softplus_grad, "kwargs": kwargs}
         elif func == "exp":
             # kwargs not used for these transform functions, for now
-            return {"func": np.exp, "inv_func": np.log, "kwargs": {}}
+            return {"func": np.exp, "inv_func": np.log, "grad_func": np.exp, "kwargs": {}}
         elif func == "sigmoid":
-            return {"func": sigmoid, "inv_func": inverse_sigmoid, "kwargs": kwargs}
+            return {"func": sigmoid, "inv_func": inverse_sigmoid, "grad_func": sigmoid_grad, "kwargs": kwargs}
         # TODO: add a linear transform
         else:
             raise NotImplementedError(f"func: {func} is not implement")
@@ -267,9 +268,11 @@ class PurePythonGPR(BaseGPRModel):
         return out
 
     @timer
-    def optimise_parameters(self, opt_method="L-BFGS-B", jac=False):
-        """an inheriting class should define method for optimising (hyper/variational) parameters"""
-        # NOTE: previous default params were: opt_method="CG", jac=True
+    def optimise_parameters(self, opt_method="L-BFGS-B", jac=True):
+        """
+        Optimise the hyper parameters, by minimising the negative log marginal likelihood.
+        With ``jac=True`` (default) the analytic gradient is used, otherwise scipy uses finite differences.
+        """
         return self.optimise(opt_method=opt_method, jac=jac)
 
     def _apply_transform_funct(self, x0, func_type="func"):
@@ -278,8 +281,9 @@ class PurePythonGPR(BaseGPRModel):
         # aim to convert parameters to variables and vice versa
         # for variables to params use func_type: "func"
         # for params to variables use func_type: "inv_func"
+        # for the derivatives of params w.r.t. variables use func_type: "grad_func"
 
-        assert func_type in ["func", "inv_func"], f"func_type: {func_type} is not valid"
+        assert func_type in ["func", "inv_func", "grad_func"], f"func_type: {func_type} is not valid"
 
         out = np.full(x0.shape, np.nan)
 
@@ -300,7 +304,7 @@ class PurePythonGPR(BaseGPRModel):
 
         return out
 
-    def optimise(self, opt_method="L-BFGS-B", jac=False):
+    def optimise(self, opt_method="L-BFGS-B", jac=True):
 
         # get the kernel and likelihood variances
         kv = np.array([self.kernel_var]) if isinstance(self.kernel_var, (float, int)) else self.kernel_var
@@ -370,7 +374,12 @@ class PurePythonGPR(BaseGPRModel):
         # convert the variable representation to (possibly) constrained parameter space
         hyps = self._apply_transform_funct(hypers, func_type="func")
 
-        return SMLII_mod(hypers=hyps, x=x, y=y, approx=approx, M=M, grad=grad)
+        if not grad:
+            return SMLII_mod(hypers=hyps, x=x, y=y, approx=approx, M=M, grad=False)
+
+        # chain rule: gradients w.r.t. parameters to gradients w.r.t. variables
+        nlZ, dnlZ = SMLII_mod(hypers=hyps, x=x, y=y, approx=approx, M=M, grad=True)
+        return nlZ, dnlZ * self._apply_transform_funct(hypers, func_type="grad_func")
 
 
 
@@ -387,15 +396,17 @@ def SGPkernel(x, xs=None, grad=False, ell=1, sigma=1):
             sigma: scaling pre-factor for covariance function
     Returns:
             sigma*k: scaled covariance function
-            sigma*dk: scaled matrix of gradients
+            sigma*dk: scaled matrix of gradients, w.r.t. log(ell), of size len(ell) x n x n
     """
     if xs is None:
-        Q = squareform(pdist(np.sqrt(3.) * x / ell, 'euclidean'))
-        k = (1 + Q) * np.exp(-Q)
-        dk = np.zeros((len(ell), k.shape[0], k.shape[1]))
-        for theta in range(len(ell)):
-            q = squareform(pdist(np.sqrt(3.) * np.atleast_2d(x[:, theta] / ell[theta]).T, 'euclidean'))
-            dk[theta, :, :] = q * q * np.exp(-Q)
+        # all from one tensor of (scaled) squared differences, n x n x len(ell)
+        z = np.sqrt(3.) * x / ell
+        q2 = np.square(z[:, None, :] - z[None, :, :])
+        Q = np.sqrt(q2.sum(axis=-1))
+        eQ = np.exp(-Q)
+        k = (1 + Q) * eQ
+        if grad:
+            dk = np.moveaxis(q2 * eQ[:, :, None], -1, 0)
     else:
         Q = cdist(np.sqrt(3.) * x / ell, np.sqrt(3.) * xs / ell, 'euclidean')
         k = (1 + Q) * np.exp(-Q)
@@ -448,7 +459,7 @@ def SMLII_mod(hypers, x, y, approx=False, M=None, grad=True, use_log=True):
             M: number of training points to use in Nyström approx (integer scalar)
     Returns:
             nlZ: negative log marginal likelihood
-            dnLZ: gradients of the negative log marginal likelihood
+            dnLZ: gradients of the negative log marginal likelihood w.r.t. hypers
     """
     # ell = [np.exp(hypers[0]), np.exp(hypers[1]), np.exp(hypers[2])]
     # sf2 = np.exp(hypers[3])
@@ -475,27 +486,33 @@ def SMLII_mod(hypers, x, y, approx=False, M=None, grad=True, use_log=True):
 
 
     n = len(y)
-    Kx, dK = SGPkernel(x, grad=True, ell=ell, sigma=sf2)
+    if grad:
+        Kx, dK = SGPkernel(x, grad=True, ell=ell, sigma=sf2)
+    else:
+        Kx = SGPkernel(x, ell=ell, sigma=sf2)
     try:
         if approx:
             Ki, A, det = Nystroem(x, y, M=M, ell=ell, sf2=sf2, sn2=sn2, opt=True)
             nlZ = np.dot(y.T, A) / 2 + det + n * np.log(2 * np.pi) / 2
             Q = Ki - np.dot(A, A.T)
         else:
-            L = np.linalg.cholesky(Kx + np.eye(n) * sn2)
-            A = np.atleast_2d(np.linalg.solve(L.T, np.linalg.solve(L, y))).T
+            Kx[np.diag_indices(n)] += sn2
+            L = scipy.linalg.cholesky(Kx, lower=True)
+            Kx[np.diag_indices(n)] -= sn2
+            A = scipy.linalg.cho_solve((L, True), y)[:, None]
             nlZ = np.dot(y.T, A) / 2 + np.log(L.diagonal()).sum() + n * np.log(2 * np.pi) / 2
-            Q = np.linalg.solve(L.T, np.linalg.solve(L, np.eye(n))) - np.dot(A, A.T)
+            if grad:
+                # inverse of K + sn2 I, reusing the Cholesky factor
+                Ki = scipy.linalg.lapack.dpotri(L, lower=True)[0]
+                Ki = np.tril(Ki) + np.tril(Ki, -1).T
+                Q = Ki - np.dot(A, A.T)
 
         if grad:
+            # gradients w.r.t. the hyper parameters: tr(Q dK / dtheta) / 2
             dnlZ = np.zeros(len(hypers))
-            for theta in range(len(hypers)):
-                if theta < (len(hypers) - 2):
-                    dnlZ[theta] = (Q * dK[theta, :, :]).sum() / 2
-                elif theta == (len(hypers) - 2):
-                    dnlZ[theta] = (Q * (2 * Kx)).sum() / 2
-                elif theta == (len(hypers) - 1):
-                    dnlZ[theta] = sn2 * np.trace(Q)
+            dnlZ[:-2] = np.einsum("ij,tij->t", Q, dK) / (2 * ell)
+            dnlZ[-2] = (Q * Kx).sum() / (2 * sf2)
+            dnlZ[-1] = np.trace(Q) / 2
     except np.linalg.LinAlgError as e:
         nlZ = np.inf;
         dnlZ = np.ones(len(hypers)) * np.inf
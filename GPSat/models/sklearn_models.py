@@ -6,6 +6,8 @@ from GPSat.decorators import timer
 from GPSat.models import BaseGPRModel
 
 import sklearn
+import scipy.optimize
+from joblib import Parallel, delayed
 from sklearn.gaussian_process import GaussianProcessRegressor
 from sklearn.gaussian_process.kernels import ConstantKernel
 from sklearn.base import clone
@@ -32,7 +34,37 @@ class sklearnGPRModel(BaseGPRModel):
                  kernel_variance=1.,
                  likelihood_variance=None,
                  param_bounds=None,
+                 predict_batch_size=None,
+                 full_cov_memory_limit=None,
+                 n_restarts_optimizer=2,
+                 n_jobs=None,
+                 restart_scale=1.,
+                 restart_seed=0,
                  **kwargs):
+        """
+        Exact GPR model using scikit-learn's ``GaussianProcessRegressor``.
+
+        Hyperparameters are optimised with L-BFGS-B from the current values and ``n_restarts_optimizer``
+        additional starting points, drawn from a (log-)normal warm-start prior centred on the current values,
+        e.g. those loaded from a neighbouring expert, rather than uniformly within the bounds.
+        The restarts can be run in parallel threads, as most of the time is spent in BLAS / LAPACK calls,
+        which release the GIL. If parameters are not optimised the posterior is built directly from the current
+        hyperparameters (a single Cholesky decomposition) when it is first needed.
+
+        Parameters
+        ----------
+        n_restarts_optimizer: int, default 2
+            Number of additional starting points for the optimiser.
+        n_jobs: int, optional
+            Number of threads used to run the optimiser from each starting point. Default is to run sequentially.
+        restart_scale: float, default 1.
+            Standard deviation, of the log hyperparameters, of the warm-start prior restarts are drawn from.
+        restart_seed: int, optional
+            Seed for drawing restart starting points.
+
+        See :class:`~GPSat.models.base_model.BaseGPRModel` for the remaining parameters.
+
+        """
         # TODO: handle kernel (hyper) parameters
         # NOTE: sklearn only handles constant mean
         # NOTE: sklearn only deals with Gaussian likelihood. Likelihood variance is not trainable.
@@ -48,7 +80,9 @@ class sklearnGPRModel(BaseGPRModel):
                          coords_scale=coords_scale,
                          obs_scale=obs_scale,
                          obs_mean=obs_mean,
-                         verbose=verbose)
+                         verbose=verbose,
+                         predict_batch_size=predict_batch_size,
+                         full_cov_memory_limit=full_cov_memory_limit)
 
         # --
         # set kernel
@@ -110,7 +144,15 @@ class sklearnGPRModel(BaseGPRModel):
 
         self.model = GaussianProcessRegressor(kernel=kernel,
                                               alpha=likelihood_variance,
-                                              n_restarts_optimizer=2)
+                                              optimizer=None)
+
+        self.n_restarts_optimizer = n_restarts_optimizer
+        self.n_jobs = n_jobs
+        self.restart_scale = restart_scale
+        self.restart_seed = restart_seed
+
+        # the posterior (Cholesky factor) is only (re)built when needed, after (hyper) parameters change
+        self._posterior_stale = True
 
     @timer
     def predict(self, coords, full_cov=False, apply_scale=True):
@@ -131,6 +173,10 @@ class sklearnGPRModel(BaseGPRModel):
         assert isinstance(coords, np.ndarray), f"coords should be an ndarray (one can be converted from)"
         coords = coords.astype(self.coords.dtype)
 
+        # for many prediction locations: predict in batches, to limit memory use
+        if self._use_predict_batches(len(coords), full_cov=full_cov):
+            return self._predict_in_batches(coords, apply_scale=apply_scale)
+
         if apply_scale:
             coords = coords / self.coords_scale
         
@@ -141,21 +187,10 @@ class sklearnGPRModel(BaseGPRModel):
             return_std = True
             return_cov = False
 
-        try:
-            _ = self.model.kernel_ # This is to check if model has been trained. NOTE: `kernel_` only exists after model has been trained.
-                                   # If not trained, gpr effectively has not been 'fitted' to the data, in which case we need to 'fake fit'.
-
-            f_pred = self.model.predict(X=coords,
-                                        return_std=return_std,
-                                        return_cov=return_cov)
-        except AttributeError as e:
-            # if fit has not been called certain attributes will be missing
-            # by calling with optimizer=None no optimization will be done
-            # TODO: this should be reviewed and validated
-            self._fake_fit()
-            f_pred = self.model.predict(X=coords,
-                                        return_std=return_std,
-                                        return_cov=return_cov)
+        self._build_posterior()
+        f_pred = self.model.predict(X=coords,
+                                    return_std=return_std,
+                                    return_cov=return_cov)
 
         # TODO: obs_scale should be applied to predictions
         # z = (x-u)/sig; x = z * sig + u
@@ -186,17 +221,15 @@ class sklearnGPRModel(BaseGPRModel):
                  k2: Constant kernel, which models the amplitude
         """
         # Below works for Matern. Not checked with other kernels.
-        try:
-            kernel = self.model.kernel_ # Only available after training
-        except:
-            kernel = self.model.kernel
+        # NOTE: the current (e.g. optimised) hyperparameters are always in self.model.kernel
+        kernel = self.model.kernel
 
-        if self.model.kernel.__class__ == sklearn.gaussian_process.kernels.Sum:
+        if kernel.__class__ == sklearn.gaussian_process.kernels.Sum:
             # Deal with mean
             k = kernel.k1
             k1 = k.k1
             k2 = k.k2
-        elif self.model.kernel.__class__ == sklearn.gaussian_process.kernels.Product:
+        elif kernel.__class__ == sklearn.gaussian_process.kernels.Product:
             k1 = kernel.k1
             k2 = kernel.k2
         else:
@@ -223,6 +256,7 @@ class sklearnGPRModel(BaseGPRModel):
     def set_lengthscales(self, lengthscales):
         k1, k2 = self._extract_k1k2()
         k1.length_scale = lengthscales
+        self._posterior_stale = True
 
     def set_kernel_variance(self, kernel_variance):
         k1, k2 = self._extract_k1k2()
@@ -230,53 +264,115 @@ class sklearnGPRModel(BaseGPRModel):
             pass
         else:
             k2.constant_value = np.sqrt(kernel_variance)
+            self._posterior_stale = True
 
     def set_likelihood_variance(self, likelihood_variance):
         self.model.alpha = likelihood_variance
+        self._posterior_stale = True
 
     @timer
-    def optimise_parameters(self, opt=None, **kwargs):
+    def optimise_parameters(self, opt=None, n_restarts_optimizer=None, n_jobs=None, **kwargs):
+        """
+        Optimise the kernel hyperparameters by maximising the log marginal likelihood.
+
+        Parameters
+        ----------
+        opt: callable, optional
+            Optimiser with the signature expected by ``GaussianProcessRegressor``, i.e.
+            ``opt(obj_func, initial_theta, bounds) -> (theta_opt, func_min)``. Default is L-BFGS-B with
+            warm-started restarts, see :class:`sklearnGPRModel`.
+        n_restarts_optimizer: int, optional
+            Overrides the value provided at initialisation.
+        n_jobs: int, optional
+            Overrides the value provided at initialisation.
+
+        Returns
+        -------
+        bool
+            ``True`` if optimisation succeeded.
 
+        """
         # TODO: add option to return opt_logs
+        if n_restarts_optimizer is None:
+            n_restarts_optimizer = self.n_restarts_optimizer
+        if n_jobs is None:
+            n_jobs = self.n_jobs
 
         if opt is None:
-            self.model.optimizer = 'fmin_l_bfgs_b'
+            self.model.optimizer = lambda obj_func, initial_theta, bounds: \
+                self._restart_optimizer(initial_theta, bounds, n_restarts_optimizer, n_jobs)
         else:
             self.model.optimizer = opt
 
-        X = self.coords
-        y = self.obs
-
         try:
-            self.model = self.model.fit(X, y)
+            self.model = self.model.fit(self.coords, self.obs)
+            # keep the optimised hyperparameters in kernel, which setters / getters use
+            self.model.kernel = self.model.kernel_
+            self._posterior_stale = False
             success = True
-        except:
+        except Exception as e:
             print("*" * 10)
             print("optimization failed!")
+            print(e)
+            self._posterior_stale = True
             success = False
+        finally:
+            self.model.optimizer = None
 
         return success
 
+    def _neg_log_marginal_likelihood(self, theta):
+        # negative log marginal likelihood and its gradient for the (log) hyperparameters theta
+        # - clone_kernel=True so it can be evaluated in several threads at once
+        lml, grad = self.model.log_marginal_likelihood(theta, eval_gradient=True, clone_kernel=True)
+        return -lml, -grad
+
+    def _minimize_from(self, theta0, bounds):
+        # run L-BFGS-B from theta0, a failed run (e.g. Cholesky failing) is given an infinite objective
+        try:
+            res = scipy.optimize.minimize(self._neg_log_marginal_likelihood, theta0,
+                                          method="L-BFGS-B", jac=True, bounds=bounds)
+            return res.x, res.fun
+        except (np.linalg.LinAlgError, ValueError) as e:
+            print(f"optimisation from {theta0} failed: {e}")
+            return theta0, np.inf
+
+    def _restart_optimizer(self, initial_theta, bounds, n_restarts_optimizer=0, n_jobs=None):
+        # optimise from initial_theta and restart points drawn from a normal distribution around it,
+        # (in the log space of the hyperparameters) clipped to the bounds - return the best
+        rng = np.random.default_rng(self.restart_seed)
+        starts = [initial_theta]
+        for _ in range(n_restarts_optimizer):
+            theta0 = initial_theta + self.restart_scale * rng.standard_normal(len(initial_theta))
+            starts.append(np.clip(theta0, bounds[:, 0], bounds[:, 1]))
+
+        if (n_jobs is None) or (n_jobs == 1) or (len(starts) == 1):
+            results = [self._minimize_from(theta0, bounds) for theta0 in starts]
+        else:
+            # threads: the time is spent in BLAS / LAPACK calls, which release the GIL
+            results = Parallel(n_jobs=n_jobs, prefer="threads")(delayed(self._minimize_from)(theta0, bounds)
+                                                                for theta0 in starts)
+
+        theta_opt, func_min = min(results, key=lambda r: r[1])
+        assert np.isfinite(func_min), "optimisation failed from all starting points"
+        return theta_opt, func_min
+
     @timer
     def get_objective_function_value(self):
         """get the marginal log likelihood"""
-        try:
-            # this only works if self.model.fit as been already called
-            return self.model.log_marginal_likelihood()
-        # if model has not been trained then self.model.log_marginal_likelihood_value_ will not exist
-        # and thus cause an attribution error
-        except AttributeError as e:
-            # kernel_ (and other attributes) only gets assigned when self.model.fit(...) is called
-            # call fit with optimizer=None via:
-            self._fake_fit()
-            return -self.model.log_marginal_likelihood()
-
-    def _fake_fit(self):
-        """call model.fit with optimizer None"""
-        optimizer = self.model.optimizer
-        self.model.optimizer = None
-        self.model.fit(X=self.coords, y=self.obs)
-        self.model.optimizer = optimizer
+        self._build_posterior()
+        return self.model.log_marginal_likelihood_value_
+
+    def _build_posterior(self):
+        """
+        Build the posterior from the current hyperparameters, without any optimisation,
+        if they have changed since it was last built.
+        """
+        if self._posterior_stale:
+            # with optimizer=None fit only computes the Cholesky factor of the kernel matrix
+            self.model.optimizer = None
+            self.model.fit(X=self.coords, y=self.obs)
+            self._posterior_stale = False
 
     def _preprocess_constraint(self, param_name, low, high, move_within_tol=True, tol=1e-8, scale=False):
         assert param_name in self.param_names, f"param_name must be one of {self.param_names}"
@@ -322,10 +418,7 @@ class sklearnGPRModel(BaseGPRModel):
             length_scale_bounds.append((l,h))
 
         # Below works for Matern. Not checked with other kernels.
-        try:
-            kernel = self.model.kernel_ # Only available after training
-        except:
-            kernel = self.model.kernel
+        kernel = self.model.kernel
 
         if kernel.__class__ == sklearn.gaussian_process.kernels.Sum:
             # Deal with mean
@@ -342,10 +435,7 @@ class sklearnGPRModel(BaseGPRModel):
         low, high = self._preprocess_constraint("kernel_variance", low, high, move_within_tol, tol, scale)
 
         # Below works for Matern. Not checked with other kernels.
-        try:
-            kernel = self.model.kernel_ # Only available after training
-        except:
-            kernel = self.model.kernel
+        kernel = self.model.kernel
 
         if kernel.__class__ == sklearn.gaussian_process.kernels.Sum:
             # Deal with mean
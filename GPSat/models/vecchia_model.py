@@ -0,0 +1,401 @@
+# Nearest neighbour (Vecchia) approximate GPR, for experts with many (dense) observations
+import heapq
+import inspect
+
+import gpflow
+import numpy as np
+import tensorflow as tf
+
+from scipy.spatial import cKDTree
+from gpflow.config import default_float
+from gpflow.models.training_mixins import InternalDataTrainingLossMixin
+
+from GPSat.decorators import timer
+from GPSat.models import BaseGPRModel
+from GPSat.models.gpflow_models import GPflowGPRModel
+
+
+def maxmin_order(X):
+    """
+    Maximum-minimum distance ordering of the locations X, of shape (N, D): the first is the location nearest
+    the centroid, each subsequent location is the one furthest from all those before it.
+
+    Uses a KD-tree and a heap (see [SSO'21]): once a location is ordered, only the distances of those within
+    the current maximum (minimum) distance of it can change, and so are updated. For (quasi) uniformly spread
+    locations this is O(N log^2 N), rather than the O(N^2 D) of a direct greedy search, with O(N) memory.
+    The ordering is exact, ties are broken by the lowest index.
+
+    Returns
+    -------
+    np.ndarray
+        Indices, of length N, of X in maxmin order.
+
+    References
+    ----------
+    \[SSO'21\] Schäfer, Florian, T. J. Sullivan, and Houman Owhadi. "Compression, inversion, and approximate PCA
+    of dense kernel matrices at near-linear computational complexity." Multiscale Modeling & Simulation 19.2 (2021).
+    """
+    X = np.ascontiguousarray(X, dtype=float)
+    N = len(X)
+    order = np.empty(N, dtype=np.int64)
+    if N == 0:
+        return order
+    tree = cKDTree(X)
+
+    # squared distance of each location to the nearest ordered location, and a (max) heap of these
+    # - heap entries are (-squared distance, index), entries no longer matching dist are skipped
+    dist = np.full(N, np.inf)
+    ordered = np.zeros(N, dtype=bool)
+    heap = []
+
+    j = np.argmin(np.sum((X - X.mean(axis=0)) ** 2, axis=1))
+    r2 = np.inf
+    for i in range(N):
+        order[i] = j
+        ordered[j] = True
+        if i == N - 1:
+            break
+        # locations which may now be nearer to j than to the previously ordered (all are within r of those)
+        if np.isinf(r2):
+            nb = np.arange(N)
+        else:
+            nb = np.asarray(tree.query_ball_point(X[j], np.sqrt(r2) * (1 + 1e-10)), dtype=np.int64)
+        d2 = np.sum((X[nb] - X[j]) ** 2, axis=1)
+        upd = (d2 < dist[nb]) & ~ordered[nb]
+        dist[nb[upd]] = d2[upd]
+        for n, d in zip(nb[upd].tolist(), d2[upd].tolist()):
+            heapq.heappush(heap, (-d, n))
+        # next: the location furthest from those ordered
+        while True:
+            d, j = heapq.heappop(heap)
+            if (not ordered[j]) and (-d == dist[j]):
+                break
+        r2 = -d
+    return order
+
+
+def nearest_predecessors(X, k, query_factor=3):
+    """
+    For each location in X, of shape (N, D), find the (up to) k nearest locations before it in X.
+
+    Candidates are found with a KD-tree query of the ``query_factor * k`` nearest locations. For locations with
+    too few predecessors among them (e.g. near the start of the ordering) all predecessors are searched.
+
+    Returns
+    -------
+    np.ndarray
+        Indices, of shape (N, k), of the nearest predecessors (nearest first), -1 where there are fewer than k.
+    """
+    N = len(X)
+    out = np.full((N, k), -1, dtype=int)
+    if N == 1:
+        return out
+
+    _, cand = cKDTree(X).query(X, k=min(N, query_factor * k + 1))
+    cand = cand.reshape(N, -1)
+    # keep the first k candidates (by distance) before each location
+    valid = cand < np.arange(N)[:, None]
+    rank = np.cumsum(valid, axis=1)
+    keep = valid & (rank <= k)
+    rows, cols = np.nonzero(keep)
+    out[rows, rank[rows, cols] - 1] = cand[rows, cols]
+
+    # search all predecessors for locations with fewer than min(k, i) found
+    num_found = keep.sum(axis=1)
+    for i in np.nonzero(num_found < np.minimum(k, np.arange(N)))[0]:
+        d = np.sum((X[:i] - X[i]) ** 2, axis=1)
+        nn = np.argsort(d, kind="stable")[:k]
+        out[i, :len(nn)] = nn
+    return out
+
+
+class VecchiaGPR(gpflow.models.GPModel, InternalDataTrainingLossMixin):
+    def __init__(self, data, kernel, mean_function=None, noise_variance=None, likelihood=None,
+                 num_neighbours=30, ordering="maxmin"):
+        """
+        Nearest neighbour (Vecchia) approximation of GPR: with the observations ordered, each is conditioned
+        only on its (up to) ``num_neighbours`` nearest predecessors, i.e.
+
+            p(y) ~ prod_i p(y_i | y_{c(i)})
+
+        which corresponds to a sparse Cholesky factor of the precision of y. The log likelihood requires
+        O(N k^3) computation and predictions, each conditioned on their k nearest observations, O(k^3) each.
+
+        Parameters
+        ----------
+        num_neighbours: int, default 30
+            Number of (nearest) previous observations each observation is conditioned on, and the number of
+            (nearest) observations predictions are conditioned on.
+        ordering: str, default "maxmin"
+            Ordering of the observations, "maxmin" (see maxmin_order) or "none", to keep the order given.
+        """
+        assert isinstance(kernel, gpflow.kernels.IsotropicStationary), \
+            f"kernel: {kernel.__class__.__name__} not implemented, must be IsotropicStationary, e.g. Matern32"
+        assert ordering in ["maxmin", "none"], f"ordering: {ordering} not implemented, must be 'maxmin' or 'none'"
+
+        if likelihood is None:
+            if noise_variance is None:
+                noise_variance = 1.0
+            likelihood = gpflow.likelihoods.Gaussian(noise_variance)
+        super().__init__(kernel, likelihood, mean_function, num_latent_gps=data[1].shape[-1])
+
+        self.num_neighbours = num_neighbours
+        self.ordering = ordering
+        self.set_data(data)
+
+    def set_data(self, data):
+        """Set the observations, (re)computing the ordering and neighbours."""
+        X, Y = [np.asarray(d, dtype=default_float()) for d in data]
+        N = len(X)
+        k = min(self.num_neighbours, max(N - 1, 1))
+
+        order = maxmin_order(X) if self.ordering == "maxmin" else np.arange(N)
+        neighbours = nearest_predecessors(X[order], k)
+        # missing neighbours point to the location itself, and are masked out
+        self._mask = tf.constant(neighbours >= 0, dtype=default_float())
+        self._neighbours = tf.constant(np.where(neighbours >= 0, neighbours, np.arange(N)[:, None]))
+
+        self.data = (tf.constant(X), tf.constant(Y))
+        self._X_ordered, self._Y_ordered = tf.constant(X[order]), tf.constant(Y[order])
+        # for finding the nearest observations to prediction locations
+        self._tree = cKDTree(X)
+        self._prediction_cache = None
+
+    def _conditional(self, Xc, Yc, mask, Xnew, Ynew_mean):
+        # mean and variance of (noise free) f at Xnew, of shape (B, D), conditioned on (noisy) observations Yc,
+        # of shape (B, k, P), at Xc, of shape (B, k, D), where mask is 0 for (masked out) missing observations
+        # - K_cc and k_ic are computed directly from (scaled) squared distances, batched over B
+        Xc_s, Xnew_s = self.kernel.scale(Xc), self.kernel.scale(Xnew)
+        Kcc = self.kernel.K_r2(tf.reduce_sum(tf.square(Xc_s[:, :, None, :] - Xc_s[:, None, :, :]), axis=-1))
+        kc = self.kernel.K_r2(tf.reduce_sum(tf.square(Xc_s - Xnew_s[:, None, :]), axis=-1)) * mask
+
+        # masked out observations are independent, with unit variance, and zero observation and covariance
+        mask2 = mask[:, :, None] * mask[:, None, :]
+        eye = tf.eye(tf.shape(mask)[1], dtype=default_float())
+        Kcc = Kcc * mask2 + eye * (1. - mask[:, None, :]) + eye * self.likelihood.variance * mask[:, None, :]
+        L = tf.linalg.cholesky(Kcc)
+
+        A = tf.linalg.triangular_solve(L, kc[:, :, None])[..., 0]  # (B, k)
+        b = tf.linalg.triangular_solve(L, (Yc - self.mean_function(Xc)) * mask[:, :, None])  # (B, k, P)
+        mean = Ynew_mean + tf.einsum("bk,bkp->bp", A, b)
+        var = self.kernel.K_diag(Xnew) - tf.reduce_sum(tf.square(A), axis=1)
+        return mean, var
+
+    def maximum_log_likelihood_objective(self):
+        return self.log_marginal_likelihood()
+
+    def log_marginal_likelihood(self):
+        """Vecchia approximation of the log marginal likelihood: sum_i log p(y_i | y_{c(i)})."""
+        X, Y = self._X_ordered, self._Y_ordered
+        Xc, Yc = tf.gather(X, self._neighbours), tf.gather(Y, self._neighbours)
+        mean, var = self._conditional(Xc, Yc, self._mask, X, self.mean_function(X))
+        var = var + self.likelihood.variance
+        return tf.reduce_sum(gpflow.logdensities.gaussian(Y, mean, var[:, None]))
+
+    def predict_f(self, Xnew, full_cov=False, full_output_cov=False):
+        """Prediction at each location, conditioned on the (up to) ``num_neighbours`` nearest observations."""
+        assert not full_output_cov
+        if full_cov:
+            raise NotImplementedError("full_cov=True not implemented for VecchiaGPR")
+        Xnew = np.asarray(Xnew, dtype=default_float())
+
+        # predictions at the same locations, with the same parameters, are reused, e.g. by predict_y
+        key = (Xnew.tobytes(), tuple(p.numpy().tobytes() for p in self.parameters))
+        if (self._prediction_cache is not None) and (self._prediction_cache[0] == key):
+            return self._prediction_cache[1]
+
+        X, Y = self.data
+        k = min(self.num_neighbours, len(Y))
+        _, neighbours = self._tree.query(Xnew, k=k)
+        neighbours = neighbours.reshape(len(Xnew), k)
+        mask = tf.ones(neighbours.shape, dtype=default_float())
+        mean, var = self._conditional(tf.gather(X, neighbours), tf.gather(Y, neighbours), mask,
+                                      tf.constant(Xnew), self.mean_function(Xnew))
+        out = mean, tf.tile(var[:, None], [1, Y.shape[1]])
+
+        self._prediction_cache = (key, out)
+        return out
+
+
+class GPflowVecchiaModel(GPflowGPRModel):
+    """
+    Model using the nearest neighbour (Vecchia) approximation of GPR, for experts with many observations,
+    e.g. where a large training radius contains dense crossing tracks. Each observation is conditioned only on
+    its nearest preceding (in maxmin order) observations, and each prediction on its nearest observations.
+
+    Uses the same hyperparameters as :class:`~GPSat.models.gpflow_models.GPflowGPRModel` ("lengthscales",
+    "kernel_variance" and "likelihood_variance"), so can be used in its place at high data density.
+
+    See :class:`~GPSat.models.base_model.BaseGPRModel` for a complete list of attributes and methods.
+
+    Notes
+    -----
+    - Has O(N k^3) computational complexity and O(N k^2) memory scaling, for k neighbours.
+    - Neighbours are found using the (scaled) coordinates, so ``coords_scale`` should make distances in each
+      dimension comparable, i.e. similar to the lengthscales.
+    - Only isotropic stationary kernels (e.g. Matern32, RBF) are supported, and ``full_cov`` predictions are not.
+
+    References
+    ----------
+    \\[KG'21\\] Katzfuss, Matthias, and Joseph Guinness. "A general framework for Vecchia approximations of
+    Gaussian processes." Statistical Science 36.1 (2021): 124-141.
+
+    """
+    @timer
+    def __init__(self,
+                 data=None,
+                 coords_col=None,
+                 obs_col=None,
+                 coords=None,
+                 obs=None,
+                 coords_scale=None,
+                 obs_scale=None,
+                 obs_mean=None,
+                 verbose=True,
+                 *,
+                 kernel="Matern32",
+                 kernel_kwargs=None,
+                 mean_function=None,
+                 mean_func_kwargs=None,
+                 noise_variance=None,
+                 likelihood: gpflow.likelihoods.Gaussian=None,
+                 num_neighbours=30,
+                 ordering="maxmin",
+                 predict_batch_size=None,
+                 full_cov_memory_limit=None,
+                 **kwargs):
+        """
+        Parameters
+        ----------
+        data
+            See :func:`BaseGPRModel.__init__() <GPSat.models.base_model.BaseGPRModel.__init__>`
+        coords_col
+            See :func:`BaseGPRModel.__init__() <GPSat.models.base_model.BaseGPRModel.__init__>`
+        obs_col
+            See :func:`BaseGPRModel.__init__() <GPSat.models.base_model.BaseGPRModel.__init__>`
+        coords
+            See :func:`BaseGPRModel.__init__() <GPSat.models.base_model.BaseGPRModel.__init__>`
+        obs
+            See :func:`BaseGPRModel.__init__() <GPSat.models.base_model.BaseGPRModel.__init__>`
+        coords_scale
+            See :func:`BaseGPRModel.__init__() <GPSat.models.base_model.BaseGPRModel.__init__>`
+        obs_scale
+            See :func:`BaseGPRModel.__init__() <GPSat.models.base_model.BaseGPRModel.__init__>`
+        obs_mean
+            See :func:`BaseGPRModel.__init__() <GPSat.models.base_model.BaseGPRModel.__init__>`
+        verbose
+            See :func:`BaseGPRModel.__init__() <GPSat.models.base_model.BaseGPRModel.__init__>`
+        kernel
+            See :func:`GPflowGPRModel.__init__() <GPSat.models.gpflow_models.GPflowGPRModel.__init__>`
+            Must be an isotropic stationary kernel.
+        kernel_kwargs
+            See :func:`GPflowGPRModel.__init__() <GPSat.models.gpflow_models.GPflowGPRModel.__init__>`
+        mean_function
+            See :func:`GPflowGPRModel.__init__() <GPSat.models.gpflow_models.GPflowGPRModel.__init__>`
+        mean_func_kwargs
+            See :func:`GPflowGPRModel.__init__() <GPSat.models.gpflow_models.GPflowGPRModel.__init__>`
+        noise_variance
+            See :func:`GPflowGPRModel.__init__() <GPSat.models.gpflow_models.GPflowGPRModel.__init__>`
+        likelihood
+            See :func:`GPflowGPRModel.__init__() <GPSat.models.gpflow_models.GPflowGPRModel.__init__>`
+        num_neighbours: int, default 30
+            Number of nearest (preceding) observations each observation, and each prediction, is conditioned on.
+        ordering: str, default "maxmin"
+            Ordering of the observations: "maxmin" or "none" (keep the order given).
+        predict_batch_size
+            See :func:`BaseGPRModel.__init__() <GPSat.models.base_model.BaseGPRModel.__init__>`
+        full_cov_memory_limit
+            See :func:`BaseGPRModel.__init__() <GPSat.models.base_model.BaseGPRModel.__init__>`
+
+        """
+        self._check_unsupported_options(kwargs, pad_to_bucket=False, precision="float64")
+
+        # --
+        # set data
+        # --
+
+        BaseGPRModel.__init__(self,
+                              data=data,
+                              coords_col=coords_col,
+                              obs_col=obs_col,
+                              coords=coords,
+                              obs=obs,
+                              coords_scale=coords_scale,
+                              obs_scale=obs_scale,
+                              obs_mean=obs_mean,
+                              verbose=verbose,
+                              predict_batch_size=predict_batch_size,
+                              full_cov_memory_limit=full_cov_memory_limit)
+
+        # --
+        # set kernel
+        # --
+
+        assert kernel is not None, "kernel was not provided"
+
+        # if kernel is str: get function
+        if isinstance(kernel, str):
+            # if additional kernel kwargs not provide use empty dict
+            if kernel_kwargs is None:
+                kernel_kwargs = {}
+
+            # get the kernel function (still requires
+            kernel = getattr(gpflow.kernels, kernel)
+
+            # check signature parameters
+            kernel_signature = inspect.signature(kernel).parameters
+            if ("lengthscales" in kernel_signature) & ("lengthscales" not in kernel_kwargs):
+                kernel_kwargs['lengthscales'] = np.ones(self.coords.shape[1])
+                if verbose:
+                    print(f"setting lengthscales to: {kernel_kwargs['lengthscales']}")
+
+            # initialise kernel
+            kernel = kernel(**kernel_kwargs)
+
+        # --
+        # prior mean function
+        # --
+
+        if isinstance(mean_function, str):
+            if mean_func_kwargs is None:
+                mean_func_kwargs = {}
+            mean_function = getattr(gpflow.mean_functions, mean_function)(**mean_func_kwargs)
+
+        # ---
+        # model
+        # ---
+
+        self.model = VecchiaGPR(data=(self.coords, self.obs),
+                                kernel=kernel,
+                                mean_function=mean_function,
+                                noise_variance=noise_variance,
+                                likelihood=likelihood,
+                                num_neighbours=num_neighbours,
+                                ordering=ordering)
+
+    def update_obs_data(self,
+                        data=None,
+                        coords_col=None,
+                        obs_col=None,
+                        coords=None,
+                        obs=None,
+                        coords_scale=None,
+                        obs_scale=None):
+
+        BaseGPRModel.__init__(self,
+                              data=data,
+                              coords_col=coords_col,
+                              obs_col=obs_col,
+                              coords=coords,
+                              obs=obs,
+                              coords_scale=coords_scale,
+                              obs_scale=obs_scale,
+                              predict_batch_size=self.predict_batch_size,
+                              full_cov_memory_limit=self.full_cov_memory_limit)
+
+        # the ordering and neighbours depend on the observations
+        self.model.set_data((self.coords, self.obs))
+
+    def get_run_details(self) -> dict:
+        """Returns the number of neighbours each observation is conditioned on ("num_neighbours")."""
+        return {"num_neighbours": self.model.num_neighbours}
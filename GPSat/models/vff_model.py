@@ -109,6 +109,8 @@ class GPflowVFFModel(GPflowGPRModel):
 
         """
 
+        self._check_unsupported_options(kwargs, pad_to_bucket=False, precision="float64")
+
         # --
         # set data
         # --
@@ -7,7 +7,6 @@ import warnings
 
 import pandas as pd
 import numpy as np
-import numba as nb
 
 from typing import List, Dict, Union
 from dataclasses import dataclass
@@ -16,15 +15,15 @@ from GPSat.local_experts import get_results_from_h5file
 from GPSat.utils import json_serializable, cprint, get_config_from_sysargv, nested_dict_literal_eval
 from GPSat import get_data_path, get_parent_path
 from GPSat.models import get_model
+from GPSat.decorators import numba_lazy
 
 
 
-@nb.guvectorize([(nb.float64[:], nb.float64[:], nb.float64[:], nb.float64[:],
-                  nb.float64[:], nb.float64[:], nb.float64[:], nb.float64[:]),
-                 (nb.float32[:], nb.float32[:], nb.float32[:], nb.float32[:],
-                  nb.float32[:], nb.float32[:], nb.float32[:], nb.float32[:])],
-                '(), (), (n), (n), (), (), (n) -> ()',
-                nopython=True, target='parallel')
+@numba_lazy("guvectorize",
+            ["void(float64[:], float64[:], float64[:], float64[:], float64[:], float64[:], float64[:], float64[:])",
+             "void(float32[:], float32[:], float32[:], float32[:], float32[:], float32[:], float32[:], float32[:])"],
+            '(), (), (n), (n), (), (), (n) -> ()',
+            nopython=True, target='parallel')
 def gaussian_2d_weight(x0, y0, x, y, l_x, l_y, vals, out):
     """weight functions of the form exp(-d^2), where d is the distance between reference position
     (x0, y0) and the others"""
@@ -444,12 +443,30 @@ def glue_local_predictions(preds_df: pd.DataFrame,
     return glued_preds.drop("total_weights", axis=1)
 
 
+def _expert_radius_column(preds: pd.DataFrame,
+                          radius_col: str,
+                          xprt_loc_cols: List[str],
+                          run_details: Union[pd.DataFrame, None] = None) -> np.ndarray:
+    # get each prediction's expert radius from the radius_col column, which the (per expert) run_details table
+    # has but the predictions table does not - so merge it on the expert location if provided
+    if run_details is not None:
+        assert radius_col in run_details, f"radius column '{radius_col}' is not in run_details"
+        radius = run_details[xprt_loc_cols + [radius_col]].drop_duplicates(subset=xprt_loc_cols)
+        preds = preds.drop(columns=radius_col, errors="ignore").merge(radius, on=xprt_loc_cols, how="left")
+    assert radius_col in preds, \
+        f"radius column '{radius_col}' is not in the predictions, provide run_details to merge it in"
+    assert not preds[radius_col].isnull().any(), \
+        f"radius column '{radius_col}' is missing for some expert locations"
+    return preds[radius_col].values
+
+
 def glue_local_predictions_1d(preds_df: pd.DataFrame,
                               pred_loc_col: str,
                               xprt_loc_col: str,
                               vars_to_glue: Union[str, List[str]],
-                              inference_radius: Union[int, float, dict],
-                              R=3
+                              inference_radius: Union[int, float, dict, str],
+                              R=3,
+                              run_details: Union[pd.DataFrame, None] = None
                               ) -> pd.DataFrame:
     """
     Glues together overlapping local expert predictions in 1D by Gaussian-weighted averaging.
@@ -466,14 +483,21 @@ def glue_local_predictions_1d(preds_df: pd.DataFrame,
         The column in the results dataframe corresponding to the local expert locations
     vars_to_glue: str | list of strs
         The column(s) corresponding to variables we wish to glue (e.g. the predictive mean and variance).
-    inference_radius: int | float | dict
+    inference_radius: int | float | dict | str
         The inference radius for each local experts. If specified as a dict, the keys should be the 
         expert locations and the corresponding values should be the corresponding inference radius of that expert.
+        If specified as a str, it is the column in the results dataframe containing each expert's radius,
+        e.g. the (adaptive) ``"local_radius"`` from the ``run_details`` table.
         If specified as an int or float, it assumes that all experts have the same inference radius.
     R: int | float, default 3
         A weight controlling the standard deviation of the Gaussian weights. The standard deviation will be given by
         the formula ``std = inference_radius / R``. The default value of 3 will place 99% of the Gaussian mass
         within the inference radius.
+    run_details: pandas dataframe, optional
+        The ``run_details`` table from the same results, with a row per expert location.
+        Only used if ``inference_radius`` is a str: the radius column is taken from ``run_details``,
+        merged on the expert location columns, as it is not in the predictions table itself.
+        If not provided the column must already be in ``preds_df``.
 
     Returns
     -------
@@ -491,10 +515,12 @@ def glue_local_predictions_1d(preds_df: pd.DataFrame,
         assert len(inference_radius) == len(preds[xprt_loc_col].unique()), print("...")
         inference_radius_ = [inference_radius[loc] for loc in preds[xprt_loc_col]]
         inference_radius = np.array(inference_radius_)
+    elif isinstance(inference_radius, str):
+        inference_radius = _expert_radius_column(preds, inference_radius, [xprt_loc_col], run_details)
     elif isinstance(inference_radius, (int, float)):
         pass
     else:
-        print(f"inference_radius must be int, float or dict.")
+        print(f"inference_radius must be int, float, dict or str.")
 
     # Compute Gaussian weights
     preds['weights'] = norm.pdf(preds[pred_loc_col], preds[xprt_loc_col], inference_radius/R)
@@ -519,8 +545,9 @@ def glue_local_predictions_2d(preds_df: pd.DataFrame,
                               pred_loc_cols: List[str],
                               xprt_loc_cols: List[str],
                               vars_to_glue: Union[str, List[str]],
-                              inference_radius: Union[int, float, dict],
-                              R=3
+                              inference_radius: Union[int, float, dict, str],
+                              R=3,
+                              run_details: Union[pd.DataFrame, None] = None
                               ) -> pd.DataFrame:
     """
     Glues together overlapping local expert predictions in 2D by Gaussian-weighted averaging.
@@ -537,12 +564,21 @@ def glue_local_predictions_2d(preds_df: pd.DataFrame,
         The xy-columns in the results dataframe corresponding to the local expert locations
     vars_to_glue: str | list of strs
         The column(s) corresponding to variables we wish to glue (e.g. the predictive mean and variance).
-    inference_radius: int | float
-        The inference radius for each local experts. We assume that all experts have the same inference radius.
+    inference_radius: int | float | dict | str
+        The inference radius for each local experts. If specified as a dict, the keys should be the
+        expert locations, as tuples of the ``xprt_loc_cols`` values, and the values the inference radius of that expert.
+        If specified as a str, it is the column in the results dataframe containing each expert's radius,
+        e.g. the (adaptive) ``"local_radius"`` from the ``run_details`` table.
+        If specified as an int or float, it assumes that all experts have the same inference radius.
     R: int | float, default 3
         A weight controlling the standard deviation of the Gaussian weights. The standard deviation will be given by
         the formula ``std = inference_radius / R``. The default value of 3 will place 99% of the Gaussian mass
         within the inference radius.
+    run_details: pandas dataframe, optional
+        The ``run_details`` table from the same results, with a row per expert location.
+        Only used if ``inference_radius`` is a str: the radius column is taken from ``run_details``,
+        merged on the expert location columns, as it is not in the predictions table itself.
+        If not provided the column must already be in ``preds_df``.
 
     Returns
     -------
@@ -556,6 +592,11 @@ def glue_local_predictions_2d(preds_df: pd.DataFrame,
 
     preds = preds_df.copy(deep=True)
 
+    if isinstance(inference_radius, dict):
+        inference_radius = np.array([inference_radius[tuple(loc)] for loc in preds[xprt_loc_cols].values])
+    elif isinstance(inference_radius, str):
+        inference_radius = _expert_radius_column(preds, inference_radius, list(xprt_loc_cols), run_details)
+
     # Compute Gaussian weights
     preds['total_weights'] = 1
     for (pred_col, xprt_col) in zip(pred_loc_cols, xprt_loc_cols):
@@ -1,13 +1,16 @@
 # class for creating prediction locations
 # - e.g. relative an expert location
 
+import os
+import json
+import hashlib
+
 import numpy as np
-import numba as nb
 import pandas as pd
 
 from typing import List, Dict, Tuple, Union, Type
 from GPSat.utils import to_array, match
-from GPSat.decorators import timer
+from GPSat.decorators import timer, numba_lazy
 from GPSat.dataloader import DataLoader
 
 # ---
@@ -15,8 +18,8 @@ from GPSat.dataloader import DataLoader
 # ---
 
 # @timer
-@nb.guvectorize([(nb.float64[:, :], nb.float64[:], nb.float64[:], nb.bool_[:])],
-                '(n, d),(d), () -> (n)')
+@numba_lazy("guvectorize", ["void(float64[:, :], float64[:], float64[:], boolean[:])"],
+            '(n, d),(d), () -> (n)')
 def _max_dist_bool(loc, ref_loc, max_dist, out):
     """given location (loc) array - shape (n,d) - and
     reference / expert location (ref_loc) - shape (d,) - and
@@ -43,6 +46,250 @@ def _max_dist_bool(loc, ref_loc, max_dist, out):
             out[i] = d2 < (max_dist[0] * max_dist[0])
 
 
+def expert_prediction_mapping(expert_locs, pred_locs, max_dist):
+    """
+    Build a sparse (CSR) mapping from expert locations to the prediction locations within ``max_dist``.
+
+    A KD-tree is built once over the prediction locations and queried for each (unique) expert location,
+    so the full set of prediction locations is not scanned per expert.
+    The selection is the same as ``_max_dist_bool``: squared p2 distance strictly less than ``max_dist`` squared.
+
+    Parameters
+    ----------
+    expert_locs: np.ndarray
+        Expert locations, shape (e, d).
+    pred_locs: np.ndarray
+        Prediction locations, shape (n, d).
+    max_dist: int or float
+        Maximum distance from expert location.
+
+    Returns
+    -------
+    dict
+        With keys ``"expert_locs"`` - unique expert locations, shape (m, d) - and ``"indptr"``, ``"indices"``,
+        such that the (sorted) row indices of ``pred_locs`` for expert ``i`` are
+        ``indices[indptr[i]:indptr[i+1]]``.
+    """
+    expert_locs = np.unique(np.asarray(expert_locs, dtype=float), axis=0)
+    pred_locs = np.asarray(pred_locs)
+
+    from scipy.spatial import cKDTree
+    tree = cKDTree(pred_locs)
+    candidates = tree.query_ball_point(expert_locs, r=max_dist, return_sorted=True)
+
+    indptr = np.zeros(len(expert_locs) + 1, dtype=np.int64)
+    indices = []
+    for i, idx in enumerate(candidates):
+        idx = np.asarray(idx, dtype=np.int64)
+        # query_ball_point uses <= - keep only those strictly within max_dist
+        d2 = np.sum((pred_locs[idx] - expert_locs[i]) ** 2, axis=1)
+        idx = idx[d2 < (max_dist * max_dist)]
+        indices.append(idx)
+        indptr[i + 1] = indptr[i] + len(idx)
+
+    indices = np.concatenate(indices) if len(indices) else np.array([], dtype=np.int64)
+
+    return {"expert_locs": expert_locs, "indptr": indptr, "indices": indices}
+
+
+def _array_hash(*args):
+    # hash the contents of arrays (and any other str-able values) - used as a cache key
+    h = hashlib.sha1()
+    for a in args:
+        if isinstance(a, np.ndarray):
+            a = np.ascontiguousarray(a)
+            h.update(str((a.shape, a.dtype)).encode())
+            h.update(a.tobytes())
+        else:
+            h.update(str(a).encode())
+    return h.hexdigest()
+
+
+
+
+def _file_signature(path):
+    # identify a file by its (absolute) path, modification time and size - so a regenerated file is not mistaken
+    # for the original
+    path = os.path.abspath(path)
+    return {"file": path, "mtime": os.path.getmtime(path), "size": os.path.getsize(path)}
+
+
+def publish_shared_grid(df, file, columns=None, source=None):
+    """
+    Write (coordinate) columns of a DataFrame to a .npy file, to be memory-mapped (read-only)
+    by any number of processes with ``attach_shared_grid``, so each process does not hold its own copy.
+
+    The array is written to a temporary file first then moved, so a process attaching will not
+    read a partially written file. Column names (and ``source``) are stored in a sidecar file:
+    ``<file>.columns.json``. An existing file is overwritten.
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        DataFrame containing (prediction) locations.
+    file: str
+        Path of .npy file to write to.
+    columns: list of str, optional
+        Columns to write, if ``None`` all columns are used.
+    source: str, optional
+        Identifies where the locations came from (e.g. a hash of their configuration or contents),
+        checked with ``shared_grid_source`` before a file is reused.
+
+    Returns
+    -------
+    None
+    """
+    columns = df.columns.tolist() if columns is None else list(columns)
+    vals = np.ascontiguousarray(df[columns].values, dtype=float)
+
+    if os.path.dirname(file):
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+
+    # write with a process specific temporary name, then (atomically) replace
+    tmp_file = f"{file}.{os.getpid()}.tmp"
+    with open(tmp_file, "wb") as f:
+        np.save(f, vals)
+    with open(f"{file}.columns.json.{os.getpid()}.tmp", "w") as f:
+        json.dump({"columns": columns, "shape": list(vals.shape), "source": source}, f)
+    os.replace(f"{file}.columns.json.{os.getpid()}.tmp", f"{file}.columns.json")
+    os.replace(tmp_file, file)
+
+
+def _shared_grid_info(file):
+    # read the sidecar file written by publish_shared_grid - older versions only stored the columns
+    with open(f"{file}.columns.json", "r") as f:
+        info = json.load(f)
+    if isinstance(info, list):
+        info = {"columns": info, "shape": None, "source": None}
+    return info
+
+
+def shared_grid_source(file):
+    """
+    Return the ``source`` a shared grid file was published with, ``None`` if the file (or its sidecar)
+    does not exist or no source was provided.
+    """
+    if not (os.path.exists(file) and os.path.exists(f"{file}.columns.json")):
+        return None
+    return _shared_grid_info(file)["source"]
+
+
+def attach_shared_grid(file):
+    """
+    Memory-map (read-only) a grid written by ``publish_shared_grid`` and return as a DataFrame,
+    which uses the memory-mapped array without copying.
+
+    Parameters
+    ----------
+    file: str
+        Path of .npy file.
+
+    Returns
+    -------
+    pd.DataFrame
+    """
+    info = _shared_grid_info(file)
+    vals = np.load(file, mmap_mode="r")
+    if info["shape"] is not None:
+        assert list(vals.shape) == info["shape"], \
+            f"shared grid file: {file} has shape {vals.shape}, expected: {info['shape']}"
+    return pd.DataFrame(vals, columns=info["columns"], copy=False)
+
+
+class _GridIndex:
+    """
+    Uniform grid (bucket) index over a static set of locations, for selecting those within
+    a maximum distance of a reference location by only visiting buckets that intersect the disc / ball.
+
+    Locations are sorted by (linear) bucket id once, each bucket is then a contiguous slice of the sort order.
+    """
+
+    def __init__(self, locs, cell_size):
+        locs = np.asarray(locs)
+        assert len(locs.shape) == 2, f"locs must be 2d, got: {len(locs.shape)}d"
+        assert cell_size > 0, f"cell_size must be > 0, got: {cell_size}"
+
+        self.cell_size = float(cell_size)
+        self.origin = locs.min(axis=0) if len(locs) else np.zeros(locs.shape[1])
+        cells = self._cell(locs)
+        self.n_cells = cells.max(axis=0) + 1 if len(locs) else np.ones(locs.shape[1], dtype=np.int64)
+        # multipliers to get linear cell id
+        self._mult = np.concatenate([np.cumprod(self.n_cells[::-1])[::-1][1:], [1]]).astype(np.int64)
+
+        cell_id = cells @ self._mult
+        self.order = np.argsort(cell_id, kind="stable")
+        # unique (sorted) cell ids and their start (end) positions in order
+        self.cell_ids, self.starts, counts = np.unique(cell_id[self.order], return_index=True, return_counts=True)
+        self.ends = self.starts + counts
+
+    # arrays of length (up to) the number of locations - shared between processes via memory-mapped files
+    _ARRAYS = ["order", "cell_ids", "starts", "ends"]
+
+    @staticmethod
+    def _files(file):
+        return {k: f"{file}.{k}.npy" for k in _GridIndex._ARRAYS}, f"{file}.json"
+
+    def publish(self, file, source=None):
+        """write the index to files (next to a shared grid), to be memory-mapped by other processes with attach"""
+        array_files, info_file = self._files(file)
+        pid = os.getpid()
+        for k, f in array_files.items():
+            np.save(f"{f}.{pid}.tmp", getattr(self, k))
+            os.replace(f"{f}.{pid}.tmp.npy", f)
+        with open(f"{info_file}.{pid}.tmp", "w") as f:
+            json.dump({"cell_size": self.cell_size, "origin": self.origin.tolist(),
+                       "n_cells": self.n_cells.tolist(), "source": source}, f)
+        # written last, so an index is only attached once all arrays exist
+        os.replace(f"{info_file}.{pid}.tmp", info_file)
+
+    @classmethod
+    def attach(cls, file, source=None):
+        """memory-map (read-only) an index written by publish, None if it does not exist or source differs"""
+        array_files, info_file = cls._files(file)
+        if not os.path.exists(info_file):
+            return None
+        with open(info_file, "r") as f:
+            info = json.load(f)
+        if info["source"] != source:
+            return None
+        self = cls.__new__(cls)
+        self.cell_size = info["cell_size"]
+        self.origin = np.array(info["origin"])
+        self.n_cells = np.array(info["n_cells"], dtype=np.int64)
+        self._mult = np.concatenate([np.cumprod(self.n_cells[::-1])[::-1][1:], [1]]).astype(np.int64)
+        for k, f in array_files.items():
+            setattr(self, k, np.load(f, mmap_mode="r"))
+        return self
+
+    def _cell(self, x):
+        return np.floor((x - self.origin) / self.cell_size).astype(np.int64)
+
+    def candidates(self, ref_loc, max_dist):
+        """return (sorted) indices of locations in buckets intersecting the box of half width max_dist
+        centred on ref_loc - a superset of those within max_dist"""
+        lo = np.maximum(self._cell(ref_loc - max_dist), 0)
+        hi = np.minimum(self._cell(ref_loc + max_dist), self.n_cells - 1)
+        if np.any(hi < lo):
+            return np.array([], dtype=np.int64)
+
+        # all cells in range, as linear ids
+        ranges = [np.arange(l, h + 1) for l, h in zip(lo, hi)]
+        cells = np.stack([r.ravel() for r in np.meshgrid(*ranges, indexing='ij')], axis=1)
+        cell_id = cells @ self._mult
+
+        # keep only non empty cells
+        pos = np.searchsorted(self.cell_ids, cell_id)
+        pos = pos[pos < len(self.cell_ids)]
+        pos = pos[np.isin(self.cell_ids[pos], cell_id)]
+        if len(pos) == 0:
+            return np.array([], dtype=np.int64)
+
+        idx = np.concatenate([self.order[self.starts[p]:self.ends[p]] for p in pos])
+        # sort to preserve the original row order
+        idx.sort()
+        return idx
+
+
 # ---
 # class def
 # ---
@@ -58,9 +305,45 @@ class PredictionLocations:
                  method="expert_loc",
                  coords_col=None,
                  expert_loc=None,
+                 precompute_mapping=False,
+                 mapping_cache_dir=None,
+                 grid_index=True,
+                 grid_index_cell_size=None,
+                 shared_grid_file=None,
+                 scale_max_dist=False,
                  **kwargs):
         self.method = method
 
+        # scale max_dist by radius_scale, the ratio of the expert's (adaptive) training radius to the nominal one
+        # - radius_scale is set (per expert) by LocalExpertOI
+        self.scale_max_dist = scale_max_dist
+        self.radius_scale = None
+
+        # share (static) prediction locations between processes via a memory-mapped .npy file
+        # - the first process to load the locations writes the file, others attach to it (read-only)
+        self.shared_grid_file = shared_grid_file
+        self._shared_attached = False
+        # identifies the prediction locations in the shared file, so a file from a different grid is not reused
+        self._shared_grid_sig = None
+
+        # use a uniform grid (bucket) index over (static) prediction locations for max_dist selection
+        # - built the first time it is needed, cell size defaults to max_dist
+        self.grid_index = grid_index
+        self.grid_index_cell_size = grid_index_cell_size
+        self._grid_index = None
+
+        # precompute (once) the prediction locations within max_dist for all expert locations
+        # - only used with method 'from_dataframe' / 'from_source' and max_dist
+        # - requires expert locations to be provided via set_mapping_expert_locs
+        self.precompute_mapping = precompute_mapping
+        self.mapping_cache_dir = mapping_cache_dir
+        self._mapping_expert_locs = None
+        self._mapping = None
+        self._mapping_lookup = None
+        # where the (static) prediction locations were loaded from, e.g. load_kwargs or df_file
+        # - used to identify the locations (for caching) without hashing their contents
+        self._grid_source = None
+
         # keyword arguments to provided to selected method for generating prediction locations
         self.kwargs = kwargs
 
@@ -88,9 +371,15 @@ class PredictionLocations:
                 " kwargs, these arguments are to be provided to DataLoader.load"
 
             load_kwargs = self.kwargs.pop("load_kwargs")
-            df = DataLoader.load(**load_kwargs)
-            # drop duplicates, just in case
-            df = df.drop_duplicates()
+            self._grid_source = {"load_kwargs": load_kwargs}
+            # if prediction locations have already been published to shared file (from the same source), use those
+            if (self.shared_grid_file is not None) and self._shared_grid_published():
+                df = attach_shared_grid(self.shared_grid_file)
+                self._shared_attached = True
+            else:
+                df = DataLoader.load(**load_kwargs)
+                # drop duplicates, just in case
+                df = df.drop_duplicates()
 
             # TODO: review this - as it stands this would only allow for loading one set of prediction locations
             # update the method and put df in kwargs for future use
@@ -105,10 +394,12 @@ class PredictionLocations:
         # apply local select? e.g. select prediction locations that have same dim, say t, as reference/expert location
         if (self.method == "from_dataframe") & ("local_select" in self.kwargs):
 
-            out = DataLoader.local_data_select(out,
-                                               reference_location=self.expert_loc,
+            # NOTE: out will only contain the candidates (e.g. those within max_dist)
+            out = DataLoader.local_data_select(pd.DataFrame(out, columns=self.coords_col),
+                                               reference_location=pd.DataFrame(self.expert_loc,
+                                                                               columns=self.coords_col),
                                                local_select=self.kwargs["local_select"],
-                                               verbose=False)
+                                               verbose=False).values
 
         assert isinstance(out, np.ndarray), f"must return ndarray, got: {type(out)}"
         assert len(out.shape) == 2, f"must return 2d array, got len {len(out.shape)}d"
@@ -179,6 +470,89 @@ class PredictionLocations:
         out, = to_array(x)
         return out
 
+    def set_mapping_expert_locs(self, expert_locs):
+        """
+        Provide the full set of expert locations, for which the expert to prediction location mapping
+        will be built (once, on the next call using 'from_dataframe' with max_dist).
+
+        Parameters
+        ----------
+        expert_locs: pd.DataFrame or np.ndarray
+            Expert locations. If DataFrame the ``coords_col`` columns are used,
+            if array the columns are expected to align with ``coords_col``.
+        """
+        if isinstance(expert_locs, pd.DataFrame):
+            assert self.coords_col is not None, "coords_col must be set before providing expert locations as DataFrame"
+            expert_locs = expert_locs[self.coords_col].values
+        expert_locs = np.asarray(expert_locs)
+        assert len(expert_locs.shape) == 2, f"expert_locs must be 2d, got: {len(expert_locs.shape)}d"
+        self._mapping_expert_locs = expert_locs
+        # reset any existing mapping
+        self._mapping = None
+        self._mapping_lookup = None
+
+    def _get_mapping(self, locs, fc_loc, max_dist):
+        # get (build or load from cache) the expert to prediction location mapping
+        if self._mapping is not None:
+            return self._mapping
+
+        exp_locs = self._mapping_expert_locs[:, fc_loc].astype(locs.dtype)
+
+        cache_file = None
+        if self.mapping_cache_dir is not None:
+            key = _array_hash(np.unique(exp_locs, axis=0), self._grid_key(locs, fc_loc), float(max_dist))
+            cache_file = os.path.join(self.mapping_cache_dir, f"pred_loc_mapping_{key}.npz")
+
+        if (cache_file is not None) and os.path.exists(cache_file):
+            with np.load(cache_file) as npz:
+                mapping = {k: npz[k] for k in ["expert_locs", "indptr", "indices"]}
+        else:
+            mapping = expert_prediction_mapping(exp_locs, locs, max_dist)
+            if cache_file is not None:
+                os.makedirs(self.mapping_cache_dir, exist_ok=True)
+                np.savez(cache_file, **mapping)
+
+        self._mapping = mapping
+        # expert location (tuple) to row in CSR arrays
+        self._mapping_lookup = {tuple(el): i for i, el in enumerate(mapping["expert_locs"].tolist())}
+        return self._mapping
+
+    def _shared_grid_published(self, df=None):
+        # check if shared_grid_file exists and was published from the current prediction locations
+        # - identified by where they are loaded from (if known) otherwise by the contents of df
+        if self._shared_grid_sig is None:
+            if self._grid_source is not None:
+                self._shared_grid_sig = _array_hash(self._grid_source_key(), self.coords_col)
+            elif df is not None:
+                self._shared_grid_sig = _array_hash(np.asarray(df.values), df.columns.tolist(), self.coords_col)
+            else:
+                return False
+        return shared_grid_source(self.shared_grid_file) == self._shared_grid_sig
+
+    def _grid_source_key(self):
+        # where the prediction locations were loaded from - including the file's mtime and size, if from a file
+        source = dict(self._grid_source)
+        file = source.get("df_file", None)
+        if (file is None) and ("load_kwargs" in source):
+            file = source["load_kwargs"].get("source", None)
+        if isinstance(file, str) and os.path.isfile(file):
+            source.update(_file_signature(file))
+        return json.dumps(source, sort_keys=True, default=str)
+
+    def _grid_key(self, locs, fc_loc):
+        # identify the prediction locations by where they were loaded from, if known, else by their contents
+        if self._grid_source is None:
+            return _array_hash(locs)
+        return _array_hash(self._grid_source_key(), locs.shape, fc_loc)
+
+    def _mapping_indices(self, exp_loc):
+        # return the prediction location indices for a given expert location, None if not found
+        i = self._mapping_lookup.get(tuple(exp_loc.tolist()), None)
+        if i is None:
+            return None
+        indptr = self._mapping["indptr"]
+        return self._mapping["indices"][indptr[i]:indptr[i + 1]]
+
     def _shift_arrays(self, Xout=None, **kwargs):
         # TODO: rename this to mesh grid or something
 
@@ -210,12 +584,23 @@ class PredictionLocations:
         # TODO: finish this method - should out array be created each time?
         # TODO: review this method... it's a mess...
         # TODO: properly implement or remove copy_df - leaning towards remove
+
+        # if prediction locations have already been published to shared file (from the same source), attach to those
+        if (self.shared_grid_file is not None) and (not self._shared_attached):
+            if (df is None) and isinstance(df_file, str):
+                self._grid_source = {"df_file": os.path.abspath(df_file), "mtime": os.path.getmtime(df_file)}
+            if self._shared_grid_published(df):
+                df = attach_shared_grid(self.shared_grid_file)
+                self.kwargs['df'] = df
+                self._shared_attached = True
+
         if df is None:
 
             assert isinstance(df_file, (str, dict)), f"df is None, df_file expected to be str or dict, got: {type(df_file)}"
             #
             if isinstance(df_file, str):
                 df = pd.read_csv(df_file)
+                self._grid_source = {"df_file": os.path.abspath(df_file), "mtime": os.path.getmtime(df_file)}
             elif isinstance(df_file, str):
                 pass
 
@@ -232,12 +617,22 @@ class PredictionLocations:
             found_cols = [c for c in self.coords_col if c in df.columns]
 
             # TODO: check if df columns are entirely in self.coords_col, if not drop extra, store in kwargs?
-            # remove any extra, unneeded columns
-            if df.shape[1] > len(found_cols):
+            # remove any extra, unneeded columns - and make sure columns are in the same order as coords_col
+            if df.columns.tolist() != found_cols:
                 df = df.loc[:, found_cols]
                 # if taking reduced set of columns, store for next time
                 self.kwargs['df'] = df.copy(True) if copy_df else df
 
+        # use shared (memory-mapped) prediction locations - publishing them first if need be
+        # - df will be read-only, so copy_df is not used
+        if (self.shared_grid_file is not None) and (not self._shared_attached):
+            if not self._shared_grid_published(df):
+                publish_shared_grid(df, self.shared_grid_file, columns=found_cols, source=self._shared_grid_sig)
+            df = attach_shared_grid(self.shared_grid_file)
+            found_cols = [c for c in self.coords_col if c in df.columns]
+            self.kwargs['df'] = df
+            self._shared_attached = True
+
         # for each of the found_cols get the location in self.coords_col
         # - for selecting correct expert location columns
         fc_loc = [match(c, self.coords_col)[0] for c in found_cols]
@@ -248,22 +643,40 @@ class PredictionLocations:
             # HACK: if, for some reason, the dtypes don't match, cast the expert location as same time as data
             if self.expert_loc.dtype != df.values.dtype:
                 self.expert_loc = self.expert_loc.astype(df.values.dtype)
-            b = self._max_dist_bool(df.values,
-                                    self.expert_loc[:, fc_loc],
-                                    max_dist)
+
+            b = None
+            use_mapping = self.precompute_mapping
+            if self.scale_max_dist and (self.radius_scale is not None):
+                # the mapping is for a fixed max_dist
+                max_dist = max_dist * self.radius_scale
+                use_mapping = False
+
+            # use the precomputed mapping, if available - fall back to a full scan if expert location is not in it
+            if use_mapping and (self._mapping_expert_locs is not None):
+                self._get_mapping(df.values, fc_loc, max_dist)
+                b = self._mapping_indices(self.expert_loc[0, fc_loc])
+
+            if (b is None) and self.grid_index:
+                b = self._grid_index_select(df.values, self.expert_loc[:, fc_loc], max_dist)
+
+            if b is None:
+                b = self._max_dist_bool(df.values,
+                                        self.expert_loc[:, fc_loc],
+                                        max_dist)
         # other wise use slice(None) - to select all rows of DataFrame
         else:
             b = slice(None)
 
         # populate output array
         # if found all columns just return values
+        # NOTE: b can be a slice, bool array or array of (positional) indices
         if len(found_cols) == len(self.coords_col):
-            out = df.loc[b, :].values
+            out = df.values[b, :]
         else:
             # create an array to fill
-            nrow_out = len(df) if isinstance(b, slice) else b.sum()
-            out = np.full((nrow_out, len(self.coords_col)), np.nan)
-            out[:, fc_loc] = df.loc[b, :].values
+            vals = df.values[b, :]
+            out = np.full((len(vals), len(self.coords_col)), np.nan)
+            out[:, fc_loc] = vals
 
             # for the missing dimension populate with expert location value
             missing_cols = [cc for cc in self.coords_col if cc not in found_cols]
@@ -273,6 +686,22 @@ class PredictionLocations:
         return out
 
 
+    def _grid_index_select(self, locs, exp_loc, max_dist):
+        # select (indices of) locations within max_dist of exp_loc, only checking candidates from the grid index
+        if self._grid_index is None:
+            cell_size = max_dist if self.grid_index_cell_size is None else self.grid_index_cell_size
+            if self._shared_attached:
+                # share the index between processes, alongside the shared grid
+                index_file = f"{self.shared_grid_file}.grid_index_{float(cell_size)}"
+                self._grid_index = _GridIndex.attach(index_file, source=self._shared_grid_sig)
+                if self._grid_index is None:
+                    _GridIndex(locs, cell_size).publish(index_file, source=self._shared_grid_sig)
+                    self._grid_index = _GridIndex.attach(index_file, source=self._shared_grid_sig)
+            else:
+                self._grid_index = _GridIndex(locs, cell_size)
+        idx = self._grid_index.candidates(exp_loc[0, :], max_dist)
+        return idx[self._max_dist_bool(locs[idx], exp_loc, max_dist)]
+
     # @timer
     def _max_dist_bool(self, locs, exp_loc, max_dist):
         # TODO: shape checks
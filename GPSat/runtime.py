@@ -0,0 +1,323 @@
+# process level runtime settings
+import os
+import re
+import sys
+import platform
+import subprocess
+import warnings
+
+from dataclasses import dataclass, replace
+from typing import Union
+
+
+# environment variables which can be used to specify the thread policy
+# - GPSAT_NUM_THREADS applies to all, unless the more specific variable is set
+_THREAD_ENV_VARS = {
+    "num_threads": "GPSAT_NUM_THREADS",
+    "tf_intra_op_threads": "GPSAT_TF_INTRA_OP_THREADS",
+    "tf_inter_op_threads": "GPSAT_TF_INTER_OP_THREADS",
+    "blas_threads": "GPSAT_BLAS_THREADS",
+    "numba_threads": "GPSAT_NUMBA_THREADS"
+}
+
+# effective thread settings, once a policy has been applied (see set_thread_policy)
+_thread_policy = None
+
+# device information, detected once per process (see environment)
+_environment = None
+# GPUs are only queried via libraries which have been imported (see _get_gpu_name)
+# - _gpu_checked records those which had been when GPUs were last queried
+_GPU_LIBRARIES = ("tensorflow", "torch")
+_gpu_checked = ()
+
+
+def thread_policy_from_env() -> dict:
+    """
+    Get the thread policy specified by environment variables: ``GPSAT_NUM_THREADS``, ``GPSAT_TF_INTRA_OP_THREADS``,
+    ``GPSAT_TF_INTER_OP_THREADS``, ``GPSAT_BLAS_THREADS`` and ``GPSAT_NUMBA_THREADS``.
+
+    Returns
+    -------
+    dict
+        Keyword arguments for :func:`set_thread_policy`, only containing those whose environment variable is set.
+
+    """
+    out = {}
+    for k, env_var in _THREAD_ENV_VARS.items():
+        val = os.environ.get(env_var, "")
+        if val != "":
+            out[k] = int(val)
+    return out
+
+
+def get_thread_settings() -> dict:
+    """
+    Get the current (effective) number of threads used by TensorFlow, BLAS and numba in this process.
+
+    A value of 0 means the library's default is used (or the library has not been loaded).
+    TensorFlow and numba are only queried if they have already been imported.
+
+    Returns
+    -------
+    dict
+        With keys: "tf_intra_op_threads", "tf_inter_op_threads", "blas_threads" and "numba_threads".
+
+    """
+    from threadpoolctl import threadpool_info
+
+    out = {"tf_intra_op_threads": 0, "tf_inter_op_threads": 0}
+    if "tensorflow" in sys.modules:
+        tf = sys.modules["tensorflow"]
+        out["tf_intra_op_threads"] = tf.config.threading.get_intra_op_parallelism_threads()
+        out["tf_inter_op_threads"] = tf.config.threading.get_inter_op_parallelism_threads()
+
+    blas = [i["num_threads"] for i in threadpool_info() if i["user_api"] == "blas"]
+    out["blas_threads"] = max(blas) if len(blas) else 0
+
+    out["numba_threads"] = sys.modules["numba"].get_num_threads() if "numba" in sys.modules else 0
+
+    return out
+
+
+def set_thread_policy(num_threads: Union[int, None] = None,
+                      tf_intra_op_threads: Union[int, None] = None,
+                      tf_inter_op_threads: Union[int, None] = None,
+                      blas_threads: Union[int, None] = None,
+                      numba_threads: Union[int, None] = None,
+                      use_env: bool = True) -> dict:
+    """
+    Set the number of threads used by TensorFlow, BLAS (via ``threadpoolctl``) and numba for this process.
+
+    Intended for when multiple GPSat processes (workers) run on one node, so each can be limited to its share
+    of the cores, rather than every library in every process assuming it can use all of them.
+
+    Values not specified (``None``) are taken from the environment (see :func:`thread_policy_from_env`),
+    if ``use_env=True``, then from ``num_threads``. Anything still not specified is left unchanged.
+
+    Parameters
+    ----------
+    num_threads: int, optional
+        Number of threads for each of: TensorFlow's intra-op thread pool, BLAS and numba.
+        If specified, ``tf_inter_op_threads`` defaults to 1, i.e. independent TensorFlow ops are run one at a time,
+        each using up to ``tf_intra_op_threads``.
+    tf_intra_op_threads: int, optional
+        Threads used within a single TensorFlow op (e.g. a matrix multiplication or Cholesky).
+    tf_inter_op_threads: int, optional
+        Threads used to run independent TensorFlow ops concurrently.
+    blas_threads: int, optional
+        Threads used by BLAS libraries (e.g. OpenBLAS, MKL) loaded in the process, e.g. by numpy / scipy.
+    numba_threads: int, optional
+        Threads used by numba parallel functions, e.g. :func:`GPSat.utils.gaussian_2d_weight`.
+        Can not exceed the number numba was started with (``NUMBA_NUM_THREADS``).
+    use_env: bool, default True
+        If ``True``, unspecified values are taken from environment variables, if set.
+
+    Returns
+    -------
+    dict
+        Effective thread settings after applying the policy (see :func:`get_thread_settings`).
+
+    Notes
+    -----
+    TensorFlow's thread pools can not be changed once TensorFlow has been initialised (e.g. after any op has run),
+    in which case a warning is given and the existing settings are kept.
+
+    """
+    global _thread_policy
+
+    req = {
+        "num_threads": num_threads,
+        "tf_intra_op_threads": tf_intra_op_threads,
+        "tf_inter_op_threads": tf_inter_op_threads,
+        "blas_threads": blas_threads,
+        "numba_threads": numba_threads
+    }
+    if use_env:
+        env = thread_policy_from_env()
+        req = {k: env.get(k) if v is None else v for k, v in req.items()}
+
+    num_threads = req.pop("num_threads")
+    if num_threads is not None:
+        req = {k: (1 if k == "tf_inter_op_threads" else num_threads) if v is None else v for k, v in req.items()}
+
+    # TensorFlow
+    if (req["tf_intra_op_threads"] is not None) or (req["tf_inter_op_threads"] is not None):
+        import tensorflow as tf
+        try:
+            if req["tf_intra_op_threads"] is not None:
+                tf.config.threading.set_intra_op_parallelism_threads(req["tf_intra_op_threads"])
+            if req["tf_inter_op_threads"] is not None:
+                tf.config.threading.set_inter_op_parallelism_threads(req["tf_inter_op_threads"])
+        except RuntimeError as e:
+            warnings.warn(f"\nunable to set TensorFlow threads, keeping existing settings. Error:\n{e}")
+
+    # BLAS
+    if req["blas_threads"] is not None:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=req["blas_threads"], user_api="blas")
+
+    # numba
+    if req["numba_threads"] is not None:
+        import numba
+        numba.set_num_threads(min(req["numba_threads"], numba.config.NUMBA_NUM_THREADS))
+
+    _thread_policy = get_thread_settings()
+    return dict(_thread_policy)
+
+
+def get_thread_policy() -> Union[dict, None]:
+    """
+    Get the effective thread settings from when a policy was last applied with :func:`set_thread_policy`,
+    or ``None`` if a policy has not been applied in this process.
+    """
+    return None if _thread_policy is None else dict(_thread_policy)
+
+
+def ensure_thread_policy() -> dict:
+    """
+    Apply the thread policy from environment variables (see :func:`thread_policy_from_env`),
+    if a policy has not already been applied in this process.
+
+    Returns
+    -------
+    dict
+        Effective thread settings.
+
+    """
+    if _thread_policy is None:
+        return set_thread_policy()
+    return get_thread_policy()
+
+
+@dataclass(frozen=True)
+class RuntimeEnvironment:
+    """
+    Information on the environment (hardware) GPSat is running on, see :func:`environment`.
+
+    Attributes
+    ----------
+    system: str
+        Operating system, as returned by ``platform.system()``.
+    python_version: str
+        Python version.
+    cpu_name: str
+        Processor name, e.g. as given by ``model name`` in ``/proc/cpuinfo`` on Linux.
+    num_cpus: int
+        Number of CPUs available to this process.
+    gpu_name: str or None
+        Name of the first GPU visible to TensorFlow, or ``None`` if there are none
+        (or TensorFlow has not been imported).
+
+    """
+    system: str
+    python_version: str
+    cpu_name: str
+    num_cpus: int
+    gpu_name: Union[str, None] = None
+
+
+def _get_processor_name() -> str:
+    # ref: https://stackoverflow.com/questions/4842448/getting-processor-information-in-python
+    system = platform.system()
+    if system == "Windows":
+        return platform.processor()
+    elif system == "Darwin":
+        os.environ['PATH'] = os.environ['PATH'] + os.pathsep + '/usr/sbin'
+        try:
+            return subprocess.check_output(["sysctl", "-n", "machdep.cpu.brand_string"]).decode().strip()
+        except (FileNotFoundError, subprocess.CalledProcessError):
+            return "Unable to get cpu info for system: Darwin"
+    elif system == "Linux":
+        # read directly, rather than in a subprocess
+        try:
+            with open("/proc/cpuinfo", "r") as f:
+                for line in f:
+                    if "model name" in line:
+                        return re.sub(".*model name.*:", "", line, 1).strip()
+        except OSError:
+            pass
+        return platform.processor() or "Unable to get cpu info for system: Linux"
+    else:
+        print(f"getting processor name for system: {system} not implemented")
+        return f"Unable to get cpu info for system: {system}"
+
+
+def _loaded_gpu_libraries() -> tuple:
+    return tuple(lib for lib in _GPU_LIBRARIES if lib in sys.modules)
+
+
+def _get_gpu_name() -> Union[str, None]:
+    # name of the first GPU visible to TensorFlow or PyTorch, if any
+    # - only if the library has already been imported (e.g. by a model using it), as importing them is slow
+    if "tensorflow" in sys.modules:
+        tf = sys.modules["tensorflow"]
+        try:
+            gpus = tf.config.list_physical_devices("GPU")
+            if len(gpus) > 0:
+                try:
+                    return tf.config.experimental.get_device_details(gpus[0]).get("device_name", gpus[0].name)
+                except Exception as e:
+                    print("there was some issue getting GPU name")
+                    print(e)
+                    return gpus[0].name
+        except Exception as e:
+            print(e)
+    if "torch" in sys.modules:
+        torch = sys.modules["torch"]
+        try:
+            if torch.cuda.is_available():
+                return torch.cuda.get_device_name(0)
+        except Exception as e:
+            print(e)
+    return None
+
+
+def environment(refresh: bool = False) -> RuntimeEnvironment:
+    """
+    Get information on the environment (CPU, GPU) of this process.
+
+    Devices are only detected the first time this is called, subsequent calls return the cached result,
+    so this is cheap to call, e.g. for every local expert model. GPUs are found via TensorFlow or PyTorch,
+    which are not imported for this: they are detected on the first call after either has been imported.
+
+    Parameters
+    ----------
+    refresh: bool, default False
+        If ``True``, detect devices again (and update the cached result).
+
+    Returns
+    -------
+    RuntimeEnvironment
+
+    Examples
+    --------
+    >>> from GPSat.runtime import environment
+    >>> env = environment()
+    >>> env.cpu_name, env.gpu_name # doctest: +SKIP
+
+    """
+    global _environment, _gpu_checked
+
+    if (_environment is None) or refresh:
+        _gpu_checked = _loaded_gpu_libraries()
+        try:
+            num_cpus = len(os.sched_getaffinity(0))
+        except AttributeError:
+            num_cpus = os.cpu_count()
+        _environment = RuntimeEnvironment(system=platform.system(),
+                                          python_version=platform.python_version(),
+                                          cpu_name=_get_processor_name(),
+                                          num_cpus=num_cpus,
+                                          gpu_name=_get_gpu_name())
+    elif (_environment.gpu_name is None) and (_gpu_checked != _loaded_gpu_libraries()):
+        _gpu_checked = _loaded_gpu_libraries()
+        _environment = replace(_environment, gpu_name=_get_gpu_name())
+    return _environment
+
+
+def clear_environment_cache():
+    """
+    Clear the cached device information, so it is detected again on the next call to :func:`environment`.
+    """
+    global _environment
+    _environment = None
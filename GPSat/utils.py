@@ -9,24 +9,17 @@ import logging
 import warnings
 import copy
 
-import tables
-
 import pandas as pd
 import numpy as np
-import numba as nb
 
-import scipy.stats as scst
-from scipy.spatial.distance import cdist
 
 from datetime import datetime as dt
 from ast import literal_eval
 from functools import reduce
-from pyproj import Transformer
-from scipy.stats import skew, kurtosis, norm
 from typing import Union
 from deprecated import deprecated
 
-from GPSat.decorators import timer
+from GPSat.decorators import timer, numba_lazy
 
 def nested_dict_literal_eval(d, verbose=False):
     """
@@ -539,6 +532,7 @@ def stats_on_vals(vals, measure=None, name=None, qs=None):
     out['mean'] = np.nanmean(vals)
     out['max'] = np.nanmax(vals)
     out['std'] = np.nanstd(vals)
+    from scipy.stats import skew, kurtosis
     out['skew'] = skew(vals[~np.isnan(vals)])
     out['kurtosis'] = kurtosis(vals[~np.isnan(vals)])
 
@@ -604,6 +598,7 @@ def WGS84toEASE2(lon, lat, return_vals="both", lon_0=0, lat_0=90):
     assert return_vals in ['both', 'x', 'y'], f"return_val: {return_vals} is not in valid set: {valid_return_vals}"
     EASE2 = f"+proj=laea +lon_0={lon_0} +lat_0={lat_0} +x_0=0 +y_0=0 +ellps=WGS84 +towgs84=0,0,0,0,0,0,0 +units=m +no_defs"
     WGS84 = "+proj=longlat +ellps=WGS84 +datum=WGS84 +no_defs"
+    from pyproj import Transformer
     transformer = Transformer.from_crs(WGS84, EASE2)
     x, y = transformer.transform(lon, lat)
     if return_vals == 'both':
@@ -653,6 +648,7 @@ def EASE2toWGS84(x, y, return_vals="both", lon_0=0, lat_0=90):
     assert return_vals in ['both', 'lon', 'lat'], f"return_val: {return_vals} is not in valid set: {valid_return_vals}"
     EASE2 = f"+proj=laea +lon_0={lon_0} +lat_0={lat_0} +x_0=0 +y_0=0 +ellps=WGS84 +towgs84=0,0,0,0,0,0,0 +units=m +no_defs"
     WGS84 = "+proj=longlat +ellps=WGS84 +datum=WGS84 +no_defs"
+    from pyproj import Transformer
     transformer = Transformer.from_crs(EASE2, WGS84)
     lon, lat = transformer.transform(x, y)
     if return_vals == "both":
@@ -808,12 +804,20 @@ def bin_obs_by_date(df,
                     n_x=None,
                     n_y=None,
                     bin_statistic='mean',
+                    return_type="dict",
+                    out_file=None,
+                    out_node=None,
+                    dates_per_chunk=31,
                     verbose=False):
     """
     This function takes in a pandas DataFrame and bins the data based on the values in a specified column and the x and y coordinates in
     other specified columns. The data is binned based on a grid with a specified resolution or number of bins. The function returns a
     dictionary of binned values for each unique date in the DataFrame.
 
+    The data is sorted by date once and all dates are binned with a grouped reduction over (date, x, y),
+    rather than by filtering the DataFrame for each date. Optionally the binned values can be returned as
+    a stacked 3-D array (date, y, x), as an ``xarray.DataArray``, or written directly to a chunked array in an HDF5 file.
+
     Parameters
     ----------
     df: pandas DataFrame
@@ -846,25 +850,46 @@ def bin_obs_by_date(df,
         Number of bins in the y direction.
     bin_statistic: string or callable, default "mean"
         Statistic to compute in each bin.
+    return_type: string, default "dict"
+        Form of the binned values returned. One of:
+
+        - ``"dict"``: dictionary of 2-D arrays keyed by date (original behaviour).
+        - ``"array"``: 3-D array with dimensions (date, y, x), dates are returned as a fourth output.
+        - ``"xarray"``: ``xarray.DataArray`` with dimensions (date, y, x) and bin centres as coordinates.
+    out_file: string, default None
+        If provided, path to an HDF5 file the binned values will be written to, as a chunked array
+        with dimensions (date, y, x) and one chunk per date. Dates are processed ``dates_per_chunk`` at a time,
+        so the full 3-D array is never held in memory. In this case ``bvals`` returned is ``out_file``.
+    out_node: string, default None
+        Name of the array node in ``out_file``. If ``None`` will use ``val_col``.
+        The dates and bin edges are stored alongside as ``<out_node>_date``, ``<out_node>_x_edge``
+        and ``<out_node>_y_edge``. An existing node with the same name will be overwritten.
+    dates_per_chunk: int, default 31
+        Number of dates binned at a time when writing to ``out_file``.
     verbose: boolean, default False
         Whether to print additional information during execution.
 
     Returns
     -------
-    bvals: dictionary
-        The binned values for each unique date in the DataFrame.
+    bvals: dictionary, numpy array, xarray.DataArray or string
+        The binned values for each unique date in the DataFrame, in the form specified by ``return_type``.
+        If ``out_file`` was provided this will be the file path.
     x_edge: numpy array
         x values for the edges of the bins.
     y_edge: numpy array
         y values for the edges of the bins.
+    dates: numpy array
+        Only returned if ``return_type="array"`` or ``out_file`` is provided. The dates for the first dimension of ``bvals``.
 
     Notes
     -----
     The x and y coordinates are swapped in the returned binned values due to the transpose operation used in the function.
+    Dates without any observations are populated with ``nan``, for any ``bin_statistic``.
 
     """
-    # TODO: review usage - this function looks like it can be removed
     # TODO: double check getting desired results if binning is asymmetrical
+    import scipy.stats as scst
+    import tables
 
     # --
     # checks
@@ -874,6 +899,9 @@ def bin_obs_by_date(df,
     for k, v in {"date_col": date_col, "x_col": x_col, "y_col": y_col, "val_col": val_col}.items():
         assert v in df, f"{k}: {v} not in: {df.columns}"
 
+    valid_return_type = ["dict", "array", "xarray"]
+    assert return_type in valid_return_type, f"return_type: {return_type} not valid, must be one of: {valid_return_type}"
+
     # number of bins determined by grid_res or (n_x, n_y)
     if grid_res is None:
         print("grid_res not provided, will used n_x, n_y")
@@ -895,71 +923,118 @@ def bin_obs_by_date(df,
     n_x += 1
     n_y += 1
 
+    # NOTE: x will be dim 1, y will be dim 0
+    x_edge = np.linspace(x_min, x_max, int(n_x))
+    y_edge = np.linspace(y_min, y_max, int(n_y))
+
     # --
     # dates
     # --
 
-    udates = df['date'].unique()
-    udates = np.sort(udates)
+    # map each row to a (sorted) unique date - the only pass over the full date column
+    date_codes, udates = pd.factorize(df[date_col], sort=True)
+    udates = np.asarray(udates)
+
+    # rows without a date get code -1, which would index (and contaminate) the last date - drop them
+    valid_date = date_codes >= 0
+    if not valid_date.all():
+        if verbose:
+            print(f"dropping {(~valid_date).sum()} rows with missing {date_col}")
+        date_codes = date_codes[valid_date]
+    else:
+        valid_date = slice(None)
+
     # get all the dates between first and last?
     # - allows for missing days to be provided with nan values
     if all_dates_in_range:
         if verbose:
             print(f"getting all_dates_in_range. current number of dates: {len(udates)}")
-        min_date, max_date = np.min(udates), np.max(udates)
-        min_date, max_date = pd.to_datetime(min_date, format=date_col_format), pd.to_datetime(max_date,
-                                                                                              format=date_col_format)
-        min_date, max_date = np.datetime64(min_date).astype('datetime64[D]'), np.datetime64(max_date).astype(
-            'datetime64[D]')
+        # only the unique dates need to be converted
+        udays = pd.to_datetime(udates, format=date_col_format).values.astype('datetime64[D]')
+        min_date, max_date = udays.min(), udays.max()
+        # location of each unique date in the full range, mapped to each row
+        date_codes = (udays - min_date).astype(int)[date_codes]
         udates = np.arange(min_date, max_date + np.timedelta64(1, "D"))
-        udates = np.array([re.sub("-", "", _) for _ in udates.astype(str)])
+        udates = np.char.replace(udates.astype(str), "-", "")
 
         if verbose:
             print(f"new number of dates: {len(udates)}")
 
     # ----
     # bin data
+    # ----
 
-    # store results in dict
-    bvals = {}
-
-    # assert x_col in df, f"x_col: {x_col} is not in df columns: {df.columns}"
-    # assert y_col in df, f"y_col: {y_col} is not in df columns: {df.columns}"
-    # assert val_col in df, f"val_col: {val_col} is not in df columns: {df.columns}"
-
-    # NOTE: x will be dim 1, y will be dim 0
-    x_edge = np.linspace(x_min, x_max, int(n_x))
-    y_edge = np.linspace(y_min, y_max, int(n_y))
+    # sort (once) by date, so each block of dates is a contiguous slice of rows
+    sort_idx = np.argsort(date_codes, kind="stable")
+    date_codes = date_codes[sort_idx]
+    x_in = df[x_col].values[valid_date][sort_idx]
+    y_in = df[y_col].values[valid_date][sort_idx]
+    vals = df[val_col].values[valid_date][sort_idx]
+
+    # dates which have some data - others will be populated with nan
+    has_data = np.zeros(len(udates), dtype=bool)
+    has_data[date_codes] = True
+    if verbose:
+        for ud in udates[~has_data]:
+            print(f"there was no data for {ud}, populating with nan")
 
-    # increment over each 'unique' date
-    for ud in udates:
+    def _bin_dates(start, end):
+        # bin values for dates in [start, end) - returns array with dims (date, y, x)
+        lo, hi = np.searchsorted(date_codes, [start, end])
         if verbose >= 3:
-            print(f"binning data for date: {ud}")
-        # get values for the date
-        _ = df.loc[df['date'] == ud]
-
-        # if there is some data, bin that values
-        if len(_) > 0:
-            # extract values
-            x_in, y_in, vals = _[x_col].values, _[y_col].values, _[val_col].values
-
-            # apply binning
-            binned = scst.binned_statistic_2d(x_in, y_in, vals,
-                                              statistic=bin_statistic,
-                                              bins=[x_edge,
-                                                    y_edge],
-                                              range=[[x_min, x_max], [y_min, y_max]])
-            # extract binned values
-            # - transposing
-            bvals[ud] = binned[0].T
+            print(f"binning data for dates: {udates[start]} to {udates[end - 1]}")
+        if lo == hi:
+            return np.full((end - start, n_y - 1, n_x - 1), np.nan)
+        # grouped reduction over (date, x, y) in a single call
+        binned = scst.binned_statistic_dd([date_codes[lo:hi], x_in[lo:hi], y_in[lo:hi]],
+                                          vals[lo:hi],
+                                          statistic=bin_statistic,
+                                          bins=[np.arange(start, end + 1) - 0.5, x_edge, y_edge])
+        # - transposing x, y
+        out = np.transpose(binned.statistic, (0, 2, 1))
+        out[~has_data[start:end]] = np.nan
+        return out
 
-        else:
-            print(f"there was no data for {ud}, populating with nan")
-            bvals[ud] = np.full((n_y - 1, n_x - 1), np.nan)
+    # write directly to file, a block of dates at a time
+    if out_file is not None:
+        if out_node is None:
+            out_node = val_col
+        shape = (len(udates), n_y - 1, n_x - 1)
+        with tables.open_file(out_file, mode="a") as h5:
+            for node in [out_node, f"{out_node}_date", f"{out_node}_x_edge", f"{out_node}_y_edge"]:
+                if node in h5.root:
+                    h5.remove_node(h5.root, node)
+            carr = h5.create_carray(h5.root, out_node,
+                                    atom=tables.Float64Atom(dflt=np.nan),
+                                    shape=shape,
+                                    chunkshape=(1,) + shape[1:],
+                                    filters=tables.Filters(complevel=5, complib="zlib"))
+            for start in range(0, len(udates), dates_per_chunk):
+                end = min(start + dates_per_chunk, len(udates))
+                carr[start:end] = _bin_dates(start, end)
+            h5.create_array(h5.root, f"{out_node}_date", udates.astype(str).astype(bytes))
+            h5.create_array(h5.root, f"{out_node}_x_edge", x_edge)
+            h5.create_array(h5.root, f"{out_node}_y_edge", y_edge)
+
+        return out_file, x_edge, y_edge, udates
+
+    bvals = _bin_dates(0, len(udates))
 
     # NOTE: x,y are swapped because of the transpose - which is confusing and not needed
     # return bvals, y_edge, x_edge
-    return bvals, x_edge, y_edge
+    if return_type == "array":
+        return bvals, x_edge, y_edge, udates
+    elif return_type == "xarray":
+        import xarray as xr
+        bvals = xr.DataArray(bvals,
+                             coords={"date": udates,
+                                     "y": y_edge[:-1] + np.diff(y_edge) / 2,
+                                     "x": x_edge[:-1] + np.diff(x_edge) / 2},
+                             dims=["date", "y", "x"],
+                             name=val_col)
+        return bvals, x_edge, y_edge
+
+    return {ud: bvals[i] for i, ud in enumerate(udates)}, x_edge, y_edge
 
 
 def not_nan(x):
@@ -1254,6 +1329,7 @@ def get_previous_oi_config(store_path, oi_config, table_name="oi_config", skip_v
                          min_itemsize={"config": 50000})
 
             # for legacy reasons, still write (first) oi_config as an attribute
+            import tables
             try:
                 store.get_storer(table_name).attrs['oi_config'] = oi_config
             except tables.exceptions.HDF5ExtError as e:
@@ -2062,6 +2138,7 @@ def glue_local_predictions(preds_df: pd.DataFrame,
     # Add a std column
     preds.insert(preds.columns.get_loc("f*_var")+1, "f*_std", np.sqrt(preds["f*_var"]))
     # Compute Gaussian weights
+    from scipy.stats import norm
     preds['weights_x'] = norm.pdf(preds['pred_loc_x'], preds['x'], hx/sigma[0])
     preds['weights_y'] = norm.pdf(preds['pred_loc_y'], preds['y'], hy/sigma[1])
     preds['total_weights'] = preds['weights_x'] * preds['weights_y']
@@ -2323,9 +2400,10 @@ def softplus(x, shift=0):
     return np.log1p(np.exp(-np.abs(x))) + np.maximum(x, 0) + shift
 
 
-@nb.guvectorize([(nb.float64[:], nb.float64[:], nb.float64[:], nb.float64[:]),
-                 (nb.float32[:], nb.float32[:], nb.float32[:], nb.float32[:])],
-                "(),(),()->()", nopython=True, target="cpu")
+@numba_lazy("guvectorize",
+            ["void(float64[:], float64[:], float64[:], float64[:])",
+              "void(float32[:], float32[:], float32[:], float32[:])"],
+            "(),(),()->()", nopython=True, target="cpu")
 def _inverse_softplus(y, shift, threshold, out):
     # TODO: define a numba function version of this? just to avoid the input_scalar bit
     # inverse of softplus - solve for y: y = log(1 + exp(x))
@@ -2380,9 +2458,24 @@ def sigmoid(x, low=0, high=1):
     return (high - low) / (1 + np.exp(-x)) + low
 
 
-@nb.guvectorize([(nb.float64[:], nb.float64[:], nb.float64[:], nb.float64[:]),
-                 (nb.float32[:], nb.float32[:], nb.float32[:], nb.float32[:])],
-                "(),(),()->()", nopython=True, target="cpu")
+def softplus_grad(x, shift=0):
+    # derivative of softplus w.r.t. x
+    from scipy.special import expit
+    return expit(x)
+
+
+def sigmoid_grad(x, low=0, high=1):
+    # derivative of (scaled) sigmoid w.r.t. x
+    from scipy.special import expit
+    assert high > low
+    s = expit(x)
+    return (high - low) * s * (1 - s)
+
+
+@numba_lazy("guvectorize",
+            ["void(float64[:], float64[:], float64[:], float64[:])",
+              "void(float32[:], float32[:], float32[:], float32[:])"],
+            "(),(),()->()", nopython=True, target="cpu")
 def _inverse_sigmoid(y, low, high, out):
 
     if y[0] <= low[0]:
@@ -2462,7 +2555,7 @@ def nll(y, mu, sig, return_tot=True):
         return out
 
 
-@nb.jit(nopython=True)
+@numba_lazy("jit", nopython=True)
 def guess_track_num(x, thresh, start_track=0):
     out = np.full(len(x), np.nan)
     track_num = start_track
@@ -2474,7 +2567,7 @@ def guess_track_num(x, thresh, start_track=0):
     return out
 
 
-@nb.jit(nopython=True)
+@numba_lazy("jit", nopython=True)
 def track_num_for_date(x):
     out = np.full(len(x), np.nan)
     out[0] = 0
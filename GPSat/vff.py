@@ -2,6 +2,7 @@
 Code adapted from:
 https://github.com/st--/VFF
 """
+import hashlib
 import numpy as np
 import tensorflow as tf
 import gpflow
@@ -455,47 +456,33 @@ def make_Kuu(kern, a, b, ms):
 
 
 def make_Kuf(k, X, a, b, ms):
+    """
+    Fourier features (cos, then sin) for locations X of shape (N, 1), as an (M, N) tensor,
+    with the corrections for locations outside [a, b], which depend on the kernel k.
+    """
     omegas = 2.0 * np.pi * ms / (b - a)
+    omegas_sin = omegas[omegas != 0]  # don't compute zeros freq.
     # if default_float() is np.float32:
     #     omegas = omegas.astype(np.float32)
-    Kuf_cos = tf.transpose(tf.cos(omegas * (X - a)))
-    omegas_sin = omegas[omegas != 0]  # don't compute zeros freq.
-    Kuf_sin = tf.transpose(tf.sin(omegas_sin * (X - a)))
+    Xt = tf.transpose(X)
+    Kuf_cos = tf.cos(omegas[:, None] * (Xt - a))
+    Kuf_sin = tf.sin(omegas_sin[:, None] * (Xt - a))
 
     # correct Kfu outside [a, b]
-    lt_a_sin = tf.tile(tf.transpose(X) < a, [len(ms) - 1, 1])
-    gt_b_sin = tf.tile(tf.transpose(X) > b, [len(ms) - 1, 1])
-    lt_a_cos = tf.tile(tf.transpose(X) < a, [len(ms), 1])
-    gt_b_cos = tf.tile(tf.transpose(X) > b, [len(ms), 1])
+    # - the (1, N) masks and edge values are broadcast over the features
+    lt_a = Xt < a
+    gt_b = Xt > b
     if isinstance(k, gpflow.kernels.Matern12):
-        # Kuf_sin[:, np.logical_or(X.flatten() < a, X.flatten() > b)] = 0
-        Kuf_sin = tf.where(
-            tf.logical_or(lt_a_sin, gt_b_sin), tf.zeros(tf.shape(Kuf_sin), default_float()), Kuf_sin
-        )
-        Kuf_cos = tf.where(
-            lt_a_cos,
-            tf.tile(tf.exp(-tf.abs(tf.transpose(X - a)) / k.lengthscales), [len(ms), 1]),
-            Kuf_cos,
-        )
-        Kuf_cos = tf.where(
-            gt_b_cos,
-            tf.tile(tf.exp(-tf.abs(tf.transpose(X - b)) / k.lengthscales), [len(ms), 1]),
-            Kuf_cos,
-        )
+        Kuf_sin = tf.where(tf.logical_or(lt_a, gt_b), tf.zeros_like(Kuf_sin), Kuf_sin)
+        Kuf_cos = tf.where(lt_a, tf.exp(-tf.abs(Xt - a) / k.lengthscales), Kuf_cos)
+        Kuf_cos = tf.where(gt_b, tf.exp(-tf.abs(Xt - b) / k.lengthscales), Kuf_cos)
     elif isinstance(k, gpflow.kernels.Matern32):
-        arg = np.sqrt(3) * tf.abs(tf.transpose(X) - a) / k.lengthscales
-        edge = tf.tile((1 + arg) * tf.exp(-arg), [len(ms), 1])
-        Kuf_cos = tf.where(lt_a_cos, edge, Kuf_cos)
-        arg = np.sqrt(3) * tf.abs(tf.transpose(X) - b) / k.lengthscales
-        edge = tf.tile((1 + arg) * tf.exp(-arg), [len(ms), 1])
-        Kuf_cos = tf.where(gt_b_cos, edge, Kuf_cos)
-
-        arg = np.sqrt(3) * tf.abs(tf.transpose(X) - a) / k.lengthscales
-        edge = (tf.transpose(X) - a) * tf.exp(-arg) * omegas_sin[:, None]
-        Kuf_sin = tf.where(lt_a_sin, edge, Kuf_sin)
-        arg = np.sqrt(3) * tf.abs(tf.transpose(X) - b) / k.lengthscales
-        edge = (tf.transpose(X) - b) * tf.exp(-arg) * omegas_sin[:, None]
-        Kuf_sin = tf.where(gt_b_sin, edge, Kuf_sin)
+        arg_a = np.sqrt(3) * tf.abs(Xt - a) / k.lengthscales
+        arg_b = np.sqrt(3) * tf.abs(Xt - b) / k.lengthscales
+        Kuf_cos = tf.where(lt_a, (1 + arg_a) * tf.exp(-arg_a), Kuf_cos)
+        Kuf_cos = tf.where(gt_b, (1 + arg_b) * tf.exp(-arg_b), Kuf_cos)
+        Kuf_sin = tf.where(lt_a, (Xt - a) * tf.exp(-arg_a) * omegas_sin[:, None], Kuf_sin)
+        Kuf_sin = tf.where(gt_b, (Xt - b) * tf.exp(-arg_b) * omegas_sin[:, None], Kuf_sin)
     elif isinstance(k, gpflow.kernels.Matern52):
         # edges not implemented yet
         tf.debugging.assert_greater_equal(
@@ -512,15 +499,17 @@ def make_Kuf(k, X, a, b, ms):
         )
     else:
         raise NotImplementedError
-    return np.concatenate([Kuf_cos, Kuf_sin], axis=0)
+    return tf.concat([Kuf_cos, Kuf_sin], axis=0)
 
 
 def make_Kuf_np(X, a, b, ms):
     omegas = 2.0 * np.pi * ms / (b - a)
-    Kuf_cos = np.cos(omegas * (X - a)).T
-    omegas = omegas[omegas != 0]  # don't compute zeros freq.
-    Kuf_sin = np.sin(omegas * (X - a)).T
-    return np.vstack([Kuf_cos, Kuf_sin])
+    omegas = np.concatenate([omegas, omegas[omegas != 0]])  # don't compute zeros freq. for sin
+    Kuf = omegas[:, None] * (X.T - a)
+    # cos features, then sin
+    Kuf[:len(ms)] = np.cos(Kuf[:len(ms)])
+    Kuf[len(ms):] = np.sin(Kuf[len(ms):])
+    return Kuf
 
 
 # ---- kronecker_ops ----
@@ -550,9 +539,43 @@ def make_kvs(k):
     return reduce(make_kvs_two, k)
 
 
+def make_kvs_cols(k):
+    """
+    Compute the column-wise Kronecker product (Khatri-Rao product) of the list of matrices k, of shapes (M_d, N),
+    i.e. the transpose of make_kvs for the transposed matrices, giving a (prod(M_d), N) tensor.
+    """
+    N = tf.shape(k[0])[1]
+    return reduce(lambda A, B: tf.reshape(tf.einsum("in,jn->ijn", A, B), tf.stack([-1, N])), k)
+
+
+def kron_solve(K, B, Ms):
+    """
+    Compute kron(K)^{-1} B, for a list of (structured) matrices K, of sizes Ms, without forming the Kronecker product.
+
+    Each column of B is reshaped to a tensor of shape Ms, and each K[d] is solved along dimension d,
+    requiring O(prod(Ms) * sum(Ms)) operations per column, rather than O(prod(Ms)^3).
+    """
+    D = len(Ms)
+    T = tf.reshape(B, list(Ms) + [-1])
+    for d in range(D):
+        # bring dimension d to the front, solve, and move it back
+        perm = [d] + [i for i in range(D + 1) if i != d]
+        Td = tf.transpose(T, perm)
+        Td_shape = tf.shape(Td)
+        Td = tf.reshape(K[d].solve(tf.reshape(Td, [Ms[d], -1])), Td_shape)
+        T = tf.transpose(Td, np.argsort(perm))
+    return tf.reshape(T, [int(np.prod(Ms)), -1])
+
+
+def kron_logdet(K, Ms):
+    """Compute the log determinant of kron(K), for a list of (structured) matrices K of sizes Ms."""
+    M = float(np.prod(Ms))
+    return reduce(tf.add, [M / Ms[d] * K[d].logdet() for d in range(len(Ms))])
+
+
 def make_kvs_two_np(A, B):
-    # return np.tile(A, [B.shape[0], 1]) * np.repeat(B, A.shape[0], axis=0)
-    return np.repeat(A, B.shape[0], axis=0) * np.tile(B, [A.shape[0], 1])
+    # equivalent to: np.repeat(A, B.shape[0], axis=0) * np.tile(B, [A.shape[0], 1]), without the copies
+    return np.einsum("in,jn->ijn", A, B).reshape(-1, A.shape[1])
 
 
 def make_kvs_np(A_list):
@@ -562,7 +585,16 @@ def make_kvs_np(A_list):
 # ------- gpr -------
 
 class GPR_kron(gpflow.models.GPModel, gpflow.models.InternalDataTrainingLossMixin):
-    def __init__(self, data, ms, a, b, kernel_list):
+    def __init__(self, data, ms, a, b, kernel_list, data_space=None):
+        """
+        GPR with variational Fourier features, using a separable kernel.
+
+        Kuu is the Kronecker product of (structured) matrices for each dimension, which is used for its
+        log determinant and solves, rather than forming it, or its inverse, as a dense matrix.
+        With ``data_space=True`` the (collapsed) bound and predictions are computed with N x N matrices,
+        which is used when there are fewer observations (N) than inducing features (M = prod(Ms)),
+        e.g. for 3-D experts with many features per dimension, otherwise with M x M matrices.
+        """
 
         for kernel in kernel_list:
             assert isinstance(kernel, (gpflow.kernels.Matern12, gpflow.kernels.Matern32, gpflow.kernels.Matern52))
@@ -594,6 +626,10 @@ class GPR_kron(gpflow.models.GPModel, gpflow.models.InternalDataTrainingLossMixi
             Nsin_d = self.ms[i].size - 1
             self.Ms.append(Ncos_d + Nsin_d)
 
+        if data_space is None:
+            data_space = len(self.X) < np.prod(self.Ms)
+        self.data_space = data_space
+
         # pre compute static quantities
         assert np.all(self.X > a)
         assert np.all(self.X < b)
@@ -603,75 +639,150 @@ class GPR_kron(gpflow.models.GPModel, gpflow.models.InternalDataTrainingLossMixi
         ]
         self.Kuf = make_kvs_np(Kuf)
         self.KufY = np.dot(self.Kuf, self.Y)
-        self.KufKfu = np.dot(self.Kuf, self.Kuf.T)
+        # M x M, only needed if not working in the data space
+        self.KufKfu = None if self.data_space else np.dot(self.Kuf, self.Kuf.T)
         self.tr_YTY = np.sum(np.square(self.Y))
 
+        # posterior quantities, shared by elbo and predict_f, and the hyperparameters they were computed for
+        self._posterior_cache = None
+        # features of, and predictions at, the most recent prediction locations,
+        # e.g. to share between predict_y and predict_f, which are both used by GPflowVFFModel.predict
+        self._features_cache = None
+        self._prediction_cache = None
+
     def maximum_log_likelihood_objective(self):
         return self.elbo()
 
+    def _parameter_key(self):
+        return tuple(p.numpy().tobytes() for p in self.parameters)
+
+    def _posterior(self):
+        # per-dimension Kuu factors, Kuu = kron(Kuu[0], Kuu[1], ...)
+        Kuu = [make_Kuu(k, a, b, self.ms[i]) for i, (k, a, b) in enumerate(zip(self.kernels, self.a, self.b))]
+        sigma2 = self.likelihood.variance
+        post = {"Kuu": Kuu, "Kuu_logdet": kron_logdet(Kuu, self.Ms)}
+
+        if self.data_space:
+            # B = Kfu Kuu^{-1} Kuf + sigma2 I
+            V = kron_solve(Kuu, self.Kuf, self.Ms)
+            Qff = tf.matmul(self.Kuf, V, transpose_a=True)
+            L = tf.linalg.cholesky(Qff + sigma2 * tf.eye(tf.shape(Qff)[0], dtype=default_float()))
+            post["V"] = V
+            post["c"] = tf.linalg.triangular_solve(L, self.Y)
+            post["tr_Qff"] = tf.linalg.trace(Qff)
+        else:
+            # P = Kuf Kfu / sigma2 + Kuu
+            P = self.KufKfu / sigma2 + kron([Kuu_d.get() for Kuu_d in Kuu])
+            L = tf.linalg.cholesky(P)
+            post["c"] = tf.linalg.triangular_solve(L, self.KufY) / sigma2
+            post["tr_Qff"] = tf.linalg.trace(kron_solve(Kuu, self.KufKfu, self.Ms))
+        post["L"] = L
+        return post
+
+    def _cached_posterior(self):
+        # reuse the posterior (e.g. from the last elbo) while the hyperparameters are unchanged
+        # - only when executing eagerly, tensors from outside a tf.function can't be used in it
+        if not tf.executing_eagerly():
+            return self._posterior()
+        key = self._parameter_key()
+        if (self._posterior_cache is None) or (self._posterior_cache[0] != key):
+            self._posterior_cache = (key, self._posterior())
+        return self._posterior_cache[1]
+
+    def _features(self, Xnew):
+        # Kus: the (M, N*) features of the prediction locations Xnew
+        Kus = [
+            make_Kuf(k, Xnew[:, i : i + 1], a, b, self.ms[i])
+            for i, (k, a, b) in enumerate(zip(self.kernels, self.a, self.b))
+        ]
+        return make_kvs_cols(Kus)
+
+    @staticmethod
+    def _locations_key(Xnew):
+        # cache key for prediction locations, None if they can't be cached
+        # - only when executing eagerly, tensors from outside a tf.function can't be used in it
+        if (not tf.executing_eagerly()) or (not isinstance(Xnew, np.ndarray)):
+            return None
+        Xnew = np.ascontiguousarray(Xnew)
+        return hashlib.sha1(Xnew.tobytes()).hexdigest(), Xnew.shape, Xnew.dtype.str
+
+    def _cached_features(self, Xnew):
+        # reuse the features while the prediction locations (and domain) are unchanged
+        # - outside the domain the features depend on the lengthscales, in which case those must be unchanged too
+        key = self._locations_key(Xnew)
+        if key is None:
+            return self._features(Xnew)
+        if np.any(Xnew < np.asarray(self.a)) or np.any(Xnew > np.asarray(self.b)):
+            key += tuple(k.lengthscales.numpy().tobytes() for k in self.kernels)
+        if (self._features_cache is None) or (self._features_cache[0] != key):
+            self._features_cache = (key, self._features(Xnew))
+        return self._features_cache[1]
+
     def elbo(self):
         Kdiag = reduce(
             tf.multiply, [k.K_diag(self.X[:, i : i + 1]) for i, k in enumerate(self.kernels)]
         )
-        Kuu = [make_Kuu(k, a, b, self.ms[i]) for i, (k, a, b) in enumerate(zip(self.kernels, self.a, self.b))]
-        Kuu_solid = kron([Kuu_d.get() for Kuu_d in Kuu])
-        Kuu_inv_solid = kron([Kuu_d.inv().get() for Kuu_d in Kuu])
+        # not cached, as gradients may be required
+        post = self._posterior()
+        if tf.executing_eagerly():
+            self._posterior_cache = (self._parameter_key(), post)
         sigma2 = self.likelihood.variance
-
-        # Compute intermediate matrices
-        P = self.KufKfu / sigma2 + Kuu_solid
-        L = tf.linalg.cholesky(P)
-        log_det_P = tf.reduce_sum(tf.math.log(tf.square(tf.linalg.diag_part(L))))
-        c = tf.linalg.triangular_solve(L, self.KufY) / sigma2
-
-        Kuu_logdets = [K.logdet() for K in Kuu]
-        N_others = [float(np.prod(self.Ms[i])) / M for i, M in enumerate(self.Ms)]
-        Kuu_logdet = reduce(tf.add, [N * logdet for N, logdet in zip(N_others, Kuu_logdets)])
+        L, c = post["L"], post["c"]
+        log_det_L = tf.reduce_sum(tf.math.log(tf.square(tf.linalg.diag_part(L))))
 
         # compute log marginal bound
         ND = tf.cast(tf.size(self.Y), default_float())
         D = tf.cast(tf.shape(self.Y)[1], default_float())
-        
-        elbo = -0.5 * ND * tf.math.log(2 * np.pi * sigma2)
-        elbo -= 0.5 * D * log_det_P
-        elbo += 0.5 * D * Kuu_logdet
-        elbo -= 0.5 * self.tr_YTY / sigma2
-        elbo += 0.5 * tf.reduce_sum(tf.square(c))
+
+        if self.data_space:
+            # log N(Y | 0, B), L = chol(B)
+            elbo = -0.5 * ND * np.log(2 * np.pi)
+            elbo -= 0.5 * D * log_det_L
+            elbo -= 0.5 * tf.reduce_sum(tf.square(c))
+        else:
+            # as above, using the matrix determinant lemma and Woodbury identity, L = chol(P)
+            elbo = -0.5 * ND * tf.math.log(2 * np.pi * sigma2)
+            elbo -= 0.5 * D * log_det_L
+            elbo += 0.5 * D * post["Kuu_logdet"]
+            elbo -= 0.5 * self.tr_YTY / sigma2
+            elbo += 0.5 * tf.reduce_sum(tf.square(c))
         elbo -= 0.5 * tf.reduce_sum(Kdiag) / sigma2
-        elbo += 0.5 * tf.reduce_sum(Kuu_inv_solid * self.KufKfu) / sigma2
-        
+        elbo += 0.5 * post["tr_Qff"] / sigma2
+
         return elbo
 
     def predict_f(self, Xnew, full_cov=False, full_output_cov=False):
         assert not full_output_cov
-        Kuu = [make_Kuu(k, a, b, self.ms[i]) for i, (k, a, b) in enumerate(zip(self.kernels, self.a, self.b))]
-        Kuu_solid = kron([Kuu_d.get() for Kuu_d in Kuu])
-        Kuu_inv_solid = kron([Kuu_d.inv().get() for Kuu_d in Kuu])
-        sigma2 = self.likelihood.variance
+        if full_cov:
+            raise NotImplementedError
 
-        # Compute intermediate matrices
-        P = self.KufKfu / sigma2 + Kuu_solid
-        L = tf.linalg.cholesky(P)
-        c = tf.linalg.triangular_solve(L, self.KufY) / sigma2
+        key = self._locations_key(Xnew)
+        if key is not None:
+            key = (key, self._parameter_key())
+            if (self._prediction_cache is not None) and (self._prediction_cache[0] == key):
+                return self._prediction_cache[1]
 
-        Kus = [
-            make_Kuf(k, Xnew[:, i : i + 1], a, b, self.ms[i])
-            for i, (k, a, b) in enumerate(zip(self.kernels, self.a, self.b))
-        ]
-        Kus = tf.transpose(make_kvs([tf.transpose(Kus_d) for Kus_d in Kus]))
-        tmp = tf.linalg.triangular_solve(L, Kus)
+        post = self._cached_posterior()
+        L, c = post["L"], post["c"]
+
+        Kus = self._cached_features(Xnew)
+        if self.data_space:
+            # Kfu Kuu^{-1} Kus
+            tmp = tf.linalg.triangular_solve(L, tf.matmul(post["V"], Kus, transpose_a=True))
+        else:
+            tmp = tf.linalg.triangular_solve(L, Kus)
         mean = tf.matmul(tf.transpose(tmp), c)
-        KiKus = tf.matmul(Kuu_inv_solid, Kus)
-        if full_cov:
-            raise NotImplementedError
+        var = reduce(
+            tf.multiply, [k.K_diag(Xnew[:, i : i + 1]) for i, k in enumerate(self.kernels)]
+        )
+        if self.data_space:
+            var -= tf.reduce_sum(tf.square(tmp), 0)
         else:
-            var = reduce(
-                tf.multiply, [k.K_diag(Xnew[:, i : i + 1]) for i, k in enumerate(self.kernels)]
-            )
             var += tf.reduce_sum(tf.square(tmp), 0)
-            var -= tf.reduce_sum(KiKus * Kus, 0)
-            shape = tf.stack([1, tf.shape(self.Y)[1]])
-            var = tf.tile(tf.expand_dims(var, 1), shape)
-        return mean, var
+            var -= tf.reduce_sum(kron_solve(post["Kuu"], Kus, self.Ms) * Kus, 0)
+        shape = tf.stack([1, tf.shape(self.Y)[1]])
+        var = tf.tile(tf.expand_dims(var, 1), shape)
 
-        
\ No newline at end of file
+        if key is not None:
+            self._prediction_cache = (key, (mean, var))
+        return mean, var
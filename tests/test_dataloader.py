@@ -1,6 +1,7 @@
 # DataLoader unit tests
 # TODO: DataLoader unit test require review
 
+import numpy as np
 import pandas as pd
 import pytest
 
@@ -167,3 +168,114 @@ def test_loc_col_not_in_ref_loc(global_dynamic_select, local_select):
     incorrect_ref_loc = pd.DataFrame({'wrong_loc_col': [1, 2, 3], 'other_col': [4, 5, 6]})
     with pytest.raises(AssertionError):
         DataLoader.get_where_list(global_select=global_dynamic_select, local_select=local_select, ref_loc=incorrect_ref_loc)
+
+def test_thin_data():
+    rng = np.random.default_rng(0)
+    # dense cluster (e.g. a track crossover) and sparse background
+    xy = np.concatenate([rng.uniform(0, 1, size=(900, 2)), rng.uniform(1, 10, size=(100, 2))])
+    df = pd.DataFrame({"x": xy[:, 0], "y": xy[:, 1], "z": rng.normal(size=len(xy))})
+
+    # no thinning needed
+    assert DataLoader.thin_data(df, max_obs=len(df), coords_col=["x", "y"]) is df
+
+    # stratified: a subset of rows, sampled evenly across bins, so the sparse observations are kept
+    out = DataLoader.thin_data(df, max_obs=200, coords_col=["x", "y"], bin_size=1.)
+    assert len(out) == 200
+    assert out.index.is_unique and out.index.isin(df.index).all()
+    assert out.index.isin(df.index[900:]).sum() == 100
+
+    # super observations: means of bins, coarsened until there are at most max_obs
+    out = DataLoader.thin_data(df, max_obs=50, coords_col=["x", "y"], obs_col="z", method="super_obs")
+    assert len(out) <= 50
+    assert out["num_averaged"].sum() == len(df)
+    np.testing.assert_allclose((out["z"] * out["num_averaged"]).sum(), df["z"].sum())
+
+
+def test_local_data_select_adaptive_radius():
+    rng = np.random.default_rng(0)
+    xy = rng.uniform(0, 10, size=(1000, 2))
+    df = pd.DataFrame({"x": xy[:, 0], "y": xy[:, 1], "t": rng.integers(0, 2, size=len(xy))})
+    ref = pd.DataFrame({"x": [5.], "y": [5.], "t": [0]})
+    d = np.sqrt(np.sum((xy - 5.) ** 2, axis=1))
+
+    def select(target, **kwargs):
+        local_select = [{"col": ["x", "y"], "comp": "<", "val": 1., "target_num_obs": target, **kwargs},
+                        {"col": "t", "comp": "==", "val": 0}]
+        return DataLoader.local_data_select(df, ref, local_select, verbose=False, return_vals=True)
+
+    # within the target: the radius is unchanged
+    n = np.sum((d <= 1.) & (df["t"] == 0))
+    out, vals = select([n - 1, n + 1])
+    assert vals == [1., 0] and len(out) == n
+
+    # grow / shrink the radius to the target number of observations, of those satisfying the other criteria
+    for target in [[100, 200], [5, 10]]:
+        out, vals = select(target)
+        assert len(out) == target[0] if vals[0] > 1. else len(out) == target[1]
+        assert np.all(out["t"] == 0)
+        # the radius is the distance to the furthest selected (grow) or just less than the nearest excluded (shrink)
+        dist = np.sqrt(((out[["x", "y"]] - 5.) ** 2).sum(axis=1))
+        if vals[0] > 1.:
+            assert dist.max() == vals[0]
+        else:
+            assert dist.max() < vals[0] < np.sort(d[df["t"] == 0])[target[1]]
+
+    # within the radius bounds
+    out, vals = select([100, 200], max_val=1.5)
+    assert vals[0] == 1.5 and len(out) < 100
+
+
+def test_quadtree_expert_locations():
+    rng = np.random.default_rng(0)
+    # sparse observations over [0, 8) x [0, 4), dense in [0, 1) x [0, 1), none over [0, 8) x [4, 8)
+    xy = np.concatenate([rng.uniform([0, 0], [8, 4], size=(200, 2)), rng.uniform(0, 1, size=(2000, 2))])
+    df = pd.DataFrame({"x": xy[:, 0], "y": xy[:, 1]})
+
+    locs = DataLoader.quadtree_expert_locations(df, min_cell_size=0.25, max_obs=50, max_experts=40,
+                                                bounds=[(0, 8), (0, 8)], return_cell_info=True)
+    assert 1 < len(locs) <= 40
+    assert locs["num_obs"].min() >= 1
+    # every observation is in exactly one cell
+    assert locs["num_obs"].sum() == len(df)
+    # no experts where there are no observations
+    assert np.all(locs["y"] < 4)
+    # smaller cells in the dense region
+    dense = (locs["x"] < 1) & (locs["y"] < 1)
+    assert locs.loc[dense, "cell_size"].max() < locs.loc[~dense, "cell_size"].min()
+    assert locs["cell_size"].min() >= 0.25
+
+    # a maximum cell size, with no budget, limits the expert spacing
+    locs = DataLoader.quadtree_expert_locations(df, min_cell_size=0.25, max_cell_size=1, max_obs=50,
+                                                bounds=[(0, 8), (0, 8)], return_cell_info=True)
+    assert locs["cell_size"].max() <= 1
+    assert list(locs.columns[:2]) == ["x", "y"]
+
+
+def test_quadtree_expert_locations_ties():
+    # uniform data gives cells of equal priority, which must not be compared themselves
+    g = np.arange(16) + 0.5
+    gx, gy = np.meshgrid(g, g)
+    df = pd.DataFrame({"x": gx.ravel(), "y": gy.ravel()})
+    locs = DataLoader.quadtree_expert_locations(df, min_cell_size=1, max_obs=1, bounds=[(0, 16), (0, 16)],
+                                                return_cell_info=True)
+    # an expert at each observation, in a cell of the minimum size
+    assert len(locs) == 256
+    assert np.all(locs["cell_size"] == 1) & np.all(locs["num_obs"] == 1)
+    pd.testing.assert_frame_equal(locs[["x", "y"]], df.sort_values(["x", "y"]).reset_index(drop=True))
+
+    # with a budget ties are split in the order they were added, so the result is deterministic
+    locs = DataLoader.quadtree_expert_locations(df, min_cell_size=1, max_obs=1, max_experts=100,
+                                                bounds=[(0, 16), (0, 16)], return_cell_info=True)
+    assert len(locs) <= 100
+    assert locs["num_obs"].sum() == len(df)
+    pd.testing.assert_frame_equal(locs, DataLoader.quadtree_expert_locations(df, min_cell_size=1, max_obs=1,
+                                                                             max_experts=100,
+                                                                             bounds=[(0, 16), (0, 16)],
+                                                                             return_cell_info=True))
+
+    # duplicated observations, at a few locations, can't be split below the minimum cell size
+    dup = pd.DataFrame({"x": np.repeat([0.5, 0.5, 3.5], 50), "y": np.repeat([0.5, 3.5, 3.5], 50)})
+    locs = DataLoader.quadtree_expert_locations(dup, min_cell_size=1, max_obs=1, bounds=[(0, 4), (0, 4)],
+                                                return_cell_info=True)
+    assert len(locs) == 3
+    assert np.all(locs["num_obs"] == 50) & np.all(locs["cell_size"] == 1)
@@ -1,5 +1,6 @@
 #%%
 # Testing local experts
+import pytest
 import numpy as np
 import pandas as pd
 import gpflow
@@ -7,6 +8,7 @@ from sklearn.gaussian_process.kernels import Matern
 from sklearn.gaussian_process import GaussianProcessRegressor
 #from GPSat.models import GPflowGPRModel, GPflowSGPRModel, GPflowSVGPModel, sklearnGPRModel
 from GPSat.models import get_model
+from GPSat.models.inducing_points import clear_inducing_point_cache
 # from GPSat.models.vff_model import GPflowVFFModel
 # from GPSat.models.gpytorch_models import GPyTorchGPRModel
 # from GPSat.models.asvgp_model import GPflowASVGPModel
@@ -15,9 +17,9 @@ os.environ["CUDA_VISIBLE_DEVICES"] = "-1" # Disable GPU
 
 # get the models
 GPflowGPRModel, GPflowSGPRModel, GPflowSVGPModel, \
-    sklearnGPRModel, GPflowVFFModel, GPyTorchGPRModel = \
+    sklearnGPRModel, GPflowVFFModel, GPyTorchGPRModel, GPflowASVGPModel = \
     [get_model(m) for m in ['GPflowGPRModel', 'GPflowSGPRModel', 'GPflowSVGPModel',
-                            'sklearnGPRModel', 'GPflowVFFModel', 'GPyTorchGPRModel']]
+                            'sklearnGPRModel', 'GPflowVFFModel', 'GPyTorchGPRModel', 'GPflowASVGPModel']]
 
 # Generate random data from matern-3/2 model
 np.random.seed(23435)
@@ -200,6 +202,39 @@ constraints_dict = {
 
 #%%
 
+# data and expert locations for running LocalExpertOI end to end
+_rng = np.random.default_rng(0)
+_xy = _rng.uniform(0, 10, size=(400, 2))
+run_data = pd.DataFrame({"x": _xy[:, 0], "y": _xy[:, 1],
+                         "z": np.sin(_xy[:, 0]) * np.cos(_xy[:, 1]) + 0.05 * _rng.normal(size=400)})
+# last expert has no observations, so is skipped
+expert_locs = pd.DataFrame({"x": [2., 5., 20., 8., 5.], "y": [2., 5., 20., 8., 2.]})
+
+
+def _local_expert_oi(oi_model, init_params=None, constraints=None, data_source=None, expert_loc_source=None,
+                     thinning=None):
+    from GPSat.local_experts import LocalExpertOI
+    return LocalExpertOI(expert_loc_config={"source": expert_locs if expert_loc_source is None else expert_loc_source},
+                         data_config={"data_source": run_data if data_source is None else data_source,
+                                      "table": None if data_source is None else "data",
+                                      "obs_col": "z", "coords_col": ["x", "y"],
+                                      "local_select": [{"col": ["x", "y"], "comp": "<", "val": 2.5}],
+                                      "thinning": thinning},
+                         model_config={"oi_model": oi_model, "init_params": init_params or {},
+                                       "constraints": constraints},
+                         pred_loc_config={"method": "expert_loc"})
+
+
+def _run_local_experts(tmp_path, oi_model, init_params=None, **run_kwargs):
+    # run LocalExpertOI with oi_model, returning the results tables
+    from GPSat.local_experts import get_results_from_h5file
+    store_path = str(tmp_path / f"{oi_model}.h5")
+    locexp = _local_expert_oi(oi_model, init_params)
+    locexp.run(store_path=store_path, check_config_compatible=False, **run_kwargs)
+    dfs, _ = get_results_from_h5file(store_path)
+    return dfs
+
+
 class TestLocalExperts:
     def test_gpflow_gpr(self, tol=1e-6):
         model = GPflowGPRModel(data=df,
@@ -226,6 +261,192 @@ class TestLocalExperts:
         assert np.abs(out['f*'] - pred_mean) < tol
         assert np.abs(out['f*_var'] - pred_std**2) < tol
 
+    def test_gpflow_gpr_padded(self, tol=1e-4):
+        # padded models (sharing a bucket) should give the same results as un-padded
+        # - and only trace when the bucket is first used
+        for n in [N, N - 5]:
+            res = {}
+            for pad_to_bucket in [False, True]:
+                model = GPflowGPRModel(data=df.iloc[:n],
+                                       obs_col='y',
+                                       coords_col='x',
+                                       obs_mean=None,
+                                       pad_to_bucket=pad_to_bucket)
+                model.set_parameters(likelihood_variance=eps**2)
+                gpflow.set_trainable(model.model.likelihood.variance, False)
+                model.set_parameter_constraints(constraints_dict)
+
+                assert model.optimise_parameters()
+                res[pad_to_bucket] = (model.get_parameters(),
+                                      model.get_objective_function_value(),
+                                      model.predict(coords=x_test))
+
+            run_details = model.get_run_details()
+            assert run_details['padded_size'] == 64
+            if n < N:
+                assert run_details['num_traces'] == 0
+
+            for k in ['lengthscales', 'kernel_variance']:
+                assert np.abs(res[True][0][k] - res[False][0][k]).max() < tol
+            assert np.abs(res[True][1] - res[False][1]) < tol
+            for k in ['f*', 'f*_var', 'y_var']:
+                assert np.abs(res[True][2][k] - res[False][2][k]).max() < tol
+
+    def test_gpflow_gpr_padded_reuse(self):
+        # constraints set for one expert should not apply to the next expert using the same (cached) padded model
+        # - switching between constrained and unconstrained parameters should not retrace
+        from GPSat.models.gpflow_models import clear_padded_model_cache, _PADDED_MODEL_CACHE
+        import tensorflow_probability as tfp
+        clear_padded_model_cache()
+
+        def _model(constrain):
+            model = GPflowGPRModel(data=df, obs_col='y', coords_col='x', obs_mean=None, pad_to_bucket=True)
+            if constrain:
+                model.set_parameter_constraints(constraints_dict)
+            model.get_objective_function_value()
+            return model
+
+        m = _model(True)
+        assert isinstance(m.model.kernel.lengthscales.transform, tfp.bijectors.Sigmoid)
+        m = _model(False)
+        assert not isinstance(m.model.kernel.lengthscales.transform, tfp.bijectors.Sigmoid)
+        assert m.get_parameters("lengthscales")["lengthscales"] == 1.0
+        for constrain in [True, False]:
+            m = _model(constrain)
+            assert m.get_run_details()["num_traces"] == 0
+
+        # cache size can be limited
+        clear_padded_model_cache(max_size=1)
+        GPflowGPRModel(data=df, obs_col='y', coords_col='x', obs_mean=None, pad_to_bucket=True)
+        GPflowGPRModel(data=df.iloc[:5], obs_col='y', coords_col='x', obs_mean=None, pad_to_bucket=True,
+                       bucket_sizes=[10])
+        assert len(_PADDED_MODEL_CACHE) == 1
+        clear_padded_model_cache(max_size=16)
+        assert len(_PADDED_MODEL_CACHE) == 0
+
+    @pytest.mark.parametrize("model_name", ["GPflowSGPRModel", "GPflowSVGPModel"])
+    def test_pad_to_bucket_exact_gpr_only(self, model_name):
+        # padding is only implemented for the exact GPR model - other models should not silently ignore it
+        with pytest.raises(AssertionError, match="pad_to_bucket"):
+            get_model(model_name)(data=df, obs_col='y', coords_col='x', obs_mean=None, pad_to_bucket=True)
+
+    @pytest.mark.parametrize("model_name", ["GPflowSGPRModel", "GPflowSVGPModel"])
+    def test_precision_exact_gpr_only(self, model_name):
+        # reduced precision is only implemented for the exact GPR model - other models should not silently ignore it
+        with pytest.raises(AssertionError, match="precision"):
+            get_model(model_name)(data=df, obs_col='y', coords_col='x', obs_mean=None, precision="mixed")
+        get_model(model_name)(data=df, obs_col='y', coords_col='x', obs_mean=None, precision="float64")
+
+    def test_gpflow_gpr_fused_predict(self, tol=1e-10):
+        # predictions from a single (cached) factorisation should match GPflow's predict_f / predict_y
+        model = GPflowGPRModel(data=df,
+                               obs_col='y',
+                               coords_col='x',
+                               obs_mean=None)
+        model.set_parameters(lengthscales=np.array([0.8]), likelihood_variance=eps**2)
+        x_new = x[::7]
+
+        for full_cov in [False, True]:
+            out = model.predict(coords=x_new, full_cov=full_cov)
+            f_mean, f_var = model.model.predict_f(x_new, full_cov=full_cov)
+            _, y_var = model.model.predict_y(x_new)
+            assert np.abs(out['f*'] - f_mean.numpy()[:, 0]).max() < tol
+            assert np.abs(out['y_var'] - y_var.numpy()[:, 0]).max() < tol
+            if full_cov:
+                assert np.abs(out['f*_cov'] - f_var.numpy()[0]).max() < tol
+            else:
+                assert np.abs(out['f*_var'] - f_var.numpy()[:, 0]).max() < tol
+
+        # factorisation is re-used for different prediction locations
+        cache = model._factorisation
+        model.predict(coords=x_test)
+        assert model._factorisation is cache
+
+        # and re-computed if parameters change
+        model.set_parameters(likelihood_variance=2 * eps**2)
+        out = model.predict(coords=x_new)
+        assert model._factorisation is not cache
+        assert np.abs(out['f*'] - model.model.predict_f(x_new)[0].numpy()[:, 0]).max() < tol
+
+    @pytest.mark.parametrize("precision", ["mixed", "float32"])
+    def test_gpflow_gpr_precision(self, precision, tol=1e-3):
+        # reduced precision models should give (approximately) the same results as float64
+        res = {}
+        for prec in ["float64", precision]:
+            model = GPflowGPRModel(data=df,
+                                   obs_col='y',
+                                   coords_col='x',
+                                   obs_mean=None,
+                                   precision=prec)
+            model.set_parameters(likelihood_variance=eps**2)
+            gpflow.set_trainable(model.model.likelihood.variance, False)
+            model.set_parameter_constraints(constraints_dict)
+
+            # NOTE: in float32 the optimiser can report failure (e.g. in the line search) once close to the optimum
+            model.optimise_parameters()
+            res[prec] = (model.get_parameters(), model.predict(coords=x[::7]))
+
+        assert res[precision][0]['lengthscales'].dtype == np.float32
+        for k in ['lengthscales', 'kernel_variance']:
+            assert np.abs(res[precision][0][k] - res['float64'][0][k]).max() < tol * 10
+        for k in ['f*', 'f*_var', 'y_var']:
+            assert np.abs(res[precision][1][k] - res['float64'][1][k]).max() < tol
+
+    def test_thread_settings_table(self, tmp_path, monkeypatch):
+        # machine specific thread settings are stored in their own table, not in run_details or oi_config,
+        # so restarting with different settings (e.g. on another machine) keeps the same config_id
+        import GPSat.local_experts as le
+        from GPSat.local_experts import get_results_from_h5file
+
+        # sources are files, so the configs of the two runs match
+        data_source, expert_loc_source = str(tmp_path / "data.h5"), str(tmp_path / "expert_locs.csv")
+        run_data.to_hdf(data_source, key="data", format="table", data_columns=True)
+        expert_locs.to_csv(expert_loc_source, index=False)
+
+        store_path = str(tmp_path / "threads.h5")
+        for i, num_threads in enumerate([2, 8]):
+            settings = {"tf_intra_op_threads": num_threads, "tf_inter_op_threads": 1,
+                        "blas_threads": num_threads, "numba_threads": num_threads}
+            monkeypatch.setattr(le, "ensure_thread_policy", lambda: settings)
+            locexp = _local_expert_oi("sklearnGPRModel", data_source=data_source,
+                                      expert_loc_source=expert_loc_source)
+            # only run the first expert, then 'restart' to run the rest
+            if i == 0:
+                locexp.expert_locs = locexp.expert_locs.iloc[:1]
+            locexp.run(store_path=store_path)
+
+        dfs, oi_configs = get_results_from_h5file(store_path)
+        assert len(oi_configs) == 1
+        assert oi_configs[0]["run_kwargs"]["thread_policy"] is None
+        assert len(dfs["run_details"]) == len(expert_locs)
+        assert "blas_threads" not in dfs["run_details"]
+        assert dfs["thread_settings"]["config_id"].tolist() == [1, 1]
+        assert dfs["thread_settings"]["blas_threads"].tolist() == [2, 8]
+
+    def test_compare_precision(self):
+        # reported differences should match those from running each expert's models in float64 and float32
+        constraints = {"lengthscales": {"low": [1e-2, 1e-2], "high": [5., 5.]}}
+        locexp = _local_expert_oi("GPflowGPRModel", constraints=constraints)
+        out = locexp.compare_precision(precision="float32", num_experts=len(expert_locs), seed=0)
+
+        # the expert without observations is skipped
+        assert len(out) == len(expert_locs) - 1
+        assert out["num_obs"].min() >= 3
+        for _, row in out.iterrows():
+            d = np.sqrt((run_data["x"] - row["x"]) ** 2 + (run_data["y"] - row["y"]) ** 2)
+            local = run_data.loc[d < 2.5]
+            assert len(local) == row["num_obs"]
+            res = {}
+            for prec in ["float64", "float32"]:
+                model = GPflowGPRModel(data=local, obs_col="z", coords_col=["x", "y"], precision=prec)
+                model.set_parameter_constraints(constraints, move_within_tol=True, tol=1e-2)
+                model.optimise_parameters()
+                res[prec] = model.predict(coords=np.array([[row["x"], row["y"]]]))
+            for k in ["f*", "f*_var", "y_var"]:
+                expected = np.abs(res["float32"][k] - res["float64"][k]).max()
+                assert np.isclose(row[f"max_abs_diff_{k}"], expected, rtol=1e-3, atol=1e-7)
+                assert row[f"max_abs_diff_{k}"] < 1e-2
+
     def test_gpflow_sgpr(self, tol=1e-4):
         model = GPflowSGPRModel(data=df,
                                 obs_col='y',
@@ -250,6 +471,374 @@ class TestLocalExperts:
         assert np.abs(out['f*'] - pred_mean) < tol
         assert np.abs(out['f*_var'] - pred_std**2) < tol
 
+    def test_gpflow_sgpr_inducing_points(self):
+        # data driven inducing point selection gives a better ELBO than random selection
+        elbo = {}
+        for method in ["random", "kmeans++", "greedy_variance", "grid"]:
+            model = GPflowSGPRModel(data=df,
+                                    obs_col='y',
+                                    coords_col='x',
+                                    num_inducing_points=20,
+                                    inducing_point_method=method)
+            model.set_parameters(likelihood_variance=eps**2, lengthscales=np.array([ls]))
+            assert model.get_inducing_points().shape == (20, 1)
+            elbo[method] = model.get_objective_function_value()
+        for method in ["kmeans++", "greedy_variance", "grid"]:
+            assert elbo[method] > elbo["random"]
+
+        # reused inducing points are relative to the expert location
+        clear_inducing_point_cache()
+        Z = []
+        for shift in [0., 1.]:
+            model = GPflowSGPRModel(data=df.assign(x=df['x'] + shift),
+                                    obs_col='y',
+                                    coords_col='x',
+                                    num_inducing_points=20,
+                                    inducing_point_method="kmeans++",
+                                    reuse_inducing_points=True,
+                                    expert_loc=np.array([5. + shift]))
+            Z.append(model.get_inducing_points())
+        np.testing.assert_allclose(Z[1], Z[0] + 1.)
+
+        # but not by an expert away from the stored location, or with different coordinate scaling
+        # - using a subset of the data, so newly selected inducing points differ from the stored ones
+        for shift, coords_scale in [(100., None), (1., 2.)]:
+            model = GPflowSGPRModel(data=df.iloc[::2].assign(x=df['x'] + shift),
+                                    obs_col='y',
+                                    coords_col='x',
+                                    coords_scale=coords_scale,
+                                    num_inducing_points=20,
+                                    inducing_point_method="kmeans++",
+                                    reuse_inducing_points=True,
+                                    expert_loc=np.array([5. + shift]))
+            assert not np.allclose(model.get_inducing_points(), Z[0] + shift)
+        clear_inducing_point_cache()
+
+    @pytest.mark.parametrize("minibatch_size", [None, 16])
+    def test_gpflow_svgp(self, minibatch_size, tol=1e-3):
+        # with fixed hyperparameters and inducing points at the data, natural gradients (gamma=1, full batch)
+        # recover the exact GP posterior, after which the (moving average) ELBO stops improving
+        model = GPflowSVGPModel(data=df,
+                                obs_col='y',
+                                coords_col='x',
+                                minibatch_size=minibatch_size)
+        model.set_parameters(likelihood_variance=eps**2, lengthscales=np.array([ls]))
+        result = model.optimise_parameters(natural_gradients=True,
+                                           gamma=1.0 if minibatch_size is None else 0.1,
+                                           fixed_params=["lengthscales", "kernel_variance", "likelihood_variance"],
+                                           max_iter=2000)
+        out = model.predict(coords=x_test)
+
+        if minibatch_size is None:
+            assert result
+            assert np.abs(out['f*'] - pred_mean) < tol
+            assert np.abs(out['f*_var'] - pred_std**2) < tol
+        else:
+            assert result is not False
+            assert np.abs(out['f*'] - pred_mean) < 100 * tol
+
+    @pytest.mark.parametrize("minibatch_size", [None, 16])
+    def test_gpflow_svgp_early_stop(self, minibatch_size, max_iter=1000, check_every=10):
+        # optimisation improves the (full data) ELBO, and stops once the moving average of the ELBO
+        # has not improved for persistence steps - later for larger persistence, never if early_stop=False
+        num_steps = {}
+        for persistence, early_stop in [(50, True), (200, True), (50, False)]:
+            model = GPflowSVGPModel(data=df, obs_col='y', coords_col='x', minibatch_size=minibatch_size)
+            model.set_parameters(likelihood_variance=eps**2, lengthscales=np.array([ls]))
+            data = (model.coords, model.obs)
+            elbo = model.model.elbo(data).numpy()
+            assert model.get_run_details() == {"num_opt_steps": 0}
+
+            result = model.optimise_parameters(natural_gradients=True,
+                                               gamma=1.0 if minibatch_size is None else 0.1,
+                                               fixed_params=["lengthscales", "kernel_variance", "likelihood_variance"],
+                                               max_iter=max_iter,
+                                               persistence=persistence,
+                                               check_every=check_every,
+                                               early_stop=early_stop)
+            assert model.model.elbo(data).numpy() > elbo
+            num_steps[(persistence, early_stop)] = n = model.get_run_details()["num_opt_steps"]
+
+            if early_stop:
+                assert result is True
+                assert (persistence < n < max_iter) and (n % check_every == 0)
+            else:
+                assert np.isnan(result)
+                assert n == max_iter
+
+        assert num_steps[(50, True)] < num_steps[(200, True)]
+
+    def test_gpflow_vff_kron(self, tol=1e-8):
+        # the Kronecker structured bound and predictions, computed with N x N or M x M matrices,
+        # should match the collapsed bound / predictions computed with dense matrices
+        from GPSat.vff import kron, make_Kuu, make_Kuf
+        rng = np.random.default_rng(0)
+        X = rng.uniform(0, 10, size=(40, 2))
+        y = np.sin(X[:, :1]) + np.cos(X[:, 1:]) + 0.1 * rng.normal(size=(40, 1))
+        Xs = rng.uniform(1, 9, size=(5, 2))
+
+        out = []
+        for num_inducing_features in [3, 6]:
+            model = GPflowVFFModel(coords=X, obs=y, num_inducing_features=num_inducing_features,
+                                   domain_size=6., expert_loc=np.array([5., 5.]), coords_scale=[1., 1.],
+                                   kernel="Matern32", verbose=False)
+            model.set_parameters(likelihood_variance=0.05, lengthscales=np.array([1.5, 2.]))
+            gpr = model.model
+            # fewer features than observations for the first, more for the second
+            assert gpr.data_space == (num_inducing_features == 6)
+
+            Kuu = kron([make_Kuu(k, a, b, gpr.ms[i]).get()
+                        for i, (k, a, b) in enumerate(zip(gpr.kernels, gpr.a, gpr.b))]).numpy()
+            Kus = np.einsum("in,jn->ijn", *[make_Kuf(k, Xs[:, i:i + 1], a, b, gpr.ms[i])
+                                            for i, (k, a, b) in enumerate(zip(gpr.kernels, gpr.a, gpr.b))])
+            Kus = Kus.reshape(-1, len(Xs))
+            Qff = gpr.Kuf.T @ np.linalg.solve(Kuu, gpr.Kuf)
+            B = Qff + 0.05 * np.eye(len(X))
+            elbo = -0.5 * (len(X) * np.log(2 * np.pi) + np.linalg.slogdet(B)[1] + y[:, 0] @ np.linalg.solve(B, y[:, 0]))
+            elbo -= 0.5 * (len(X) - np.trace(Qff)) / 0.05
+            Qsf = Kus.T @ np.linalg.solve(Kuu, gpr.Kuf)
+            mean = Qsf @ np.linalg.solve(B, y[:, 0])
+            var = 1. - np.sum(Qsf * np.linalg.solve(B, Qsf.T).T, axis=1)
+
+            for data_space in [True, False]:
+                gpr.data_space = data_space
+                gpr.KufKfu = gpr.Kuf @ gpr.Kuf.T
+                gpr._posterior_cache = None
+                assert np.abs(model.get_objective_function_value() - elbo) < tol
+                pred = model.predict(Xs)
+                assert np.abs(pred['f*'] - mean).max() < tol
+                assert np.abs(pred['f*_var'] - var).max() < tol
+            out.append(elbo)
+
+        # the posterior, and predictions at the same locations, are reused while the hyperparameters are unchanged
+        key, post = gpr._posterior_cache
+        pred = gpr.predict_f(Xs)
+        assert gpr._posterior_cache[1] is post
+        assert gpr.predict_f(Xs) is pred
+        model.set_parameters(lengthscales=np.array([1., 1.]))
+        assert gpr.predict_f(Xs) is not pred
+        assert gpr._posterior_cache[1] is not post
+
+        # features of locations outside the domain depend on the lengthscales
+        Xs = np.concatenate([Xs, [[-2., 5.], [5., 12.]]])
+        features = gpr._cached_features(Xs)
+        assert gpr._cached_features(Xs) is features
+        K1, K2 = [make_Kuf(k, Xs[:, i:i + 1], a, b, gpr.ms[i]).numpy()
+                  for i, (k, a, b) in enumerate(zip(gpr.kernels, gpr.a, gpr.b))]
+        np.testing.assert_allclose(features.numpy(), np.repeat(K1, len(K2), axis=0) * np.tile(K2, [len(K1), 1]))
+        model.set_parameters(lengthscales=np.array([1.5, 2.]))
+        assert gpr._cached_features(Xs) is not features
+
+        # more features should give a tighter bound
+        assert out[1] > out[0]
+
+    def test_gpflow_vecchia(self, tmp_path, tol=1e-8):
+        from GPSat.models.vecchia_model import maxmin_order, nearest_predecessors
+        GPflowVecchiaModel = get_model("GPflowVecchiaModel")
+        rng = np.random.default_rng(0)
+        X = rng.uniform(0, 10, size=(200, 2))
+        y = np.sin(X[:, :1]) * np.cos(X[:, 1:]) + 0.1 * rng.normal(size=(200, 1))
+        Xs = rng.uniform(0, 10, size=(10, 2))
+
+        # maxmin ordering matches a direct greedy search (including with ties, on a grid with duplicates),
+        # and the neighbours are the nearest predecessors
+        def _greedy_maxmin(X):
+            order = [np.argmin(np.sum((X - X.mean(axis=0)) ** 2, axis=1))]
+            dist = np.full(len(X), np.inf)
+            for _ in range(len(X) - 1):
+                dist = np.minimum(dist, np.sum((X - X[order[-1]]) ** 2, axis=1))
+                dist[order[-1]] = -1
+                order.append(np.argmax(dist))
+            return np.array(order)
+
+        grid = np.stack(np.meshgrid(np.arange(6.), np.arange(5.)), axis=-1).reshape(-1, 2)
+        for Z in [X, np.concatenate([grid, grid[:7]])]:
+            np.testing.assert_array_equal(maxmin_order(Z), _greedy_maxmin(Z))
+        order = maxmin_order(X)
+        X_ordered = X[order]
+        neighbours = nearest_predecessors(X_ordered, 10)
+        for i in range(len(X)):
+            d = np.sum((X_ordered[:i] - X_ordered[i]) ** 2, axis=1)
+            nn = neighbours[i][neighbours[i] >= 0]
+            assert len(nn) == min(i, 10)
+            np.testing.assert_allclose(d[nn], np.sort(d)[:10])
+
+        # conditioning on all previous observations is exact, with fewer the approximation improves with more
+        gpr = GPflowGPRModel(coords=X, obs=y, verbose=False)
+        gpr.set_parameters(lengthscales=np.array([1.5, 1.5]), likelihood_variance=0.01)
+        exact = gpr.predict(Xs)
+        errors = []
+        for num_neighbours in [5, 20, 199]:
+            model = GPflowVecchiaModel(coords=X, obs=y, num_neighbours=num_neighbours, verbose=False)
+            model.set_parameters(lengthscales=np.array([1.5, 1.5]), likelihood_variance=0.01)
+            pred = model.predict(Xs)
+            errors.append([np.abs(model.get_objective_function_value() - gpr.get_objective_function_value()),
+                           np.abs(pred["f*"] - exact["f*"]).max(),
+                           np.abs(pred["f*_var"] - exact["f*_var"]).max()])
+        errors = np.array(errors)
+        assert np.all(errors[-1] < tol)
+        assert np.all(np.diff(errors, axis=0) < 0)
+
+        # a drop in replacement for GPflowGPRModel: run end to end, with (exact) neighbourhoods of all observations
+        vecchia = _run_local_experts(tmp_path, "GPflowVecchiaModel", {"num_neighbours": 500})
+        gpr = _run_local_experts(tmp_path, "GPflowGPRModel")
+        assert np.all(vecchia["model_run_details"]["num_neighbours"] == 500)
+        for table, cols in [("preds", ["f*", "f*_var"]), ("lengthscales", ["lengthscales"])]:
+            a = vecchia[table].sort_values(["x", "y"])
+            b = gpr[table].sort_values(["x", "y"])
+            np.testing.assert_array_equal(a[["x", "y"]].values, b[["x", "y"]].values)
+            assert np.abs(a[cols].values - b[cols].values).max() < 1e-3
+
+    def test_gpflow_kalman(self, tol=1e-3):
+        # with the distinct spatial locations as inducing points Kalman filtering / smoothing is exact GPR
+        from GPSat.models.kalman_model import SeparableSpaceTime
+        GPflowKalmanModel = get_model("GPflowKalmanModel")
+        rng = np.random.default_rng(0)
+        sites = rng.uniform(0, 3, size=(8, 2))
+        X = np.vstack([np.c_[sites[rng.choice(8, 5, replace=False)], np.full(5, t)] for t in range(6)])
+        y = np.sin(X[:, :1]) + np.cos(X[:, 2:]) + 0.1 * rng.normal(size=(len(X), 1))
+        Xs = np.c_[rng.uniform(0, 3, size=(10, 2)), rng.uniform(-1, 7, size=10)]
+
+        for time_kernel in ["Matern12", "Matern32", "Matern52"]:
+            model = GPflowKalmanModel(coords=X, obs=y, time_kernel=time_kernel, verbose=False)
+            model.set_parameters(lengthscales=np.array([0.8, 1.2, 1.5]), kernel_variance=1.3,
+                                 likelihood_variance=0.1)
+            assert model.get_run_details() == {"num_time_steps": 6, "num_inducing_points": 8}
+            kernel = SeparableSpaceTime(lengthscales=[0.8, 1.2, 1.5], variance=1.3, time_kernel=time_kernel)
+            gpr = GPflowGPRModel(coords=X, obs=y, kernel=kernel, noise_variance=0.1, verbose=False)
+            assert np.abs(model.get_objective_function_value() - gpr.get_objective_function_value()) < tol
+            pred, exact = model.predict(Xs), gpr.predict(Xs)
+            for k in ["f*", "f*_var", "y_var"]:
+                np.testing.assert_allclose(pred[k], exact[k], atol=tol)
+
+        # fewer inducing points give a lower bound, which can be optimised
+        model = GPflowKalmanModel(coords=X, obs=y, num_inducing_points=4, verbose=False)
+        assert model.get_run_details()["num_inducing_points"] == 4
+        assert model.get_objective_function_value() > GPflowKalmanModel(coords=X, obs=y, verbose=False) \
+            .get_objective_function_value()
+        assert model.optimise_parameters()
+
+    def test_pure_python_gpr_gradients(self, tol=1e-4):
+        # the analytic gradient, w.r.t. the (transformed) variables, should match finite differences
+        # and optimising should agree with GPflow
+        PurePythonGPR = get_model("PurePythonGPR")
+        rng = np.random.default_rng(0)
+        X = rng.uniform(0, 10, size=(50, 2))
+        y = np.sin(X[:, :1]) + np.cos(X[:, 1:]) + 0.5 * rng.normal(size=(50, 1))
+        model = PurePythonGPR(coords=X, obs=y, coords_scale=[1., 1.], length_scales=[1., 2.], kernel_var=1.5,
+                              likeli_var=0.3)
+        model.set_parameter_constraints({"lengthscales": {"func": "sigmoid", "low": 0.1, "high": 10.},
+                                         "likelihood_variance": {"func": "softplus", "shift": 1e-4}})
+        x0 = model._apply_transform_funct(np.array([1., 2., 1.5, 0.3]), func_type="inv_func")
+        nlZ, dnlZ = model.SMLII(x0, model.x, model.y[:, 0], grad=True)
+        eps = 1e-6
+        fd = [(model.SMLII(x0 + eps * e, model.x, model.y[:, 0], grad=False) - nlZ) / eps for e in np.eye(len(x0))]
+        np.testing.assert_allclose(dnlZ, np.concatenate(fd), rtol=tol, atol=tol)
+
+        # jac=True is the default
+        model = PurePythonGPR(coords=X, obs=y)
+        assert model.optimise_parameters()
+        gpflow_model = GPflowGPRModel(coords=X, obs=y, verbose=False)
+        gpflow_model.set_parameters(**model.get_parameters())
+        assert np.abs(gpflow_model.get_objective_function_value() - model.get_objective_function_value()) < 1e-6
+        assert gpflow_model.optimise_parameters()
+        assert np.abs(gpflow_model.get_objective_function_value() - model.get_objective_function_value()) < 1e-3
+
+    def test_banded_ops(self, tol=1e-6):
+        # banded logdet / quadratic form and selected inverse should match dense computations, with gradients
+        import tensorflow as tf
+        from GPSat.banded import dense_to_banded, banded_to_dense, banded_logdet_quad, banded_selected_inverse
+        rng = np.random.default_rng(0)
+        M, bw, eps = 20, 3, 1e-6
+        ab = rng.normal(size=(bw + 1, M))
+        ab[0] = 10 + np.abs(ab[0])
+        A = banded_to_dense(ab)
+        b = rng.normal(size=(M, 2))
+        W = rng.normal(size=ab.shape)
+
+        def f(ab):
+            logdet, quad = banded_logdet_quad(ab, tf.constant(b))
+            return 0.3 * logdet + 0.7 * quad + tf.reduce_sum(W * banded_selected_inverse(ab))
+
+        def f_dense(A):
+            return 0.3 * np.linalg.slogdet(A)[1] + 0.7 * np.sum(b * np.linalg.solve(A, b)) \
+                + np.sum(W * dense_to_banded(np.linalg.inv(A), bw))
+
+        ab_t = tf.constant(ab)
+        with tf.GradientTape() as tape:
+            tape.watch(ab_t)
+            val = f(ab_t)
+        grad = tape.gradient(val, ab_t).numpy()
+        assert np.abs(val.numpy() - f_dense(A)) < tol
+
+        fd = np.zeros_like(ab)
+        for k in range(bw + 1):
+            for j in range(M - k):
+                ab_ = ab.copy()
+                ab_[k, j] += eps
+                fd[k, j] = (f_dense(banded_to_dense(ab_)) - f_dense(A)) / eps
+        assert np.abs(fd - grad).max() < 1e-4
+
+    def test_gpflow_asvgp_banded(self, tol=1e-8):
+        # the banded bound and predictions should match the collapsed bound / predictions
+        # computed with dense matrices
+        from functools import reduce
+        from GPSat.banded import banded_to_dense
+        rng = np.random.default_rng(0)
+        X = rng.uniform(0, 10, size=(40, 2))
+        y = np.sin(X[:, :1]) + np.cos(X[:, 1:]) + 0.1 * rng.normal(size=(40, 1))
+        Xs = rng.uniform(1, 9, size=(5, 2))
+
+        out = []
+        for num_inducing_features in [[5, 6], [10, 12]]:
+            model = GPflowASVGPModel(coords=X, obs=y, num_inducing_features=num_inducing_features,
+                                     domain_size=6., expert_loc=np.array([5., 5.]), coords_scale=[1., 1.],
+                                     kernels="Matern32", banded=True, verbose=False)
+            model.set_parameters(likelihood_variance=0.05, lengthscales=np.array([1.5, 2.]))
+            gpr = model.model
+            # banded with bandwidth: degree x (number of features in the second dimension) + degree
+            assert gpr.bandwidth == 2 * num_inducing_features[1] + 2
+            assert gpr.KufKfu.shape == (gpr.bandwidth + 1, gpr.M)
+
+            Kuu = reduce(np.kron, [banded_to_dense(K.numpy()) for K in gpr._Kuu()])
+            Kuf, Kus = np.zeros((gpr.M, len(X))), np.zeros((gpr.M, len(Xs)))
+            for K, x in [(Kuf, X), (Kus, Xs)]:
+                idx, vals = gpr._features(x)
+                np.put_along_axis(K.T, idx, vals, axis=1)
+            Kff = np.prod([k(X[:, i:i + 1]).numpy() for i, k in enumerate(gpr.kernels)], axis=0)
+            Qff = Kuf.T @ np.linalg.solve(Kuu, Kuf)
+            B = Qff + 0.05 * np.eye(len(X))
+            elbo = -0.5 * (len(X) * np.log(2 * np.pi) + np.linalg.slogdet(B)[1] + y[:, 0] @ np.linalg.solve(B, y[:, 0]))
+            elbo -= 0.5 * np.trace(Kff - Qff) / 0.05
+            Qsf = Kus.T @ np.linalg.solve(Kuu, Kuf)
+            mean = Qsf @ np.linalg.solve(B, y[:, 0])
+            var = 1. - np.sum(Kus * np.linalg.solve(Kuu, Kus), axis=0) \
+                + np.sum(Kus * np.linalg.solve(Kuu + Kuf @ Kuf.T / 0.05, Kus), axis=0)
+
+            assert np.abs(model.get_objective_function_value() - elbo) < tol
+            pred = model.predict(Xs)
+            assert np.abs(pred['f*'] - mean).max() < tol
+            assert np.abs(pred['f*_var'] - var).max() < tol
+            out.append(elbo)
+
+        # the posterior is reused while the hyperparameters are unchanged
+        post = gpr._posterior()
+        assert gpr._posterior() is post
+        model.set_parameters(lengthscales=np.array([1., 1.]))
+        assert gpr._posterior() is not post
+
+        # more features should give a tighter bound
+        assert out[1] > out[0]
+
+        # 1-D, Matern12: the bandwidth is that of the B-splines, so the cost is linear in the number of features
+        model = GPflowASVGPModel(coords=X[:, :1], obs=y, num_inducing_features=200, domain_size=6.,
+                                 expert_loc=np.array([5.]), coords_scale=[1.], kernels="Matern12",
+                                 banded=True, verbose=False)
+        assert model.model.bandwidth == 1
+        before = model.get_objective_function_value()
+        assert model.optimise_parameters()
+        assert model.get_objective_function_value() > before
+
     # def test_gpflow_vff(self):
     #     # TODO: complete this test
     #     model = GPflowVFFModel(data=df,
@@ -294,6 +883,237 @@ class TestLocalExperts:
         assert np.abs(out['f*'] - pred_mean) < tol
         assert np.abs(out['f*_var'] - pred_std**2) < tol
 
+    def test_scikit_restarts(self, tol=1e-6):
+        # restarts run in parallel threads should find the same optimum as run sequentially
+        out = {}
+        for n_jobs in [None, 3]:
+            model = sklearnGPRModel(data=df, obs_col='y', coords_col='x', obs_mean=None,
+                                    kernel_variance=None, likelihood_variance=eps**2,
+                                    n_restarts_optimizer=2, n_jobs=n_jobs)
+            model.set_parameter_constraints(constraints_dict)
+            assert model.optimise_parameters()
+            out[n_jobs] = (model.get_parameters()['lengthscales'], model.get_objective_function_value())
+        np.testing.assert_allclose(out[None][0], out[3][0], atol=tol)
+        assert np.abs(out[None][1] - ml) < 1e-1
+
+    def test_scikit_no_optimise(self, tol=1e-8):
+        # without optimising, the posterior is built from the given (and later updated) hyperparameters
+        model = sklearnGPRModel(data=df, obs_col='y', coords_col='x', obs_mean=None,
+                                kernel_variance=None, likelihood_variance=eps**2)
+        for length_scale in [ls, 2 * ls]:
+            model.set_parameters(lengthscales=np.array([length_scale]))
+            out = model.predict(coords=x_test)
+            ref = GaussianProcessRegressor(Matern(length_scale=length_scale, nu=3/2), alpha=eps**2, optimizer=None)
+            ref.fit(x_train, y_train)
+            mean, std = ref.predict(x_test, return_std=True)
+            assert np.abs(out['f*'] - mean).max() < tol
+            assert np.abs(out['f*_var'] - std**2).max() < tol
+            assert np.abs(model.get_objective_function_value() - ref.log_marginal_likelihood_value_) < tol
+
+    @pytest.mark.parametrize("model_name, kwargs, tol", [
+        ("GPflowGPRModel", {}, 1e-10),
+        ("sklearnGPRModel", {"likelihood_variance": eps**2}, 1e-10),
+        ("GPflowSGPRModel", {"num_inducing_points": 10}, 1e-10),
+        ("GPflowSVGPModel", {"num_inducing_points": 10}, 1e-10),
+        ("GPyTorchGPRModel", {}, 1e-5)])
+    def test_predict_batches(self, model_name, kwargs, tol):
+        # predicting in batches should give the same (marginal) predictions as all at once
+        # - and full_cov=True beyond the memory budget should be rejected
+        Model = get_model(model_name)
+        full = Model(data=df, obs_col='y', coords_col='x', obs_mean=None, **kwargs)
+        batched = Model(data=df, obs_col='y', coords_col='x', obs_mean=None,
+                        predict_batch_size=7, full_cov_memory_limit=0.01, **kwargs)
+        assert batched.predict_batch_size == 7
+
+        out = full.predict(coords=x)
+        out_batched = batched.predict(coords=x)
+        assert out.keys() == out_batched.keys()
+        for k in out:
+            assert np.shape(out_batched[k]) == np.shape(out[k])
+            assert np.abs(out[k] - out_batched[k]).max() < tol
+
+        # 100 locations requires more than 0.01MB for full covariance matrices
+        with pytest.raises(AssertionError):
+            batched.predict(coords=x, full_cov=True)
+        assert 'f*_cov' in batched.predict(coords=x[:10], full_cov=True)
+
+        # the memory budget is for the model's dtype, e.g. float32 for GPyTorch
+        assert batched._predict_dtype() == (np.float32 if model_name.startswith("GPyTorch") else np.float64)
+        # batching options are kept when the data is updated
+        if model_name in ["GPflowGPRModel", "GPflowSGPRModel"]:
+            batched.update_obs_data(data=df, coords_col='x', obs_col='y')
+            assert batched.predict_batch_size == 7
+
+    def test_gpytorch_batch(self):
+        # optimising / predicting several experts as a batch should match doing so one expert at a time
+        GPyTorchBatchGPRModel = get_model("GPyTorchBatchGPRModel")
+        # experts with different numbers of observations - so padding is used
+        subsets = [df.iloc[:20], df.iloc[10:45], df]
+
+        models = [GPyTorchBatchGPRModel(data=d, obs_col='y', coords_col='x', obs_mean=None) for d in subsets]
+        for m in models:
+            m.set_parameter_constraints(constraints_dict)
+        opt_success = GPyTorchBatchGPRModel.optimise_parameters_batch(models, iterations=30, tol=None)
+        preds = GPyTorchBatchGPRModel.predict_batch(models, [x_test, x[:7], x[3:5]])
+
+        assert opt_success == [True] * len(models)
+        for d, m, c, pred in zip(subsets, models, [x_test, x[:7], x[3:5]], preds):
+            assert m.get_run_details()["batch_size"] == len(models)
+            single = GPyTorchGPRModel(data=d, obs_col='y', coords_col='x', obs_mean=None)
+            single.set_parameter_constraints(constraints_dict)
+            single.optimise_parameters(iterations=30)
+            # the single model is float32, the batch float64
+            assert np.abs(m.get_lengthscales() - single.get_lengthscales()).max() < 1e-3
+            out = single.predict(coords=c)
+            for k in ["f*", "f*_var", "y_var"]:
+                assert len(pred[k]) == len(c)
+                assert np.abs(pred[k] - out[k]).max() < 1e-3
+
+    def test_gpytorch_batch_convergence(self):
+        # an expert which has converged stops being updated, while the others continue
+        GPyTorchBatchGPRModel = get_model("GPyTorchBatchGPRModel")
+
+        def _models():
+            models = [GPyTorchBatchGPRModel(data=d, obs_col='y', coords_col='x', obs_mean=None)
+                      for d in [df, df.iloc[:40]]]
+            # first expert is already (close to) optimised
+            GPyTorchBatchGPRModel.optimise_parameters_batch(models[:1], iterations=500, learning_rate=0.05, tol=None)
+            return models
+
+        models = _models()
+        opt_success = GPyTorchBatchGPRModel.optimise_parameters_batch(models, iterations=50, learning_rate=0.05)
+        assert opt_success == [True, True]
+        steps = [m.get_run_details()["num_opt_steps"] for m in models]
+        assert steps[0] < steps[1] == 50
+
+        # the converged expert's parameters are those after the steps it took, the others' after all 50 steps
+        for m, ref, n in zip(models, _models(), steps):
+            GPyTorchBatchGPRModel.optimise_parameters_batch([ref], iterations=n, learning_rate=0.05, tol=None)
+            expected = ref.get_parameters()
+            for k, v in m.get_parameters().items():
+                np.testing.assert_allclose(v, expected[k], rtol=1e-6)
+
+        # without a tolerance all experts take every step
+        GPyTorchBatchGPRModel.optimise_parameters_batch(models, iterations=10, tol=None)
+        assert [m.get_run_details()["num_opt_steps"] for m in models] == [10, 10]
+
+    def test_gpytorch_batch_run(self, tmp_path, tol=1e-5):
+        # run LocalExpertOI with the batch model end to end, compare with running the experts one at a time
+        from GPSat.local_experts import LocalExpertOI, get_results_from_h5file
+
+        rng = np.random.default_rng(0)
+        xy = rng.uniform(0, 10, size=(400, 2))
+        data = pd.DataFrame({"x": xy[:, 0], "y": xy[:, 1],
+                             "z": np.sin(xy[:, 0]) * np.cos(xy[:, 1]) + 0.05 * rng.normal(size=400)})
+        # last expert has no observations, so is skipped
+        eloc = pd.DataFrame({"x": [2., 5., 8., 5., 20.], "y": [2., 5., 8., 2., 20.]})
+
+        results = {}
+        for oi_model, init_params in [("GPyTorchGPRModel", {}),
+                                      ("GPyTorchBatchGPRModel", {"expert_batch_size": 3})]:
+            store_path = str(tmp_path / f"{oi_model}.h5")
+            locexp = LocalExpertOI(expert_loc_config={"source": eloc},
+                                   data_config={"data_source": data, "obs_col": "z", "coords_col": ["x", "y"],
+                                                "local_select": [{"col": ["x", "y"], "comp": "<", "val": 2.5}]},
+                                   model_config={"oi_model": oi_model, "init_params": init_params},
+                                   pred_loc_config={"method": "expert_loc"})
+            locexp.run(store_path=store_path, check_config_compatible=False)
+            results[oi_model], _ = get_results_from_h5file(store_path)
+
+        single, batch = results["GPyTorchGPRModel"], results["GPyTorchBatchGPRModel"]
+        assert len(batch["run_details"]) == len(eloc)
+        assert len(batch["preds"]) == len(eloc) - 1
+        for table, cols in [("preds", ["f*", "f*_var", "y_var"]), ("likelihood_variance", ["likelihood_variance"])]:
+            a = single[table].sort_values(["x", "y"])
+            b = batch[table].sort_values(["x", "y"])
+            np.testing.assert_array_equal(a[["x", "y"]].values, b[["x", "y"]].values)
+            assert np.abs(a[cols].values - b[cols].values).max() < tol
+
+    def test_run_details_skipped_experts(self, tmp_path):
+        # experts skipped (too few observations) are stored in run_details, with the same columns as those run,
+        # when results are written after every expert - model specific details are in their own table
+        dfs = _run_local_experts(tmp_path, "GPflowGPRModel", {"pad_to_bucket": True}, store_every=1)
+        assert len(dfs["run_details"]) == len(expert_locs)
+        assert len(dfs["model_run_details"]) == len(expert_locs) - 1
+        assert "padded_size" not in dfs["run_details"]
+
+    def test_run_with_thinning(self, tmp_path):
+        # local data is thinned to at most max_obs, with the number before thinning recorded in run_details
+        from GPSat.local_experts import get_results_from_h5file
+        for method in ["stratified", "super_obs"]:
+            store_path = str(tmp_path / f"thin_{method}.h5")
+            locexp = _local_expert_oi("GPflowGPRModel", thinning={"max_obs": 30, "method": method})
+            locexp.run(store_path=store_path, check_config_compatible=False, store_every=1)
+            run_details = get_results_from_h5file(store_path)[0]["run_details"]
+            assert len(run_details) == len(expert_locs)
+            assert np.all(run_details["num_obs"] <= 30)
+            assert np.all(run_details["num_obs"] <= run_details["num_obs_local"])
+            assert np.any(run_details["num_obs_local"] > 30)
+            # the thinning applied is recorded, including the mean number of observations per super-observation
+            assert np.all(run_details["thinning_method"] == method)
+            assert np.all(run_details["thinning_max_obs"] == 30)
+            assert np.all(run_details["thinning_bin_size"] == "None")
+            thinned = run_details["num_obs_local"] > 30
+            if method == "super_obs":
+                assert np.all(run_details.loc[thinned, "num_averaged_mean"] > 1)
+            assert np.all(run_details.loc[~thinned & (run_details["num_obs"] > 0), "num_averaged_mean"] == 1)
+
+    def test_quadtree_expert_locations_config(self):
+        # expert locations can be generated from the observations, with a quadtree, via the expert location config
+        from GPSat.local_experts import LocalExpertOI
+        from GPSat.config_dataclasses import ExpertLocsConfig
+        from GPSat.dataloader import DataLoader
+        quadtree = {"min_cell_size": 1., "max_obs": 50, "coords_col": ["x", "y"], "bounds": [(0, 20), (0, 20)]}
+        expected = DataLoader.quadtree_expert_locations(run_data, **quadtree)
+        for config in [{"source": run_data, "quadtree": quadtree},
+                       ExpertLocsConfig(source=run_data, quadtree=quadtree)]:
+            locexp = LocalExpertOI(expert_loc_config=config)
+            pd.testing.assert_frame_equal(locexp.expert_locs, expected)
+        assert locexp.config["locations"]["quadtree"]["max_obs"] == 50
+        assert len(expected) > 1
+
+    def test_run_with_adaptive_radius(self, tmp_path):
+        # the training radius adapts to select a target number of observations, it is stored in run_details
+        # - and prediction locations can be within a max_dist relative to it
+        from GPSat.local_experts import LocalExpertOI, get_results_from_h5file
+        store_path = str(tmp_path / "adaptive.h5")
+        pred_locs = pd.DataFrame({"x": _xy[:50, 0], "y": _xy[:50, 1]})
+        locexp = LocalExpertOI(expert_loc_config={"source": expert_locs},
+                               data_config={"data_source": run_data, "obs_col": "z", "coords_col": ["x", "y"],
+                                            "local_select": [{"col": ["x", "y"], "comp": "<", "val": 2.5,
+                                                              "target_num_obs": [20, 40], "max_val": 5.}]},
+                               model_config={"oi_model": "GPflowGPRModel"},
+                               pred_loc_config={"method": "from_dataframe", "df": pred_locs, "max_dist": 2.,
+                                                "scale_max_dist": True})
+        locexp.run(store_path=store_path, check_config_compatible=False, store_every=1)
+        dfs, _ = get_results_from_h5file(store_path)
+        run_details = dfs["run_details"].set_index(["x", "y"])
+        # the expert at (20, 20) has no prediction locations within max_dist, so is skipped
+        assert len(run_details) == len(expert_locs) - 1
+        assert np.all(run_details["num_obs"] == 40)
+        assert np.all(run_details["local_radius"] < 2.5)
+        for (x, y), p in dfs["preds"].groupby(["x", "y"]):
+            d = np.sqrt((p["pred_loc_x"] - x) ** 2 + (p["pred_loc_y"] - y) ** 2)
+            assert d.max() < 2. * run_details.loc[(x, y), "local_radius"] / 2.5
+
+        # selecting the local data does not change the prediction locations, the caller sets the radius scale
+        locexp.pred_loc.radius_scale = None
+        rl = expert_locs.iloc[[0], :]
+        _, _, _, select_details, radius_scale = locexp._select_local_data(rl, df=None, prev_where=None)
+        assert locexp.pred_loc.radius_scale is None
+        assert radius_scale == select_details["local_radius"] / 2.5
+
+        # the adaptive radius can be used to glue the predictions, merged from run_details
+        from GPSat.postprocessing import glue_local_predictions_2d
+        glue_kwargs = dict(pred_loc_cols=["pred_loc_x", "pred_loc_y"], xprt_loc_cols=["x", "y"], vars_to_glue="f*")
+        with pytest.raises(AssertionError):
+            glue_local_predictions_2d(dfs["preds"], inference_radius="local_radius", **glue_kwargs)
+        glued = glue_local_predictions_2d(dfs["preds"], inference_radius="local_radius",
+                                          run_details=dfs["run_details"], **glue_kwargs)
+        expected = glue_local_predictions_2d(dfs["preds"], inference_radius=run_details["local_radius"].to_dict(),
+                                             **glue_kwargs)
+        pd.testing.assert_frame_equal(glued, expected)
+
     # def test_gpytorch(self, tol=1e-7):
     #     model = GPyTorchGPRModel(data=df,
     #                             obs_col='y',
@@ -0,0 +1,79 @@
+# unit tests for multioutput GPR: structured (separable kernel) vs dense computations
+
+import os
+import sys
+
+import pytest
+import numpy as np
+import gpflow
+import tensorflow as tf
+
+# multioutput modules import each other as top level modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "GPSat", "models", "multioutput"))
+
+from gpr import MultioutputGPR
+from likelihoods import LinearModelLikelihood
+
+
+def _problem(P):
+    # M training locations, L latent GPs, P observations (linear combinations of the latent GPs)
+    rng = np.random.default_rng(0)
+    M, L = 12, 2
+    X = rng.uniform(0, 5, size=(M, 1))
+    Y = rng.normal(size=(M, P))
+    H = rng.normal(size=(P, L))
+    A = rng.normal(size=(P, P))
+    R = 0.1 * A @ A.T + 0.05 * np.eye(P)
+    Xnew = rng.uniform(0, 5, size=(5, 1))
+    return X, Y, H, R, Xnew
+
+
+def _kernels(L):
+    k = gpflow.kernels.Matern32(lengthscales=1.3, variance=0.7)
+    W = np.array([[1.0, 0.3], [-0.5, 0.8]])[:L, :L]
+    return {"shared_independent": gpflow.kernels.SharedIndependent(k, output_dim=L),
+            "linear_coregionalization": gpflow.kernels.LinearCoregionalization([k] * L, W=W)}
+
+
+def _models(problem, kernel):
+    X, Y, H, R, _ = problem
+    likelihood = LinearModelLikelihood(input_dim=X.shape[1], variance=tf.constant(R), forward_model=H)
+    # the structured and dense models share the kernel and likelihood (and so their parameters)
+    return [MultioutputGPR((X, Y), kernel, num_latent_gps=H.shape[1], likelihood=likelihood, structured=s)
+            for s in [True, False]]
+
+
+@pytest.mark.parametrize("kernel_name", ["shared_independent", "linear_coregionalization"])
+@pytest.mark.parametrize("P", [2, 3])
+def test_separable_log_marginal_likelihood(kernel_name, P, tol=1e-8):
+    problem = _problem(P)
+    structured, dense = _models(problem, _kernels(problem[2].shape[1])[kernel_name])
+    assert structured.separable_kernel() is not None
+    assert dense.separable_kernel() is None
+
+    grads = []
+    for model in [structured, dense]:
+        with tf.GradientTape() as tape:
+            lml = model.log_marginal_likelihood()
+        grads.append((lml.numpy(), tape.gradient(lml, model.trainable_variables)))
+
+    (lml_s, grad_s), (lml_d, grad_d) = grads
+    np.testing.assert_allclose(lml_s, lml_d, rtol=tol)
+    assert len(grad_s) > 0
+    for gs, gd in zip(grad_s, grad_d):
+        np.testing.assert_allclose(gs.numpy(), gd.numpy(), rtol=1e-6, atol=tol)
+
+
+@pytest.mark.parametrize("kernel_name", ["shared_independent", "linear_coregionalization"])
+# NOTE: full_cov=True, full_output_cov=False is not supported by predict_f
+@pytest.mark.parametrize("full_cov, full_output_cov", [(False, False), (False, True), (True, True)])
+def test_separable_predict_f(kernel_name, full_cov, full_output_cov, tol=1e-8):
+    # NOTE: predict_f adds the (observation space) mean function to the latent mean, so requires P == L
+    problem = _problem(2)
+    structured, dense = _models(problem, _kernels(problem[2].shape[1])[kernel_name])
+    Xnew = problem[-1]
+    mean_s, var_s = structured.predict_f(Xnew, full_cov=full_cov, full_output_cov=full_output_cov)
+    mean_d, var_d = dense.predict_f(Xnew, full_cov=full_cov, full_output_cov=full_output_cov)
+    assert var_s.shape == var_d.shape
+    np.testing.assert_allclose(mean_s.numpy(), mean_d.numpy(), atol=tol)
+    np.testing.assert_allclose(var_s.numpy(), var_d.numpy(), atol=tol)
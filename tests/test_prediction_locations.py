@@ -0,0 +1,217 @@
+# unit tests for PredictionLocations
+
+import pytest
+import numpy as np
+import pandas as pd
+
+from GPSat.prediction_locations import PredictionLocations
+from GPSat.utils import grid_2d_flatten
+
+
+@pytest.fixture
+def pred_grid():
+    X = grid_2d_flatten([-500., 500.], [-500., 500.], step_size=10.)
+    return pd.DataFrame(X, columns=['y', 'x'])
+
+
+@pytest.fixture
+def expert_locs():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({"x": rng.uniform(-500, 500, 20),
+                         "y": rng.uniform(-500, 500, 20),
+                         "t": 3.0})
+
+
+def _full_scan_locs(df, expert_locs, coords_col, max_dist):
+    ploc = PredictionLocations(method="from_dataframe", df=df, max_dist=max_dist,
+                               coords_col=coords_col)
+    out = []
+    for i in range(len(expert_locs)):
+        ploc.expert_loc = expert_locs.iloc[[i], :]
+        out.append(ploc())
+    return out
+
+
+@pytest.mark.parametrize("precompute_mapping", [True, False])
+def test_from_dataframe_max_dist(pred_grid, expert_locs, precompute_mapping):
+    """all returned locations within max_dist, those not returned are outside"""
+    coords_col = ['x', 'y', 't']
+    max_dist = 75.
+    ploc = PredictionLocations(method="from_dataframe", df=pred_grid, max_dist=max_dist,
+                               coords_col=coords_col, precompute_mapping=precompute_mapping)
+    ploc.set_mapping_expert_locs(expert_locs)
+    for i in range(len(expert_locs)):
+        ploc.expert_loc = expert_locs.iloc[[i], :]
+        out = ploc()
+        el = expert_locs.iloc[i]
+        d = np.sqrt((out[:, 0] - el['x']) ** 2 + (out[:, 1] - el['y']) ** 2)
+        assert np.all(d < max_dist)
+        # missing 't' column is populated with expert location
+        assert np.all(out[:, 2] == el['t'])
+        d_all = np.sqrt((pred_grid['x'] - el['x']) ** 2 + (pred_grid['y'] - el['y']) ** 2)
+        assert len(out) == (d_all < max_dist).sum()
+
+
+def test_precomputed_mapping_matches_full_scan(pred_grid, expert_locs, tmp_path):
+    """precomputed (and cached) mapping should give identical prediction locations to full scan"""
+    coords_col = ['x', 'y', 't']
+    max_dist = 75.
+    expected = _full_scan_locs(pred_grid, expert_locs, coords_col, max_dist)
+
+    for _ in range(2):
+        # second iteration will load the mapping from cache
+        ploc = PredictionLocations(method="from_dataframe", df=pred_grid, max_dist=max_dist,
+                                   coords_col=coords_col, precompute_mapping=True,
+                                   mapping_cache_dir=str(tmp_path))
+        ploc.set_mapping_expert_locs(expert_locs)
+        for i in range(len(expert_locs)):
+            ploc.expert_loc = expert_locs.iloc[[i], :]
+            np.testing.assert_array_equal(ploc(), expected[i])
+        assert ploc._mapping is not None
+
+        assert len(list(tmp_path.glob("pred_loc_mapping_*.npz"))) == 1
+
+
+def test_mapping_cache_keyed_on_source(pred_grid, expert_locs, tmp_path, monkeypatch):
+    """with locations from a file the cached mapping is keyed on the file, not the locations,
+    and reused when only the remaining expert locations are run (e.g. on restart)"""
+    import GPSat.prediction_locations as pl
+    coords_col = ['x', 'y', 't']
+    max_dist = 75.
+    df_file = str(tmp_path / "pred_grid.csv")
+    pred_grid.to_csv(df_file, index=False)
+    expected = _full_scan_locs(pred_grid, expert_locs, coords_col, max_dist)
+
+    hashed = []
+    _array_hash = pl._array_hash
+    monkeypatch.setattr(pl, "_array_hash", lambda *args: hashed.append(args) or _array_hash(*args))
+
+    for start in [0, 10]:
+        ploc = PredictionLocations(method="from_dataframe", df_file=df_file, max_dist=max_dist,
+                                   coords_col=coords_col, precompute_mapping=True,
+                                   mapping_cache_dir=str(tmp_path / "cache"))
+        ploc.set_mapping_expert_locs(expert_locs)
+        for i in range(start, len(expert_locs)):
+            ploc.expert_loc = expert_locs.iloc[[i], :]
+            np.testing.assert_allclose(ploc(), expected[i])
+
+    assert len(list((tmp_path / "cache").glob("pred_loc_mapping_*.npz"))) == 1
+    # the prediction locations themselves are never hashed
+    for args in hashed:
+        assert not any(isinstance(a, np.ndarray) and (len(a) == len(pred_grid)) for a in args)
+
+
+@pytest.mark.parametrize("cell_size", [None, 20., 500.])
+def test_grid_index_matches_full_scan(pred_grid, expert_locs, cell_size):
+    """grid index selection should give identical prediction locations to full scan"""
+    coords_col = ['x', 'y']
+    max_dist = 75.
+    full = PredictionLocations(method="from_dataframe", df=pred_grid, max_dist=max_dist,
+                               coords_col=coords_col, grid_index=False)
+    gidx = PredictionLocations(method="from_dataframe", df=pred_grid, max_dist=max_dist,
+                               coords_col=coords_col, grid_index_cell_size=cell_size)
+    # include a location outside of the grid
+    locs = pd.concat([expert_locs, pd.DataFrame({"x": [2000.], "y": [0.], "t": [3.]})])
+    for i in range(len(locs)):
+        full.expert_loc = locs.iloc[[i], :]
+        gidx.expert_loc = locs.iloc[[i], :]
+        np.testing.assert_array_equal(gidx(), full())
+    assert gidx._grid_index is not None
+
+
+def test_local_select_applied_to_candidates(expert_locs):
+    """local_select conditions (e.g. on t) are applied to the prediction locations within max_dist"""
+    X = grid_2d_flatten([-500., 500.], [-500., 500.], step_size=10.)
+    df = pd.concat([pd.DataFrame(X, columns=['y', 'x']).assign(t=t) for t in [1., 2., 3.]])
+    ploc = PredictionLocations(method="from_dataframe", df=df, max_dist=75., coords_col=['x', 'y', 't'],
+                               local_select=[{"col": "t", "comp": "==", "val": 0}])
+    ploc.expert_loc = expert_locs.iloc[[0], :]
+    out = ploc()
+    assert len(out) > 0
+    assert np.all(out[:, 2] == 3.)
+
+
+def test_shared_grid_file(pred_grid, expert_locs, tmp_path):
+    """prediction locations published to (and attached from) a memory-mapped file give the same results"""
+    coords_col = ['x', 'y', 't']
+    max_dist = 75.
+    expected = _full_scan_locs(pred_grid, expert_locs, coords_col, max_dist)
+    shared_grid_file = str(tmp_path / "pred_grid.npy")
+
+    # first instance publishes, second attaches to existing file
+    for _ in range(2):
+        ploc = PredictionLocations(method="from_dataframe", df=pred_grid.assign(extra=1.0), max_dist=max_dist,
+                                   coords_col=coords_col, shared_grid_file=shared_grid_file)
+        for i in range(len(expert_locs)):
+            ploc.expert_loc = expert_locs.iloc[[i], :]
+            np.testing.assert_array_equal(ploc(), expected[i])
+
+        df = ploc.kwargs['df']
+        # read-only, memory-mapped values
+        assert not df.values.flags.writeable
+        assert df.columns.tolist() == ['x', 'y']
+        # grid index is shared (memory-mapped) alongside the grid
+        assert isinstance(ploc._grid_index.order, np.memmap)
+
+
+@pytest.mark.parametrize("from_file", [True, False])
+def test_shared_grid_file_from_different_grid(pred_grid, expert_locs, tmp_path, from_file):
+    """a shared grid file left by a different set of prediction locations should not be reused"""
+    coords_col = ['x', 'y', 't']
+    max_dist = 75.
+    shared_grid_file = str(tmp_path / "pred_grid.npy")
+    old_grid = pred_grid.iloc[::7]
+
+    def _kwargs(grid, name):
+        if not from_file:
+            return {"df": grid}
+        df_file = str(tmp_path / f"{name}.csv")
+        grid.to_csv(df_file, index=False)
+        return {"df_file": df_file}
+
+    for grid, name in [(old_grid, "old"), (pred_grid, "new")]:
+        expected = _full_scan_locs(grid, expert_locs, coords_col, max_dist)
+        ploc = PredictionLocations(method="from_dataframe", max_dist=max_dist, coords_col=coords_col,
+                                   shared_grid_file=shared_grid_file, **_kwargs(grid, name))
+        for i in range(len(expert_locs)):
+            ploc.expert_loc = expert_locs.iloc[[i], :]
+            np.testing.assert_array_equal(ploc(), expected[i])
+        assert len(ploc.kwargs['df']) == len(grid)
+
+
+def test_mapping_cache_regenerated_source(pred_grid, expert_locs, tmp_path):
+    """a cached mapping for locations loaded from a file is not reused if the file is regenerated (same path)"""
+    coords_col = ['x', 'y', 't']
+    max_dist = 75.
+    source = str(tmp_path / "pred_grid.csv")
+
+    for grid in [pred_grid.iloc[::7], pred_grid]:
+        grid.to_csv(source, index=False)
+        expected = _full_scan_locs(grid, expert_locs, coords_col, max_dist)
+        ploc = PredictionLocations(method="from_source", load_kwargs={"source": source}, max_dist=max_dist,
+                                   coords_col=coords_col, precompute_mapping=True,
+                                   mapping_cache_dir=str(tmp_path / "cache"))
+        ploc.set_mapping_expert_locs(expert_locs)
+        for i in range(len(expert_locs)):
+            ploc.expert_loc = expert_locs.iloc[[i], :]
+            np.testing.assert_allclose(ploc(), expected[i])
+
+    assert len(list((tmp_path / "cache").glob("pred_loc_mapping_*.npz"))) == 2
+
+
+def test_shared_grid_file_regenerated_source(pred_grid, expert_locs, tmp_path):
+    """a shared grid published from a file is not reused if the file is regenerated (same path)"""
+    coords_col = ['x', 'y', 't']
+    max_dist = 75.
+    source = str(tmp_path / "pred_grid.csv")
+    shared_grid_file = str(tmp_path / "pred_grid.npy")
+
+    for grid in [pred_grid.iloc[::7], pred_grid]:
+        grid.to_csv(source, index=False)
+        expected = _full_scan_locs(grid, expert_locs, coords_col, max_dist)
+        ploc = PredictionLocations(method="from_source", load_kwargs={"source": source}, max_dist=max_dist,
+                                   coords_col=coords_col, shared_grid_file=shared_grid_file)
+        for i in range(len(expert_locs)):
+            ploc.expert_loc = expert_locs.iloc[[i], :]
+            np.testing.assert_array_equal(ploc(), expected[i])
+        assert len(ploc.kwargs['df']) == len(grid)
@@ -0,0 +1,77 @@
+# unit tests for process level runtime settings
+
+import pytest
+import numpy as np
+
+from GPSat import runtime
+from GPSat.runtime import set_thread_policy, get_thread_settings, thread_policy_from_env, environment, \
+    clear_environment_cache
+
+
+@pytest.fixture
+def restore_thread_settings():
+    # restore BLAS / numba threads after each test
+    before = get_thread_settings()
+    yield
+    set_thread_policy(blas_threads=before["blas_threads"] or None,
+                      numba_threads=before["numba_threads"] or None,
+                      use_env=False)
+
+
+def test_set_thread_policy(restore_thread_settings):
+    numba = pytest.importorskip("numba")
+    out = set_thread_policy(blas_threads=1, numba_threads=1, use_env=False)
+    assert out["blas_threads"] in (0, 1)
+    assert out["numba_threads"] == numba.get_num_threads() == 1
+    assert runtime.get_thread_policy() == out
+
+
+def test_thread_policy_from_env(monkeypatch, restore_thread_settings):
+    numba = pytest.importorskip("numba")
+    monkeypatch.setenv("GPSAT_NUM_THREADS", "1")
+    monkeypatch.setenv("GPSAT_TF_INTRA_OP_THREADS", "")
+    assert thread_policy_from_env() == {"num_threads": 1}
+
+    # explicitly specified values take precedence over the environment
+    monkeypatch.setenv("GPSAT_BLAS_THREADS", "1")
+    out = set_thread_policy(numba_threads=2, tf_intra_op_threads=0, tf_inter_op_threads=0)
+    assert out["blas_threads"] in (0, 1)
+    assert out["numba_threads"] == min(2, numba.config.NUMBA_NUM_THREADS)
+
+
+def test_environment_cached(monkeypatch):
+    env = environment(refresh=True)
+    assert isinstance(env.cpu_name, str)
+    assert env.num_cpus >= 1
+
+    # devices are not detected again, unless requested
+    def _fail():
+        raise AssertionError("devices detected again")
+    monkeypatch.setattr(runtime, "_get_processor_name", _fail)
+    assert environment() is env
+
+    from GPSat.models.sklearn_models import sklearnGPRModel
+    model = sklearnGPRModel(coords=np.array([[0.0], [1.0]]), obs=np.array([[0.0], [1.0]]), verbose=False)
+    assert (model.gpu_name, model.cpu_name) == (env.gpu_name, env.cpu_name)
+
+    monkeypatch.undo()
+    clear_environment_cache()
+    assert environment() is not env
+
+
+def test_environment_gpu_from_torch(monkeypatch):
+    # GPUs visible to PyTorch are found (e.g. for GPyTorch models), including if it is imported after the
+    # environment was first detected
+    import sys
+    import types
+    monkeypatch.delitem(sys.modules, "torch", raising=False)
+    clear_environment_cache()
+    if environment().gpu_name is not None:
+        pytest.skip("a GPU is visible to TensorFlow")
+
+    cuda = types.SimpleNamespace(is_available=lambda: True, get_device_name=lambda i: f"Fake GPU {i}")
+    monkeypatch.setitem(sys.modules, "torch", types.SimpleNamespace(cuda=cuda))
+    assert environment().gpu_name == "Fake GPU 0"
+
+    monkeypatch.undo()
+    clear_environment_cache()
@@ -0,0 +1,60 @@
+# startup benchmark: importing light-weight modules should not pull in heavy (optional) packages
+
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+# heavy packages which should only be imported when the backend / feature requiring them is used
+HEAVY_MODULES = ["tensorflow", "gpflow", "torch", "gpytorch", "cartopy", "numba", "matplotlib", "sklearn"]
+
+# time budget (seconds) for importing GPSat.dataloader in a fresh process
+IMPORT_TIME_BUDGET = float(os.environ.get("GPSAT_IMPORT_TIME_BUDGET", 3.0))
+
+
+def _import_in_subprocess(module):
+    code = f"""
+import sys, time, json
+t0 = time.perf_counter()
+import {module}
+t1 = time.perf_counter()
+print(json.dumps({{"time": t1 - t0, "modules": sorted(m for m in {HEAVY_MODULES} if m in sys.modules)}}))
+"""
+    out = subprocess.check_output([sys.executable, "-c", code], text=True)
+    return json.loads(out.strip().split("\n")[-1])
+
+
+@pytest.mark.parametrize("module", ["GPSat.dataloader", "GPSat.utils", "GPSat.models",
+                                    "GPSat.prediction_locations", "GPSat.local_experts",
+                                    "GPSat.models.pure_python_gpr"])
+def test_no_heavy_imports(module):
+    out = _import_in_subprocess(module)
+    assert out["modules"] == [], f"importing {module} imported: {out['modules']}"
+
+
+def test_dataloader_import_time():
+    # take the best of a few attempts, to reduce the impact of a busy machine
+    times = [_import_in_subprocess("GPSat.dataloader")["time"] for _ in range(3)]
+    assert min(times) < IMPORT_TIME_BUDGET, \
+        f"importing GPSat.dataloader took {min(times):.2f}s, budget: {IMPORT_TIME_BUDGET}s"
+
+
+def test_non_tensorflow_models_do_not_import_tensorflow():
+    # constructing models which do not use TensorFlow (e.g. checking the device) should not import it
+    code = """
+import sys, json
+import numpy as np
+from GPSat.models import get_model
+from GPSat.runtime import environment
+rng = np.random.default_rng(0)
+coords, obs = rng.normal(size=(20, 2)), rng.normal(size=(20, 1))
+for name in ["sklearnGPRModel", "PurePythonGPR"]:
+    get_model(name)(coords=coords, obs=obs)
+print(json.dumps({"tensorflow": "tensorflow" in sys.modules, "gpu_name": environment().gpu_name}))
+"""
+    out = subprocess.check_output([sys.executable, "-c", code], text=True)
+    out = json.loads(out.strip().split("\n")[-1])
+    assert not out["tensorflow"], "constructing a non-TensorFlow model imported tensorflow"
+    assert out["gpu_name"] is None
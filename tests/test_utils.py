@@ -20,7 +20,7 @@ from GPSat.utils import array_to_dataframe, to_array, \
     dataframe_to_array, match, pandas_to_dict, grid_2d_flatten, convert_lon_lat_str, \
     config_func, EASE2toWGS84, WGS84toEASE2, nested_dict_literal_eval, \
     dataframe_to_2d_array, sigmoid, inverse_sigmoid, softplus, inverse_softplus, \
-    get_weighted_values
+    get_weighted_values, bin_obs_by_date
 
 # -----
 # convert_lon_lat_str
@@ -1123,3 +1123,75 @@ def test_shape_mismatch(ref_col, dist_to_col):
     })
     with pytest.raises(AssertionError):
         get_weighted_values(df, ref_col, dist_to_col, 'value1', lengthscale=1.0)
+
+
+# ---
+# bin_obs_by_date
+# ---
+
+@pytest.fixture
+def date_obs_df():
+    rng = np.random.default_rng(0)
+    n = 1000
+    return pd.DataFrame({
+        'x': rng.uniform(-100, 100, n),
+        'y': rng.uniform(-100, 100, n),
+        'obs': rng.normal(size=n),
+        'date': rng.choice(['20200101', '20200102', '20200105'], n)
+    })
+
+
+@pytest.mark.parametrize("bin_statistic", ["mean", "count", "median"])
+def test_bin_obs_by_date_matches_per_date_binning(date_obs_df, bin_statistic):
+    """Binning all dates at once should match binning each date separately."""
+    import scipy.stats as scst
+    bvals, x_edge, y_edge = bin_obs_by_date(date_obs_df, 'obs',
+                                            x_min=-100, x_max=100, y_min=-100, y_max=100,
+                                            n_x=10, n_y=8, bin_statistic=bin_statistic)
+    assert list(bvals.keys()) == ['20200101', '20200102', '20200103', '20200104', '20200105']
+    for d, b in bvals.items():
+        assert b.shape == (8, 10)
+        _ = date_obs_df.loc[date_obs_df['date'] == d]
+        if len(_) == 0:
+            assert np.isnan(b).all()
+            continue
+        expected = scst.binned_statistic_2d(_['x'].values, _['y'].values, _['obs'].values,
+                                            statistic=bin_statistic, bins=[x_edge, y_edge])[0].T
+        np.testing.assert_allclose(b, expected)
+
+
+def test_bin_obs_by_date_return_types(date_obs_df, tmp_path):
+    """array, xarray and file outputs should all contain the same values."""
+    import tables
+    kwargs = dict(x_min=-100, x_max=100, y_min=-100, y_max=100, n_x=10, n_y=8)
+    arr, x_edge, y_edge, dates = bin_obs_by_date(date_obs_df, 'obs', return_type="array", **kwargs)
+    assert arr.shape == (5, 8, 10)
+    assert len(dates) == 5
+
+    da, _, _ = bin_obs_by_date(date_obs_df, 'obs', return_type="xarray", **kwargs)
+    assert da.dims == ("date", "y", "x")
+    np.testing.assert_array_equal(da.values, arr)
+
+    out_file = str(tmp_path / "binned.h5")
+    res, _, _, _ = bin_obs_by_date(date_obs_df, 'obs', out_file=out_file, dates_per_chunk=2, **kwargs)
+    assert res == out_file
+    with tables.open_file(out_file, mode="r") as h5:
+        assert h5.root.obs.chunkshape == (1, 8, 10)
+        np.testing.assert_array_equal(h5.root.obs[:], arr)
+
+
+@pytest.mark.parametrize("all_dates_in_range", [True, False])
+def test_bin_obs_by_date_missing_dates(all_dates_in_range):
+    """Observations without a date should be dropped, not added to the last date."""
+    df = pd.DataFrame({
+        'x': [0.5, 0.5, 0.5, 0.5],
+        'y': [0.5, 0.5, 0.5, 0.5],
+        'obs': [1.0, 1.0, 100.0, 100.0],
+        'date': ['20200101', '20200103', None, np.nan]
+    })
+    bvals, _, _ = bin_obs_by_date(df, 'obs', all_dates_in_range=all_dates_in_range,
+                                  x_min=0, x_max=1, y_min=0, y_max=1, n_x=1, n_y=1)
+    expected_dates = ['20200101', '20200102', '20200103'] if all_dates_in_range else ['20200101', '20200103']
+    assert list(bvals.keys()) == expected_dates
+    assert bvals['20200101'][0, 0] == 1.0
+    assert bvals['20200103'][0, 0] == 1.0